@@ -0,0 +1,195 @@
+import gzip
+import random
+import time
+
+from datetime import datetime
+from datetime import timedelta
+from decimal import Decimal
+from microlib.microlib import encode_response_body
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+'''
+    python -m benchmarks.bench_compression
+
+    Compares compression ratio against cpu time for json year
+    payloads the size of /years/{year} and a multi year /search
+'''
+BENCHMARK_REPEAT = 5
+
+MOCK_SHOWS = [
+    "Dragon Ball Z Kai", "Jojo's Bizarre Adventure", "Hunter x Hunter",
+    "Naruto Shippuden", "One Piece", "Black Clover", "My Hero Academia",
+    "Attack on Titan", "Sword Art Online", "Star Wars the Clone Wars",
+    "Dr. Stone", "One Punch Man", "Gundam: Iron-Blooded Orphans"
+]
+
+MOCK_TIMESLOTS = [
+    "11:00", "11:30", "12:00", "12:30", "1:00", "1:30", "2:00",
+    "2:30", "3:00", "3:30", "4:00", "4:30", "5:00"
+]
+
+
+def representative_year(year, random_generator):
+    """Builds one year of television ratings, every saturday night
+        with one rating per timeslot
+
+        Parameters
+        ----------
+        year : int
+            year of the ratings
+
+        random_generator : random.Random
+            seeded generator so payloads are repeatable
+
+        Returns
+        -------
+        year_ratings : list
+            list of dict where each dict is a television show
+            rating as returned by dynamodb
+
+        Raises
+        ------
+    """
+    saturday_night = datetime(year, 1, 1)
+    saturday_night += timedelta(days=(5 - saturday_night.weekday()) % 7)
+
+    year_ratings = []
+    while saturday_night.year == year:
+        for timeslot in MOCK_TIMESLOTS:
+            total_viewers = random_generator.randint(250, 1500)
+            year_ratings.append({
+                "RATINGS_OCCURRED_ON": saturday_night.strftime("%Y-%m-%d"),
+                "TIME": timeslot,
+                "SHOW": random_generator.choice(MOCK_SHOWS),
+                "TOTAL_VIEWERS": Decimal(total_viewers),
+                "YEAR": Decimal(year),
+                "PERCENTAGE_OF_HOUSEHOLDS": Decimal(total_viewers * 48 // 1000) / 100,
+                "TOTAL_VIEWERS_AGE_18_49": Decimal(total_viewers * 6 // 10)
+            })
+        saturday_night += timedelta(days=7)
+
+    return(year_ratings)
+
+
+def time_compression(compress_function, encoded_body):
+    """Returns the compressed size and best time of compress_function
+
+        Parameters
+        ----------
+        compress_function : function
+            called with encoded_body
+
+        encoded_body : bytes
+            json payload
+
+        Returns
+        -------
+        compressed_bytes : int
+
+        best_milliseconds : float
+            fastest of BENCHMARK_REPEAT runs
+
+        Raises
+        ------
+    """
+    best_milliseconds = None
+    for benchmark_run in range(BENCHMARK_REPEAT):
+        start_time = time.perf_counter()
+        compressed_body = compress_function(encoded_body)
+        elapsed_milliseconds = (time.perf_counter() - start_time) * 1000
+
+        if best_milliseconds is None or elapsed_milliseconds < best_milliseconds:
+            best_milliseconds = elapsed_milliseconds
+
+    return(len(compressed_body), best_milliseconds)
+
+
+def compression_options():
+    """Returns each compression setting to benchmark
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        compression_options : list
+            list of (name, function) tuples
+
+        Raises
+        ------
+    """
+    compression_options = [
+        (
+            "gzip-" + str(compress_level),
+            lambda encoded_body, compress_level=compress_level: gzip.compress(
+                encoded_body, compresslevel=compress_level, mtime=0
+            )
+        )
+        for compress_level in (1, 4, 6, 9)
+    ]
+
+    if brotli is not None:
+        compression_options.extend([
+            (
+                "br-" + str(quality),
+                lambda encoded_body, quality=quality: brotli.compress(
+                    encoded_body, quality=quality
+                )
+            )
+            for quality in (1, 5, 9, 11)
+        ])
+
+    return(compression_options)
+
+
+def main():
+    """Prints compression ratio and time for each payload
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+
+        Raises
+        ------
+    """
+    random_generator = random.Random(2013)
+
+    one_year = representative_year(year=2016, random_generator=random_generator)
+    five_years = []
+    for year in range(2014, 2019):
+        five_years.extend(
+            representative_year(year=year, random_generator=random_generator)
+        )
+
+    payloads = [
+        ("one year", encode_response_body(one_year)),
+        ("five year search", encode_response_body({"next": None, "ratings": five_years}))
+    ]
+
+    print("{:<18}{:<10}{:>12}{:>12}{:>8}{:>10}".format(
+        "payload", "encoding", "raw bytes", "compressed", "ratio", "ms"
+    ))
+    for payload_name, encoded_body in payloads:
+        for compression_name, compress_function in compression_options():
+            compressed_bytes, best_milliseconds = time_compression(
+                compress_function=compress_function,
+                encoded_body=encoded_body
+            )
+            print("{:<18}{:<10}{:>12}{:>12}{:>8.1f}{:>10.2f}".format(
+                payload_name,
+                compression_name,
+                len(encoded_body),
+                compressed_bytes,
+                len(encoded_body) / compressed_bytes,
+                best_milliseconds
+            ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,470 @@
+import json
+import logging
+import os
+import sys
+import timeit
+
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+'''
+    python -m benchmarks.bench_hot_paths [--update-baselines]
+
+    Microbenchmarks the request hot paths of the handlers against the
+    in memory tables of benchmarks.local_dynamodb, with one night, one
+    year and one long running show as payloads. Every timing alternates
+    with a calibration loop and is kept relative to it, so a slower or
+    busier machine does not fail the gate against
+    benchmarks/hot_path_baselines.json
+
+    The baselines are recorded with tests/requirements_dev.txt, which
+    does not install orjson. Wall clock gates are too noisy for the unit
+    tests on shared runners, builds/buildspec_benchmarks.yml runs this
+    gate in its own opt in CodeBuild project
+'''
+BENCHMARK_REPEAT = 5
+CALIBRATION_NUMBER = 3
+
+'''
+    a benchmark fails once its time relative to the calibration loop
+    is this many times its baseline, override with
+    BENCHMARK_MAX_SLOWDOWN
+'''
+MAX_SLOWDOWN = 2.5
+
+BASELINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "hot_path_baselines.json")
+
+'''
+    ten years of ratings, a year is 52 or 53 saturdays of 13 timeslots
+'''
+BENCHMARK_START_YEAR = 2012
+BENCHMARK_YEARS = 10
+BENCHMARK_YEAR = 2016
+BENCHMARK_NIGHT = "2016-06-04"
+
+
+def calibration_loop():
+    """Fixed pure python work timed next to every benchmark, it builds,
+        sorts and encodes Decimal items like the handlers do
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+
+        Raises
+        ------
+    """
+    from benchmarks.synthetic_ratings import synthetic_ratings
+
+    calibration_items = list(synthetic_ratings(nights_per_year=20))
+    calibration_items.sort(key=lambda calibration_item: calibration_item["TOTAL_VIEWERS"])
+    json.dumps(calibration_items, default=str)
+
+
+@contextmanager
+def benchmark_environment():
+    """Turns off the response cache, request metrics and info logging
+        so every call does the same work
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+
+        Raises
+        ------
+    """
+    benchmark_variables = {"RESPONSE_CACHE_MAX_BYTES": "0", "REQUEST_METRICS": "false"}
+    saved_variables = {
+        variable_name: os.environ.get(variable_name)
+        for variable_name in benchmark_variables
+    }
+    os.environ.update(benchmark_variables)
+
+    root_logger = logging.getLogger()
+    root_level = root_logger.level
+    root_logger.setLevel(logging.WARNING)
+
+    try:
+        yield
+    finally:
+        root_logger.setLevel(root_level)
+        for variable_name, variable_value in saved_variables.items():
+            if variable_value is None:
+                os.environ.pop(variable_name, None)
+            else:
+                os.environ[variable_name] = variable_value
+
+
+def hot_path_benchmarks():
+    """Builds the local tables, installs them and returns every benchmark
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        hot_path_benchmarks : dict
+            benchmark name to (function, calls per timing), each
+            function is called with no arguments
+
+        Raises
+        ------
+    """
+    from benchmarks.local_dynamodb import install_local_tables
+    from benchmarks.local_dynamodb import local_ratings_tables
+    from benchmarks.synthetic_ratings import synthetic_ratings
+    from microlib.microlib import encode_response_body
+    from microlib.microlib import lambda_proxy_response
+    from microservices.nights import nights
+    from microservices.search import search
+    from microservices.shows import shows
+    from microservices.years import years
+
+    ratings_table, rollup_table = local_ratings_tables(
+        television_ratings=synthetic_ratings(
+            start_year=BENCHMARK_START_YEAR,
+            years=BENCHMARK_YEARS
+        )
+    )
+    install_local_tables(local_tables=[ratings_table, rollup_table])
+
+    ratings_items = ratings_table.all_items()
+    long_running_show = Counter(
+        ratings_item["SHOW"] for ratings_item in ratings_items
+    ).most_common(1)[0][0]
+
+    payloads = {
+        "night": [
+            ratings_item for ratings_item in ratings_items
+            if ratings_item["RATINGS_OCCURRED_ON"] == BENCHMARK_NIGHT
+        ],
+        "year": [
+            ratings_item for ratings_item in ratings_items
+            if ratings_item["YEAR"] == BENCHMARK_YEAR
+        ],
+        "show": [
+            ratings_item for ratings_item in ratings_items
+            if ratings_item["SHOW"] == long_running_show
+        ]
+    }
+
+    search_start = datetime(BENCHMARK_YEAR, 3, 1)
+    search_end = datetime(BENCHMARK_YEAR, 8, 31)
+    query_parameter_dates = ["2016-06-04", "2016-13-04", "20160604", None, "2016-02-30"] * 20
+    path_parameters = {
+        "night": ["2016-06-04", "2016-6-4", "not a night", "2016-02-30"] * 25,
+        "year": ["2016", "20160", "two", "1999"] * 25,
+        "show": [long_running_show, "", "x" * 200, "Cowboy Bebop"] * 25
+    }
+
+    def proxy_event(path_parameters=None, query_parameters=None):
+        return({
+            "pathParameters": path_parameters,
+            "queryStringParameters": query_parameters,
+            "headers": {}
+        })
+
+    hot_path_benchmarks = {
+        "filter_ratings_year": (lambda: search.filter_ratings(
+            ratings_query_response=payloads["year"],
+            start_date=search_start,
+            end_date=search_end
+        ), 20),
+        "clean_query_parameter_string": (lambda: [
+            search.clean_query_parameter_string(query_parameter_date)
+            for query_parameter_date in query_parameter_dates
+        ], 20),
+        "clean_path_parameter_string": (lambda: [
+            clean_function(path_parameter)
+            for clean_function, parameter_name in (
+                (nights.clean_path_parameter_string, "night"),
+                (years.clean_path_parameter_string, "year"),
+                (shows.clean_path_parameter_string, "show")
+            )
+            for path_parameter in path_parameters[parameter_name]
+        ], 20),
+        "dynamodb_night_request": (
+            lambda: nights.dynamodb_night_request(night=BENCHMARK_NIGHT), 50),
+        "dynamodb_year_request": (
+            lambda: years.dynamodb_year_request(year=str(BENCHMARK_YEAR)), 5),
+        "dynamodb_show_request": (
+            lambda: shows.dynamodb_show_request(show_name=long_running_show), 5),
+        "dynamodb_range_request": (lambda: search.dynamodb_range_request(
+            start_date=search_start,
+            end_date=search_end
+        ), 5),
+        "main_nights": (lambda: nights.main(event=proxy_event(
+            path_parameters={"night": BENCHMARK_NIGHT})), 20),
+        "main_years": (lambda: years.main(event=proxy_event(
+            path_parameters={"year": str(BENCHMARK_YEAR)})), 3),
+        "main_shows": (lambda: shows.main(event=proxy_event(
+            path_parameters={"show": long_running_show})), 3),
+        "main_search": (lambda: search.main(event=proxy_event(query_parameters={
+            "startDate": search_start.strftime("%Y-%m-%d"),
+            "endDate": search_end.strftime("%Y-%m-%d")
+        })), 3)
+    }
+
+    for payload_name, payload in payloads.items():
+        hot_path_benchmarks["encode_response_body_" + payload_name] = (
+            lambda payload=payload: encode_response_body(payload),
+            20 if payload_name == "night" else 3
+        )
+        hot_path_benchmarks["lambda_proxy_response_" + payload_name] = (
+            lambda payload=payload: lambda_proxy_response(
+                status_code=200, headers_dict={}, response_body=payload
+            ),
+            20 if payload_name == "night" else 3
+        )
+
+    hot_path_benchmarks["lambda_proxy_response_year_gzip"] = (
+        lambda: lambda_proxy_response(
+            status_code=200, headers_dict={}, response_body=payloads["year"],
+            request_headers={"Accept-Encoding": "gzip"}
+        ),
+        3
+    )
+
+    return(hot_path_benchmarks)
+
+
+def time_benchmark(benchmark_function, benchmark_number, benchmark_repeat=None):
+    """Returns the fastest milliseconds per call of a benchmark and of
+        the calibration loop timed after each of its timings
+
+        Parameters
+        ----------
+        benchmark_function : function
+            called with no arguments
+
+        benchmark_number : int
+            calls per timing
+
+        benchmark_repeat : int
+            timings, defaults to BENCHMARK_REPEAT
+
+        Returns
+        -------
+        best_milliseconds : float
+
+        calibration_milliseconds : float
+
+        Raises
+        ------
+    """
+    if benchmark_repeat is None:
+        benchmark_repeat = BENCHMARK_REPEAT
+
+    '''
+        the first call builds indexes and clients
+    '''
+    benchmark_function()
+
+    benchmark_timer = timeit.Timer(benchmark_function)
+    calibration_timer = timeit.Timer(calibration_loop)
+    benchmark_timings = []
+    calibration_timings = []
+    for timing_number in range(benchmark_repeat):
+        benchmark_timings.append(
+            benchmark_timer.timeit(number=benchmark_number) / benchmark_number
+        )
+        calibration_timings.append(
+            calibration_timer.timeit(number=CALIBRATION_NUMBER) / CALIBRATION_NUMBER
+        )
+
+    return(min(benchmark_timings) * 1000, min(calibration_timings) * 1000)
+
+
+def run_benchmarks(benchmark_repeat=None):
+    """Times every hot path benchmark
+
+        Parameters
+        ----------
+        benchmark_repeat : int
+            timings of each benchmark, defaults to BENCHMARK_REPEAT
+
+        Returns
+        -------
+        benchmark_results : dict
+            benchmark name to dict of milliseconds per call and
+            relative, the milliseconds over those of the calibration
+            loop
+
+        Raises
+        ------
+    """
+    from microlib.microlib import reset_boto_clients
+    from microlib.microlib import reset_response_cache
+
+    benchmark_results = {}
+    with benchmark_environment():
+        try:
+            for benchmark_name, (benchmark_function, benchmark_number) in hot_path_benchmarks().items():
+                best_milliseconds, calibration_milliseconds = time_benchmark(
+                    benchmark_function=benchmark_function,
+                    benchmark_number=benchmark_number,
+                    benchmark_repeat=benchmark_repeat
+                )
+                benchmark_results[benchmark_name] = {
+                    "milliseconds": best_milliseconds,
+                    "relative": best_milliseconds / calibration_milliseconds
+                }
+        finally:
+            reset_boto_clients()
+            reset_response_cache()
+
+    return(benchmark_results)
+
+
+def load_baselines(baselines_path=None):
+    """Reads the stored baselines
+
+        Parameters
+        ----------
+        baselines_path : str
+            defaults to BASELINES_PATH
+
+        Returns
+        -------
+        baselines : dict
+            benchmark name to dict of milliseconds and relative
+
+        Raises
+        ------
+    """
+    with open(baselines_path or BASELINES_PATH, "r") as baselines_file:
+        return(json.load(baselines_file))
+
+
+def save_baselines(benchmark_results, baselines_path=None):
+    """Writes benchmark results as the new baselines
+
+        Parameters
+        ----------
+        benchmark_results : dict
+            from run_benchmarks
+
+        baselines_path : str
+            defaults to BASELINES_PATH
+
+        Returns
+        -------
+
+        Raises
+        ------
+    """
+    with open(baselines_path or BASELINES_PATH, "w") as baselines_file:
+        json.dump(
+            {
+                benchmark_name: {
+                    result_name: round(result_value, 4)
+                    for result_name, result_value in sorted(benchmark_result.items())
+                }
+                for benchmark_name, benchmark_result in sorted(benchmark_results.items())
+            },
+            baselines_file,
+            indent=2
+        )
+        baselines_file.write("\n")
+
+
+def regression_errors(benchmark_results, baselines, max_slowdown=None):
+    """Returns why benchmarks are slower than their baselines
+
+        Parameters
+        ----------
+        benchmark_results : dict
+            from run_benchmarks
+
+        baselines : dict
+            from load_baselines
+
+        max_slowdown : float
+            defaults to BENCHMARK_MAX_SLOWDOWN or MAX_SLOWDOWN
+
+        Returns
+        -------
+        regression_errors : list
+            str for each benchmark whose relative time is over
+            max_slowdown times its baseline, or without a baseline
+
+        Raises
+        ------
+    """
+    if max_slowdown is None:
+        max_slowdown = float(os.environ.get("BENCHMARK_MAX_SLOWDOWN", MAX_SLOWDOWN))
+
+    regression_errors = []
+    for benchmark_name, benchmark_result in sorted(benchmark_results.items()):
+        if benchmark_name not in baselines:
+            regression_errors.append(benchmark_name + " has no baseline, run "
+                "python -m benchmarks.bench_hot_paths --update-baselines")
+            continue
+
+        slowdown = benchmark_result["relative"] / baselines[benchmark_name]["relative"]
+        if slowdown > max_slowdown:
+            regression_errors.append(
+                "{benchmark_name} is {slowdown:.2f} times its baseline, over {max_slowdown}".format(
+                    benchmark_name=benchmark_name,
+                    slowdown=slowdown,
+                    max_slowdown=max_slowdown
+                )
+            )
+
+    return(regression_errors)
+
+
+def main():
+    """Prints each benchmark against its baseline, exits 1 on a
+        regression, --update-baselines stores the results instead
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+
+        Raises
+        ------
+    """
+    from microlib.microlib import orjson
+
+    if orjson is not None:
+        print("orjson is installed, the baselines are recorded without it, "
+            "compare in an environment from tests/requirements_dev.txt")
+
+    benchmark_results = run_benchmarks()
+
+    if "--update-baselines" in sys.argv[1:]:
+        save_baselines(benchmark_results=benchmark_results)
+        print("baselines written to " + BASELINES_PATH)
+        return
+
+    baselines = load_baselines()
+    print("{:<34}{:>10}{:>10}{:>10}".format("benchmark", "ms", "relative", "baseline"))
+    for benchmark_name, benchmark_result in sorted(benchmark_results.items()):
+        print("{:<34}{:>10.3f}{:>10.3f}{:>10.3f}".format(
+            benchmark_name,
+            benchmark_result["milliseconds"],
+            benchmark_result["relative"],
+            baselines.get(benchmark_name, {}).get("relative", float("nan"))
+        ))
+
+    all_errors = regression_errors(
+        benchmark_results=benchmark_results,
+        baselines=baselines
+    )
+    for regression_error in all_errors:
+        print(regression_error)
+
+    if all_errors:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
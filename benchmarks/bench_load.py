@@ -0,0 +1,359 @@
+import argparse
+import importlib
+import json
+import os
+import random
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
+from datetime import datetime
+from datetime import timedelta
+
+'''
+    python -m benchmarks.bench_load --years 8 --nights 52 --shows 13
+
+    Fills the in memory tables of benchmarks.local_dynamodb with
+    synthetic ratings, then calls each lambda_handler concurrently with
+    the events in tests/events and reports latency percentiles and
+    throughput. Threads share one process like concurrent requests to
+    one warm router container, not like separate lambda containers
+'''
+LOAD_ENDPOINTS = {
+    "nights": "microservices.nights.nights",
+    "years": "microservices.years.years",
+    "shows": "microservices.shows.shows",
+    "search": "microservices.search.search",
+    "aggregations": "microservices.aggregations.aggregations",
+    "showNames": "microservices.show_names.show_names"
+}
+DEFAULT_LOAD_ENDPOINTS = ("nights", "years", "shows", "search")
+
+EVENTS_DIRECTORY = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests", "events"
+)
+EVENT_FILES = {
+    "nights": "nights_proxy_event.json",
+    "years": "years_proxy_event.json",
+    "shows": "shows_proxy_event.json",
+    "search": "search_proxy_event.json",
+    "aggregations": "aggregations_proxy_event.json",
+    "showNames": "show_names_proxy_event.json"
+}
+
+'''
+    /search windows are up to this many days so requests cross
+    year boundaries
+'''
+SEARCH_WINDOW_DAYS = 120
+
+
+def load_event_fixtures(endpoints):
+    """Reads the proxy event fixture of each endpoint
+
+        Parameters
+        ----------
+        endpoints : list
+            keys of LOAD_ENDPOINTS
+
+        Returns
+        -------
+        event_fixtures : dict
+            endpoint to proxy event
+
+        Raises
+        ------
+    """
+    event_fixtures = {}
+    for endpoint in endpoints:
+        with open(os.path.join(EVENTS_DIRECTORY, EVENT_FILES[endpoint]), "r") as lambda_event:
+            event_fixtures[endpoint] = json.load(lambda_event)
+
+    return(event_fixtures)
+
+
+def request_event(endpoint, event_fixture, ratings_items, random_generator):
+    """Copies an event fixture with parameters that are in the table
+
+        Parameters
+        ----------
+        endpoint : str
+            key of LOAD_ENDPOINTS
+
+        event_fixture : dict
+            from load_event_fixtures
+
+        ratings_items : list
+            items of the ratings table the parameters are drawn from
+
+        random_generator : random.Random
+
+        Returns
+        -------
+        proxy_event : dict
+
+        Raises
+        ------
+    """
+    proxy_event = deepcopy(event_fixture)
+    ratings_item = random_generator.choice(ratings_items)
+
+    if endpoint == "nights":
+        proxy_event["pathParameters"] = {"night": ratings_item["RATINGS_OCCURRED_ON"]}
+    elif endpoint == "years":
+        proxy_event["pathParameters"] = {"year": str(ratings_item["YEAR"])}
+    elif endpoint == "shows":
+        proxy_event["pathParameters"] = {"show": ratings_item["SHOW"]}
+    elif endpoint == "aggregations":
+        proxy_event["pathParameters"] = {"dimension": "shows", "value": ratings_item["SHOW"]}
+    elif endpoint == "showNames":
+        proxy_event["queryStringParameters"] = {"prefix": ratings_item["SHOW"][:1]}
+    elif endpoint == "search":
+        start_date = datetime.strptime(ratings_item["RATINGS_OCCURRED_ON"], "%Y-%m-%d")
+        end_date = start_date + timedelta(days=random_generator.randint(7, SEARCH_WINDOW_DAYS))
+        proxy_event["queryStringParameters"] = {
+            "startDate": start_date.strftime("%Y-%m-%d"),
+            "endDate": end_date.strftime("%Y-%m-%d")
+        }
+
+    return(proxy_event)
+
+
+def latency_percentiles(latencies_ms):
+    """Returns nearest rank percentiles of request latencies
+
+        Parameters
+        ----------
+        latencies_ms : list
+            milliseconds of each request
+
+        Returns
+        -------
+        latency_stats : dict
+            p50, p95, p99, max and mean milliseconds
+
+        Raises
+        ------
+    """
+    sorted_latencies = sorted(latencies_ms)
+    if not sorted_latencies:
+        return({})
+
+    latency_stats = {
+        "p" + str(percentile): sorted_latencies[
+            max(int(-(-percentile * len(sorted_latencies) // 100)) - 1, 0)
+        ]
+        for percentile in (50, 95, 99)
+    }
+    latency_stats["max"] = sorted_latencies[-1]
+    latency_stats["mean"] = sum(sorted_latencies) / len(sorted_latencies)
+
+    return(latency_stats)
+
+
+def timed_invocation(lambda_handler, proxy_event):
+    """Calls a lambda_handler and times it
+
+        Parameters
+        ----------
+        lambda_handler : function
+
+        proxy_event : dict
+
+        Returns
+        -------
+        status_code : int
+            500 if the handler raised
+
+        latency_ms : float
+
+        Raises
+        ------
+    """
+    start_time = time.perf_counter()
+    try:
+        status_code = lambda_handler(event=proxy_event, context=None)["statusCode"]
+    except Exception:
+        status_code = 500
+
+    return(status_code, (time.perf_counter() - start_time) * 1000)
+
+
+def run_load(ratings_table, endpoints=DEFAULT_LOAD_ENDPOINTS, requests=200,
+    concurrency=8, seed=2012):
+    """Sends requests to each endpoint from concurrency threads
+
+        The local tables must already be installed with
+        benchmarks.local_dynamodb.install_local_tables
+
+        Parameters
+        ----------
+        ratings_table : benchmarks.local_dynamodb.LocalTable
+            table request parameters are drawn from
+
+        endpoints : list
+            keys of LOAD_ENDPOINTS
+
+        requests : int
+            requests per endpoint
+
+        concurrency : int
+            threads sending requests
+
+        seed : int
+            seed for the request parameters
+
+        Returns
+        -------
+        load_report : dict
+            endpoint, and all for every endpoint, to requests,
+            errors, throughput per second and latency_percentiles
+
+        Raises
+        ------
+    """
+    random_generator = random.Random(seed)
+    ratings_items = ratings_table.all_items()
+    event_fixtures = load_event_fixtures(endpoints=endpoints)
+    lambda_handlers = {
+        endpoint: importlib.import_module(LOAD_ENDPOINTS[endpoint]).lambda_handler
+        for endpoint in endpoints
+    }
+
+    load_requests = [
+        (endpoint, request_event(
+            endpoint=endpoint,
+            event_fixture=event_fixtures[endpoint],
+            ratings_items=ratings_items,
+            random_generator=random_generator
+        ))
+        for request_number in range(requests)
+        for endpoint in endpoints
+    ]
+
+    endpoint_results = {endpoint: [] for endpoint in endpoints}
+    load_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as load_pool:
+        load_futures = [
+            (endpoint, load_pool.submit(
+                timed_invocation, lambda_handlers[endpoint], proxy_event
+            ))
+            for endpoint, proxy_event in load_requests
+        ]
+        for endpoint, load_future in load_futures:
+            endpoint_results[endpoint].append(load_future.result())
+    load_seconds = time.perf_counter() - load_start
+
+    endpoint_results["all"] = [
+        endpoint_result
+        for endpoint in endpoints
+        for endpoint_result in endpoint_results[endpoint]
+    ]
+
+    return({
+        endpoint: {
+            "requests": len(request_results),
+            "errors": sum(status_code >= 500 for status_code, latency_ms in request_results),
+            "not_found": sum(status_code == 404 for status_code, latency_ms in request_results),
+            "throughput": len(request_results) / load_seconds,
+            "latency": latency_percentiles(
+                [latency_ms for status_code, latency_ms in request_results]
+            )
+        }
+        for endpoint, request_results in endpoint_results.items()
+    })
+
+
+def main():
+    """Builds the local tables, runs the load and prints the report
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+
+        Raises
+        ------
+    """
+    from benchmarks.local_dynamodb import install_local_tables
+    from benchmarks.local_dynamodb import local_ratings_tables
+    from benchmarks.synthetic_ratings import read_ratings
+    from benchmarks.synthetic_ratings import synthetic_ratings
+
+    argument_parser = argparse.ArgumentParser(description="offline load test of the lambda handlers")
+    argument_parser.add_argument("--start-year", type=int, default=2012)
+    argument_parser.add_argument("--years", type=int, default=8)
+    argument_parser.add_argument("--nights", type=int, default=52, help="nights per year")
+    argument_parser.add_argument("--shows", type=int, default=13, help="shows per night")
+    argument_parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    argument_parser.add_argument("--concurrency", type=int, default=8)
+    argument_parser.add_argument("--endpoints", default=",".join(DEFAULT_LOAD_ENDPOINTS),
+        help="comma separated, from " + ", ".join(LOAD_ENDPOINTS))
+    argument_parser.add_argument("--page-latency-ms", type=float, default=0,
+        help="simulated dynamodb round trip of each query page")
+    argument_parser.add_argument("--year-date-index", action="store_true",
+        help="add an index on YEAR sorted by RATINGS_OCCURRED_ON")
+    argument_parser.add_argument("--no-response-cache", action="store_true")
+    argument_parser.add_argument("--seed", type=int, default=2012)
+    argument_parser.add_argument("--ratings-file",
+        help="json lines from python -m benchmarks.synthetic_ratings instead of generating them")
+    load_arguments = argument_parser.parse_args()
+
+    '''
+        one metrics record and the info lines of every request would
+        flood the report
+    '''
+    os.environ.setdefault("REQUEST_METRICS", "false")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    if load_arguments.no_response_cache:
+        os.environ["RESPONSE_CACHE_MAX_BYTES"] = "0"
+
+    if load_arguments.ratings_file:
+        television_ratings = read_ratings(ratings_path=load_arguments.ratings_file)
+    else:
+        television_ratings = synthetic_ratings(
+            start_year=load_arguments.start_year,
+            years=load_arguments.years,
+            nights_per_year=load_arguments.nights,
+            shows_per_night=load_arguments.shows,
+            seed=load_arguments.seed
+        )
+
+    ratings_table, rollup_table = local_ratings_tables(
+        television_ratings=television_ratings,
+        table_name=os.environ.get("DYNAMO_TABLE_NAME", "prod_toonami_ratings"),
+        year_date_index=load_arguments.year_date_index,
+        page_latency_ms=load_arguments.page_latency_ms
+    )
+    install_local_tables(local_tables=[ratings_table, rollup_table])
+    print("{} ratings, {} rollups".format(
+        len(ratings_table.all_items()), len(rollup_table.all_items())
+    ))
+
+    load_report = run_load(
+        ratings_table=ratings_table,
+        endpoints=load_arguments.endpoints.split(","),
+        requests=load_arguments.requests,
+        concurrency=load_arguments.concurrency,
+        seed=load_arguments.seed
+    )
+
+    print("{:<14}{:>10}{:>8}{:>8}{:>10}{:>10}{:>10}{:>10}".format(
+        "endpoint", "requests", "errors", "404", "req/s", "p50 ms", "p95 ms", "p99 ms"
+    ))
+    for endpoint, endpoint_report in load_report.items():
+        print("{:<14}{:>10}{:>8}{:>8}{:>10.1f}{:>10.2f}{:>10.2f}{:>10.2f}".format(
+            endpoint,
+            endpoint_report["requests"],
+            endpoint_report["errors"],
+            endpoint_report["not_found"],
+            endpoint_report["throughput"],
+            endpoint_report["latency"]["p50"],
+            endpoint_report["latency"]["p95"],
+            endpoint_report["latency"]["p99"]
+        ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+import os
+import subprocess
+import sys
+
+'''
+    python -m benchmarks.bench_startup
+
+    Imports every lambda handler in a new interpreter with
+    python -X importtime, the same work a lambda init phase does, and
+    compares the import time against STARTUP_BUDGET_MS
+
+    The unit tests only check DEFERRED_MODULES, the wall clock budget
+    is too noisy for shared runners and is gated by
+    builds/buildspec_benchmarks.yml
+'''
+BENCHMARK_REPEAT = 5
+
+HANDLER_MODULES = [
+    "microservices.aggregations.aggregations",
+    "microservices.nights.nights",
+    "microservices.rollups.rollups",
+    "microservices.router.router",
+    "microservices.search.search",
+    "microservices.show_names.show_names",
+    "microservices.shows.shows",
+    "microservices.years.years"
+]
+
+'''
+    milliseconds each handler may spend being imported without
+    prewarm_boto_clients, about twice the measured time so only a new
+    heavy top level import goes over
+'''
+STARTUP_BUDGET_MS = {
+    "microservices.aggregations.aggregations": 200,
+    "microservices.nights.nights": 200,
+    "microservices.rollups.rollups": 200,
+    "microservices.router.router": 200,
+    "microservices.search.search": 200,
+    "microservices.show_names.show_names": 200,
+    "microservices.shows.shows": 200,
+    "microservices.years.years": 200
+}
+
+'''
+    only imported on first use or by prewarm_boto_clients
+'''
+DEFERRED_MODULES = ("boto3", "botocore", "pyarrow")
+
+REPOSITORY_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_importtime(importtime_output):
+    """Parses the stderr of python -X importtime
+
+        Parameters
+        ----------
+        importtime_output : str
+            lines of import time: self [us] | cumulative | imported package
+
+        Returns
+        -------
+        module_times : dict
+            module name to (self_us, cumulative_us)
+
+        Raises
+        ------
+    """
+    module_times = {}
+    for importtime_line in importtime_output.splitlines():
+        if not importtime_line.startswith("import time:"):
+            continue
+
+        self_us, cumulative_us, module_name = importtime_line[
+            len("import time:"):].split("|")
+        if not self_us.strip().isdigit():
+            continue
+
+        module_times[module_name.strip()] = (int(self_us), int(cumulative_us))
+
+    return(module_times)
+
+
+def measure_startup(handler_module, prewarm=False, benchmark_repeat=None):
+    """Imports handler_module in new interpreters
+
+        Parameters
+        ----------
+        handler_module : str
+            dotted module name of the handler
+
+        prewarm : boolean
+            True to set AWS_LAMBDA_FUNCTION_NAME so prewarm_boto_clients
+            builds the dynamodb clients while the handler is imported,
+            placeholder credentials stand in for the lambda role
+
+        benchmark_repeat : int
+            interpreters to start, defaults to BENCHMARK_REPEAT
+
+        Returns
+        -------
+        startup_stats : dict
+            import_ms of the fastest run, imported_modules and the
+            slowest modules by self time
+
+        Raises
+        ------
+        RuntimeError
+            if handler_module cannot be imported
+    """
+    if benchmark_repeat is None:
+        benchmark_repeat = BENCHMARK_REPEAT
+
+    startup_env = dict(os.environ)
+    startup_env.pop("AWS_LAMBDA_FUNCTION_NAME", None)
+    if prewarm is True:
+        startup_env.update({
+            "AWS_LAMBDA_FUNCTION_NAME": "bench_startup",
+            "AWS_ACCESS_KEY_ID": startup_env.get("AWS_ACCESS_KEY_ID", "bench_startup"),
+            "AWS_SECRET_ACCESS_KEY": startup_env.get("AWS_SECRET_ACCESS_KEY", "bench_startup")
+        })
+
+    fastest_times = None
+    for benchmark_run in range(benchmark_repeat):
+        import_process = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import " + handler_module],
+            cwd=REPOSITORY_ROOT,
+            env=startup_env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            universal_newlines=True
+        )
+        if import_process.returncode != 0:
+            raise RuntimeError(handler_module + " import failed\n" + import_process.stderr)
+
+        module_times = parse_importtime(importtime_output=import_process.stderr)
+
+        if fastest_times is None or (
+            module_times[handler_module][1] < fastest_times[handler_module][1]):
+            fastest_times = module_times
+
+    return({
+        "import_ms": fastest_times[handler_module][1] / 1000,
+        "imported_modules": set(fastest_times),
+        "slowest_modules": sorted(
+            fastest_times,
+            key=lambda module_name: fastest_times[module_name][0],
+            reverse=True
+        )[:3]
+    })
+
+
+def deferred_import_errors(handler_module, startup_stats):
+    """Returns the DEFERRED_MODULES a handler imports at import time
+
+        Parameters
+        ----------
+        handler_module : str
+            dotted module name of the handler
+
+        startup_stats : dict
+            from measure_startup without prewarm
+
+        Returns
+        -------
+        deferred_import_errors : list
+            str for each deferred module imported, empty if none are
+
+        Raises
+        ------
+    """
+    return([
+        handler_module + " imports " + module_name + " at import time"
+        for module_name in DEFERRED_MODULES
+        if module_name in startup_stats["imported_modules"]
+    ])
+
+
+def budget_errors(handler_module, startup_stats):
+    """Returns why a handler is over its startup budget
+
+        Parameters
+        ----------
+        handler_module : str
+            key of STARTUP_BUDGET_MS
+
+        startup_stats : dict
+            from measure_startup without prewarm
+
+        Returns
+        -------
+        budget_errors : list
+            str for each problem, empty if the handler is in budget
+
+        Raises
+        ------
+    """
+    budget_errors = deferred_import_errors(
+        handler_module=handler_module,
+        startup_stats=startup_stats
+    )
+
+    if startup_stats["import_ms"] > STARTUP_BUDGET_MS[handler_module]:
+        budget_errors.append("{handler_module} imports in {import_ms:.1f} ms, budget {budget_ms} ms".format(
+            handler_module=handler_module,
+            import_ms=startup_stats["import_ms"],
+            budget_ms=STARTUP_BUDGET_MS[handler_module]
+        ))
+
+    return(budget_errors)
+
+
+def main():
+    """Prints the import time of each handler with and without
+        prewarmed clients, exits 1 if a handler is over budget
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+
+        Raises
+        ------
+    """
+    print("{:<42}{:>10}{:>10}{:>10}  {}".format(
+        "handler", "import ms", "prewarm", "budget", "slowest modules"
+    ))
+
+    all_errors = []
+    for handler_module in HANDLER_MODULES:
+        startup_stats = measure_startup(handler_module=handler_module)
+        prewarm_stats = measure_startup(handler_module=handler_module, prewarm=True)
+        all_errors.extend(budget_errors(
+            handler_module=handler_module,
+            startup_stats=startup_stats
+        ))
+
+        print("{:<42}{:>10.1f}{:>10.1f}{:>10}  {}".format(
+            handler_module,
+            startup_stats["import_ms"],
+            prewarm_stats["import_ms"],
+            STARTUP_BUDGET_MS[handler_module],
+            ", ".join(startup_stats["slowest_modules"])
+        ))
+
+    for budget_error in all_errors:
+        print(budget_error)
+
+    if all_errors:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
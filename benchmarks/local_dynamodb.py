@@ -0,0 +1,657 @@
+import math
+import threading
+import time
+
+from bisect import bisect_left
+from bisect import bisect_right
+from contextlib import contextmanager
+from microlib.microlib import estimate_item_bytes
+from microlib.microlib import register_boto_client
+from microlib.microlib import reset_boto_clients
+from microlib.microlib import reset_response_cache
+from microlib.microlib import rollup_items
+from microlib.microlib import rollup_table_name
+from microlib.microlib import show_names_rollup
+
+'''
+    In memory stand in for the dynamodb Table resources the handlers
+    use, registered with register_boto_client so get_boto_clients
+    returns it instead of calling aws
+'''
+QUERY_PAGE_BYTES = 1024 * 1024
+READ_CAPACITY_UNIT_BYTES = 4 * 1024
+
+'''
+    the ratings table is keyed by night and timeslot, YEAR_ACCESS is
+    not sorted by night, see search.year_key_condition
+'''
+RATINGS_KEY_SCHEMA = [
+    {"AttributeName": "RATINGS_OCCURRED_ON", "KeyType": "HASH"},
+    {"AttributeName": "TIME", "KeyType": "RANGE"}
+]
+RATINGS_GLOBAL_SECONDARY_INDEXES = [
+    {
+        "IndexName": "SHOW_ACCESS",
+        "KeySchema": [
+            {"AttributeName": "SHOW", "KeyType": "HASH"},
+            {"AttributeName": "RATINGS_OCCURRED_ON", "KeyType": "RANGE"}
+        ]
+    },
+    {
+        "IndexName": "YEAR_ACCESS",
+        "KeySchema": [
+            {"AttributeName": "YEAR", "KeyType": "HASH"}
+        ]
+    }
+]
+YEAR_DATE_INDEX = {
+    "IndexName": "YEAR_DATE_ACCESS",
+    "KeySchema": [
+        {"AttributeName": "YEAR", "KeyType": "HASH"},
+        {"AttributeName": "RATINGS_OCCURRED_ON", "KeyType": "RANGE"}
+    ]
+}
+ROLLUP_KEY_SCHEMA = [
+    {"AttributeName": "ROLLUP", "KeyType": "HASH"},
+    {"AttributeName": "PERIOD", "KeyType": "RANGE"}
+]
+
+
+def _key_names(key_schema):
+    """Returns the hash and range attribute names of a key schema
+
+        Parameters
+        ----------
+        key_schema : list
+            KeySchema of a table or index
+
+        Returns
+        -------
+        hash_name : str
+
+        range_name : str
+            None if the key has no range attribute
+
+        Raises
+        ------
+    """
+    key_types = {
+        key_element["KeyType"]: key_element["AttributeName"]
+        for key_element in key_schema
+    }
+
+    return(key_types["HASH"], key_types.get("RANGE"))
+
+
+def _key_condition_parts(key_condition):
+    """Flattens a boto3 KeyConditionExpression into its comparisons
+
+        Parameters
+        ----------
+        key_condition : boto3.dynamodb.conditions.ConditionBase
+            for example Key("YEAR").eq(2019) & Key("RATINGS_OCCURRED_ON").between(...)
+
+        Returns
+        -------
+        condition_parts : dict
+            attribute name to (operator, values)
+
+        Raises
+        ------
+        ValueError
+            if the condition uses an operator a key condition cannot
+    """
+    condition_expression = key_condition.get_expression()
+    condition_operator = condition_expression["operator"]
+
+    if condition_operator == "AND":
+        condition_parts = {}
+        for condition_value in condition_expression["values"]:
+            condition_parts.update(_key_condition_parts(condition_value))
+        return(condition_parts)
+
+    if condition_operator not in ("=", "<", "<=", ">", ">=", "BETWEEN", "begins_with"):
+        raise ValueError("unsupported key condition " + condition_operator)
+
+    key_attribute = condition_expression["values"][0]
+
+    return({key_attribute.name: (condition_operator, condition_expression["values"][1:])})
+
+
+def _range_slice(range_values, condition_operator, condition_values):
+    """Returns the positions of the sorted range values a range key
+        condition selects
+
+        Parameters
+        ----------
+        range_values : list
+            sorted range key values of one partition
+
+        condition_operator : str
+            operator from _key_condition_parts
+
+        condition_values : tuple
+            operands of the operator
+
+        Returns
+        -------
+        first_position : int
+
+        last_position : int
+            exclusive
+
+        Raises
+        ------
+    """
+    if condition_operator == "=":
+        return(bisect_left(range_values, condition_values[0]),
+            bisect_right(range_values, condition_values[0]))
+    if condition_operator == "<":
+        return(0, bisect_left(range_values, condition_values[0]))
+    if condition_operator == "<=":
+        return(0, bisect_right(range_values, condition_values[0]))
+    if condition_operator == ">":
+        return(bisect_right(range_values, condition_values[0]), len(range_values))
+    if condition_operator == ">=":
+        return(bisect_left(range_values, condition_values[0]), len(range_values))
+    if condition_operator == "BETWEEN":
+        return(bisect_left(range_values, condition_values[0]),
+            bisect_right(range_values, condition_values[1]))
+
+    '''
+        begins_with on a string range key
+    '''
+    return(bisect_left(range_values, condition_values[0]),
+        bisect_left(range_values, condition_values[0] + "\U0010ffff"))
+
+
+def _projected_item(dynamodb_item, projection_expression, attribute_names):
+    """Returns the attributes of an item a ProjectionExpression selects
+
+        Parameters
+        ----------
+        dynamodb_item : dict
+
+        projection_expression : str
+            for example "#SHOW, TOTAL_VIEWERS", None for every attribute
+
+        attribute_names : dict
+            ExpressionAttributeNames
+
+        Returns
+        -------
+        projected_item : dict
+            copy, so callers can change it
+
+        Raises
+        ------
+    """
+    if projection_expression is None:
+        return(dict(dynamodb_item))
+
+    projected_names = [
+        attribute_names.get(projected_name.strip(), projected_name.strip())
+        for projected_name in projection_expression.split(",")
+    ]
+
+    return({
+        projected_name: dynamodb_item[projected_name]
+        for projected_name in projected_names
+        if projected_name in dynamodb_item
+    })
+
+
+class LocalTable:
+    """dynamodb Table resource kept in memory with global secondary
+        indexes, 1 MB query pages, LastEvaluatedKey and consumed capacity
+        like the service
+    """
+    def __init__(self, name, key_schema, global_secondary_indexes=None,
+        page_latency_ms=0):
+        """
+            Parameters
+            ----------
+            name : str
+                table name
+
+            key_schema : list
+                KeySchema of the table
+
+            global_secondary_indexes : list
+                GlobalSecondaryIndexes, each with IndexName and KeySchema
+
+            page_latency_ms : float
+                sleep before each page is returned, stands in for the
+                network round trip to dynamodb
+        """
+        self.name = name
+        self.key_schema = key_schema
+        self.global_secondary_indexes = global_secondary_indexes or []
+        self.page_latency_ms = page_latency_ms
+
+        self._table_key_names = [key_element["AttributeName"] for key_element in key_schema]
+        self._items = {}
+        self._partitions = {}
+        self._index_key_names = {}
+        self._lock = threading.Lock()
+
+    def _primary_key(self, dynamodb_item):
+        """Returns the table key of an item as a tuple
+        """
+        return(tuple(dynamodb_item[key_name] for key_name in self._table_key_names))
+
+    def _index_partitions(self, index_name):
+        """Returns the partitions of the table or of an index, rebuilt
+            after items are written
+
+            Parameters
+            ----------
+            index_name : str
+                None for the table
+
+            Returns
+            -------
+            index_partitions : dict
+                hash value to (range_values, sort_keys, items), sorted
+                by range value then table key
+
+            Raises
+            ------
+            ValueError
+                if the table has no index called index_name
+        """
+        with self._lock:
+            index_partitions = self._partitions.get(index_name)
+            if index_partitions is not None:
+                return(index_partitions)
+
+            if index_name is None:
+                key_schema = self.key_schema
+            else:
+                key_schemas = {
+                    global_secondary_index["IndexName"]: global_secondary_index["KeySchema"]
+                    for global_secondary_index in self.global_secondary_indexes
+                }
+                if index_name not in key_schemas:
+                    raise ValueError("The table does not have the specified index: " + index_name)
+                key_schema = key_schemas[index_name]
+
+            hash_name, range_name = _key_names(key_schema=key_schema)
+
+            partition_items = {}
+            for primary_key, dynamodb_item in self._items.items():
+                '''
+                    items without the index keys are not in the index
+                '''
+                if hash_name not in dynamodb_item:
+                    continue
+                if range_name is not None and range_name not in dynamodb_item:
+                    continue
+
+                sort_key = (
+                    (dynamodb_item[range_name],) if range_name is not None else ()
+                ) + primary_key
+                partition_items.setdefault(dynamodb_item[hash_name], []).append(
+                    (sort_key, dynamodb_item)
+                )
+
+            index_partitions = {}
+            for hash_value, sorted_items in partition_items.items():
+                sorted_items.sort(key=lambda sorted_item: sorted_item[0])
+                index_partitions[hash_value] = (
+                    [sort_key[0] for sort_key, dynamodb_item in sorted_items]
+                    if range_name is not None else [],
+                    [sort_key for sort_key, dynamodb_item in sorted_items],
+                    [dynamodb_item for sort_key, dynamodb_item in sorted_items]
+                )
+
+            self._partitions[index_name] = index_partitions
+            self._index_key_names[index_name] = (hash_name, range_name)
+
+            return(index_partitions)
+
+    def _page(self, candidate_items, query_kwargs):
+        """Returns one page of candidate_items the way query and scan
+            do, at most QUERY_PAGE_BYTES or Limit items
+
+            Parameters
+            ----------
+            candidate_items : iterable
+                items after ExclusiveStartKey in read order
+
+            query_kwargs : dict
+                arguments of the query or scan
+
+            Returns
+            -------
+            page_items : list
+
+            last_item : dict
+                last item read if there are more items, otherwise None
+
+            read_bytes : int
+
+            Raises
+            ------
+        """
+        item_limit = query_kwargs.get("Limit", float("inf"))
+        page_items = []
+        read_bytes = 0
+        last_item = None
+
+        for dynamodb_item in candidate_items:
+            page_items.append(dynamodb_item)
+            read_bytes += estimate_item_bytes(dynamodb_item)
+
+            if read_bytes >= QUERY_PAGE_BYTES or len(page_items) >= item_limit:
+                last_item = dynamodb_item
+                break
+
+        '''
+            like the service, a page that stops on the last item
+            still returns a LastEvaluatedKey and the next page is empty
+        '''
+        return(page_items, last_item, read_bytes)
+
+    def _response(self, page_items, last_item, read_bytes, query_kwargs, key_names):
+        """Builds a query or scan response from one page
+        """
+        if self.page_latency_ms:
+            time.sleep(self.page_latency_ms / 1000)
+
+        attribute_names = query_kwargs.get("ExpressionAttributeNames", {})
+        query_response = {
+            "Items": [
+                _projected_item(
+                    dynamodb_item=dynamodb_item,
+                    projection_expression=query_kwargs.get("ProjectionExpression"),
+                    attribute_names=attribute_names
+                )
+                for dynamodb_item in page_items
+            ],
+            "Count": len(page_items),
+            "ScannedCount": len(page_items)
+        }
+
+        if last_item is not None:
+            query_response["LastEvaluatedKey"] = {
+                key_name: last_item[key_name]
+                for key_name in key_names
+                if key_name is not None
+            }
+
+        if query_kwargs.get("ReturnConsumedCapacity", "NONE") != "NONE":
+            query_response["ConsumedCapacity"] = {
+                "TableName": self.name,
+                "CapacityUnits": math.ceil(read_bytes / READ_CAPACITY_UNIT_BYTES) * 0.5
+            }
+
+        return(query_response)
+
+    def query(self, **query_kwargs):
+        """Table.query with KeyConditionExpression as boto3 conditions
+        """
+        index_name = query_kwargs.get("IndexName")
+        index_partitions = self._index_partitions(index_name=index_name)
+        hash_name, range_name = self._index_key_names[index_name]
+
+        condition_parts = _key_condition_parts(query_kwargs["KeyConditionExpression"])
+        hash_operator, hash_values = condition_parts.pop(hash_name, (None, None))
+        if hash_operator != "=" or set(condition_parts) - {range_name}:
+            raise ValueError("Query condition missed key schema element: " + hash_name)
+
+        range_values, sort_keys, partition_items = index_partitions.get(
+            hash_values[0], ([], [], [])
+        )
+
+        first_position, last_position = 0, len(partition_items)
+        if range_name in condition_parts:
+            first_position, last_position = _range_slice(
+                range_values,
+                *condition_parts[range_name]
+            )
+
+        scan_forward = query_kwargs.get("ScanIndexForward", True)
+        exclusive_start_key = query_kwargs.get("ExclusiveStartKey")
+        if exclusive_start_key is not None:
+            start_sort_key = (
+                (exclusive_start_key[range_name],) if range_name is not None else ()
+            ) + self._primary_key(exclusive_start_key)
+
+            if scan_forward:
+                first_position = max(first_position, bisect_right(sort_keys, start_sort_key))
+            else:
+                last_position = min(last_position, bisect_left(sort_keys, start_sort_key))
+
+        if scan_forward:
+            candidate_items = (
+                partition_items[item_position]
+                for item_position in range(first_position, last_position)
+            )
+        else:
+            candidate_items = (
+                partition_items[item_position]
+                for item_position in range(last_position - 1, first_position - 1, -1)
+            )
+
+        page_items, last_item, read_bytes = self._page(
+            candidate_items=candidate_items,
+            query_kwargs=query_kwargs
+        )
+        return(self._response(
+            page_items=page_items,
+            last_item=last_item,
+            read_bytes=read_bytes,
+            query_kwargs=query_kwargs,
+            key_names=set(self._table_key_names) | {hash_name, range_name}
+        ))
+
+    def scan(self, **scan_kwargs):
+        """Table.scan in table key order
+        """
+        index_partitions = self._index_partitions(index_name=None)
+        table_items = [
+            dynamodb_item
+            for hash_value in sorted(index_partitions, key=str)
+            for dynamodb_item in index_partitions[hash_value][2]
+        ]
+
+        first_position = 0
+        exclusive_start_key = scan_kwargs.get("ExclusiveStartKey")
+        if exclusive_start_key is not None:
+            start_key = self._primary_key(exclusive_start_key)
+            first_position = 1 + next(
+                item_position
+                for item_position, dynamodb_item in enumerate(table_items)
+                if self._primary_key(dynamodb_item) == start_key
+            )
+
+        page_items, last_item, read_bytes = self._page(
+            candidate_items=table_items[first_position:],
+            query_kwargs=scan_kwargs
+        )
+        return(self._response(
+            page_items=page_items,
+            last_item=last_item,
+            read_bytes=read_bytes,
+            query_kwargs=scan_kwargs,
+            key_names=self._table_key_names
+        ))
+
+    def get_item(self, Key, **get_kwargs):
+        """Table.get_item
+        """
+        with self._lock:
+            dynamodb_item = self._items.get(self._primary_key(Key))
+
+        if dynamodb_item is None:
+            return({})
+
+        return({"Item": _projected_item(
+            dynamodb_item=dynamodb_item,
+            projection_expression=get_kwargs.get("ProjectionExpression"),
+            attribute_names=get_kwargs.get("ExpressionAttributeNames", {})
+        )})
+
+    def put_item(self, Item, **put_kwargs):
+        """Table.put_item
+        """
+        with self._lock:
+            self._items[self._primary_key(Item)] = dict(Item)
+            self._partitions.clear()
+
+        return({})
+
+    def delete_item(self, Key, **delete_kwargs):
+        """Table.delete_item
+        """
+        with self._lock:
+            self._items.pop(self._primary_key(Key), None)
+            self._partitions.clear()
+
+        return({})
+
+    def load_items(self, dynamodb_items):
+        """Writes every item of an iterable, faster than put_item
+            because the indexes are rebuilt once
+
+            Parameters
+            ----------
+            dynamodb_items : iterable
+
+            Returns
+            -------
+            item_count : int
+
+            Raises
+            ------
+        """
+        item_count = 0
+        with self._lock:
+            for dynamodb_item in dynamodb_items:
+                self._items[self._primary_key(dynamodb_item)] = dict(dynamodb_item)
+                item_count += 1
+            self._partitions.clear()
+
+        return(item_count)
+
+    def all_items(self):
+        """Returns every item of the table, not copied
+        """
+        with self._lock:
+            return(list(self._items.values()))
+
+    @contextmanager
+    def batch_writer(self):
+        """Table.batch_writer, every write is applied immediately
+        """
+        yield(self)
+
+
+class LocalDynamoClient:
+    """dynamodb client returned with the local tables, only
+        describe_table is implemented
+    """
+    def __init__(self, local_tables):
+        self.local_tables = {local_table.name: local_table for local_table in local_tables}
+
+    def describe_table(self, TableName):
+        """DynamoDB.Client.describe_table
+        """
+        local_table = self.local_tables[TableName]
+
+        return({"Table": {
+            "TableName": local_table.name,
+            "KeySchema": local_table.key_schema,
+            "GlobalSecondaryIndexes": local_table.global_secondary_indexes,
+            "ItemCount": len(local_table._items)
+        }})
+
+
+def local_ratings_tables(television_ratings, table_name="prod_toonami_ratings",
+    year_date_index=False, page_latency_ms=0):
+    """Builds the ratings table and its rollup table from ratings
+
+        Parameters
+        ----------
+        television_ratings : iterable
+            ratings table items, for example from
+            benchmarks.synthetic_ratings.synthetic_ratings or
+            benchmarks.synthetic_ratings.read_ratings
+
+        table_name : str
+            name of the ratings table
+
+        year_date_index : boolean
+            True to add YEAR_DATE_ACCESS, a YEAR index sorted by
+            RATINGS_OCCURRED_ON that /search reads date windows from
+
+        page_latency_ms : float
+            simulated round trip of each query page
+
+        Returns
+        -------
+        ratings_table : LocalTable
+
+        rollup_table : LocalTable
+
+        Raises
+        ------
+    """
+    global_secondary_indexes = list(RATINGS_GLOBAL_SECONDARY_INDEXES)
+    if year_date_index is True:
+        global_secondary_indexes.append(YEAR_DATE_INDEX)
+
+    ratings_table = LocalTable(
+        name=table_name,
+        key_schema=RATINGS_KEY_SCHEMA,
+        global_secondary_indexes=global_secondary_indexes,
+        page_latency_ms=page_latency_ms
+    )
+    ratings_table.load_items(television_ratings)
+
+    rollup_table = LocalTable(
+        name=rollup_table_name(),
+        key_schema=ROLLUP_KEY_SCHEMA,
+        page_latency_ms=page_latency_ms
+    )
+    built_rollups = rollup_items(television_ratings=ratings_table.all_items())
+    rollup_table.load_items(built_rollups.values())
+    rollup_table.put_item(Item=show_names_rollup(built_rollups=built_rollups))
+
+    return(ratings_table, rollup_table)
+
+
+def install_local_tables(local_tables, region_name="us-east-1"):
+    """Registers local tables so get_boto_clients returns them, and
+        empties every cache filled from the previous tables
+
+        Parameters
+        ----------
+        local_tables : list
+            LocalTable for each table name the handlers read
+
+        region_name : str
+            region the handlers ask for
+
+        Returns
+        -------
+
+        Raises
+        ------
+    """
+    reset_boto_clients()
+    reset_response_cache()
+
+    register_boto_client(
+        boto_object=LocalDynamoClient(local_tables=local_tables),
+        resource_name="dynamodb",
+        region_name=region_name
+    )
+    for local_table in local_tables:
+        register_boto_client(
+            boto_object=local_table,
+            resource_name="dynamodb",
+            region_name=region_name,
+            table_name=local_table.name
+        )
@@ -0,0 +1,352 @@
+import argparse
+import gzip
+import json
+import random
+import re
+
+from datetime import datetime
+from datetime import timedelta
+from decimal import Decimal
+
+'''
+    python -m benchmarks.synthetic_ratings --size 2GB --output ratings.json.gz
+
+    Generates television ratings shaped like the ratings table, the
+    same seed always produces the same ratings. Ratings are yielded one
+    at a time, so they stream from a few kilobytes to gigabytes into
+    a LocalTable of benchmarks.local_dynamodb or a json lines file
+'''
+SYNTHETIC_SEED = 2012
+
+'''
+    ordered most to least popular, SHOW_POPULARITY_EXPONENT skews
+    which shows are scheduled so the first few run for years like
+    long running shows do
+'''
+SYNTHETIC_SHOWS = [
+    "Dragon Ball Z Kai", "Naruto Shippuden", "One Piece", "My Hero Academia",
+    "Attack on Titan", "Black Clover", "Jojo's Bizarre Adventure",
+    "Hunter x Hunter", "Sword Art Online", "Star Wars the Clone Wars",
+    "Dr. Stone", "One Punch Man", "Gundam: Iron-Blooded Orphans",
+    "FLCL", "Space Dandy", "Cowboy Bebop", "Samurai Jack",
+    "Mob Psycho 100", "Fire Force", "Lupin the 3rd"
+]
+SHOW_POPULARITY_EXPONENT = 1.1
+
+'''
+    weeks a show holds its timeslot once scheduled, a season or more
+'''
+SHOW_RUN_WEEKS = (13, 26, 26, 52, 52, 104)
+
+'''
+    toonami airs saturday nights from 11pm to 5am
+'''
+SYNTHETIC_TIMESLOTS = [
+    "11:00", "11:30", "12:00", "12:30", "1:00", "1:30", "2:00",
+    "2:30", "3:00", "3:30", "4:00", "4:30", "5:00"
+]
+
+'''
+    production plus nights continue until 10:30 the next evening, 24
+    half hour timeslots that never repeat a TIME
+'''
+EXTENDED_TIMESLOTS = SYNTHETIC_TIMESLOTS + [
+    "5:30", "6:00", "6:30", "7:00", "7:30", "8:00", "8:30", "9:00",
+    "9:30", "10:00", "10:30"
+]
+
+'''
+    viewers of the first timeslot and how much of them each later
+    timeslot keeps
+'''
+PRIME_TIMESLOT_VIEWERS = 1500
+TIMESLOT_VIEWER_RETENTION = 0.88
+
+'''
+    last year a RATINGS_OCCURRED_ON date can have
+'''
+MAX_SYNTHETIC_YEAR = 9999
+
+SIZE_UNITS = {"": 1, "B": 1, "KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3}
+
+
+def saturday_nights(year, nights_per_year):
+    """Returns the first saturdays of a year
+
+        Parameters
+        ----------
+        year : int
+            year of the nights
+
+        nights_per_year : int
+            saturdays to return, at most every saturday of the year
+
+        Returns
+        -------
+        saturday_nights : list
+            YYYY-MM-DD str
+
+        Raises
+        ------
+    """
+    saturday_night = datetime(year, 1, 1)
+    saturday_night += timedelta(days=(5 - saturday_night.weekday()) % 7)
+
+    nights = []
+    while saturday_night.year == year and len(nights) < nights_per_year:
+        nights.append(saturday_night.strftime("%Y-%m-%d"))
+        if saturday_night > datetime.max - timedelta(days=7):
+            break
+        saturday_night += timedelta(days=7)
+
+    return(nights)
+
+
+def synthetic_ratings(start_year=2012, years=1, nights_per_year=52,
+    shows_per_night=len(SYNTHETIC_TIMESLOTS), seed=SYNTHETIC_SEED):
+    """Generator of ratings table items, years x nights x shows of them
+
+        Each timeslot keeps a show for one of SHOW_RUN_WEEKS, shows are
+        drawn by popularity, viewers fall through the night and later
+        timeslots air more reruns
+
+        Parameters
+        ----------
+        start_year : int
+            first year of ratings
+
+        years : int
+            number of years, None for every year until
+            MAX_SYNTHETIC_YEAR
+
+        nights_per_year : int
+            saturdays rated in each year, at most 53
+
+        shows_per_night : int
+            timeslots rated each night, at most len(EXTENDED_TIMESLOTS).
+            The first len(SYNTHETIC_TIMESLOTS) are the toonami block
+
+        seed : int
+            seed of the random generator
+
+        Returns
+        -------
+        synthetic_rating : dict
+            yields one televisionRating item at a time with Decimal
+            numbers as boto3 returns them
+
+        Raises
+        ------
+    """
+    random_generator = random.Random(seed)
+
+    show_weights = [
+        1 / (show_rank + 1) ** SHOW_POPULARITY_EXPONENT
+        for show_rank in range(len(SYNTHETIC_SHOWS))
+    ]
+    show_popularity = {
+        show_name: 0.7 + 0.6 * show_weight / show_weights[0]
+        for show_name, show_weight in zip(SYNTHETIC_SHOWS, show_weights)
+    }
+
+    '''
+        timeslot to [show, weeks left in its run], kept across years
+    '''
+    night_timeslots = EXTENDED_TIMESLOTS[:shows_per_night]
+    timeslot_runs = {timeslot: [None, 0] for timeslot in night_timeslots}
+
+    if years is None:
+        years = MAX_SYNTHETIC_YEAR + 1 - start_year
+
+    for year in range(start_year, start_year + years):
+        for ratings_night in saturday_nights(year=year, nights_per_year=nights_per_year):
+            for timeslot_number, timeslot in enumerate(night_timeslots):
+                timeslot_run = timeslot_runs[timeslot]
+                if timeslot_run[1] == 0:
+                    timeslot_run[0] = random_generator.choices(
+                        SYNTHETIC_SHOWS, weights=show_weights
+                    )[0]
+                    timeslot_run[1] = random_generator.choice(SHOW_RUN_WEEKS)
+                timeslot_run[1] -= 1
+
+                is_rerun = random_generator.random() < (
+                    0.1 + 0.5 * timeslot_number / len(EXTENDED_TIMESLOTS)
+                )
+                total_viewers = max(int(
+                    PRIME_TIMESLOT_VIEWERS
+                    * TIMESLOT_VIEWER_RETENTION ** timeslot_number
+                    * show_popularity[timeslot_run[0]]
+                    * random_generator.uniform(0.8, 1.2)
+                    * (0.75 if is_rerun else 1)
+                ), 1)
+                viewers_age_18_49 = total_viewers * random_generator.randint(40, 70) // 100
+
+                yield({
+                    "RATINGS_OCCURRED_ON": ratings_night,
+                    "TIME": timeslot,
+                    "SHOW": timeslot_run[0],
+                    "TOTAL_VIEWERS": Decimal(total_viewers),
+                    "YEAR": Decimal(year),
+                    "PERCENTAGE_OF_HOUSEHOLDS": Decimal(total_viewers * 48 // 1000) / 100,
+                    "TOTAL_VIEWERS_AGE_18_49": Decimal(viewers_age_18_49),
+                    "PERCENTAGE_OF_HOUSEHOLDS_AGE_18_49": Decimal(viewers_age_18_49 * 52 // 1000) / 100,
+                    "IS_RERUN": is_rerun
+                })
+
+
+def parse_size(size_string):
+    """Returns the bytes of a size such as 512KB or 2GB
+
+        Parameters
+        ----------
+        size_string : str
+            number and optional B, KB, MB or GB unit
+
+        Returns
+        -------
+        size_bytes : int
+
+        Raises
+        ------
+        ValueError
+            if size_string is not a size
+    """
+    size_match = re.fullmatch(r"\s*([0-9]+(?:\.[0-9]+)?)\s*([KMG]?B?)\s*", size_string.upper())
+    if size_match is None:
+        raise ValueError("not a size: " + size_string)
+
+    return(int(float(size_match.group(1)) * SIZE_UNITS[size_match.group(2)]))
+
+
+def open_ratings_file(ratings_path, file_mode):
+    """Opens a json lines ratings file, gzip compressed when the path
+        ends in .gz
+
+        Parameters
+        ----------
+        ratings_path : str
+
+        file_mode : str
+            "rt" or "wt"
+
+        Returns
+        -------
+        ratings_file : file object
+
+        Raises
+        ------
+    """
+    if ratings_path.endswith(".gz"):
+        return(gzip.open(ratings_path, file_mode, encoding="utf-8"))
+
+    return(open(ratings_path, file_mode[0], encoding="utf-8"))
+
+
+def write_ratings(television_ratings, ratings_path, max_bytes=None):
+    """Streams ratings to a json lines file, one televisionRating per
+        line
+
+        Parameters
+        ----------
+        television_ratings : iterable
+            ratings table items, for example from synthetic_ratings
+
+        ratings_path : str
+            file to write, gzip compressed when it ends in .gz
+
+        max_bytes : int
+            stop before the json lines would be larger, None to write
+            every rating
+
+        Returns
+        -------
+        item_count : int
+
+        written_bytes : int
+            bytes of json lines before compression
+
+        Raises
+        ------
+    """
+    from microlib.microlib import decimal_json_default
+
+    item_count = 0
+    written_bytes = 0
+    with open_ratings_file(ratings_path=ratings_path, file_mode="wt") as ratings_file:
+        for television_rating in television_ratings:
+            ratings_line = json.dumps(television_rating, default=decimal_json_default) + "\n"
+            if max_bytes is not None and written_bytes + len(ratings_line) > max_bytes:
+                break
+
+            ratings_file.write(ratings_line)
+            item_count += 1
+            written_bytes += len(ratings_line)
+
+    return(item_count, written_bytes)
+
+
+def read_ratings(ratings_path):
+    """Generator of the ratings in a file from write_ratings, numbers
+        are Decimal as boto3 returns them
+
+        Parameters
+        ----------
+        ratings_path : str
+
+        Returns
+        -------
+        television_rating : dict
+            yields one item at a time
+
+        Raises
+        ------
+    """
+    with open_ratings_file(ratings_path=ratings_path, file_mode="rt") as ratings_file:
+        for ratings_line in ratings_file:
+            yield(json.loads(ratings_line, parse_float=Decimal, parse_int=Decimal))
+
+
+def main():
+    """Writes synthetic ratings to a file, --size bounds the file
+        instead of --years
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+
+        Raises
+        ------
+    """
+    argument_parser = argparse.ArgumentParser(description="seeded synthetic television ratings")
+    argument_parser.add_argument("--output", required=True,
+        help="json lines file, gzip compressed when it ends in .gz")
+    argument_parser.add_argument("--size", help="for example 512KB or 2GB, before compression")
+    argument_parser.add_argument("--start-year", type=int, default=2012)
+    argument_parser.add_argument("--years", type=int, default=8,
+        help="ignored with --size, which writes years until the size is reached")
+    argument_parser.add_argument("--nights", type=int, default=52, help="nights per year")
+    argument_parser.add_argument("--shows", type=int, default=len(SYNTHETIC_TIMESLOTS),
+        help="shows per night, up to " + str(len(EXTENDED_TIMESLOTS)))
+    argument_parser.add_argument("--seed", type=int, default=SYNTHETIC_SEED)
+    ratings_arguments = argument_parser.parse_args()
+
+    item_count, written_bytes = write_ratings(
+        television_ratings=synthetic_ratings(
+            start_year=ratings_arguments.start_year,
+            years=None if ratings_arguments.size else ratings_arguments.years,
+            nights_per_year=ratings_arguments.nights,
+            shows_per_night=ratings_arguments.shows,
+            seed=ratings_arguments.seed
+        ),
+        ratings_path=ratings_arguments.output,
+        max_bytes=parse_size(ratings_arguments.size) if ratings_arguments.size else None
+    )
+    print("{} ratings, {} bytes written to {}".format(
+        item_count, written_bytes, ratings_arguments.output
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,11 @@ for lambda_code in */ ; do
     endpoint_name="${lambda_code%/}"
     echo "$endpoint_name is a directory"; 
 
+    #router imports the other endpoints as packages, packaged below
+    if [[ "$endpoint_name" == "router" ]]; then
+      continue
+    fi
+
     cd $endpoint_name
 
     #add microlib module
@@ -36,4 +41,26 @@ for lambda_code in */ ; do
   fi; 
 done
 
-cd ..
\ No newline at end of file
+cd ..
+
+#router lambda is only deployed when the stack apiDeployment is router
+router_function="${PROJECT_NAME}-router-endpoint-${BUILD_ENVIRONMENT}"
+if aws lambda get-function --function-name "$router_function" > /dev/null 2>&1; then
+  #keeps the microservices package layout, without the per endpoint
+  #archives and microlib copies made above
+  zip -r9 router.zip microlib microservices \
+          -x "microservices/*.zip" "microservices/*/microlib/*" "*__pycache__*"
+
+  aws lambda update-function-code \
+          --function-name "$router_function" \
+          --zip-file "fileb://router.zip"
+
+  aws lambda update-function-configuration \
+          --function-name "$router_function" \
+          --handler "microservices.router.router.lambda_handler" \
+          --runtime python3.8
+
+  mv router.zip microservices/
+
+  echo "$router_function"
+fi
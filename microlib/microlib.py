@@ -1,91 +1,3177 @@
-import boto3 
+import base64
+import binascii
+import gzip
+import hashlib
+import hmac
 import json
+import logging
+import os
+import random
+import threading
+import time
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+from decimal import Decimal
+from email.utils import formatdate
+from email.utils import parsedate_to_datetime
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+'''
+    Budget for paginated_query, the byte budget stays under the
+    6 MB lambda proxy response limit
+'''
+DEFAULT_QUERY_MAX_PAGES = 50
+DEFAULT_QUERY_MAX_BYTES = 5 * 1024 * 1024
+
+'''
+    televisionRating properties in templates/openapi3_spec.yml and
+    their schema types, RATING_FIELDS are the properties the fields
+    query parameter can select
+'''
+RATING_FIELD_TYPES = {
+    "RATINGS_OCCURRED_ON": "string",
+    "TIME": "string",
+    "SHOW": "string",
+    "TOTAL_VIEWERS": "integer",
+    "YEAR": "integer",
+    "PERCENTAGE_OF_HOUSEHOLDS": "number",
+    "TOTAL_VIEWERS_AGE_18_49": "integer",
+    "PERCENTAGE_OF_HOUSEHOLDS_AGE_18_49": "number",
+    "IS_RERUN": "boolean"
+}
+RATING_FIELDS = tuple(RATING_FIELD_TYPES)
+_RATING_NUMBER_FIELDS = frozenset(
+    field_name for field_name, field_type in RATING_FIELD_TYPES.items()
+    if field_type == "number"
+)
+
+'''
+    media type of each response format, selected with the format
+    query parameter or the Accept header
+'''
+RESPONSE_FORMATS = {
+    "rows": "application/json",
+    "columnar": "application/vnd.ratingsapi.columnar+json",
+    "ndjson": "application/x-ndjson"
+}
+
+'''
+    ndjson lines are grouped into chunks of about this many bytes so
+    a stream is not one write per rating
+'''
+NDJSON_CHUNK_BYTES = 64 * 1024
+
+'''
+    responses smaller than COMPRESSION_MIN_BYTES are not worth the
+    base64 overhead, levels chosen with benchmarks/bench_compression.py
+'''
+COMPRESSION_MIN_BYTES = 1024
+GZIP_COMPRESS_LEVEL = 6
+BROTLI_QUALITY = 5
+
+'''
+    upper bound on concurrent dynamodb requests from run_concurrently
+'''
+DEFAULT_MAX_WORKERS = 8
+_THREAD_POOL = None
+
+'''
+    Process wide registry of boto3 clients and dynamodb Table
+    resources keyed by (service, region, table, endpoint) so warm
+    lambda invocations reuse the same session and service model
+'''
+_BOTO_CLIENT_REGISTRY = {}
+_BOTO_CLIENT_REGISTRY_LOCK = threading.Lock()
+
+'''
+    boto3 resources are not thread safe, so only the main thread
+    uses the registered Table resources, other threads build their
+    own. Objects injected with register_boto_client are shared
+'''
+_THREAD_TABLE_RESOURCES = threading.local()
+_INJECTED_BOTO_KEYS = set()
+_BOTO_REGISTRY_GENERATION = 0
+
+'''
+    global secondary index names found by find_index_name
+'''
+_TABLE_INDEX_CACHE = {}
+
+'''
+    secrets manager values read by cursor_signing_key, keyed by arn
+'''
+_SECRET_VALUE_CACHE = {}
+
+'''
+    least recently used response cache of encoded bodies shared by
+    every endpoint, bounded by entries and by bytes. Inside lambda the
+    byte limit is RESPONSE_CACHE_MEMORY_FRACTION of the function memory,
+    RESPONSE_CACHE_MAX_BYTES is used elsewhere
+'''
+HISTORICAL_AGE_DAYS = 28
+RESPONSE_CACHE_HISTORICAL_TTL = 24 * 60 * 60
+RESPONSE_CACHE_CURRENT_TTL = 5 * 60
+RESPONSE_CACHE_MAX_BYTES = 8 * 1024 * 1024
+RESPONSE_CACHE_MEMORY_FRACTION = 1 / 16
+RESPONSE_CACHE_MAX_ENTRIES = 1024
+
+'''
+    set to true on responses missing ratings because a query reached
+    its page or byte budget
+'''
+TRUNCATED_RESPONSE_HEADER = "X-Results-Truncated"
+
+_RESPONSE_CACHE = OrderedDict()
+_RESPONSE_CACHE_LOCK = threading.Lock()
+_RESPONSE_CACHE_STATS = {
+    "hits": 0,
+    "misses": 0,
+    "evictions": 0,
+    "expirations": 0,
+    "bytes": 0
+}
+
+'''
+    summary items kept per night, year, show and show year by
+    microservices/rollups, keyed by ROLLUP and PERIOD
+'''
+DEFAULT_ROLLUP_TABLE_NAME = "prod_toonami_rollups"
+VIEWER_METRICS = ("TOTAL_VIEWERS", "TOTAL_VIEWERS_AGE_18_49")
+NIGHT_ROLLUP = "NIGHT"
+YEAR_ROLLUP = "YEAR"
+SHOW_ROLLUP_PREFIX = "SHOW#"
+ALL_PERIODS = "ALL"
+
+'''
+    every show with a rollup and the latest ratings night, PERIOD is
+    ALL_PERIODS, read by microservices/show_names
+'''
+SHOW_NAMES_ROLLUP = "SHOW_NAMES"
+
+'''
+    one record per request written to stdout in cloudwatch embedded
+    metric format, cloudwatch logs extracts the metrics so no
+    PutMetricData call is made. Phases are summed over every call, so
+    concurrent queries can add up to more than duration_ms
+'''
+METRICS_NAMESPACE = "ratingsapi"
+REQUEST_METRIC_UNITS = {
+    "pages": "Count",
+    "items": "Count",
+    "scanned_items": "Count",
+    "consumed_capacity": "Count",
+    "cache_hits": "Count",
+    "response_bytes": "Bytes"
+}
+
+_REQUEST_METRICS = {"endpoint": None, "phases": {}, "counters": {}, "properties": {}}
+_REQUEST_METRICS_LOCK = threading.Lock()
+
+'''
+    deadline and metrics record of the request that submitted the
+    run_concurrently_within_budget call running on this thread, a call
+    still running after the request ends stops at its next dynamodb
+    page and never counts towards a later request
+'''
+_BUDGET_CONTEXT = threading.local()
+
+'''
+    defaults for configure_logging, each can be overridden with the
+    environment variable of the same name. LOG_SAMPLE_RATES is the
+    fraction of requests that write each level, for example
+    INFO=0.1,DEBUG=0, WARNING and above are always written and
+    LOG_LEVEL=DEBUG writes everything
+'''
+LOG_LEVEL = "INFO"
+LOG_FORMAT = "json"
+LOG_SAMPLE_RATES = "DEBUG=1,INFO=1"
+
+'''
+    LogRecord attributes, anything else on a record came from extra
+    and is written as a field of the json line
+'''
+_LOG_RECORD_ATTRIBUTES = frozenset(
+    vars(logging.LogRecord("", logging.INFO, "", 0, "", (), None))
+) | {"message", "asctime", "request_id"}
+
+
+class JsonLogFormatter(logging.Formatter):
+    """Formats each log record as one line of json with the lambda
+        request id and any fields passed with extra
+    """
+    def format(self, record):
+        """Returns the json line for a log record
+
+            Parameters
+            ----------
+            record : logging.LogRecord
+
+            Returns
+            -------
+            json_line : str
+
+            Raises
+            ------
+        """
+        json_record = {
+            "level": record.levelname,
+            "function": record.funcName,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None)
+        }
+        json_record.update({
+            attribute_name: attribute_value
+            for attribute_name, attribute_value in vars(record).items()
+            if attribute_name not in _LOG_RECORD_ATTRIBUTES
+        })
+
+        if record.exc_info:
+            json_record["exception"] = self.formatException(record.exc_info)
+
+        return(json.dumps(json_record, default=str, separators=(",", ":")))
+
+
+class SampledLogFilter(logging.Filter):
+    """Drops DEBUG and INFO records of requests that were not sampled
+        for that level, every line of a sampled request is kept
+    """
+    def __init__(self):
+        super().__init__()
+        self.sampled_levels = None
+        self.request_id = None
+
+    def sample_request(self, sample_rates, request_id=None):
+        """Decides which levels the next request writes
+
+            Parameters
+            ----------
+            sample_rates : dict
+                level number to the fraction of requests written,
+                None to write every level
+
+            request_id : str
+                lambda request id added to every record
+
+            Returns
+            -------
+
+            Raises
+            ------
+        """
+        if sample_rates is None:
+            self.sampled_levels = None
+        else:
+            self.sampled_levels = {
+                level_number
+                for level_number, sample_rate in sample_rates.items()
+                if random.random() < sample_rate
+            }
+        self.request_id = request_id
+
+    def filter(self, record):
+        """Returns True if the record should be written
+
+            Parameters
+            ----------
+            record : logging.LogRecord
+
+            Returns
+            -------
+            keep_record : boolean
+
+            Raises
+            ------
+        """
+        record.request_id = self.request_id
+
+        if self.sampled_levels is None or record.levelno >= logging.WARNING:
+            return(True)
+
+        return(record.levelno in self.sampled_levels)
+
+
+_LOG_FILTER = SampledLogFilter()
+
+
+def log_sample_rates():
+    """Parses LOG_SAMPLE_RATES
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        sample_rates : dict
+            level number to the fraction of requests written, levels
+            that are not listed are always written
+
+        Raises
+        ------
+    """
+    sample_rates = {}
+    for level_rate in os.environ.get("LOG_SAMPLE_RATES", LOG_SAMPLE_RATES).split(","):
+        level_name, _, sample_rate = level_rate.partition("=")
+        level_number = logging.getLevelName(level_name.strip().upper())
+
+        try:
+            sample_rates[level_number] = min(max(float(sample_rate), 0.0), 1.0)
+        except ValueError:
+            continue
+
+    return({
+        level_number: sample_rate
+        for level_number, sample_rate in sample_rates.items()
+        if isinstance(level_number, int) and level_number < logging.WARNING
+    })
+
+
+def configure_logging(context=None):
+    """Sets the log level, json format and sampling of the root logger
+        for one lambda invocation
+
+        The formatter and filter are added to the handlers the lambda
+        runtime installed, so boto3 records are sampled as well
+
+        Parameters
+        ----------
+        context : LambdaContext
+            lambda context, aws_request_id is added to every record
+
+        Returns
+        -------
+        log_level : str
+            level the root logger was set to
+
+        Raises
+        ------
+    """
+    root_logger = logging.getLogger()
+    log_level = os.environ.get("LOG_LEVEL", LOG_LEVEL).upper()
+    root_logger.setLevel(log_level)
+
+    for log_handler in root_logger.handlers:
+        if _LOG_FILTER not in log_handler.filters:
+            log_handler.addFilter(_LOG_FILTER)
+
+        if os.environ.get("LOG_FORMAT", LOG_FORMAT).lower() == "json":
+            if not isinstance(log_handler.formatter, JsonLogFormatter):
+                log_handler.setFormatter(JsonLogFormatter())
+
+    '''
+        debug mode writes every line of every request
+    '''
+    _LOG_FILTER.sample_request(
+        sample_rates=None if log_level == "DEBUG" else log_sample_rates(),
+        request_id=getattr(context, "aws_request_id", None)
+    )
+
+    return(log_level)
+
+
+def reset_request_metrics(endpoint=None):
+    """Starts an empty metrics record for the next request
+
+        Parameters
+        ----------
+        endpoint : str
+            endpoint dimension of the record
+
+        Returns
+        -------
+
+        Raises
+        ------
+    """
+    global _REQUEST_METRICS
+
+    with _REQUEST_METRICS_LOCK:
+        _REQUEST_METRICS = {
+            "endpoint": endpoint,
+            "phases": {},
+            "counters": {},
+            "properties": {}
+        }
+
+
+def _current_request_metrics():
+    """Returns the metrics record this thread adds to, call with
+        _REQUEST_METRICS_LOCK held
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        request_metrics : dict
+            record of the request that submitted the budgeted call
+            running on this thread, otherwise the current request
+
+        Raises
+        ------
+    """
+    return(getattr(_BUDGET_CONTEXT, "request_metrics", _REQUEST_METRICS))
+
+
+@contextmanager
+def metrics_phase(phase_name):
+    """Adds the time spent in the block, or in the decorated function,
+        to phase_name of the current request
+
+        Parameters
+        ----------
+        phase_name : str
+            for example validate, clients, query, serialize or compress
+
+        Returns
+        -------
+
+        Raises
+        ------
+    """
+    phase_start = time.perf_counter()
+    try:
+        yield
+    finally:
+        phase_ms = (time.perf_counter() - phase_start) * 1000
+        with _REQUEST_METRICS_LOCK:
+            request_phases = _current_request_metrics()["phases"]
+            request_phases[phase_name] = request_phases.get(phase_name, 0.0) + phase_ms
+
+
+def record_request_metric(metric_name, metric_value):
+    """Adds metric_value to a counter of the current request
+
+        Parameters
+        ----------
+        metric_name : str
+            key of REQUEST_METRIC_UNITS
+
+        metric_value : float
+
+        Returns
+        -------
+
+        Raises
+        ------
+    """
+    with _REQUEST_METRICS_LOCK:
+        request_counters = _current_request_metrics()["counters"]
+        request_counters[metric_name] = request_counters.get(metric_name, 0) + metric_value
+
+
+def record_request_property(property_name, property_value):
+    """Sets a value logged with the current request that is not a metric
+
+        Parameters
+        ----------
+        property_name : str
+            for example status_code
+
+        property_value : str or int
+
+        Returns
+        -------
+
+        Raises
+        ------
+    """
+    with _REQUEST_METRICS_LOCK:
+        _current_request_metrics()["properties"][property_name] = property_value
+
+
+def record_query_metrics(query_response):
+    """Counts one page of a dynamodb query towards the current request
+
+        Parameters
+        ----------
+        query_response : dict
+            response of Table.query
+
+        Returns
+        -------
+
+        Raises
+        ------
+    """
+    record_request_metric(metric_name="pages", metric_value=1)
+    record_request_metric(metric_name="items",
+        metric_value=query_response.get("Count", len(query_response.get("Items", []))))
+    record_request_metric(metric_name="scanned_items",
+        metric_value=query_response.get("ScannedCount", 0))
+    record_request_metric(metric_name="consumed_capacity",
+        metric_value=query_response.get("ConsumedCapacity", {}).get("CapacityUnits", 0.0))
+
+
+def request_metrics_record(duration_ms):
+    """Returns the current request as a cloudwatch embedded metric
+        format record
+
+        Parameters
+        ----------
+        duration_ms : float
+            time spent in the request
+
+        Returns
+        -------
+        metrics_record : dict
+            every phase as <phase>_ms and every counter, with endpoint
+            as the only dimension
+
+        Raises
+        ------
+    """
+    with _REQUEST_METRICS_LOCK:
+        request_metrics = {
+            "duration_ms": round(duration_ms, 3)
+        }
+        metric_units = {"duration_ms": "Milliseconds"}
+
+        for phase_name, phase_ms in sorted(_REQUEST_METRICS["phases"].items()):
+            request_metrics[phase_name + "_ms"] = round(phase_ms, 3)
+            metric_units[phase_name + "_ms"] = "Milliseconds"
+
+        for metric_name, metric_value in sorted(_REQUEST_METRICS["counters"].items()):
+            request_metrics[metric_name] = metric_value
+            metric_units[metric_name] = REQUEST_METRIC_UNITS.get(metric_name, "Count")
+
+        metrics_record = dict(
+            _REQUEST_METRICS["properties"],
+            endpoint=str(_REQUEST_METRICS["endpoint"]),
+            **request_metrics
+        )
+
+    metrics_record["_aws"] = {
+        "Timestamp": int(time.time() * 1000),
+        "CloudWatchMetrics": [{
+            "Namespace": os.environ.get("METRICS_NAMESPACE", METRICS_NAMESPACE),
+            "Dimensions": [["endpoint"]],
+            "Metrics": [
+                {"Name": metric_name, "Unit": metric_unit}
+                for metric_name, metric_unit in metric_units.items()
+            ]
+        }]
+    }
+
+    return(metrics_record)
+
+
+@contextmanager
+def request_metrics(endpoint):
+    """Times a request, or the decorated main, and prints its metrics
+        record when it ends. Records are printed inside lambda, where
+        AWS_LAMBDA_FUNCTION_NAME is set, unless REQUEST_METRICS is
+        false, and elsewhere only when REQUEST_METRICS is true
+
+        Parameters
+        ----------
+        endpoint : str
+            endpoint dimension of the record
+
+        Returns
+        -------
+
+        Raises
+        ------
+    """
+    reset_request_metrics(endpoint=endpoint)
+    request_start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics_record = request_metrics_record(
+            duration_ms=(time.perf_counter() - request_start) * 1000
+        )
+        '''
+            on by default only inside lambda, so tests and scripts
+            calling main do not print a record each
+        '''
+        metrics_default = "false"
+        if os.environ.get("AWS_LAMBDA_FUNCTION_NAME") is not None:
+            metrics_default = "true"
+
+        if os.environ.get("REQUEST_METRICS", metrics_default).lower() != "false":
+            '''
+                print instead of logging, the lambda log format prefix
+                stops cloudwatch from parsing the json
+            '''
+            print(json.dumps(metrics_record, separators=(",", ":")))
+
+
+def decimal_json_default(json_value):
+    """json default for the Decimal values boto3 returns for dynamodb
+        numbers, following the televisionRating schema in
+        openapi3_spec.yml
+
+        Parameters
+        ----------
+        json_value : decimal.Decimal
+            value json cannot serialize
+
+        Returns
+        -------
+        json_number : int
+            int for integral values such as YEAR or TOTAL_VIEWERS,
+            float otherwise. Integral values of number properties are
+            converted before by _schema_typed_body
+
+        Raises
+        ------
+        TypeError
+            if json_value is not a Decimal
+    """
+    if isinstance(json_value, Decimal):
+        if json_value == json_value.to_integral_value():
+            return(int(json_value))
+        return(float(json_value))
+
+    raise TypeError("cannot serialize " + type(json_value).__name__)
+
+
+def _schema_typed_body(json_value, number_field=False):
+    """Returns json_value with the integral Decimal values of number
+        properties in RATING_FIELD_TYPES as float, so a
+        PERCENTAGE_OF_HOUSEHOLDS of 1.0 is not written as 1
+
+        Only the dicts and lists holding a converted value are copied,
+        the items passed in are never changed
+
+        Parameters
+        ----------
+        json_value : object
+            response body or a value inside it
+
+        number_field : boolean
+            True if json_value is the value, or a column of values, of
+            a number property
+
+        Returns
+        -------
+        typed_value : object
+            json_value itself when nothing was converted
+
+        Raises
+        ------
+    """
+    if isinstance(json_value, dict):
+        typed_value = json_value
+        for field_name, field_value in json_value.items():
+            if isinstance(field_value, (dict, list)) or (
+                isinstance(field_value, Decimal) and field_name in _RATING_NUMBER_FIELDS):
+                typed_field = _schema_typed_body(
+                    json_value=field_value,
+                    number_field=field_name in _RATING_NUMBER_FIELDS
+                )
+                if typed_field is not field_value:
+                    if typed_value is json_value:
+                        typed_value = dict(json_value)
+                    typed_value[field_name] = typed_field
+
+        return(typed_value)
+
+    if isinstance(json_value, list):
+        typed_value = json_value
+        for value_position, list_value in enumerate(json_value):
+            if isinstance(list_value, (dict, list)) or (
+                number_field and isinstance(list_value, Decimal)):
+                typed_item = _schema_typed_body(
+                    json_value=list_value,
+                    number_field=number_field
+                )
+                if typed_item is not list_value:
+                    if typed_value is json_value:
+                        typed_value = list(json_value)
+                    typed_value[value_position] = typed_item
+
+        return(typed_value)
+
+    '''
+        values that are not integral are already floats in
+        decimal_json_default
+    '''
+    if (number_field and isinstance(json_value, Decimal) and
+        json_value == json_value.to_integral_value()):
+        return(float(json_value))
+
+    return(json_value)
+
+
+def encode_response_body(response_body):
+    """Serializes a response body to json bytes without changing it,
+        using orjson if it is installed
+
+        Parameters
+        ----------
+        response_body : dict
+            dict or list to serialize, bytes are assumed to already be
+            encoded json and returned as is
+
+        Returns
+        -------
+        encoded_body : bytes
+            utf-8 json
+
+        Raises
+        ------
+        TypeError
+            if response_body contains a value json cannot serialize
+    """
+    if isinstance(response_body, bytes):
+        return(response_body)
+
+    with metrics_phase("serialize"):
+        response_body = _schema_typed_body(json_value=response_body)
+
+        if orjson is not None:
+            return(orjson.dumps(response_body, default=decimal_json_default))
+
+        return(json.dumps(
+            response_body,
+            default=decimal_json_default,
+            separators=(",", ":")
+        ).encode("utf-8"))
+
+
+def request_header(request_headers, header_name):
+    """Case insensitive lookup of a request header
+
+        Parameters
+        ----------
+        request_headers : dict
+            headers from the api gateway event, may be None
+
+        header_name : str
+            name of the header, for example If-None-Match
+
+        Returns
+        -------
+        header_value : str
+            None if the header was not sent
+
+        Raises
+        ------
+    """
+    if not request_headers:
+        return(None)
+
+    for request_header_name, header_value in request_headers.items():
+        if request_header_name.lower() == header_name.lower():
+            return(header_value)
+
+    return(None)
+
+
+def negotiate_content_encoding(request_headers):
+    """Chooses the response compression from the Accept-Encoding
+        request header
+
+        Parameters
+        ----------
+        request_headers : dict
+            headers from the api gateway event, may be None
+
+        Returns
+        -------
+        content_encoding : str
+            br if brotli is installed and accepted, otherwise gzip if
+            accepted, None for an uncompressed response
+
+        Raises
+        ------
+    """
+    accept_encoding = request_header(
+        request_headers=request_headers, header_name="Accept-Encoding"
+    )
+
+    if not accept_encoding:
+        return(None)
+
+    '''
+        coding name to q value, gzip;q=0 means gzip is not accepted
+    '''
+    accepted_encodings = {}
+    for encoding_option in accept_encoding.lower().split(","):
+        encoding_parts = encoding_option.strip().split(";")
+        quality = 1.0
+        for encoding_parameter in encoding_parts[1:]:
+            parameter_name, _, parameter_value = encoding_parameter.strip().partition("=")
+            if parameter_name == "q":
+                try:
+                    quality = float(parameter_value)
+                except ValueError:
+                    quality = 0.0
+        accepted_encodings[encoding_parts[0].strip()] = quality
+
+    for content_encoding in ("br", "gzip"):
+        if content_encoding == "br" and brotli is None:
+            continue
+        quality = accepted_encodings.get(
+            content_encoding, accepted_encodings.get("*", 0.0)
+        )
+        if quality > 0:
+            return(content_encoding)
+
+    return(None)
+
+
+def compress_response_body(encoded_body, content_encoding):
+    """Compresses an encoded response body
+
+        Parameters
+        ----------
+        encoded_body : bytes
+            body from encode_response_body
+
+        content_encoding : str
+            br or gzip from negotiate_content_encoding
+
+        Returns
+        -------
+        compressed_body : bytes
+
+        Raises
+        ------
+        ValueError
+            if content_encoding is not supported
+    """
+    if content_encoding == "gzip":
+        '''
+            mtime of 0 so the same body always compresses to the
+            same bytes
+        '''
+        return(gzip.compress(encoded_body, compresslevel=GZIP_COMPRESS_LEVEL,
+            mtime=0))
+
+    if content_encoding == "br" and brotli is not None:
+        return(brotli.compress(encoded_body, quality=BROTLI_QUALITY))
+
+    raise ValueError("unsupported content encoding " + str(content_encoding))
+
+
+def encode_batch_response(batch_keys, encoded_bodies, batch_errors):
+    """Joins the encoded response of each key in a batch request into
+        one json object without decoding them
+
+        Parameters
+        ----------
+        batch_keys : list
+            keys in the order requested, for example nights
+
+        encoded_bodies : dict
+            key to the encoded body from encode_response_body for keys
+            that were found
+
+        batch_errors : dict
+            key to an error dict with status and message for keys
+            that failed
+
+        Returns
+        -------
+        encoded_body : bytes
+            {key: {"status": 200, "ratings": [...]}} or
+            {key: {"status": 404, "message": "..."}} for each key
+
+        Raises
+        ------
+    """
+    batch_entries = []
+    for batch_key in batch_keys:
+        if batch_key in encoded_bodies:
+            batch_entry = b'{"status":200,"ratings":' + encoded_bodies[batch_key] + b"}"
+        else:
+            batch_entry = encode_response_body(batch_errors[batch_key])
+
+        batch_entries.append(encode_response_body(batch_key) + b":" + batch_entry)
+
+    return(b"{" + b",".join(batch_entries) + b"}")
+
+
+@metrics_phase("validate")
+def validate_format_parameter(event):
+    """Chooses the response format from the format query parameter,
+        falling back to the Accept request header
+
+        Parameters
+        ----------
+        event : dict
+            lambda_handler event from api gateway
+
+        Returns
+        -------
+        error_response : dict
+            None if the format is valid or not passed. Otherwise a
+            dict with keys status_code and message
+
+        response_format : str
+            key of RESPONSE_FORMATS, rows by default
+
+        Raises
+        ------
+    """
+    format_parameter = (event.get("queryStringParameters") or {}).get("format")
+
+    if format_parameter is not None:
+        if format_parameter not in RESPONSE_FORMATS:
+            logging.info("validate_format_parameter - invalid format")
+            return(
+                {
+                    "message": "format must be one of " + ", ".join(RESPONSE_FORMATS),
+                    "status_code": 400
+                },
+                None
+            )
+        return(None, format_parameter)
+
+    accept_header = (request_header(
+        request_headers=event.get("headers"), header_name="Accept"
+    ) or "").lower()
+
+    for response_format, media_type in RESPONSE_FORMATS.items():
+        if response_format != "rows" and media_type in accept_header:
+            return(None, response_format)
+
+    return(None, "rows")
+
+
+def response_format_headers(response_format):
+    """Returns the headers for a response in response_format
+
+        Parameters
+        ----------
+        response_format : str
+            key of RESPONSE_FORMATS
+
+        Returns
+        -------
+        headers_dict : dict
+            Content-Type of the format, Vary Accept since the same url
+            has a representation for each format
+
+        Raises
+        ------
+    """
+    return({
+        "Content-Type": RESPONSE_FORMATS[response_format],
+        "Vary": "Accept"
+    })
+
+
+@metrics_phase("convert")
+def columnar_ratings(television_ratings):
+    """Converts a list of ratings to one list per attribute in a
+        single pass, SHOW is dictionary encoded
+
+        Parameters
+        ----------
+        television_ratings : list
+            list of dict where each dict is a television show
+            rating
+
+        Returns
+        -------
+        columnar_body : dict
+            rows and columns, every column has one value per row with
+            None where a rating does not have the attribute. SHOW is a
+            dict of the distinct show names and the position of each
+            row's show in that list
+
+        Raises
+        ------
+    """
+    columns = {}
+    show_positions = {}
+    show_indices = []
+
+    for row_number, individual_rating in enumerate(television_ratings):
+        for attribute_name, attribute_value in individual_rating.items():
+            if attribute_name == "SHOW":
+                continue
+            attribute_column = columns.get(attribute_name)
+            if attribute_column is None:
+                attribute_column = columns[attribute_name] = [None] * row_number
+            attribute_column.append(attribute_value)
+
+        '''
+            pad the columns this rating does not have
+        '''
+        for attribute_column in columns.values():
+            if len(attribute_column) == row_number:
+                attribute_column.append(None)
+
+        show_name = individual_rating.get("SHOW")
+        if show_name is None:
+            show_indices.append(None)
+        else:
+            show_indices.append(
+                show_positions.setdefault(show_name, len(show_positions))
+            )
+
+    ordered_columns = {
+        attribute_name: columns[attribute_name]
+        for attribute_name in sorted(
+            columns,
+            key=lambda attribute_name: (
+                RATING_FIELDS.index(attribute_name)
+                if attribute_name in RATING_FIELDS else len(RATING_FIELDS),
+                attribute_name
+            )
+        )
+    }
+    if show_positions:
+        ordered_columns["SHOW"] = {
+            "dictionary": list(show_positions),
+            "indices": show_indices
+        }
+
+    return({"rows": len(show_indices), "columns": ordered_columns})
+
+
+def ndjson_chunks(television_ratings, chunk_bytes=None):
+    """Generator encoding one rating per line as the ratings arrive
+
+        Parameters
+        ----------
+        television_ratings : iterable
+            list or generator of dict where each dict is a television
+            show rating
+
+        chunk_bytes : int
+            yield once the lines reach this many bytes, defaults to
+            NDJSON_CHUNK_BYTES
+
+        Returns
+        -------
+        ndjson_chunk : bytes
+            yields newline terminated json lines
+
+        Raises
+        ------
+    """
+    if chunk_bytes is None:
+        chunk_bytes = NDJSON_CHUNK_BYTES
+
+    chunk_lines = []
+    chunk_size = 0
+    for individual_rating in television_ratings:
+        ndjson_line = encode_response_body(individual_rating) + b"\n"
+        chunk_lines.append(ndjson_line)
+        chunk_size += len(ndjson_line)
+
+        if chunk_size >= chunk_bytes:
+            yield(b"".join(chunk_lines))
+            chunk_lines = []
+            chunk_size = 0
+
+    if chunk_lines:
+        yield(b"".join(chunk_lines))
+
+
+def encode_ndjson_body(television_ratings):
+    """Encodes one rating per line into one body for a response that
+        is returned whole, use ndjson_chunks when the body is streamed
+
+        Parameters
+        ----------
+        television_ratings : iterable
+            list or generator of dict where each dict is a television
+            show rating
+
+        Returns
+        -------
+        encoded_body : bytes
+            newline terminated json lines, each rating is appended as
+            it arrives without holding a list of chunks
+
+        Raises
+        ------
+    """
+    ndjson_body = bytearray()
+    for individual_rating in television_ratings:
+        ndjson_body += encode_response_body(individual_rating)
+        ndjson_body += b"\n"
+
+    return(bytes(ndjson_body))
+
+
+def response_etag(encoded_body):
+    """Returns a weak entity tag for an encoded response body
+
+        Parameters
+        ----------
+        encoded_body : bytes
+            body from encode_response_body
+
+        Returns
+        -------
+        etag : str
+            weak so the tag still matches after the body is compressed
+
+        Raises
+        ------
+    """
+    return('W/"' + hashlib.sha256(encoded_body).hexdigest()[:32] + '"')
+
+
+def http_caching_policy(encoded_body, max_age, last_modified=None):
+    """Returns the http caching policy for a successful response
+
+        Parameters
+        ----------
+        encoded_body : bytes
+            body from encode_response_body
+
+        max_age : int
+            seconds clients and CDNs can reuse the response, see
+            response_cache_ttl
+
+        last_modified : str
+            most recent RATINGS_OCCURRED_ON in the response in
+            YYYY-MM-DD format, None if unknown
+
+        Returns
+        -------
+        http_caching : dict
+            etag, max_age and last_modified for lambda_proxy_response
+
+        Raises
+        ------
+    """
+    return({
+        "etag": response_etag(encoded_body=encoded_body),
+        "max_age": int(max_age),
+        "last_modified": last_modified
+    })
+
+
+def _ratings_night_datetime(ratings_night):
+    """Returns midnight UTC of a YYYY-MM-DD ratings night
+
+        Parameters
+        ----------
+        ratings_night : str
+            YYYY-MM-DD
+
+        Returns
+        -------
+        night_datetime : datetime.datetime
+            timezone aware
+
+        Raises
+        ------
+    """
+    return(datetime.strptime(ratings_night, "%Y-%m-%d").replace(
+        tzinfo=timezone.utc
+    ))
+
+
+def http_caching_headers(http_caching):
+    """Returns the ETag, Cache-Control and Last-Modified headers
+
+        Parameters
+        ----------
+        http_caching : dict
+            from http_caching_policy
+
+        Returns
+        -------
+        caching_headers : dict
+
+        Raises
+        ------
+    """
+    caching_headers = {
+        "ETag": http_caching["etag"],
+        "Cache-Control": "public, max-age=" + str(max(http_caching["max_age"], 0))
+    }
+
+    if http_caching.get("last_modified") is not None:
+        caching_headers["Last-Modified"] = formatdate(
+            _ratings_night_datetime(http_caching["last_modified"]).timestamp(),
+            usegmt=True
+        )
+
+    return(caching_headers)
+
+
+def truncated_response_headers(headers_dict):
+    """Returns headers_dict for a response built from a query that
+        stopped at the query budget, see paginated_query
+
+        The response is missing ratings so clients and CDNs must not
+        reuse it, it is also left out of the response cache
+
+        Parameters
+        ----------
+        headers_dict : dict
+            headers of the response
+
+        Returns
+        -------
+        truncated_headers : dict
+            headers_dict with TRUNCATED_RESPONSE_HEADER and
+            Cache-Control no-store
+
+        Raises
+        ------
+    """
+    record_request_property(property_name="truncated", property_value=True)
+
+    return(dict(headers_dict, **{
+        TRUNCATED_RESPONSE_HEADER: "true",
+        "Cache-Control": "no-store"
+    }))
+
+
+def request_not_modified(request_headers, http_caching):
+    """Evaluates the If-None-Match and If-Modified-Since request headers,
+        If-Modified-Since is ignored when If-None-Match is sent
+
+        Parameters
+        ----------
+        request_headers : dict
+            headers from the api gateway event, may be None
+
+        http_caching : dict
+            from http_caching_policy
+
+        Returns
+        -------
+        not_modified : bool
+            True if the client copy is current and a 304 can be returned
+
+        Raises
+        ------
+    """
+    if_none_match = request_header(
+        request_headers=request_headers, header_name="If-None-Match"
+    )
+
+    if if_none_match is not None:
+        '''
+            weak comparison, W/"abc" matches "abc"
+        '''
+        current_tag = http_caching["etag"].replace("W/", "", 1)
+        for client_tag in if_none_match.split(","):
+            client_tag = client_tag.strip()
+            if client_tag == "*" or client_tag.replace("W/", "", 1) == current_tag:
+                return(True)
+        return(False)
+
+    if_modified_since = request_header(
+        request_headers=request_headers, header_name="If-Modified-Since"
+    )
+
+    if if_modified_since is None or http_caching.get("last_modified") is None:
+        return(False)
+
+    try:
+        client_modified = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return(False)
+
+    if client_modified.tzinfo is None:
+        client_modified = client_modified.replace(tzinfo=timezone.utc)
+
+    return(
+        _ratings_night_datetime(http_caching["last_modified"]) <= client_modified
+    )
+
 
 def lambda_proxy_response(status_code, headers_dict, 
-    response_body):
+    response_body, request_headers=None, http_caching=None,
+    binary_body=False):
     """lambda proxy response handler
 
         Parameters
         ----------
-        status_code : int
-            status code of the response
+        status_code : int
+            status code of the response
+
+        headers_dict : dict 
+            dict for headers
+
+        response_body : dict
+            response body to return as string, bytes from
+            encode_response_body are not encoded again
+
+        request_headers : dict
+            headers from the api gateway event, bodies of at least
+            COMPRESSION_MIN_BYTES are compressed if the Accept-Encoding
+            header allows it
+
+        http_caching : dict
+            from http_caching_policy, adds ETag, Cache-Control and
+            Last-Modified headers and returns a 304 without a body
+            when the conditional request headers match
+
+        binary_body : boolean
+            True if response_body is bytes that are not utf-8, the
+            body is always base64 encoded
+        
+
+        Returns
+        -------
+        lambda_proxy_response : dict
+            lambda proxy response formatted as apigateway 
+            version 2.0 payload
+            
+
+        Raises
+        ------
+    """
+    encoded_body = encode_response_body(response_body)
+
+    if http_caching is not None:
+        headers_dict = dict(headers_dict, **http_caching_headers(
+            http_caching=http_caching
+        ))
+
+        if request_not_modified(request_headers=request_headers,
+            http_caching=http_caching):
+            headers_dict["Vary"] = _vary_header(headers_dict=headers_dict)
+            return(_recorded_response(
+                    {
+                        "statusCode": 304,
+                        "isBase64Encoded": False,
+                        "headers": headers_dict,
+                        "body": ""
+                    }
+            ))
+
+    content_encoding = None
+    if request_headers is not None:
+        headers_dict = dict(headers_dict, Vary=_vary_header(headers_dict=headers_dict))
+
+        if len(encoded_body) >= int(os.environ.get(
+            "COMPRESSION_MIN_BYTES", COMPRESSION_MIN_BYTES)):
+            content_encoding = negotiate_content_encoding(
+                request_headers=request_headers
+            )
+
+    if content_encoding is not None:
+        headers_dict["Content-Encoding"] = content_encoding
+        with metrics_phase("compress"):
+            compressed_body = compress_response_body(
+                encoded_body=encoded_body,
+                content_encoding=content_encoding
+            )
+
+        return(_recorded_response(
+                {
+                    "statusCode": status_code,
+                    "isBase64Encoded": True,
+                    "headers": headers_dict,
+                    "body": base64.b64encode(compressed_body).decode("ascii")
+                }
+        ))
+
+    if binary_body is True:
+        return(_recorded_response(
+                {
+                    "statusCode": status_code,
+                    "isBase64Encoded": True,
+                    "headers": headers_dict,
+                    "body": base64.b64encode(encoded_body).decode("ascii")
+                }
+        ))
+
+    return(_recorded_response(
+            {
+                "statusCode": status_code,
+                "isBase64Encoded": False,
+                "headers": headers_dict,
+                "body": encoded_body.decode("utf-8")
+            }
+    ))
+
+
+def _recorded_response(proxy_response):
+    """Records the status code and body size of a lambda proxy response
+        for the current request
+
+        Parameters
+        ----------
+        proxy_response : dict
+            from lambda_proxy_response
+
+        Returns
+        -------
+        proxy_response : dict
+            unchanged
+
+        Raises
+        ------
+    """
+    record_request_property(property_name="status_code",
+        property_value=proxy_response["statusCode"])
+    record_request_metric(metric_name="response_bytes",
+        metric_value=len(proxy_response["body"]))
+
+    return(proxy_response)
+
+
+def _vary_header(headers_dict):
+    """Adds Accept-Encoding to the Vary header an endpoint already set
+
+        Parameters
+        ----------
+        headers_dict : dict
+            response headers
+
+        Returns
+        -------
+        vary_header : str
+
+        Raises
+        ------
+    """
+    if headers_dict.get("Vary") is None:
+        return("Accept-Encoding")
+
+    return(headers_dict["Vary"] + ", Accept-Encoding")
+
+
+def _boto_registry_key(resource_name, region_name, table_name=None,
+    endpoint_url=None):
+    """Returns the key used to store a client in the registry
+
+        Parameters
+        ----------
+        resource_name : str
+            Name of the resource for the client
+
+        region_name : str
+            aws region of the client
+
+        table_name : str
+            dynamodb table name, None for a service client
+
+        endpoint_url : str
+            custom endpoint url, None for the aws default
+
+        Returns
+        -------
+        registry_key : tuple
+            (service, region, table, endpoint)
+
+        Raises
+        ------
+    """
+    return((resource_name, region_name, table_name, endpoint_url))
+
+
+def _build_boto_client(resource_name, region_name, endpoint_url=None):
+    """Creates a new boto3 client
+
+        Parameters
+        ----------
+        resource_name : str
+            Name of the resource for the client
+
+        region_name : str
+            aws region of the client
+
+        endpoint_url : str
+            custom endpoint url, only passed to boto3 if not None
+
+        Returns
+        -------
+        service_client : boto3.client
+            new boto3 client
+
+        Raises
+        ------
+    """
+    client_kwargs = {
+        "service_name": resource_name,
+        "region_name": region_name
+    }
+    if endpoint_url is not None:
+        client_kwargs["endpoint_url"] = endpoint_url
+
+    '''
+        boto3 is imported by the first client instead of at import
+        time, see prewarm_boto_clients
+    '''
+    import boto3
+
+    return(boto3.client(**client_kwargs))
+
+
+def _build_table_resource(resource_name, region_name, table_name,
+    endpoint_url=None):
+    """Creates a new boto3 dynamodb Table resource
+
+        Parameters
+        ----------
+        resource_name : str
+            Name of the resource for the client
+
+        region_name : str
+            aws region of the client
+
+        table_name : str
+            name of the dynamodb table
+
+        endpoint_url : str
+            custom endpoint url, only passed to boto3 if not None
+
+        Returns
+        -------
+        dynamodb_table_resource : boto3.resource.Table
+            new boto3 Table resource
+
+        Raises
+        ------
+    """
+    resource_kwargs = {
+        "service_name": resource_name,
+        "region_name": region_name
+    }
+    if endpoint_url is not None:
+        resource_kwargs["endpoint_url"] = endpoint_url
+
+    import boto3
+
+    return(boto3.resource(**resource_kwargs).Table(table_name))
+
+
+def _get_registered(registry_key, builder, *builder_args):
+    """Returns the registry entry for registry_key, building it
+        with builder on first use
+
+        Parameters
+        ----------
+        registry_key : tuple
+            key from _boto_registry_key
+
+        builder : function
+            called with builder_args if registry_key is not registered
+
+        Returns
+        -------
+        registered_object : object
+            cached boto3 client or resource
+
+        Raises
+        ------
+    """
+    registered_object = _BOTO_CLIENT_REGISTRY.get(registry_key)
+    if registered_object is not None:
+        return(registered_object)
+
+    with _BOTO_CLIENT_REGISTRY_LOCK:
+        '''
+            another thread may have built the client while
+            we were waiting on the lock
+        '''
+        registered_object = _BOTO_CLIENT_REGISTRY.get(registry_key)
+        if registered_object is None:
+            registered_object = builder(*builder_args)
+            _BOTO_CLIENT_REGISTRY[registry_key] = registered_object
+
+    return(registered_object)
+
+
+def _get_table_resource(registry_key, resource_name, region_name,
+    table_name, endpoint_url=None):
+    """Returns the Table resource for registry_key that the calling
+        thread may use
+
+        The main thread gets the registered resource, other threads
+        get one built for that thread on first use
+
+        Parameters
+        ----------
+        registry_key : tuple
+            key from _boto_registry_key
+
+        resource_name : str
+            Name of the resource for the client
+
+        region_name : str
+            aws region of the client
+
+        table_name : str
+            name of the dynamodb table
+
+        endpoint_url : str
+            custom endpoint url
+
+        Returns
+        -------
+        dynamodb_table_resource : boto3.resource.Table
+            Table resource owned by the calling thread, or the
+            injected object
+
+        Raises
+        ------
+    """
+    if (threading.current_thread() is threading.main_thread() or
+        registry_key in _INJECTED_BOTO_KEYS):
+        return(_get_registered(registry_key, _build_table_resource,
+            resource_name, region_name, table_name, endpoint_url))
+
+    '''
+        resources of a thread are dropped after reset_boto_clients
+    '''
+    if getattr(_THREAD_TABLE_RESOURCES, "generation", None) != _BOTO_REGISTRY_GENERATION:
+        _THREAD_TABLE_RESOURCES.generation = _BOTO_REGISTRY_GENERATION
+        _THREAD_TABLE_RESOURCES.table_resources = {}
+
+    dynamodb_table_resource = _THREAD_TABLE_RESOURCES.table_resources.get(registry_key)
+    if dynamodb_table_resource is None:
+        dynamodb_table_resource = _build_table_resource(resource_name,
+            region_name, table_name, endpoint_url)
+        _THREAD_TABLE_RESOURCES.table_resources[registry_key] = dynamodb_table_resource
+
+    return(dynamodb_table_resource)
+
+
+def register_boto_client(boto_object, resource_name,
+    region_name="us-east-1", table_name=None, endpoint_url=None):
+    """Injects a client or Table resource into the registry, used by
+        tests and local harnesses to stand in for aws
+
+        Parameters
+        ----------
+        boto_object : object
+            client or Table resource to return from get_boto_clients
+
+        resource_name : str
+            Name of the resource for the client
+
+        region_name : str
+            aws region, defaults to us-east-1
+
+        table_name : str
+            if not None boto_object is registered as the Table
+            resource for table_name
+
+        endpoint_url : str
+            custom endpoint url
+
+        Returns
+        -------
+
+        Raises
+        ------
+    """
+    registry_key = _boto_registry_key(
+        resource_name=resource_name,
+        region_name=region_name,
+        table_name=table_name,
+        endpoint_url=endpoint_url
+    )
+    with _BOTO_CLIENT_REGISTRY_LOCK:
+        _BOTO_CLIENT_REGISTRY[registry_key] = boto_object
+        _INJECTED_BOTO_KEYS.add(registry_key)
+
+
+def prewarm_boto_clients(table_names, region_name="us-east-1"):
+    """Builds the dynamodb client and Table resources a handler uses
+        while its module is imported, so the lambda init phase pays for
+        importing boto3 and loading the service models instead of the
+        first request. The cursor signing secret is read too when
+        CURSOR_SIGNING_SECRET_ARN is set
+
+        Only runs inside lambda, where AWS_LAMBDA_FUNCTION_NAME is set,
+        so tests and scripts importing a handler stay fast. Set
+        PREWARM_BOTO_CLIENTS to false to turn it off
+
+        Parameters
+        ----------
+        table_names : list
+            dynamodb tables the handler reads
+
+        region_name : str
+            aws region of the tables
+
+        Returns
+        -------
+        prewarmed : boolean
+            True if the clients were built
+
+        Raises
+        ------
+    """
+    if os.environ.get("AWS_LAMBDA_FUNCTION_NAME") is None:
+        return(False)
+
+    if os.environ.get("PREWARM_BOTO_CLIENTS", "true").lower() == "false":
+        return(False)
+
+    for table_name in table_names:
+        get_boto_clients(
+            resource_name="dynamodb",
+            region_name=region_name,
+            table_name=table_name
+        )
+    logging.info("prewarm_boto_clients - " + ", ".join(table_names))
+
+    if os.environ.get("CURSOR_SIGNING_SECRET_ARN") is not None:
+        cursor_signing_key()
+
+    return(True)
+
+
+def reset_boto_clients():
+    """Clears every cached client, Table resource, index name and
+        secret so the next get_boto_clients call builds new ones
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+
+        Raises
+        ------
+    """
+    global _BOTO_REGISTRY_GENERATION
+
+    with _BOTO_CLIENT_REGISTRY_LOCK:
+        _BOTO_CLIENT_REGISTRY.clear()
+        _INJECTED_BOTO_KEYS.clear()
+        _TABLE_INDEX_CACHE.clear()
+        _SECRET_VALUE_CACHE.clear()
+        _BOTO_REGISTRY_GENERATION += 1
+
+
+def get_boto_clients(resource_name, region_name="us-east-1",
+    table_name=None, endpoint_url=None):
+    """Returns the boto client for various aws resources
+
+        Clients are built lazily on first use and reused by every
+        later call in the same process. Table resources are not thread
+        safe, threads other than the main thread get their own
+
+        Parameters
+        ----------
+        resource_name : str
+            Name of the resource for the client
+
+        region_name : str
+                aws region you are using, defaults to
+                us-east-1
+
+        table_name : str
+            dynamodb table name, if not None a Table resource
+            is also returned
+
+        endpoint_url : str
+            custom endpoint url, for example a local dynamodb
+
+        Returns
+        -------
+        service_client : boto3.client
+            boto3 client for the aws resource in resource_name
+            in region region_name
+
+        dynamodb_table_resource : boto3.resource.Table
+            boto3 Table resource, only returned if table_name is
+            not None
+
+
+
+        Raises
+        ------
+    """
+    with metrics_phase("clients"):
+        service_client = _get_registered(
+            _boto_registry_key(
+                resource_name=resource_name,
+                region_name=region_name,
+                endpoint_url=endpoint_url
+            ),
+            _build_boto_client, resource_name, region_name, endpoint_url
+        )
+
+        '''
+            return boto3 DynamoDb table resource in addition to boto3 client
+            if table_name parameter is not None
+        '''
+        if table_name is not None:
+            dynamodb_table_resource = _get_table_resource(
+                _boto_registry_key(
+                    resource_name=resource_name,
+                    region_name=region_name,
+                    table_name=table_name,
+                    endpoint_url=endpoint_url
+                ),
+                resource_name, region_name, table_name, endpoint_url
+            )
+
+            return(service_client, dynamodb_table_resource)
+
+    '''
+        Otherwise return just a resource client
+    '''
+    return(service_client)
+
+
+def estimate_item_bytes(dynamodb_item):
+    """Estimates the size of a dynamodb item the way dynamodb does,
+        attribute name lengths plus attribute value lengths
+
+        Parameters
+        ----------
+        dynamodb_item : dict
+            item returned from a dynamodb query
+
+        Returns
+        -------
+        item_bytes : int
+            approximate size of the item in bytes
+
+        Raises
+        ------
+    """
+    item_bytes = 0
+    for attribute_name, attribute_value in dynamodb_item.items():
+        item_bytes += len(attribute_name)
+        if isinstance(attribute_value, str):
+            item_bytes += len(attribute_value.encode("utf-8"))
+        elif isinstance(attribute_value, bool) or attribute_value is None:
+            item_bytes += 1
+        else:
+            item_bytes += len(str(attribute_value))
+
+    return(item_bytes)
+
+
+def _query_budget(max_pages, max_bytes):
+    """Resolves the page and byte budget for paginated_query
+
+        Parameters
+        ----------
+        max_pages : int
+            maximum pages to read, None to use the
+            DYNAMO_QUERY_MAX_PAGES environment variable or
+            DEFAULT_QUERY_MAX_PAGES
+
+        max_bytes : int
+            maximum estimated bytes to read, None to use the
+            DYNAMO_QUERY_MAX_BYTES environment variable or
+            DEFAULT_QUERY_MAX_BYTES
+
+        Returns
+        -------
+        max_pages : int
+
+        max_bytes : int
+
+        Raises
+        ------
+    """
+    if max_pages is None:
+        max_pages = int(os.environ.get(
+            "DYNAMO_QUERY_MAX_PAGES", DEFAULT_QUERY_MAX_PAGES
+        ))
+
+    if max_bytes is None:
+        max_bytes = int(os.environ.get(
+            "DYNAMO_QUERY_MAX_BYTES", DEFAULT_QUERY_MAX_BYTES
+        ))
+
+    return(max_pages, max_bytes)
+
+
+def paginated_query(dynamo_table, query_stats=None, max_pages=None,
+    max_bytes=None, **query_kwargs):
+    """Generator that follows LastEvaluatedKey yielding one item at a
+        time as each page of a dynamodb query arrives
+
+        A query run by run_concurrently_within_budget also stops after
+        the page where its budget_seconds run out
+
+        Parameters
+        ----------
+        dynamo_table : boto3.resource.Table
+            Table resource to query
+
+        query_stats : dict
+            optional dict updated in place with pages, count,
+            scanned_count, bytes, consumed_capacity,
+            last_evaluated_key and truncated
+
+        max_pages : int
+            stop after this many pages
+
+        max_bytes : int
+            stop after the page where the estimated item bytes
+            reach max_bytes
+
+        query_kwargs : dict
+            arguments passed to dynamo_table.query, for example
+            IndexName and KeyConditionExpression
+
+        Returns
+        -------
+        dynamodb_item : dict
+            yields each item returned by the query
+
+        Raises
+        ------
+    """
+    max_pages, max_bytes = _query_budget(
+        max_pages=max_pages, max_bytes=max_bytes
+    )
+
+    if query_stats is None:
+        query_stats = {}
+    query_stats.update({
+        "pages": 0,
+        "count": 0,
+        "scanned_count": 0,
+        "bytes": 0,
+        "consumed_capacity": 0.0,
+        "last_evaluated_key": None,
+        "truncated": False
+    })
+
+    query_kwargs.setdefault("ReturnConsumedCapacity", "TOTAL")
+
+    while True:
+        with metrics_phase("query"):
+            query_response = dynamo_table.query(**query_kwargs)
+        record_query_metrics(query_response=query_response)
+
+        query_stats["pages"] += 1
+        query_stats["scanned_count"] += query_response.get("ScannedCount", 0)
+        query_stats["consumed_capacity"] += query_response.get(
+            "ConsumedCapacity", {}
+        ).get("CapacityUnits", 0.0)
+
+        for dynamodb_item in query_response["Items"]:
+            query_stats["count"] += 1
+            query_stats["bytes"] += estimate_item_bytes(dynamodb_item)
+            yield(dynamodb_item)
+
+        last_evaluated_key = query_response.get("LastEvaluatedKey")
+        query_stats["last_evaluated_key"] = last_evaluated_key
+
+        if last_evaluated_key is None:
+            return
+
+        if (
+                (query_stats["pages"] >= max_pages)
+            or
+                (query_stats["bytes"] >= max_bytes)
+            or
+                (time.monotonic() >= getattr(_BUDGET_CONTEXT, "deadline", float("inf")))
+            ):
+            logging.info("paginated_query - budget reached after " +
+                str(query_stats["pages"]) + " pages")
+            query_stats["truncated"] = True
+            return
+
+        query_kwargs["ExclusiveStartKey"] = last_evaluated_key
+
+
+def find_index_name(dynamo_table, hash_key, range_key):
+    """Returns the global secondary index with hash_key as the
+        partition key and range_key as the sort key
+
+        The table description is only loaded once per process
+
+        Parameters
+        ----------
+        dynamo_table : boto3.resource.Table
+            Table resource to inspect
+
+        hash_key : str
+            partition key attribute name
+
+        range_key : str
+            sort key attribute name
+
+        Returns
+        -------
+        index_name : str
+            name of the index, None if no index has that key schema
+            or the table cannot be described
+
+        Raises
+        ------
+    """
+    index_cache_key = (dynamo_table.name, hash_key, range_key)
+    if index_cache_key in _TABLE_INDEX_CACHE:
+        return(_TABLE_INDEX_CACHE[index_cache_key])
+
+    from botocore.exceptions import ClientError
+
+    index_name = None
+    try:
+        for global_secondary_index in (dynamo_table.global_secondary_indexes or []):
+            key_schema = {
+                key_element["KeyType"]: key_element["AttributeName"]
+                for key_element in global_secondary_index["KeySchema"]
+            }
+            if key_schema == {"HASH": hash_key, "RANGE": range_key}:
+                index_name = global_secondary_index["IndexName"]
+                break
+
+    except ClientError as describe_table_error:
+        logging.info("find_index_name - unable to describe table " +
+            str(describe_table_error))
+
+    logging.info("find_index_name - " + hash_key + " " + range_key +
+        " index " + str(index_name))
+    _TABLE_INDEX_CACHE[index_cache_key] = index_name
+
+    return(index_name)
+
+
+@metrics_phase("validate")
+def validate_fields_parameter(event):
+    """Validates the optional fields query parameter against
+        RATING_FIELDS
+
+        Parameters
+        ----------
+        event : dict
+            lambda_handler event from api gateway
+
+        Returns
+        -------
+        error_response : dict
+            None if fields is valid or not passed. Otherwise a dict
+            with keys status_code and message
+
+        fields : tuple
+            requested attributes in RATING_FIELDS order, always
+            including RATINGS_OCCURRED_ON. None if fields was not
+            passed
+
+        Raises
+        ------
+    """
+    fields_parameter = (event.get("queryStringParameters") or {}).get("fields")
+
+    if fields_parameter is None or fields_parameter.strip() == "":
+        return(None, None)
+
+    requested_fields = {
+        field_name.strip() for field_name in fields_parameter.split(",")
+        if field_name.strip() != ""
+    }
+    invalid_fields = requested_fields.difference(RATING_FIELDS)
+
+    if invalid_fields:
+        logging.info("validate_fields_parameter - invalid fields")
+        return(
+            {
+                "message": "Invalid fields {invalid_fields}, must be one of {rating_fields}".format(
+                    invalid_fields=", ".join(sorted(invalid_fields))[:200],
+                    rating_fields=", ".join(RATING_FIELDS)
+                ),
+                "status_code": 400
+            },
+            None
+        )
+
+    '''
+        the partition key orders, filters and dates every response
+    '''
+    requested_fields.add("RATINGS_OCCURRED_ON")
+
+    return(None, tuple(
+        field_name for field_name in RATING_FIELDS
+        if field_name in requested_fields
+    ))
+
+
+def fields_projection(fields):
+    """Returns the query arguments that only read fields
+
+        Parameters
+        ----------
+        fields : tuple
+            from validate_fields_parameter, None for every attribute
+
+        Returns
+        -------
+        projection_kwargs : dict
+            ProjectionExpression and ExpressionAttributeNames, empty
+            if fields is None. Every attribute gets a placeholder since
+            SHOW, TIME and YEAR are dynamodb reserved words
+
+        Raises
+        ------
+    """
+    if fields is None:
+        return({})
+
+    return({
+        "ProjectionExpression": ", ".join("#" + field_name for field_name in fields),
+        "ExpressionAttributeNames": {
+            "#" + field_name: field_name for field_name in fields
+        }
+    })
+
+
+def get_thread_pool():
+    """Returns the process wide thread pool used for concurrent
+        dynamodb requests, threads are reused on warm invocations
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        thread_pool : concurrent.futures.ThreadPoolExecutor
+            pool bounded by the DYNAMO_MAX_WORKERS environment
+            variable or DEFAULT_MAX_WORKERS
+
+        Raises
+        ------
+    """
+    global _THREAD_POOL
+
+    if _THREAD_POOL is None:
+        with _BOTO_CLIENT_REGISTRY_LOCK:
+            if _THREAD_POOL is None:
+                _THREAD_POOL = ThreadPoolExecutor(
+                    max_workers=int(os.environ.get(
+                        "DYNAMO_MAX_WORKERS", DEFAULT_MAX_WORKERS
+                    )),
+                    thread_name_prefix="microlib"
+                )
+
+    return(_THREAD_POOL)
+
+
+def run_concurrently(request_function, request_kwargs_list):
+    """Calls request_function once for each dict of keyword arguments
+        on the shared thread pool
+
+        Parameters
+        ----------
+        request_function : function
+            function to call, for example dynamodb_year_request
+
+        request_kwargs_list : list
+            list of dict, each dict is passed as keyword arguments
+            to one request_function call
+
+        Returns
+        -------
+        request_results : list
+            return value of each call in the same order as
+            request_kwargs_list
+
+        Raises
+        ------
+        Exception
+            the first exception raised by request_function
+    """
+    if len(request_kwargs_list) == 1:
+        return([request_function(**request_kwargs_list[0])])
+
+    request_futures = [
+        get_thread_pool().submit(request_function, **request_kwargs)
+        for request_kwargs in request_kwargs_list
+    ]
+
+    return([request_future.result() for request_future in request_futures])
+
+
+def _call_within_budget(request_function, request_kwargs, deadline,
+    request_metrics):
+    """Calls request_function with the deadline and metrics record of
+        the submitting request bound to this thread, see _BUDGET_CONTEXT
+
+        Parameters
+        ----------
+        request_function : function
+
+        request_kwargs : dict
+            keyword arguments of request_function
+
+        deadline : float
+            time.monotonic() when the budget runs out
+
+        request_metrics : dict
+            _REQUEST_METRICS of the submitting request
+
+        Returns
+        -------
+        request_result
+            return value of request_function
+
+        Raises
+        ------
+        Exception
+            any exception raised by request_function
+    """
+    _BUDGET_CONTEXT.deadline = deadline
+    _BUDGET_CONTEXT.request_metrics = request_metrics
+    try:
+        return(request_function(**request_kwargs))
+    finally:
+        del _BUDGET_CONTEXT.deadline
+        del _BUDGET_CONTEXT.request_metrics
+
+
+def run_concurrently_within_budget(request_function, request_kwargs_list,
+    budget_seconds):
+    """Calls request_function once for each dict of keyword arguments
+        on a thread pool of its own, waiting at most budget_seconds for
+        all of them
+
+        A failed or late call does not fail the others. Calls still
+        running when the budget is spent stop at their next dynamodb
+        page and their results are dropped, they never hold threads of
+        the shared pool or count towards a later request
+
+        Parameters
+        ----------
+        request_function : function
+            function to call, for example dynamodb_show_request
+
+        request_kwargs_list : list
+            list of dict, each dict is passed as keyword arguments
+            to one request_function call
+
+        budget_seconds : float
+            seconds to wait for every call to finish
+
+        Returns
+        -------
+        request_outcomes : list
+            (request_result, request_error) tuple for each call in the
+            same order as request_kwargs_list, request_error is None
+            on success, the exception raised by request_function or a
+            FutureTimeoutError if the budget ran out first
+
+        Raises
+        ------
+    """
+    deadline = time.monotonic() + budget_seconds
+
+    if len(request_kwargs_list) == 0:
+        return([])
+
+    with _REQUEST_METRICS_LOCK:
+        request_metrics = _current_request_metrics()
+
+    budget_pool = ThreadPoolExecutor(
+        max_workers=min(
+            len(request_kwargs_list),
+            int(os.environ.get("DYNAMO_MAX_WORKERS", DEFAULT_MAX_WORKERS))
+        ),
+        thread_name_prefix="microlib-budget"
+    )
+
+    request_futures = [
+        budget_pool.submit(
+            _call_within_budget,
+            request_function=request_function,
+            request_kwargs=request_kwargs,
+            deadline=deadline,
+            request_metrics=request_metrics
+        )
+        for request_kwargs in request_kwargs_list
+    ]
+
+    request_outcomes = []
+    try:
+        for request_future in request_futures:
+            try:
+                request_outcomes.append((
+                    request_future.result(
+                        timeout=max(deadline - time.monotonic(), 0)
+                    ),
+                    None
+                ))
+
+            except FutureTimeoutError as budget_error:
+                '''
+                    only calls still waiting for a pool thread can be
+                    cancelled
+                '''
+                request_future.cancel()
+                request_outcomes.append((None, budget_error))
+
+            except Exception as request_error:
+                logging.info("run_concurrently_within_budget - " + str(request_error))
+                request_outcomes.append((None, request_error))
+
+    finally:
+        '''
+            late calls finish their current page on their own threads
+        '''
+        budget_pool.shutdown(wait=False)
+
+    return(request_outcomes)
+
+
+def cursor_signing_key():
+    """Returns the key every container signs cursors with
+
+        The secret in CURSOR_SIGNING_SECRET_ARN is read once per
+        container through get_boto_clients, so the key never sits in
+        the lambda environment. A CURSOR_SIGNING_KEY environment
+        variable is used instead when set, for tests and local runs
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        signing_key : bytes
+            None if neither variable is set or the secret could not
+            be read, cursors must not be issued or accepted then
+
+        Raises
+        ------
+    """
+    signing_key = os.environ.get("CURSOR_SIGNING_KEY")
+    if signing_key:
+        return(signing_key.encode("utf-8"))
+
+    signing_secret_arn = os.environ.get("CURSOR_SIGNING_SECRET_ARN")
+    if not signing_secret_arn:
+        logging.error("cursor_signing_key - CURSOR_SIGNING_SECRET_ARN is not set")
+        return(None)
+
+    signing_key = _SECRET_VALUE_CACHE.get(signing_secret_arn)
+    if signing_key is None:
+        '''
+            arn:aws:secretsmanager:<region>:<account>:secret:<name>
+        '''
+        secrets_client = get_boto_clients(
+            resource_name="secretsmanager",
+            region_name=signing_secret_arn.split(":")[3]
+        )
+        try:
+            signing_key = secrets_client.get_secret_value(
+                SecretId=signing_secret_arn
+            )["SecretString"].encode("utf-8")
+        except Exception as secret_error:
+            logging.error("cursor_signing_key - " + str(secret_error))
+            return(None)
+
+        _SECRET_VALUE_CACHE[signing_secret_arn] = signing_key
+
+    return(signing_key)
+
+
+def _cursor_signature(cursor_payload):
+    """HMAC-SHA256 of the cursor payload using cursor_signing_key
+
+        Parameters
+        ----------
+        cursor_payload : bytes
+            base64 encoded cursor position
+
+        Returns
+        -------
+        cursor_signature : bytes
+            base64 encoded signature without padding
+
+        Raises
+        ------
+        ValueError
+            if cursor_signing_key has no key
+    """
+    signing_key = cursor_signing_key()
+    if signing_key is None:
+        raise ValueError("cursor signing key is not available")
+
+    return(base64.urlsafe_b64encode(
+        hmac.new(signing_key, cursor_payload, hashlib.sha256).digest()
+    ).rstrip(b"="))
+
+
+def encode_cursor(cursor_position):
+    """Encodes a pagination position as an opaque signed token
+
+        Parameters
+        ----------
+        cursor_position : dict
+            position to resume from, for example the
+            LastEvaluatedKey and year of a query
+
+        Returns
+        -------
+        cursor_token : str
+            url safe token to pass back as the cursor query parameter
+
+        Raises
+        ------
+        ValueError
+            if cursor_signing_key has no key
+    """
+    cursor_payload = base64.urlsafe_b64encode(
+        json.dumps(
+            cursor_position,
+            default=decimal_json_default,
+            separators=(",", ":"),
+            sort_keys=True
+        ).encode("utf-8")
+    ).rstrip(b"=")
+
+    return((cursor_payload + b"." + _cursor_signature(cursor_payload)).decode("ascii"))
+
+
+def decode_cursor(cursor_token):
+    """Validates the signature of a token from encode_cursor and
+        returns the position
+
+        Parameters
+        ----------
+        cursor_token : str
+            token from the cursor query parameter
+
+        Returns
+        -------
+        cursor_position : dict
+            position passed to encode_cursor, floats are returned
+            as Decimal for dynamodb. None if the token is invalid or
+            cursor_signing_key has no key
+
+        Raises
+        ------
+    """
+    if type(cursor_token) != str or len(cursor_token) > 2048:
+        logging.info("decode_cursor - datatype or string length")
+        return(None)
+
+    try:
+        cursor_payload, cursor_signature = cursor_token.encode("ascii").split(b".")
+
+        if not hmac.compare_digest(cursor_signature,
+            _cursor_signature(cursor_payload)):
+            logging.info("decode_cursor - invalid signature")
+            return(None)
+
+        cursor_position = json.loads(
+            base64.urlsafe_b64decode(cursor_payload + b"=" * (-len(cursor_payload) % 4)),
+            parse_float=Decimal
+        )
+
+    except (ValueError, UnicodeError, binascii.Error):
+        logging.info("decode_cursor - malformed cursor")
+        return(None)
+
+    if type(cursor_position) != dict:
+        return(None)
+
+    return(cursor_position)
+
+
+def response_cache_key(endpoint, **request_parameters):
+    """Returns the response cache key for an endpoint and its
+        normalized request parameters
+
+        Parameters
+        ----------
+        endpoint : str
+            name of the endpoint, for example years
+
+        request_parameters : dict
+            validated parameters that change the response, None
+            values are left out
+
+        Returns
+        -------
+        cache_key : tuple
+            (endpoint, sorted parameter tuples)
+
+        Raises
+        ------
+    """
+    return((
+        endpoint,
+        tuple(sorted(
+            (parameter_name, str(parameter_value))
+            for parameter_name, parameter_value in request_parameters.items()
+            if parameter_value is not None
+        ))
+    ))
+
+
+def response_cache_ttl(period_end=None):
+    """Returns how long a response can be cached
+
+        Ratings for nights more than HISTORICAL_AGE_DAYS old never
+        change so they are cached for RESPONSE_CACHE_HISTORICAL_TTL
+
+        Parameters
+        ----------
+        period_end : str
+            last night covered by the response in YYYY-MM-DD format,
+            None if unknown
+
+        Returns
+        -------
+        ttl_seconds : int
+
+        Raises
+        ------
+    """
+    historical_cutoff = datetime.strftime(
+        datetime.now() - timedelta(days=HISTORICAL_AGE_DAYS), "%Y-%m-%d"
+    )
+
+    if period_end is not None and period_end < historical_cutoff:
+        return(RESPONSE_CACHE_HISTORICAL_TTL)
+
+    return(RESPONSE_CACHE_CURRENT_TTL)
+
+
+def latest_ratings_night(television_ratings):
+    """Returns the most recent RATINGS_OCCURRED_ON in a list of ratings
+
+        Parameters
+        ----------
+        television_ratings : list
+            list of dict where each dict is a television show
+            rating
+
+        Returns
+        -------
+        latest_night : str
+            YYYY-MM-DD, None if television_ratings is empty
+
+        Raises
+        ------
+    """
+    return(max(
+        (
+            individual_ratings["RATINGS_OCCURRED_ON"]
+            for individual_ratings in television_ratings
+        ),
+        default=None
+    ))
+
+
+def response_cache_get(cache_key):
+    """Returns a cached response body
+
+        Parameters
+        ----------
+        cache_key : tuple
+            key from response_cache_key
+
+        Returns
+        -------
+        encoded_body : bytes
+            body from encode_response_body, None if cache_key is not
+            cached or has expired
+
+        http_caching : dict
+            policy stored with the body where max_age is the seconds
+            left before the entry expires, None if no policy was stored
+
+        Raises
+        ------
+    """
+    with _RESPONSE_CACHE_LOCK:
+        cache_entry = _RESPONSE_CACHE.get(cache_key)
+
+        if cache_entry is None:
+            _RESPONSE_CACHE_STATS["misses"] += 1
+            return(None, None)
+
+        expires_at, encoded_body, http_caching = cache_entry
+        seconds_left = expires_at - time.monotonic()
+        if seconds_left <= 0:
+            _remove_cache_entry(cache_key=cache_key)
+            _RESPONSE_CACHE_STATS["expirations"] += 1
+            _RESPONSE_CACHE_STATS["misses"] += 1
+            return(None, None)
+
+        _RESPONSE_CACHE.move_to_end(cache_key)
+        _RESPONSE_CACHE_STATS["hits"] += 1
+
+    record_request_metric(metric_name="cache_hits", metric_value=1)
+
+    '''
+        clients should not keep a copy longer than this container does
+    '''
+    if http_caching is not None:
+        http_caching = dict(http_caching, max_age=int(seconds_left))
+
+    return(encoded_body, http_caching)
+
+
+def response_cache_max_bytes():
+    """Returns the byte limit of the response cache
+
+        Parameters
+        ----------
 
-        headers_dict : dict 
-            dict for headers
+        Returns
+        -------
+        max_bytes : int
+            RESPONSE_CACHE_MAX_BYTES environment variable if set,
+            otherwise RESPONSE_CACHE_MEMORY_FRACTION of
+            AWS_LAMBDA_FUNCTION_MEMORY_SIZE megabytes, 8 MB for a
+            128 MB function, or RESPONSE_CACHE_MAX_BYTES outside lambda
 
-        response_body : dict
-            response body to return as string
-        
+        Raises
+        ------
+    """
+    if os.environ.get("RESPONSE_CACHE_MAX_BYTES") is not None:
+        return(int(os.environ.get("RESPONSE_CACHE_MAX_BYTES")))
+
+    function_memory_mb = os.environ.get("AWS_LAMBDA_FUNCTION_MEMORY_SIZE")
+    if function_memory_mb is None:
+        return(RESPONSE_CACHE_MAX_BYTES)
+
+    return(int(int(function_memory_mb) * 1024 * 1024 * RESPONSE_CACHE_MEMORY_FRACTION))
+
+
+def response_cache_put(cache_key, encoded_body, ttl_seconds,
+    http_caching=None):
+    """Caches a response body, evicting the least recently used
+        entries when the cache is over its entry or byte limit
+
+        Parameters
+        ----------
+        cache_key : tuple
+            key from response_cache_key
+
+        encoded_body : bytes
+            body from encode_response_body
+
+        ttl_seconds : int
+            seconds until the entry expires, see response_cache_ttl
+
+        http_caching : dict
+            from http_caching_policy, returned with cache hits
 
         Returns
         -------
-        lambda_proxy_response : dict
-            lambda proxy response formatted as apigateway 
-            version 2.0 payload
-            
 
         Raises
         ------
     """
-    return(
-            {
-                "statusCode": status_code,
-                "isBase64Encoded": False,
-                "headers": headers_dict,
-                "body": json.dumps(response_body)
-            }
-    )
+    max_bytes = response_cache_max_bytes()
 
+    '''
+        one large entry should not flush the whole cache
+    '''
+    if len(encoded_body) > max_bytes // 4:
+        logging.info("response_cache_put - body too large to cache")
+        return
 
+    with _RESPONSE_CACHE_LOCK:
+        if cache_key in _RESPONSE_CACHE:
+            _remove_cache_entry(cache_key=cache_key)
 
-def get_boto_clients(resource_name, region_name="us-east-1",
-    table_name=None):
-    """Returns the boto client for various aws resources
+        _RESPONSE_CACHE[cache_key] = (
+            time.monotonic() + ttl_seconds, encoded_body, http_caching
+        )
+        _RESPONSE_CACHE_STATS["bytes"] += len(encoded_body)
+
+        while (
+                (_RESPONSE_CACHE_STATS["bytes"] > max_bytes)
+            or
+                (len(_RESPONSE_CACHE) > RESPONSE_CACHE_MAX_ENTRIES)
+            ):
+            _remove_cache_entry(cache_key=next(iter(_RESPONSE_CACHE)))
+            _RESPONSE_CACHE_STATS["evictions"] += 1
+
+
+def _remove_cache_entry(cache_key):
+    """Removes an entry from the response cache, the caller must
+        hold _RESPONSE_CACHE_LOCK
 
         Parameters
         ----------
-        resource_name : str
-            Name of the resource for the client
+        cache_key : tuple
+            key from response_cache_key
+
+        Returns
+        -------
+
+        Raises
+        ------
+    """
+    expires_at, encoded_body, http_caching = _RESPONSE_CACHE.pop(cache_key)
+    _RESPONSE_CACHE_STATS["bytes"] -= len(encoded_body)
 
-        region_name : str
-                aws region you are using, defaults to
-                us-east-1
+
+def response_cache_stats():
+    """Returns the response cache counters
+
+        Parameters
+        ----------
 
         Returns
         -------
-        service_client : boto3.client
-            boto3 client for the aws resource in resource_name
-            in region region_name
+        cache_stats : dict
+            hits, misses, evictions, expirations, bytes and entries
+
+        Raises
+        ------
+    """
+    with _RESPONSE_CACHE_LOCK:
+        cache_stats = dict(_RESPONSE_CACHE_STATS)
+        cache_stats["entries"] = len(_RESPONSE_CACHE)
+
+    return(cache_stats)
 
-        dynamodb_table_resource : boto3.resource.Table
-            boto3 Table resource, only returned if table_name is
-            not None
-        
 
+def reset_response_cache():
+    """Empties the response cache and zeroes its counters
+
+        Parameters
+        ----------
+
+        Returns
+        -------
 
         Raises
         ------
     """
+    with _RESPONSE_CACHE_LOCK:
+        _RESPONSE_CACHE.clear()
+        for stat_name in _RESPONSE_CACHE_STATS:
+            _RESPONSE_CACHE_STATS[stat_name] = 0
 
-    service_client = boto3.client(
-            service_name=resource_name, 
-            region_name=region_name
-        )
+
+def rollup_table_name():
+    """Returns the name of the rollup table
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        rollup_table_name : str
+            ROLLUP_TABLE_NAME environment variable or
+            DEFAULT_ROLLUP_TABLE_NAME
+
+        Raises
+        ------
+    """
+    return(os.environ.get("ROLLUP_TABLE_NAME") or DEFAULT_ROLLUP_TABLE_NAME)
+
+
+def get_rollup_table():
+    """Returns the dynamodb rollup Table resource, the table name is
+        the ROLLUP_TABLE_NAME environment variable
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        rollup_table : boto3.resource.Table
+
+        Raises
+        ------
+    """
+    dynamo_client, rollup_table = get_boto_clients(
+            resource_name="dynamodb",
+            region_name="us-east-1",
+            table_name=rollup_table_name()
+    )
+
+    return(rollup_table)
+
+
+def rollup_statistics(television_ratings):
+    """Returns the count, sum, min and max of each VIEWER_METRICS,
+        statistics that can be stored and read back without the ratings
+
+        Parameters
+        ----------
+        television_ratings : list
+            list of dict where each dict is a television show
+            rating
+
+        Returns
+        -------
+        rollup_values : dict
+            RATINGS, FIRST_NIGHT, LAST_NIGHT and a map of count, sum,
+            min and max for each metric, ratings without a metric
+            are left out of its map
+
+        Raises
+        ------
+    """
+    rollup_values = {
+        "RATINGS": 0,
+        "FIRST_NIGHT": None,
+        "LAST_NIGHT": None
+    }
+    for metric_name in VIEWER_METRICS:
+        rollup_values[metric_name] = {"count": 0, "sum": 0}
+
+    for individual_rating in television_ratings:
+        add_rollup_rating(rollup_values=rollup_values, individual_rating=individual_rating)
+
+    return(rollup_values)
+
+
+def add_rollup_rating(rollup_values, individual_rating):
+    """Counts one rating in rollup values, in place
+
+        Parameters
+        ----------
+        rollup_values : dict
+            from rollup_statistics or a rollup item read from the
+            rollup table
+
+        individual_rating : dict
+            television show rating
+
+        Returns
+        -------
+
+        Raises
+        ------
+    """
+    rollup_values["RATINGS"] = int(rollup_values.get("RATINGS", 0)) + 1
+
+    ratings_night = individual_rating["RATINGS_OCCURRED_ON"]
+    if rollup_values.get("FIRST_NIGHT") is None or ratings_night < rollup_values["FIRST_NIGHT"]:
+        rollup_values["FIRST_NIGHT"] = ratings_night
+    if rollup_values.get("LAST_NIGHT") is None or ratings_night > rollup_values["LAST_NIGHT"]:
+        rollup_values["LAST_NIGHT"] = ratings_night
+
+    for metric_name in VIEWER_METRICS:
+        metric_rollup = rollup_values.setdefault(metric_name, {"count": 0, "sum": 0})
+        metric_value = individual_rating.get(metric_name)
+        if metric_value is None:
+            continue
+
+        metric_value = int(metric_value)
+        metric_rollup["count"] = int(metric_rollup.get("count", 0)) + 1
+        metric_rollup["sum"] = int(metric_rollup.get("sum", 0)) + metric_value
+        if metric_rollup.get("min") is None or metric_value < metric_rollup["min"]:
+            metric_rollup["min"] = metric_value
+        if metric_rollup.get("max") is None or metric_value > metric_rollup["max"]:
+            metric_rollup["max"] = metric_value
+
+
+def remove_rollup_rating(rollup_values, individual_rating):
+    """Takes one rating out of rollup values, in place
+
+        Counts and sums can be taken back, a first or last night or a
+        min or max can not, so a rating holding one of them is left in
+        and the rollup has to be built again from its ratings
+
+        Parameters
+        ----------
+        rollup_values : dict
+            from rollup_statistics or a rollup item read from the
+            rollup table
+
+        individual_rating : dict
+            television show rating counted in rollup_values
+
+        Returns
+        -------
+        removed : boolean
+            False if the rollup has to be built again
+
+        Raises
+        ------
+    """
+    remaining_ratings = int(rollup_values.get("RATINGS", 0)) - 1
+    metric_values = {
+        metric_name: int(individual_rating[metric_name])
+        for metric_name in VIEWER_METRICS
+        if individual_rating.get(metric_name) is not None
+    }
 
     '''
-        return boto3 DynamoDb table resource in addition to boto3 client
-        if table_name parameter is not None
+        the last rating takes every statistic with it
     '''
-    if table_name is not None:
-        dynamodb_table_resource = boto3.resource(
-            service_name=resource_name,
-            region_name=region_name
-        ).Table(table_name)
+    if remaining_ratings > 0 and (
+        individual_rating["RATINGS_OCCURRED_ON"] in (
+            rollup_values.get("FIRST_NIGHT"), rollup_values.get("LAST_NIGHT")
+        ) or any(
+            metric_value in (
+                rollup_values.get(metric_name, {}).get("min"),
+                rollup_values.get(metric_name, {}).get("max")
+            )
+            for metric_name, metric_value in metric_values.items()
+        )):
+        return(False)
+
+    rollup_values["RATINGS"] = remaining_ratings
+    for metric_name, metric_value in metric_values.items():
+        metric_rollup = rollup_values.setdefault(metric_name, {"count": 0, "sum": 0})
+        metric_rollup["count"] = int(metric_rollup.get("count", 0)) - 1
+        metric_rollup["sum"] = int(metric_rollup.get("sum", 0)) - metric_value
+
+    return(True)
+
+
+def rollup_summary(rollup_item):
+    """Converts a rollup item to the response format of the
+        aggregations endpoint, without percentiles
+
+        Parameters
+        ----------
+        rollup_item : dict
+            item from the rollup table or rollup_statistics
+
+        Returns
+        -------
+        summary_statistics : dict
+            ratings, first_night, last_night and the count, sum,
+            mean, min and max of each metric
+
+        Raises
+        ------
+    """
+    summary_statistics = {
+        "ratings": int(rollup_item["RATINGS"]),
+        "first_night": rollup_item.get("FIRST_NIGHT"),
+        "last_night": rollup_item.get("LAST_NIGHT")
+    }
+
+    for metric_name in VIEWER_METRICS:
+        metric_rollup = rollup_item.get(metric_name) or {}
+        metric_count = int(metric_rollup.get("count", 0))
+
+        if metric_count == 0:
+            summary_statistics[metric_name] = {"count": 0}
+            continue
+
+        summary_statistics[metric_name] = {
+            "count": metric_count,
+            "sum": int(metric_rollup["sum"]),
+            "mean": round(int(metric_rollup["sum"]) / metric_count, 2),
+            "min": int(metric_rollup["min"]),
+            "max": int(metric_rollup["max"])
+        }
+
+    return(summary_statistics)
+
+
+def get_rollups(rollup_name, period=None):
+    """Reads rollups with one GetItem or Query
+
+        Parameters
+        ----------
+        rollup_name : str
+            NIGHT, YEAR or SHOW#{show name}
+
+        period : str
+            night, year or ALL, None for every period of rollup_name
+
+        Returns
+        -------
+        rollup_items : list
+            empty if the rollup has not been built or the rollup
+            table is not available
+
+        Raises
+        ------
+    """
+    from boto3.dynamodb.conditions import Key
+    from botocore.exceptions import ClientError
+
+    rollup_table = get_rollup_table()
+
+    try:
+        if period is not None:
+            with metrics_phase("query"):
+                rollup_item = rollup_table.get_item(
+                    Key={"ROLLUP": rollup_name, "PERIOD": str(period)}
+                ).get("Item")
+
+            return([] if rollup_item is None else [rollup_item])
+
+        '''
+            every year of a show is in the same partition
+        '''
+        return(list(paginated_query(
+            dynamo_table=rollup_table,
+            KeyConditionExpression=Key("ROLLUP").eq(rollup_name)
+        )))
+
+    except ClientError as rollup_error:
+        '''
+            callers fall back to querying the ratings table
+        '''
+        logging.info("get_rollups - " + str(rollup_error))
+        return([])
+
+
+def ratings_rollup_keys(ratings_item):
+    """Returns the rollups a rating is counted in
+
+        Parameters
+        ----------
+        ratings_item : dict
+            television show rating, items without a valid
+            RATINGS_OCCURRED_ON are ignored
+
+        Returns
+        -------
+        rollup_keys : set
+            set of (ROLLUP, PERIOD) tuples for the night, the year,
+            the show and the show year of the rating
 
-        return(service_client, dynamodb_table_resource)
+        Raises
+        ------
+    """
+    ratings_night = ratings_item.get("RATINGS_OCCURRED_ON")
+    try:
+        datetime.strptime(ratings_night, "%Y-%m-%d")
+    except (TypeError, ValueError):
+        return(set())
+
+    ratings_year = str(int(ratings_item.get("YEAR", ratings_night[:4])))
+    rollup_keys = {
+        (NIGHT_ROLLUP, ratings_night),
+        (YEAR_ROLLUP, ratings_year)
+    }
+
+    if ratings_item.get("SHOW") is not None:
+        show_rollup = SHOW_ROLLUP_PREFIX + ratings_item["SHOW"]
+        rollup_keys.add((show_rollup, ALL_PERIODS))
+        rollup_keys.add((show_rollup, ratings_year))
+
+    return(rollup_keys)
+
+
+def rollup_items(television_ratings, built_rollups=None):
+    """Groups ratings into rollup items
+
+        Parameters
+        ----------
+        television_ratings : iterable
+            dict where each dict is a television show rating
+
+        built_rollups : dict
+            optional rollup items from an earlier call that the
+            ratings are added to in place, so pages of a scan can be
+            folded in one at a time
+
+        Returns
+        -------
+        rollup_items : dict
+            (ROLLUP, PERIOD) tuple to the rollup item to store
+
+        Raises
+        ------
+    """
+    if built_rollups is None:
+        built_rollups = {}
+
+    for individual_rating in television_ratings:
+        for rollup_name, period in ratings_rollup_keys(ratings_item=individual_rating):
+            rollup_item = built_rollups.get((rollup_name, period))
+            if rollup_item is None:
+                rollup_item = built_rollups[(rollup_name, period)] = dict(
+                    rollup_statistics(television_ratings=[]),
+                    ROLLUP=rollup_name,
+                    PERIOD=period
+                )
+            add_rollup_rating(rollup_values=rollup_item, individual_rating=individual_rating)
+
+    return(built_rollups)
+
+
+def rollup_show_names(rollup_keys):
+    """Returns the show names of ALL_PERIODS show rollups
+
+        Parameters
+        ----------
+        rollup_keys : iterable
+            (ROLLUP, PERIOD) tuples
+
+        Returns
+        -------
+        show_names : set
+
+        Raises
+        ------
+    """
+    return({
+        rollup_name[len(SHOW_ROLLUP_PREFIX):]
+        for rollup_name, period in rollup_keys
+        if rollup_name.startswith(SHOW_ROLLUP_PREFIX) and period == ALL_PERIODS
+    })
+
+
+def show_names_rollup(built_rollups):
+    """Returns the SHOW_NAMES rollup item of a complete set of rollups
+
+        Parameters
+        ----------
+        built_rollups : dict
+            (ROLLUP, PERIOD) tuple to rollup item from rollup_items
+            built from every rating
+
+        Returns
+        -------
+        show_names_item : dict
+            SHOW_NAMES of every show with an ALL_PERIODS rollup and
+            LAST_NIGHT, the latest NIGHT rollup
+
+        Raises
+        ------
+    """
+    show_names = rollup_show_names(rollup_keys=built_rollups)
+    show_names_item = {
+        "ROLLUP": SHOW_NAMES_ROLLUP,
+        "PERIOD": ALL_PERIODS,
+        "LAST_NIGHT": max(
+            (period for rollup_name, period in built_rollups if rollup_name == NIGHT_ROLLUP),
+            default=None
+        )
+    }
 
     '''
-        Otherwise return just a resource client
+        dynamodb does not allow empty sets
     '''
-    return(service_client)
+    if show_names:
+        show_names_item["SHOW_NAMES"] = show_names
+
+    return(show_names_item)
+
+
+def query_parameter_flag(event, parameter_name, default=False):
+    """Reads a true or false query string parameter
+
+        Parameters
+        ----------
+        event : dict
+            api gateway lambda proxy event
+
+        parameter_name : str
+            name of the query string parameter
+
+        default : boolean
+            returned if the parameter is missing or not true or false
+
+        Returns
+        -------
+        parameter_flag : boolean
+
+        Raises
+        ------
+    """
+    parameter_value = (event.get("queryStringParameters") or {}).get(parameter_name)
+
+    if type(parameter_value) != str or parameter_value.lower() not in ("true", "false"):
+        return(default)
 
+    return(parameter_value.lower() == "true")
@@ -0,0 +1,488 @@
+import logging
+import os
+
+from datetime import datetime
+from microlib.microlib import ALL_PERIODS
+from microlib.microlib import NIGHT_ROLLUP
+from microlib.microlib import SHOW_ROLLUP_PREFIX
+from microlib.microlib import VIEWER_METRICS
+from microlib.microlib import YEAR_ROLLUP
+from microlib.microlib import configure_logging
+from microlib.microlib import encode_response_body
+from microlib.microlib import get_boto_clients
+from microlib.microlib import get_rollups
+from microlib.microlib import http_caching_policy
+from microlib.microlib import lambda_proxy_response
+from microlib.microlib import latest_ratings_night
+from microlib.microlib import metrics_phase
+from microlib.microlib import paginated_query
+from microlib.microlib import prewarm_boto_clients
+from microlib.microlib import query_parameter_flag
+from microlib.microlib import request_metrics
+from microlib.microlib import response_cache_get
+from microlib.microlib import response_cache_key
+from microlib.microlib import response_cache_put
+from microlib.microlib import response_cache_ttl
+from microlib.microlib import rollup_statistics
+from microlib.microlib import rollup_summary
+from microlib.microlib import rollup_table_name
+from microlib.microlib import truncated_response_headers
+
+PERCENTILES = (25, 50, 75, 90, 99)
+
+'''
+    dimension path parameter to the index and key used to query it,
+    None is the table primary key
+'''
+DIMENSION_QUERIES = {
+    "nights": (None, "RATINGS_OCCURRED_ON"),
+    "shows": ("SHOW_ACCESS", "SHOW"),
+    "years": ("YEAR_ACCESS", "YEAR")
+}
+
+
+'''
+    dynamodb clients are built during the lambda init phase
+'''
+prewarm_boto_clients(table_names=[
+    os.environ.get("DYNAMO_TABLE_NAME", "prod_toonami_ratings"),
+    rollup_table_name()
+])
+
+
+def clean_dimension_value(dimension, dimension_value):
+    """Validates the value path parameter for a dimension, following the
+        nights, shows and years endpoints
+
+        Parameters
+        ----------
+        dimension : str
+            nights, shows or years
+
+        dimension_value : str
+            night in YYYY-MM-DD format, show name or year
+
+        Returns
+        -------
+        valid_value : boolean
+
+        Raises
+        ------
+    """
+    if type(dimension_value) != str or dimension_value == "":
+        logging.info("clean_dimension_value - empty or not a string")
+        return(False)
+
+    if dimension == "nights":
+        try:
+            datetime.strptime(dimension_value, "%Y-%m-%d")
+        except ValueError:
+            logging.info("clean_dimension_value - Invalid date format")
+            return(False)
+        return(len(dimension_value) == 10)
+
+    if dimension == "years":
+        return(len(dimension_value) < 5 and dimension_value.isnumeric())
+
+    return(len(dimension_value) <= 500 and dimension_value.isascii())
+
+
+@metrics_phase("validate")
+def validate_request_parameters(event):
+    """Validates the request passed in via the lambda handler event
+
+        Parameters
+        ----------
+        event : dict
+            lambda_handler event from api gateway
+
+        Returns
+        -------
+        error_response : dict
+            None if request is valid. Otherwise a dict with
+            keys status_code and message detailing the error in
+            the request
+
+        Raises
+        ------
+    """
+    error_response = None
+    try:
+        dimension = event["pathParameters"]["dimension"]
+        assert dimension in DIMENSION_QUERIES, (
+            "dimension must be one of " + ", ".join(sorted(DIMENSION_QUERIES))
+        )
+        assert clean_dimension_value(
+            dimension=dimension,
+            dimension_value=event["pathParameters"]["value"]
+        ) is True, (
+            "Invalid {dimension} path parameter".format(dimension=dimension)
+        )
+        logging.info("validate_request_parameters - path parameters valid")
+
+    except (KeyError, TypeError):
+        logging.info("validate_request_parameters - path parameters not found in request")
+        error_response = {
+            "message": "Path parameters dimension and value are required",
+            "status_code": 400
+        }
+
+    except AssertionError as path_parameter_error:
+        logging.info("validate_request_parameters - path parameter invalid")
+        error_response = {
+            "message": str(path_parameter_error),
+            "status_code": 404
+        }
+
+    return(error_response)
+
+
+def dynamodb_dimension_request(dimension, dimension_value, query_stats=None):
+    """Queries the viewer counts for one show, year or night
+
+        Parameters
+        ----------
+        dimension : str
+            nights, shows or years
+
+        dimension_value : str
+            validated by clean_dimension_value
+
+        query_stats : dict
+            optional dict updated in place by paginated_query,
+            truncated is True when the query budget was reached
+
+        Returns
+        -------
+        error_message : dict
+            None if items are returned, dict of 404 errors otherwise
+
+        television_ratings : list
+            list of dict with RATINGS_OCCURRED_ON and the
+            VIEWER_METRICS of each rating
+
+        Raises
+        ------
+    """
+    from boto3.dynamodb.conditions import Key
+
+    error_message = None
+
+    if os.environ.get("DYNAMO_TABLE_NAME") is None:
+        dynamo_table_name = "prod_toonami_ratings"
+    else:
+        dynamo_table_name = os.environ.get("DYNAMO_TABLE_NAME")
+
+    logging.info("dynamodb_dimension_request - DYNAMO_TABLE_NAME" + dynamo_table_name)
+    dynamo_client, dynamo_table = get_boto_clients(
+            resource_name="dynamodb",
+            region_name="us-east-1",
+            table_name=dynamo_table_name
+    )
+
+    index_name, key_name = DIMENSION_QUERIES[dimension]
+    key_value = int(dimension_value) if dimension == "years" else dimension_value
+
+    query_kwargs = {
+        "KeyConditionExpression": Key(key_name).eq(key_value),
+        "ProjectionExpression": ", ".join(("RATINGS_OCCURRED_ON",) + VIEWER_METRICS)
+    }
+    if index_name is not None:
+        query_kwargs["IndexName"] = index_name
+
+    '''
+        only the attributes that are summarized are returned
+    '''
+    if query_stats is None:
+        query_stats = {}
+    television_ratings = list(paginated_query(
+        dynamo_table=dynamo_table,
+        query_stats=query_stats,
+        **query_kwargs
+    ))
+
+    logging.info("dynamodb_dimension_request - Count " + str(query_stats["count"]) +
+        " Pages " + str(query_stats["pages"]) +
+        " ConsumedCapacity " + str(query_stats["consumed_capacity"]))
+
+    if query_stats["truncated"] is True:
+        logging.info("dynamodb_dimension_request - query budget reached, results truncated")
+
+    if query_stats["count"] == 0:
+        error_message = {
+            "message": "{dimension}: {dimension_value} not found".format(
+                dimension=dimension[:-1],
+                dimension_value=dimension_value
+            )
+        }
+
+    logging.info(error_message)
+
+    return(error_message, television_ratings)
+
+
+def percentile(sorted_values, percentile_rank):
+    """Linear interpolation between the closest ranks, the same as the
+        numpy default
+
+        Parameters
+        ----------
+        sorted_values : list
+            values in ascending order, must not be empty
+
+        percentile_rank : int
+            0 to 100
+
+        Returns
+        -------
+        percentile_value : float
+
+        Raises
+        ------
+    """
+    rank_position = (len(sorted_values) - 1) * percentile_rank / 100
+    lower_position = int(rank_position)
+    upper_position = min(lower_position + 1, len(sorted_values) - 1)
+
+    return(
+        sorted_values[lower_position] +
+        (sorted_values[upper_position] - sorted_values[lower_position]) *
+        (rank_position - lower_position)
+    )
+
+
+def viewer_statistics(television_ratings):
+    """Summarizes the VIEWER_METRICS of a list of ratings in one pass
+
+        Parameters
+        ----------
+        television_ratings : list
+            list of dict where each dict is a television show
+            rating
+
+        Returns
+        -------
+        ratings_statistics : dict
+            count, sum, mean, min, max and PERCENTILES of each metric,
+            ratings without a metric are left out of its statistics
+
+        Raises
+        ------
+    """
+    metric_values = {metric_name: [] for metric_name in VIEWER_METRICS}
+
+    for individual_rating in television_ratings:
+        for metric_name, metric_list in metric_values.items():
+            metric_value = individual_rating.get(metric_name)
+            if metric_value is not None:
+                metric_list.append(int(metric_value))
+
+    ratings_statistics = {}
+    for metric_name, metric_list in metric_values.items():
+        if not metric_list:
+            ratings_statistics[metric_name] = {"count": 0}
+            continue
+
+        metric_list.sort()
+        metric_sum = sum(metric_list)
+        metric_statistics = {
+            "count": len(metric_list),
+            "sum": metric_sum,
+            "mean": round(metric_sum / len(metric_list), 2),
+            "min": metric_list[0],
+            "max": metric_list[-1]
+        }
+        for percentile_rank in PERCENTILES:
+            metric_statistics["p" + str(percentile_rank)] = round(
+                percentile(sorted_values=metric_list, percentile_rank=percentile_rank), 2
+            )
+
+        ratings_statistics[metric_name] = metric_statistics
+
+    return(ratings_statistics)
+
+
+def dimension_rollup(dimension, dimension_value):
+    """Reads the precomputed rollup for one show, year or night
+
+        Parameters
+        ----------
+        dimension : str
+            nights, shows or years
+
+        dimension_value : str
+            validated by clean_dimension_value
+
+        Returns
+        -------
+        rollup_item : dict
+            None if the rollup has not been built
+
+        Raises
+        ------
+    """
+    if dimension == "nights":
+        rollup_name, period = NIGHT_ROLLUP, dimension_value
+    elif dimension == "years":
+        rollup_name, period = YEAR_ROLLUP, str(int(dimension_value))
+    else:
+        rollup_name, period = SHOW_ROLLUP_PREFIX + dimension_value, ALL_PERIODS
+
+    dimension_rollups = get_rollups(rollup_name=rollup_name, period=period)
+
+    return(dimension_rollups[0] if dimension_rollups else None)
+
+
+@request_metrics(endpoint="aggregations")
+def main(event):
+    """Entry point into the script
+
+        Parameters
+        ----------
+        event : dict
+            api gateway lambda proxy event
+
+        Returns
+        -------
+
+        Raises
+        ------
+    """
+    error_response = validate_request_parameters(event=event)
+
+    if error_response is not None:
+        status_code = error_response.pop("status_code")
+        '''
+            return http 400 level error response
+        '''
+        return(lambda_proxy_response(status_code=status_code,
+        headers_dict={}, response_body=error_response))
+
+    dimension = event["pathParameters"]["dimension"]
+    dimension_value = event["pathParameters"]["value"]
+    include_percentiles = query_parameter_flag(
+        event=event, parameter_name="percentiles", default=True
+    )
+
+    cache_key = response_cache_key(
+        endpoint="aggregations",
+        dimension=dimension,
+        value=dimension_value,
+        percentiles=include_percentiles
+    )
+    cached_body, http_caching = response_cache_get(cache_key=cache_key)
+
+    if cached_body is not None:
+        logging.info("main - response cache hit")
+        return(
+            lambda_proxy_response(status_code=200, headers_dict={},
+            response_body=cached_body, request_headers=event.get("headers"),
+            http_caching=http_caching)
+        )
+
+    '''
+        percentiles need every rating, the other statistics are
+        read from the rollup table when it has been built
+    '''
+    dimension_statistics = None
+    query_stats = {}
+    if include_percentiles is False:
+        rollup_item = dimension_rollup(dimension=dimension, dimension_value=dimension_value)
+        if rollup_item is not None:
+            dimension_statistics = rollup_summary(rollup_item=rollup_item)
+
+    if dimension_statistics is None:
+        error_message, television_ratings = dynamodb_dimension_request(
+            dimension=dimension,
+            dimension_value=dimension_value,
+            query_stats=query_stats
+        )
+
+        if error_message is not None:
+            logging.info("main - error_message " + str(error_message))
+            return(
+                lambda_proxy_response(status_code=404, headers_dict={},
+                response_body=error_message)
+            )
+
+        if include_percentiles is True:
+            dimension_statistics = dict(
+                viewer_statistics(television_ratings=television_ratings),
+                ratings=len(television_ratings),
+                first_night=min(
+                    individual_rating["RATINGS_OCCURRED_ON"]
+                    for individual_rating in television_ratings
+                ),
+                last_night=latest_ratings_night(television_ratings=television_ratings)
+            )
+        else:
+            dimension_statistics = rollup_summary(
+                rollup_item=rollup_statistics(television_ratings=television_ratings)
+            )
+
+    ratings_statistics = dict(
+        dimension_statistics,
+        dimension=dimension,
+        value=dimension_value
+    )
+    last_night = ratings_statistics["last_night"]
+    logging.info("main - returning statistics for " +
+        str(ratings_statistics["ratings"]) + " ratings")
+
+    encoded_body = encode_response_body(ratings_statistics)
+
+    if query_stats.get("truncated") is True:
+        '''
+            statistics of part of the ratings are neither cached
+            nor reusable
+        '''
+        return(
+            lambda_proxy_response(status_code=200,
+            headers_dict=truncated_response_headers(headers_dict={}),
+            response_body=encoded_body, request_headers=event.get("headers"))
+        )
+
+    http_caching = http_caching_policy(
+        encoded_body=encoded_body,
+        max_age=response_cache_ttl(period_end=last_night),
+        last_modified=last_night
+    )
+    response_cache_put(
+        cache_key=cache_key,
+        encoded_body=encoded_body,
+        ttl_seconds=http_caching["max_age"],
+        http_caching=http_caching
+    )
+
+    return(
+        lambda_proxy_response(status_code=200, headers_dict={},
+        response_body=encoded_body, request_headers=event.get("headers"),
+        http_caching=http_caching)
+    )
+
+
+def lambda_handler(event, context):
+    """Handles lambda invocation from cloudwatch events rule
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+
+        Raises
+        ------
+    """
+    '''
+        Logging required for cloudwatch logs, the whole proxy
+        event is only logged with LOG_LEVEL=DEBUG
+    '''
+    configure_logging(context=context)
+
+    logging.info("lambda_handler - " + str(event.get("httpMethod")) + " " + str(event.get("path")))
+    logging.debug(event)
+    return(main(event=event))
+
+
+if __name__ == "__main__":
+    main(event={"pathParameters": {"dimension": "shows", "value": "One Piece"}})
@@ -1,12 +1,39 @@
-import boto3
-import json
 import logging
 import os
 
-from boto3.dynamodb.conditions import Key
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from datetime import datetime
+from microlib.microlib import configure_logging
+from microlib.microlib import encode_batch_response
+from microlib.microlib import encode_response_body
+from microlib.microlib import fields_projection
 from microlib.microlib import get_boto_clients
+from microlib.microlib import http_caching_policy
 from microlib.microlib import lambda_proxy_response
+from microlib.microlib import metrics_phase
+from microlib.microlib import prewarm_boto_clients
+from microlib.microlib import record_query_metrics
+from microlib.microlib import request_metrics
+from microlib.microlib import response_cache_get
+from microlib.microlib import response_cache_key
+from microlib.microlib import response_cache_put
+from microlib.microlib import response_cache_ttl
+from microlib.microlib import run_concurrently_within_budget
+from microlib.microlib import validate_fields_parameter
+
+'''
+    one year of saturday nights per batch request
+'''
+MAX_BATCH_NIGHTS = 52
+DEFAULT_BATCH_BUDGET_SECONDS = 3.5
+
+
+'''
+    dynamodb clients are built during the lambda init phase
+'''
+prewarm_boto_clients(table_names=[
+    os.environ.get("DYNAMO_TABLE_NAME", "prod_toonami_ratings")
+])
 
 
 def clean_path_parameter_string(night):
@@ -43,6 +70,7 @@ def clean_path_parameter_string(night):
     return(True)
 
 
+@metrics_phase("validate")
 def validate_request_parameters(event):
     """Validates the request passed in via the lambda handler event
 
@@ -84,7 +112,91 @@ def validate_request_parameters(event):
 
     return(error_response)
 
-def dynamodb_night_request(night):
+
+def batch_request(event):
+    """Returns True if the event is a batch request for
+        /nights?nights=YYYY-MM-DD,YYYY-MM-DD
+
+        Parameters
+        ----------
+        event : dict
+            lambda_handler event from api gateway
+
+        Returns
+        -------
+        batch_request : bool
+
+        Raises
+        ------
+    """
+    return(
+        (event.get("pathParameters") or {}).get("night") is None
+        and
+        (event.get("queryStringParameters") or {}).get("nights") is not None
+    )
+
+
+@metrics_phase("validate")
+def validate_batch_parameters(event):
+    """Validates the comma separated nights query parameter
+
+        Parameters
+        ----------
+        event : dict
+            lambda_handler event from api gateway
+
+        Returns
+        -------
+        error_response : dict
+            None if request is valid. Otherwise a dict with 
+            keys status_code and message detailing the error in
+            the request
+
+        batch_nights : list
+            distinct nights in the order requested
+
+        Raises
+        ------
+    """
+    error_response = None
+    batch_nights = list(dict.fromkeys(
+        night.strip()
+        for night in event["queryStringParameters"]["nights"].split(",")
+        if night.strip() != ""
+    ))
+
+    if len(batch_nights) == 0 or len(batch_nights) > MAX_BATCH_NIGHTS:
+        logging.info("validate_batch_parameters - nights count " + str(len(batch_nights)))
+        return(
+            {
+                "message": "Query parameter nights must have 1 to {max_nights} nights".format(
+                    max_nights=MAX_BATCH_NIGHTS
+                ),
+                "status_code": 400
+            },
+            batch_nights
+        )
+
+    try:
+        for night in batch_nights:
+            assert clean_path_parameter_string(night) is True, (
+                "Invalid night {night}, must be in YYYY-MM-DD format".format(
+                    night=night
+                )
+            )
+        logging.info("validate_batch_parameters - nights valid")
+
+    except AssertionError as night_error:
+        logging.info("validate_batch_parameters - night parameter invalid")
+        error_response = {
+            "message": str(night_error),
+            "status_code": 404 
+        }
+
+    return(error_response, batch_nights)
+
+
+def dynamodb_night_request(night, fields=None):
     """Query using the night_ACCESS GSI
 
         Parameters
@@ -93,6 +205,10 @@ def dynamodb_night_request(night):
             night passed to the request, must be in YYYY-MM-DD
             format
 
+        fields : tuple
+            attributes to read from validate_fields_parameter, None
+            for every attribute
+
         Returns
         -------
         error_message : dict
@@ -104,6 +220,8 @@ def dynamodb_night_request(night):
         Raises
         ------
     """
+    from boto3.dynamodb.conditions import Key
+
     error_message = None
 
     if os.environ.get("DYNAMO_TABLE_NAME") is None:
@@ -123,9 +241,12 @@ def dynamodb_night_request(night):
     '''
         Query one night using the PK RATINGS_OCCURRED_ON
     '''
-    ratings_query_response = dynamo_table.query(
-        KeyConditionExpression=Key("RATINGS_OCCURRED_ON").eq(night)
-    )
+    with metrics_phase("query"):
+        ratings_query_response = dynamo_table.query(
+            KeyConditionExpression=Key("RATINGS_OCCURRED_ON").eq(night),
+            **fields_projection(fields=fields)
+        )
+    record_query_metrics(query_response=ratings_query_response)
 
     show_ratings = ratings_query_response["Items"]
     logging.info("dynamodb_night_request - Count " + str(ratings_query_response["Count"]))
@@ -139,22 +260,208 @@ def dynamodb_night_request(night):
                 night_number=night
             )
         }
-    else:
-        logging.info("dynamodb_night_request - preparing night for serialization")
-        '''
-            convert from decimal to str for json serialization
-        '''
-        for individual_show in show_ratings:
-            try:
-                individual_show["YEAR"] = str(individual_show["YEAR"])
-            except KeyError:
-                logging.info("dynamodb_night_request - No YEAR for " + individual_show["SHOW"])
         
     logging.info(error_message)
 
     return(error_message, show_ratings)
 
 
+def dynamodb_batch_night_request(batch_nights, fields=None):
+    """Queries each night concurrently within one latency budget
+
+        Parameters
+        ----------
+        batch_nights : list
+            nights in YYYY-MM-DD format
+
+        fields : tuple
+            attributes to read from validate_fields_parameter, None
+            for every attribute
+
+        Returns
+        -------
+        night_results : dict
+            night to the (error_message, show_ratings) tuple from
+            dynamodb_night_request, error_message has a status of 404
+            for nights not found, 502 for a failed query and 504 if
+            the budget ran out first
+
+        Raises
+        ------
+    """
+    budget_seconds = float(os.environ.get(
+        "NIGHTS_BATCH_BUDGET_SECONDS", DEFAULT_BATCH_BUDGET_SECONDS
+    ))
+
+    request_outcomes = run_concurrently_within_budget(
+        request_function=dynamodb_night_request,
+        request_kwargs_list=[
+            {"night": night, "fields": fields} for night in batch_nights
+        ],
+        budget_seconds=budget_seconds
+    )
+
+    night_results = {}
+    for night, (request_result, request_error) in zip(batch_nights, request_outcomes):
+        if request_error is None:
+            error_message, show_ratings = request_result
+            if error_message is not None:
+                error_message = dict(error_message, status=404)
+            night_results[night] = (error_message, show_ratings)
+
+        elif isinstance(request_error, FutureTimeoutError):
+            night_results[night] = (
+                {
+                    "message": "night: {night} not returned within {budget} seconds".format(
+                        night=night, budget=budget_seconds
+                    ),
+                    "status": 504
+                },
+                []
+            )
+
+        else:
+            night_results[night] = (
+                {
+                    "message": "night: {night} request failed".format(
+                        night=night
+                    ),
+                    "status": 502
+                },
+                []
+            )
+
+    return(night_results)
+
+
+def cache_night_response(cache_key, night, show_ratings):
+    """Encodes one night of ratings and adds it to the response cache
+
+        Parameters
+        ----------
+        cache_key : tuple
+            from response_cache_key
+
+        night : str
+            YYYY-MM-DD
+
+        show_ratings : list
+            from dynamodb_night_request
+
+        Returns
+        -------
+        encoded_body : bytes
+
+        http_caching : dict
+            from http_caching_policy
+
+        Raises
+        ------
+    """
+    encoded_body = encode_response_body(show_ratings)
+    http_caching = http_caching_policy(
+        encoded_body=encoded_body,
+        max_age=response_cache_ttl(period_end=night),
+        last_modified=night
+    )
+    response_cache_put(
+        cache_key=cache_key,
+        encoded_body=encoded_body,
+        ttl_seconds=http_caching["max_age"],
+        http_caching=http_caching
+    )
+
+    return(encoded_body, http_caching)
+
+
+def main_batch(event):
+    """Returns the ratings for many nights in one response, nights
+        that are not found, failed or late get their own status inside
+        the response
+
+        Parameters
+        ----------
+        event : dict
+            api gateway lambda proxy event
+
+        Returns
+        -------
+
+        Raises
+        ------
+    """
+    error_response, batch_nights = validate_batch_parameters(event=event)
+
+    if error_response is None:
+        error_response, fields = validate_fields_parameter(event=event)
+
+    if error_response is not None:
+        status_code = error_response.pop("status_code")
+        return(lambda_proxy_response(status_code=status_code, 
+        headers_dict={}, response_body=error_response))
+
+    fields_key = None if fields is None else ",".join(fields)
+
+    night_bodies = {}
+    night_errors = {}
+    uncached_nights = []
+    for night in batch_nights:
+        cached_body, http_caching = response_cache_get(
+            cache_key=response_cache_key(endpoint="nights", night=night, fields=fields_key)
+        )
+        if cached_body is None:
+            uncached_nights.append(night)
+        else:
+            night_bodies[night] = cached_body
+
+    logging.info("main_batch - " + str(len(batch_nights) - len(uncached_nights)) +
+        " cached nights, querying " + str(len(uncached_nights)))
+
+    night_results = dynamodb_batch_night_request(batch_nights=uncached_nights, fields=fields)
+
+    for night, (error_message, show_ratings) in night_results.items():
+        if error_message is None:
+            night_bodies[night], http_caching = cache_night_response(
+                cache_key=response_cache_key(endpoint="nights", night=night, fields=fields_key),
+                night=night,
+                show_ratings=show_ratings
+            )
+        else:
+            logging.info("main_batch - error_message " + str(error_message))
+            night_errors[night] = error_message
+
+    encoded_body = encode_batch_response(
+        batch_keys=batch_nights,
+        encoded_bodies=night_bodies,
+        batch_errors=night_errors
+    )
+
+    '''
+        a batch with a failed night should be retried, not cached
+    '''
+    if any(night_error["status"] != 404 for night_error in night_errors.values()):
+        return(
+            lambda_proxy_response(status_code=200, headers_dict={}, 
+            response_body=encoded_body, request_headers=event.get("headers"))
+        )
+
+    '''
+        the most recent night decides how long the batch can be reused
+    '''
+    return(
+        lambda_proxy_response(status_code=200, headers_dict={}, 
+        response_body=encoded_body, request_headers=event.get("headers"),
+        http_caching=http_caching_policy(
+            encoded_body=encoded_body,
+            max_age=min(
+                response_cache_ttl(period_end=night) for night in batch_nights
+            ),
+            last_modified=max(night_bodies, default=None)
+        ))
+    )
+
+
+@request_metrics(endpoint="nights")
 def main(event):
     """Entry point into the script
 
@@ -169,6 +476,9 @@ def main(event):
         Raises
         ------
     """
+    if batch_request(event=event):
+        return(main_batch(event=event))
+
     error_response = validate_request_parameters(event=event)
 
     if error_response is not None:
@@ -180,15 +490,46 @@ def main(event):
         headers_dict={}, response_body=error_response))
 
 
+    error_response, fields = validate_fields_parameter(event=event)
+
+    if error_response is not None:
+        status_code = error_response.pop("status_code")
+        return(lambda_proxy_response(status_code=status_code,
+        headers_dict={}, response_body=error_response))
+
+    night = event["pathParameters"]["night"]
+
+    cache_key = response_cache_key(
+        endpoint="nights",
+        night=night,
+        fields=None if fields is None else ",".join(fields)
+    )
+    cached_body, http_caching = response_cache_get(cache_key=cache_key)
+
+    if cached_body is not None:
+        logging.info("main - response cache hit")
+        return(
+            lambda_proxy_response(status_code=200, headers_dict={}, 
+            response_body=cached_body, request_headers=event.get("headers"),
+            http_caching=http_caching)
+        )
+
     error_message, ratings_query_response = dynamodb_night_request(
-        night=event["pathParameters"]["night"]
+        night=night,
+        fields=fields
     )
 
     if error_message is None:
         logging.info("main - returning ratings_query_response" + str(len(ratings_query_response)))
+        encoded_body, http_caching = cache_night_response(
+            cache_key=cache_key,
+            night=night,
+            show_ratings=ratings_query_response
+        )
         return(
             lambda_proxy_response(status_code=200, headers_dict={}, 
-            response_body=ratings_query_response)
+            response_body=encoded_body, request_headers=event.get("headers"),
+            http_caching=http_caching)
             
         )
     else:
@@ -212,12 +553,13 @@ def lambda_handler(event, context):
         ------
     """
     '''
-        Logging required for cloudwatch logs
+        Logging required for cloudwatch logs, the whole proxy
+        event is only logged with LOG_LEVEL=DEBUG
     '''
-    logging.getLogger().setLevel(logging.INFO)
+    configure_logging(context=context)
 
-    logging.info("main - Lambda proxy event: ")
-    logging.info(event)
+    logging.info("lambda_handler - " + str(event.get("httpMethod")) + " " + str(event.get("path")))
+    logging.debug(event)
     return(main(event=event))
 
 
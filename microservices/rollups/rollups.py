@@ -0,0 +1,621 @@
+import logging
+import os
+
+from microlib.microlib import ALL_PERIODS
+from microlib.microlib import NIGHT_ROLLUP
+from microlib.microlib import SHOW_NAMES_ROLLUP
+from microlib.microlib import SHOW_ROLLUP_PREFIX
+from microlib.microlib import VIEWER_METRICS
+from microlib.microlib import YEAR_ROLLUP
+from microlib.microlib import add_rollup_rating
+from microlib.microlib import configure_logging
+from microlib.microlib import get_boto_clients
+from microlib.microlib import get_rollup_table
+from microlib.microlib import paginated_query
+from microlib.microlib import prewarm_boto_clients
+from microlib.microlib import ratings_rollup_keys
+from microlib.microlib import remove_rollup_rating
+from microlib.microlib import rollup_items
+from microlib.microlib import rollup_show_names
+from microlib.microlib import rollup_statistics
+from microlib.microlib import rollup_table_name
+from microlib.microlib import show_names_rollup
+
+'''
+    attributes read from the ratings table to build rollups,
+    SHOW and YEAR are dynamodb reserved words
+'''
+ROLLUP_PROJECTION = {
+    "ProjectionExpression": ", ".join(
+        ("RATINGS_OCCURRED_ON", "#show", "#year") + VIEWER_METRICS
+    ),
+    "ExpressionAttributeNames": {"#show": "SHOW", "#year": "YEAR"}
+}
+
+'''
+    every rollup item keeps the last stream sequence number applied
+    for each night, nights are the ratings table partition key so
+    their sequence numbers only increase, and a VERSION so each write
+    is conditional on the rollup that was read
+'''
+STREAM_SEQUENCES = "STREAM_SEQUENCES"
+ROLLUP_VERSION = "VERSION"
+ROLLUP_UPDATE_ATTEMPTS = 5
+
+
+'''
+    dynamodb clients are built during the lambda init phase
+'''
+prewarm_boto_clients(table_names=[
+    os.environ.get("DYNAMO_TABLE_NAME", "prod_toonami_ratings"),
+    rollup_table_name()
+])
+
+
+def get_ratings_table():
+    """Returns the dynamodb ratings Table resource
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        dynamo_table : boto3.resource.Table
+
+        Raises
+        ------
+    """
+    if os.environ.get("DYNAMO_TABLE_NAME") is None:
+        dynamo_table_name = "prod_toonami_ratings"
+    else:
+        dynamo_table_name = os.environ.get("DYNAMO_TABLE_NAME")
+
+    logging.info("get_ratings_table - DYNAMO_TABLE_NAME" + dynamo_table_name)
+    dynamo_client, dynamo_table = get_boto_clients(
+            resource_name="dynamodb",
+            region_name="us-east-1",
+            table_name=dynamo_table_name
+    )
+
+    return(dynamo_table)
+
+
+def stream_rollup_changes(stream_records):
+    """Returns the ratings each rollup gains and loses in a batch of
+        dynamodb stream records
+
+        Both images are used so a rating that moves to another
+        night, year or show leaves the rollup it was counted in
+
+        Parameters
+        ----------
+        stream_records : list
+            Records of a dynamodb stream event, the stream view type
+            must include NEW_IMAGE or OLD_IMAGE
+
+        Returns
+        -------
+        rollup_changes : dict
+            (ROLLUP, PERIOD) tuple to a list of (night, sequence_number,
+            removed_rating, added_rating) tuples in stream order,
+            removed_rating or added_rating is None when the rollup
+            only gains or only loses the rating
+
+        Raises
+        ------
+    """
+    from boto3.dynamodb.types import TypeDeserializer
+
+    type_deserializer = TypeDeserializer()
+    rollup_changes = {}
+
+    for stream_record in stream_records:
+        stream_images = {}
+        for image_name in ("OldImage", "NewImage"):
+            stream_image = stream_record.get("dynamodb", {}).get(image_name)
+            if stream_image is None:
+                continue
+
+            ratings_item = {
+                attribute_name: type_deserializer.deserialize(attribute_value)
+                for attribute_name, attribute_value in stream_image.items()
+            }
+            stream_images[image_name] = (
+                ratings_item, ratings_rollup_keys(ratings_item=ratings_item)
+            )
+
+        old_item, old_keys = stream_images.get("OldImage", (None, set()))
+        new_item, new_keys = stream_images.get("NewImage", (None, set()))
+        if not old_keys and not new_keys:
+            continue
+
+        '''
+            the night is the ratings table partition key, so it is
+            the same in both images
+        '''
+        ratings_night = (new_item if new_keys else old_item)["RATINGS_OCCURRED_ON"]
+        sequence_number = int(stream_record["dynamodb"]["SequenceNumber"])
+
+        for rollup_key in old_keys | new_keys:
+            rollup_changes.setdefault(rollup_key, []).append((
+                ratings_night,
+                sequence_number,
+                old_item if rollup_key in old_keys else None,
+                new_item if rollup_key in new_keys else None
+            ))
+
+    return(rollup_changes)
+
+
+def source_ratings(rollup_name, rollup_value):
+    """Queries every rating counted in a night, year or show rollup
+
+        Parameters
+        ----------
+        rollup_name : str
+            NIGHT_ROLLUP, YEAR_ROLLUP or SHOW_ROLLUP_PREFIX
+
+        rollup_value : str
+            night, year or show name
+
+        Returns
+        -------
+        television_ratings : list
+            list of dict with the ROLLUP_PROJECTION attributes
+
+        Raises
+        ------
+    """
+    from boto3.dynamodb.conditions import Key
+
+    if rollup_name == NIGHT_ROLLUP:
+        query_kwargs = {"KeyConditionExpression": Key("RATINGS_OCCURRED_ON").eq(rollup_value)}
+    elif rollup_name == YEAR_ROLLUP:
+        query_kwargs = {
+            "IndexName": "YEAR_ACCESS",
+            "KeyConditionExpression": Key("YEAR").eq(int(rollup_value))
+        }
+    else:
+        query_kwargs = {
+            "IndexName": "SHOW_ACCESS",
+            "KeyConditionExpression": Key("SHOW").eq(rollup_value)
+        }
+
+    '''
+        the rollup must see every rating, so no page budget
+    '''
+    return(list(paginated_query(
+        dynamo_table=get_ratings_table(),
+        max_pages=float("inf"),
+        max_bytes=float("inf"),
+        **query_kwargs,
+        **ROLLUP_PROJECTION
+    )))
+
+
+def rebuild_rollup_item(rollup_key):
+    """Recomputes one rollup from the ratings it summarizes
+
+        Parameters
+        ----------
+        rollup_key : tuple
+            (ROLLUP, PERIOD)
+
+        Returns
+        -------
+        rollup_item : dict
+            None if the rollup has no ratings left
+
+        Raises
+        ------
+    """
+    rollup_name, period = rollup_key
+    logging.info("rebuild_rollup_item - " + rollup_name + " " + period)
+
+    '''
+        the show query covers ALL and each year of the show
+    '''
+    if rollup_name.startswith(SHOW_ROLLUP_PREFIX):
+        television_ratings = source_ratings(
+            rollup_name=SHOW_ROLLUP_PREFIX,
+            rollup_value=rollup_name[len(SHOW_ROLLUP_PREFIX):]
+        )
+    else:
+        television_ratings = source_ratings(rollup_name=rollup_name, rollup_value=period)
+
+    return(rollup_items(television_ratings=television_ratings).get(rollup_key))
+
+
+def changed_rollup_item(rollup_key, stored_item, rollup_changes):
+    """Applies the changes from stream_rollup_changes to a rollup item
+
+        A change at or below the sequence number stored for its night
+        was applied by an earlier delivery of the same stream records
+        and is skipped. Removing a rating that holds the first or last
+        night, a min or a max rebuilds the rollup from its ratings
+
+        Parameters
+        ----------
+        rollup_key : tuple
+            (ROLLUP, PERIOD)
+
+        stored_item : dict
+            rollup item read from the rollup table, None if missing
+
+        rollup_changes : list
+            changes of rollup_key from stream_rollup_changes
+
+        Returns
+        -------
+        rollup_item : dict
+            rollup item to write, None if it has no ratings left
+
+        rollup_action : str
+            written, deleted, or skipped if every change was applied
+            before
+
+        Raises
+        ------
+    """
+    rollup_name, period = rollup_key
+    applied_sequences = dict((stored_item or {}).get(STREAM_SEQUENCES, {}))
+
+    pending_changes = [
+        rollup_change for rollup_change in rollup_changes
+        if rollup_change[1] > int(applied_sequences.get(rollup_change[0], 0))
+    ]
+    if not pending_changes:
+        return(None, "skipped")
+
+    if stored_item is None:
+        rollup_item = dict(
+            rollup_statistics(television_ratings=[]), ROLLUP=rollup_name, PERIOD=period
+        )
+    else:
+        rollup_item = dict(stored_item, **{
+            metric_name: dict(stored_item.get(metric_name) or {})
+            for metric_name in VIEWER_METRICS
+        })
+
+    rebuild_required = False
+    for ratings_night, sequence_number, removed_rating, added_rating in pending_changes:
+        if removed_rating is not None and not rebuild_required:
+            rebuild_required = not remove_rollup_rating(
+                rollup_values=rollup_item, individual_rating=removed_rating
+            )
+        if added_rating is not None:
+            add_rollup_rating(rollup_values=rollup_item, individual_rating=added_rating)
+        applied_sequences[ratings_night] = str(sequence_number)
+
+    if rebuild_required:
+        rollup_item = rebuild_rollup_item(rollup_key=rollup_key)
+
+    if rollup_item is None or int(rollup_item["RATINGS"]) <= 0:
+        return(None, "deleted")
+
+    rollup_item[STREAM_SEQUENCES] = applied_sequences
+    rollup_item[ROLLUP_VERSION] = int((stored_item or {}).get(ROLLUP_VERSION, 0)) + 1
+
+    return(rollup_item, "written")
+
+
+def apply_rollup_changes(rollup_key, rollup_changes):
+    """Reads a rollup, applies its changes and writes it back on the
+        condition that no other batch wrote it in between, reading it
+        again if one did
+
+        Parameters
+        ----------
+        rollup_key : tuple
+            (ROLLUP, PERIOD)
+
+        rollup_changes : list
+            changes of rollup_key from stream_rollup_changes
+
+        Returns
+        -------
+        rollup_item : dict
+            rollup item written, None if it was deleted or skipped
+
+        rollup_action : str
+            from changed_rollup_item
+
+        Raises
+        ------
+        botocore.exceptions.ClientError
+            if the rollup kept changing for ROLLUP_UPDATE_ATTEMPTS
+            reads, the stream batch is then retried
+    """
+    from botocore.exceptions import ClientError
+
+    rollup_name, period = rollup_key
+    rollup_table = get_rollup_table()
+
+    for update_attempt in range(1, ROLLUP_UPDATE_ATTEMPTS + 1):
+        stored_item = rollup_table.get_item(
+            Key={"ROLLUP": rollup_name, "PERIOD": period},
+            ConsistentRead=True
+        ).get("Item")
+
+        rollup_item, rollup_action = changed_rollup_item(
+            rollup_key=rollup_key,
+            stored_item=stored_item,
+            rollup_changes=rollup_changes
+        )
+        if rollup_action == "skipped" or (rollup_action == "deleted" and stored_item is None):
+            return(None, "skipped")
+
+        if stored_item is None:
+            condition_kwargs = {
+                "ConditionExpression": "attribute_not_exists(#rollup)",
+                "ExpressionAttributeNames": {"#rollup": "ROLLUP"}
+            }
+        elif stored_item.get(ROLLUP_VERSION) is None:
+            condition_kwargs = {
+                "ConditionExpression": "attribute_exists(#rollup) AND attribute_not_exists(#version)",
+                "ExpressionAttributeNames": {"#rollup": "ROLLUP", "#version": ROLLUP_VERSION}
+            }
+        else:
+            condition_kwargs = {
+                "ConditionExpression": "#version = :version",
+                "ExpressionAttributeNames": {"#version": ROLLUP_VERSION},
+                "ExpressionAttributeValues": {":version": stored_item[ROLLUP_VERSION]}
+            }
+
+        try:
+            if rollup_action == "deleted":
+                rollup_table.delete_item(
+                    Key={"ROLLUP": rollup_name, "PERIOD": period},
+                    **condition_kwargs
+                )
+            else:
+                rollup_table.put_item(Item=rollup_item, **condition_kwargs)
+
+            return(rollup_item, rollup_action)
+
+        except ClientError as write_error:
+            if (write_error.response["Error"]["Code"] != "ConditionalCheckFailedException" or
+                update_attempt == ROLLUP_UPDATE_ATTEMPTS):
+                raise
+
+            logging.info("apply_rollup_changes - " + rollup_name + " " + period +
+                " written by another batch, attempt " + str(update_attempt))
+
+
+def update_rollups(rollup_changes):
+    """Applies a batch of stream changes to the rollups they affect,
+        reading the rollups instead of the ratings they summarize
+
+        Parameters
+        ----------
+        rollup_changes : dict
+            from stream_rollup_changes
+
+        Returns
+        -------
+        rollup_counts : dict
+            number of rollups written, deleted and skipped because
+            their changes were applied before
+
+        Raises
+        ------
+    """
+    logging.info("update_rollups - " + str(len(rollup_changes)) + " rollups")
+
+    rollup_counts = {"written": 0, "deleted": 0, "skipped": 0}
+    written_items = {}
+    deleted_keys = set()
+    for rollup_key in sorted(rollup_changes):
+        rollup_item, rollup_action = apply_rollup_changes(
+            rollup_key=rollup_key,
+            rollup_changes=rollup_changes[rollup_key]
+        )
+        rollup_counts[rollup_action] += 1
+
+        if rollup_action == "written":
+            written_items[rollup_key] = rollup_item
+        elif rollup_action == "deleted":
+            deleted_keys.add(rollup_key)
+
+    update_show_names_rollup(written_items=written_items, deleted_keys=deleted_keys)
+
+    logging.info("update_rollups - " + str(rollup_counts))
+
+    return(rollup_counts)
+
+
+def update_show_names_rollup(written_items, deleted_keys):
+    """Adds the shows of written ALL_PERIODS show rollups to the
+        SHOW_NAMES rollup, removes the shows of deleted ones and moves
+        LAST_NIGHT forward to the latest written night
+
+        Only a SHOW_NAMES rollup written by backfill_rollups is
+        updated, so a stream batch never creates a partial one
+
+        Parameters
+        ----------
+        written_items : dict
+            (ROLLUP, PERIOD) tuple to the rollup items written
+
+        deleted_keys : set
+            set of (ROLLUP, PERIOD) tuples deleted
+
+        Returns
+        -------
+        applied_updates : int
+            updates whose condition held, 0 if the SHOW_NAMES rollup
+            has not been built
+
+        Raises
+        ------
+        botocore.exceptions.ClientError
+            for errors other than a failed condition
+    """
+    from botocore.exceptions import ClientError
+
+    update_kwargs_list = [
+        {
+            "UpdateExpression": set_action + " #show_names :show_names",
+            "ConditionExpression": "attribute_exists(#rollup)",
+            "ExpressionAttributeNames": {"#rollup": "ROLLUP", "#show_names": "SHOW_NAMES"},
+            "ExpressionAttributeValues": {":show_names": changed_names}
+        }
+        for set_action, changed_names in (
+            ("ADD", rollup_show_names(rollup_keys=written_items)),
+            ("DELETE", rollup_show_names(rollup_keys=deleted_keys))
+        )
+        if changed_names
+    ]
+
+    latest_night = max(
+        (period for rollup_name, period in written_items if rollup_name == NIGHT_ROLLUP),
+        default=None
+    )
+    if latest_night is not None:
+        update_kwargs_list.append({
+            "UpdateExpression": "SET #last_night = :last_night",
+            "ConditionExpression": "attribute_exists(#rollup) AND "
+                "(attribute_not_exists(#last_night) OR #last_night < :last_night)",
+            "ExpressionAttributeNames": {"#rollup": "ROLLUP", "#last_night": "LAST_NIGHT"},
+            "ExpressionAttributeValues": {":last_night": latest_night}
+        })
+
+    rollup_table = get_rollup_table()
+    applied_updates = 0
+    for update_kwargs in update_kwargs_list:
+        try:
+            rollup_table.update_item(
+                Key={"ROLLUP": SHOW_NAMES_ROLLUP, "PERIOD": ALL_PERIODS},
+                **update_kwargs
+            )
+            applied_updates += 1
+
+        except ClientError as update_error:
+            if update_error.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+
+            '''
+                an earlier night or a missing rollup
+            '''
+            logging.info("update_show_names_rollup - " + update_kwargs["UpdateExpression"] +
+                " condition failed")
+
+    return(applied_updates)
+
+
+def backfill_rollups():
+    """Rebuilds every rollup from one scan of the ratings table and
+        deletes rollups that no longer have ratings
+
+        Each page of the scan is folded into the rollups as it is read,
+        so only the rollups are kept in memory
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        rollup_counts : dict
+            number of ratings scanned and rollups written and deleted
+
+        Raises
+        ------
+    """
+    dynamo_table = get_ratings_table()
+    scan_kwargs = dict(ROLLUP_PROJECTION)
+    rebuilt_items = {}
+    scanned_ratings = 0
+
+    while True:
+        scan_response = dynamo_table.scan(**scan_kwargs)
+        rollup_items(
+            television_ratings=scan_response.get("Items", []),
+            built_rollups=rebuilt_items
+        )
+        scanned_ratings += len(scan_response.get("Items", []))
+
+        if scan_response.get("LastEvaluatedKey") is None:
+            break
+        scan_kwargs["ExclusiveStartKey"] = scan_response["LastEvaluatedKey"]
+
+    rebuilt_items[(SHOW_NAMES_ROLLUP, ALL_PERIODS)] = show_names_rollup(
+        built_rollups=rebuilt_items
+    )
+
+    rollup_table = get_rollup_table()
+    stale_keys = set()
+    scan_kwargs = {"ProjectionExpression": "#rollup, #period, #sequences, #version",
+        "ExpressionAttributeNames": {"#rollup": "ROLLUP", "#period": "PERIOD",
+            "#sequences": STREAM_SEQUENCES, "#version": ROLLUP_VERSION}}
+
+    while True:
+        scan_response = rollup_table.scan(**scan_kwargs)
+        for stored_item in scan_response.get("Items", []):
+            rollup_key = (stored_item["ROLLUP"], stored_item["PERIOD"])
+            if rollup_key not in rebuilt_items:
+                stale_keys.add(rollup_key)
+                continue
+
+            '''
+                stream records already applied stay applied and a
+                stream batch that read the old item writes again
+            '''
+            if stored_item.get(STREAM_SEQUENCES) is not None:
+                rebuilt_items[rollup_key][STREAM_SEQUENCES] = stored_item[STREAM_SEQUENCES]
+            if stored_item.get(ROLLUP_VERSION) is not None:
+                rebuilt_items[rollup_key][ROLLUP_VERSION] = int(stored_item[ROLLUP_VERSION]) + 1
+
+        if scan_response.get("LastEvaluatedKey") is None:
+            break
+        scan_kwargs["ExclusiveStartKey"] = scan_response["LastEvaluatedKey"]
+
+    with rollup_table.batch_writer() as rollup_batch:
+        for rollup_item in rebuilt_items.values():
+            rollup_batch.put_item(Item=rollup_item)
+
+        for rollup_name, period in stale_keys:
+            rollup_batch.delete_item(Key={"ROLLUP": rollup_name, "PERIOD": period})
+
+    rollup_counts = {
+        "ratings": scanned_ratings,
+        "written": len(rebuilt_items),
+        "deleted": len(stale_keys)
+    }
+    logging.info("backfill_rollups - " + str(rollup_counts))
+
+    return(rollup_counts)
+
+
+def lambda_handler(event, context):
+    """Handles dynamodb stream events from the ratings table and
+        backfill invocations
+
+        Parameters
+        ----------
+        event : dict
+            dynamodb stream event or {"backfill": true}
+
+        Returns
+        -------
+        rollup_counts : dict
+
+        Raises
+        ------
+    """
+    '''
+        Logging required for cloudwatch logs
+    '''
+    configure_logging(context=context)
+
+    if event.get("backfill") is True:
+        logging.info("lambda_handler - backfill")
+        return(backfill_rollups())
+
+    stream_records = event.get("Records", [])
+    logging.info("lambda_handler - stream records " + str(len(stream_records)))
+
+    return(update_rollups(rollup_changes=stream_rollup_changes(stream_records=stream_records)))
+
+
+if __name__ == "__main__":
+    lambda_handler(event={"backfill": True}, context={})
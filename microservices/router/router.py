@@ -0,0 +1,148 @@
+import importlib
+import logging
+import os
+
+from microlib.microlib import configure_logging
+from microlib.microlib import lambda_proxy_response
+from microlib.microlib import prewarm_boto_clients
+from microlib.microlib import rollup_table_name
+
+'''
+    first segment of the api gateway resource to the module whose
+    main handles it, every module shares the microlib client registry
+    and response cache of this container
+'''
+ENDPOINT_MODULES = {
+    "aggregations": "microservices.aggregations.aggregations",
+    "nights": "microservices.nights.nights",
+    "search": "microservices.search.search",
+    "showNames": "microservices.show_names.show_names",
+    "shows": "microservices.shows.shows",
+    "years": "microservices.years.years"
+}
+
+
+def endpoint_name(event):
+    """Returns the endpoint an api gateway proxy event is for
+
+        Parameters
+        ----------
+        event : dict
+            api gateway lambda proxy event
+
+        Returns
+        -------
+        endpoint_name : str
+            first segment of the resource, or of the path if there
+            is no resource
+
+        Raises
+        ------
+    """
+    resource_path = event.get("resource") or event.get("path") or ""
+
+    return(resource_path.strip("/").split("/")[0])
+
+
+def endpoint_main(endpoint_name):
+    """Imports the module of an endpoint on first use and returns
+        its main function
+
+        Parameters
+        ----------
+        endpoint_name : str
+            key of ENDPOINT_MODULES
+
+        Returns
+        -------
+        main : function
+            called with the api gateway proxy event
+
+        Raises
+        ------
+    """
+    endpoint_module = importlib.import_module(ENDPOINT_MODULES[endpoint_name])
+
+    return(endpoint_module.main)
+
+
+def prewarm_endpoints():
+    """Imports every endpoint module during the lambda init phase so
+        no request pays for an import, the same conditions as
+        prewarm_boto_clients
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        prewarmed : boolean
+            True if the endpoint modules were imported
+
+        Raises
+        ------
+    """
+    prewarmed = prewarm_boto_clients(table_names=[
+        os.environ.get("DYNAMO_TABLE_NAME", "prod_toonami_ratings"),
+        rollup_table_name()
+    ])
+
+    if prewarmed is True:
+        for endpoint_module in ENDPOINT_MODULES.values():
+            importlib.import_module(endpoint_module)
+
+    return(prewarmed)
+
+
+prewarm_endpoints()
+
+
+def main(event):
+    """Entry point into the script
+
+        Parameters
+        ----------
+        event : dict
+            api gateway lambda proxy event
+
+        Returns
+        -------
+
+        Raises
+        ------
+    """
+    requested_endpoint = endpoint_name(event=event)
+
+    if requested_endpoint not in ENDPOINT_MODULES:
+        logging.info("main - no endpoint for " + str(requested_endpoint))
+        return(
+            lambda_proxy_response(status_code=404, headers_dict={},
+            response_body={"message": "No endpoint for " + str(event.get("resource"))})
+        )
+
+    logging.info("main - routing to " + requested_endpoint)
+
+    return(endpoint_main(endpoint_name=requested_endpoint)(event=event))
+
+
+def lambda_handler(event, context):
+    """Handles lambda invocation from api gateway for every endpoint
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+
+        Raises
+        ------
+    """
+    '''
+        Logging required for cloudwatch logs, the whole proxy
+        event is only logged with LOG_LEVEL=DEBUG
+    '''
+    configure_logging(context=context)
+
+    logging.info("lambda_handler - " + str(event.get("httpMethod")) + " " + str(event.get("path")))
+    logging.debug(event)
+    return(main(event=event))
@@ -1,13 +1,90 @@
-import boto3
-import json
+import hashlib
+import importlib.util
 import logging
 import os
 
-from boto3.dynamodb.conditions import Key
-from copy import deepcopy
 from datetime import datetime
+from http import HTTPStatus
+from itertools import groupby
+from microlib.microlib import configure_logging
+from microlib.microlib import find_index_name
+from microlib.microlib import DEFAULT_QUERY_MAX_PAGES
+from microlib.microlib import RATING_FIELDS
+from microlib.microlib import columnar_ratings
+from microlib.microlib import cursor_signing_key
+from microlib.microlib import decode_cursor
+from microlib.microlib import encode_cursor
+from microlib.microlib import encode_ndjson_body
+from microlib.microlib import encode_response_body
+from microlib.microlib import estimate_item_bytes
+from microlib.microlib import fields_projection
 from microlib.microlib import get_boto_clients
+from microlib.microlib import http_caching_policy
 from microlib.microlib import lambda_proxy_response
+from microlib.microlib import latest_ratings_night
+from microlib.microlib import metrics_phase
+from microlib.microlib import ndjson_chunks
+from microlib.microlib import paginated_query
+from microlib.microlib import prewarm_boto_clients
+from microlib.microlib import request_metrics
+from microlib.microlib import response_cache_get
+from microlib.microlib import response_cache_key
+from microlib.microlib import response_cache_put
+from microlib.microlib import response_cache_ttl
+from microlib.microlib import response_format_headers
+from microlib.microlib import run_concurrently
+from microlib.microlib import truncated_response_headers
+from microlib.microlib import validate_fields_parameter
+from microlib.microlib import validate_format_parameter
+from operator import itemgetter
+from urllib.parse import parse_qsl
+
+'''
+    fullRange responses stop at a year boundary once the estimated
+    size of the ratings reaches this many bytes, leaving room for json
+    overhead under the 6 MB lambda proxy response limit
+'''
+DEFAULT_MAX_RESPONSE_BYTES = 4 * 1024 * 1024
+
+FULL_RANGE_NEXT_URL = "/search?startDate={new_start_date}&endDate={same_end_date}&fullRange=true"
+
+'''
+    page size bounds for the limit query parameter
+'''
+DEFAULT_CURSOR_LIMIT = 100
+MAX_CURSOR_LIMIT = 1000
+
+CURSOR_NEXT_URL = "/search?startDate={start_date}&endDate={end_date}&limit={limit}&cursor={cursor}"
+
+'''
+    media type of each export query parameter value
+'''
+EXPORT_FORMATS = {
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet"
+}
+
+'''
+    base64 grows the body by a third, larger exports are staged in
+    the EXPORT_BUCKET_NAME s3 bucket behind a presigned url
+'''
+EXPORT_MAX_INLINE_BYTES = 4 * 1024 * 1024
+EXPORT_KEY_PREFIX = "exports/"
+EXPORT_URL_EXPIRES_SECONDS = 15 * 60
+
+'''
+    pyarrow is optional and slow to import, it is only imported by
+    the export functions
+'''
+PYARROW_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+
+
+'''
+    dynamodb clients are built during the lambda init phase
+'''
+prewarm_boto_clients(table_names=[
+    os.environ.get("DYNAMO_TABLE_NAME", "prod_toonami_ratings")
+])
 
 
 def clean_query_parameter_string(query_parameter_date):
@@ -48,6 +125,7 @@ def clean_query_parameter_string(query_parameter_date):
     return(True, valid_date_format)
 
 
+@metrics_phase("validate")
 def validate_request_parameters(event):
     """Validates the request passed in via the lambda handler event
 
@@ -171,127 +249,1301 @@ def get_next_url(start_date, end_date):
     return(next_url)
 
 
-def dynamodb_year_request(year):
+def full_range_requested(event):
+    """Returns True if the client opted into the fullRange search mode
+
+        Parameters
+        ----------
+        event : dict
+            lambda_handler event from api gateway
+
+        Returns
+        -------
+        full_range : boolean
+            True if the fullRange query parameter is true
+
+        Raises
+        ------
+    """
+    try:
+        return(str(event["queryStringParameters"]["fullRange"]).lower() == "true")
+
+    except (KeyError, TypeError):
+        return(False)
+
+
+def dynamodb_range_request(start_date, end_date, max_response_bytes=None,
+    fields=None, query_stats=None):
+    """Queries every year between start_date and end_date concurrently
+        and merges the ratings in date order
+
+        Parameters
+        ----------
+        start_date : datetime.datetime
+            converted startDate query parameter
+
+        end_date : datetime.datetime
+            converted endDate query parameter
+
+        max_response_bytes : int
+            years after the one where the estimated size reaches
+            max_response_bytes are left for the next url, defaults to
+            the SEARCH_MAX_RESPONSE_BYTES environment variable or
+            DEFAULT_MAX_RESPONSE_BYTES
+
+        fields : tuple
+            attributes to read from validate_fields_parameter, None
+            for every attribute
+
+        query_stats : dict
+            optional dict, truncated is set to True when the query
+            budget was reached in any year returned
+
+        Returns
+        -------
+        error_message : dict
+            None if any year was found, the first 404 error otherwise
+
+        range_ratings : list
+            list of dict where each dict is a television show
+            rating sorted by RATINGS_OCCURRED_ON
+
+        next_url : str
+            path and query parameters starting at the first year left
+            out because of the size cap, None if every year fit
+
+        Raises
+        ------
+    """
+    if max_response_bytes is None:
+        max_response_bytes = int(os.environ.get(
+            "SEARCH_MAX_RESPONSE_BYTES", DEFAULT_MAX_RESPONSE_BYTES
+        ))
+
+    '''
+        years in the future have no ratings
+    '''
+    last_year = max(start_date.year, min(end_date.year, datetime.now().year))
+
+    year_request_kwargs = [
+        {
+            "year": year,
+            "start_date": max(start_date, datetime(year, 1, 1)),
+            "end_date": min(end_date, datetime(year, 12, 31)),
+            "fields": fields,
+            "query_stats": {}
+        }
+        for year in range(start_date.year, last_year + 1)
+    ]
+    logging.info("dynamodb_range_request - querying " +
+        str(len(year_request_kwargs)) + " years")
+
+    year_responses = run_concurrently(
+        request_function=dynamodb_year_request,
+        request_kwargs_list=year_request_kwargs
+    )
+
+    error_message = None
+    range_ratings = []
+    response_bytes = 0
+    range_truncated = False
+    next_url = None
+    for request_kwargs, (year_error_message, year_ratings) in zip(
+        year_request_kwargs, year_responses):
+
+        if year_error_message is not None:
+            logging.debug("dynamodb_range_request - " + str(year_error_message))
+            continue
+
+        year_bytes = sum(
+            estimate_item_bytes(individual_ratings)
+            for individual_ratings in year_ratings
+        )
+        '''
+            only paginate when the response would be too large,
+            the first year is always returned
+        '''
+        if response_bytes > 0 and response_bytes + year_bytes > max_response_bytes:
+            next_url = FULL_RANGE_NEXT_URL.format(
+                new_start_date=datetime.strftime(request_kwargs["start_date"], "%Y-%m-%d"),
+                same_end_date=datetime.strftime(end_date, "%Y-%m-%d")
+            )
+            logging.info("dynamodb_range_request - size cap reached " + next_url)
+            break
+
+        range_ratings.extend(
+            sorted(year_ratings, key=itemgetter("RATINGS_OCCURRED_ON"))
+        )
+        response_bytes += year_bytes
+        if request_kwargs["query_stats"].get("truncated") is True:
+            range_truncated = True
+
+    if query_stats is not None:
+        query_stats["truncated"] = range_truncated
+
+    if all(year_error_message is not None for year_error_message, year_ratings in year_responses):
+        error_message = year_responses[0][0]
+
+    '''
+        one line per request, the per year lines are debug
+    '''
+    logging.info("dynamodb_range_request - {ratings_count} ratings from {years_count} years, {missing_count} years not found".format(
+        ratings_count=len(range_ratings),
+        years_count=len(year_request_kwargs),
+        missing_count=sum(
+            year_error_message is not None
+            for year_error_message, year_ratings in year_responses
+        )
+    ))
+
+    return(error_message, range_ratings, next_url)
+
+
+def year_key_condition(dynamo_table, year, start_date=None, end_date=None):
+    """Returns the index and key condition to query one year
+
+        Parameters
+        ----------
+        dynamo_table : boto3.resource.Table
+            Table resource to query
+
+        year : int
+            year to request
+
+        start_date : datetime.datetime
+            optional inclusive start of the date window
+
+        end_date : datetime.datetime
+            optional inclusive end of the date window
+
+        Returns
+        -------
+        index_name : str
+            YEAR_ACCESS or the index sorted by RATINGS_OCCURRED_ON
+
+        key_condition : boto3.dynamodb.conditions.ConditionBase
+            KeyConditionExpression for the query
+
+        window_in_key_condition : boolean
+            True if the date window is part of key_condition, False
+            if the results still need filter_ratings
+
+        Raises
+        ------
+    """
+    from boto3.dynamodb.conditions import Key
+
+    index_name = "YEAR_ACCESS"
+    key_condition = Key("YEAR").eq(int(year))
+    window_in_key_condition = False
+
+    if start_date is not None and end_date is not None:
+        date_index_name = find_index_name(
+            dynamo_table=dynamo_table,
+            hash_key="YEAR",
+            range_key="RATINGS_OCCURRED_ON"
+        )
+        '''
+            only read the nights between start_date and end_date
+            instead of the whole year
+        '''
+        if date_index_name is not None:
+            index_name = date_index_name
+            key_condition = key_condition & Key("RATINGS_OCCURRED_ON").between(
+                datetime.strftime(start_date, "%Y-%m-%d"),
+                datetime.strftime(end_date, "%Y-%m-%d")
+            )
+            window_in_key_condition = True
+
+    return(index_name, key_condition, window_in_key_condition)
+
+
+@metrics_phase("validate")
+def validate_cursor_parameters(event, start_date, end_date):
+    """Validates the optional limit and cursor query parameters
+
+        Parameters
+        ----------
+        event : dict
+            lambda_handler event from api gateway
+
+        start_date : datetime.datetime
+            converted startDate query parameter
+
+        end_date : datetime.datetime
+            converted endDate query parameter
+
+        Returns
+        -------
+        error_response : dict
+            None if the parameters are valid or not passed. Otherwise
+            a dict with keys status_code and message
+
+        limit : int
+            maximum ratings per page, None if neither limit nor
+            cursor were passed
+
+        cursor_position : dict
+            decoded cursor, None for the first page
+
+        Raises
+        ------
+    """
+    query_parameters = event.get("queryStringParameters") or {}
+    limit = query_parameters.get("limit")
+    cursor_token = query_parameters.get("cursor")
+    cursor_position = None
+
+    if limit is None and cursor_token is None:
+        return(None, None, None)
+
+    '''
+        fail closed, a key per container would reject cursors issued by
+        every other container
+    '''
+    if cursor_signing_key() is None:
+        return(
+            {
+                "message": "Cursor pagination is not configured",
+                "status_code": 500
+            },
+            None,
+            None
+        )
+
+    if limit is None:
+        limit = DEFAULT_CURSOR_LIMIT
+
+    elif (
+            (type(limit) != str)
+        or
+            (not limit.isdigit())
+        or
+            (len(limit) > 4)
+        or
+            (not 1 <= int(limit) <= MAX_CURSOR_LIMIT)
+        ):
+        logging.info("validate_cursor_parameters - invalid limit")
+        return(
+            {
+                "message": "limit must be an integer from 1 to " + str(MAX_CURSOR_LIMIT),
+                "status_code": 404
+            },
+            None,
+            None
+        )
+
+    if cursor_token is not None:
+        cursor_position = decode_cursor(cursor_token=cursor_token)
+
+        '''
+            a cursor is only valid for the search that created it
+        '''
+        if (
+                (cursor_position is None)
+            or
+                (cursor_position.get("start") != datetime.strftime(start_date, "%Y-%m-%d"))
+            or
+                (cursor_position.get("end") != datetime.strftime(end_date, "%Y-%m-%d"))
+            ):
+            logging.info("validate_cursor_parameters - invalid cursor")
+            return(
+                {
+                    "message": "Invalid cursor for this startDate and endDate",
+                    "status_code": 404
+                },
+                None,
+                None
+            )
+
+    return(None, int(limit), cursor_position)
+
+
+def dynamodb_cursor_request(start_date, end_date, limit, cursor_position=None,
+    fields=None):
+    """Returns at most limit ratings starting where cursor_position
+        stopped, moving on to the next year when a year runs out
+
+        Parameters
+        ----------
+        start_date : datetime.datetime
+            converted startDate query parameter
+
+        end_date : datetime.datetime
+            converted endDate query parameter
+
+        limit : int
+            maximum ratings to return
+
+        cursor_position : dict
+            year and LastEvaluatedKey to resume from, None to start at
+            start_date
+
+        fields : tuple
+            attributes to read from validate_fields_parameter, None
+            for every attribute
+
+        Returns
+        -------
+        cursor_ratings : list
+            list of dict where each dict is a television show
+            rating
+
+        next_url : str
+            path and query parameters for the next page, None if
+            every rating has been returned
+
+        Raises
+        ------
+    """
+    if os.environ.get("DYNAMO_TABLE_NAME") is None:
+        dynamo_table_name = "prod_toonami_ratings"
+    else:
+        dynamo_table_name = os.environ.get("DYNAMO_TABLE_NAME")
+
+    dynamo_client, dynamo_table = get_boto_clients(
+            resource_name="dynamodb",
+            region_name="us-east-1",
+            table_name=dynamo_table_name
+    )
+
+    if cursor_position is None:
+        year = start_date.year
+        exclusive_start_key = None
+    else:
+        year = cursor_position["year"]
+        exclusive_start_key = cursor_position["key"]
+
+    last_year = max(start_date.year, min(end_date.year, datetime.now().year))
+
+    cursor_ratings = []
+    pages_read = 0
+    while len(cursor_ratings) < limit and year <= last_year and pages_read < DEFAULT_QUERY_MAX_PAGES:
+        year_start_date = max(start_date, datetime(year, 1, 1))
+        year_end_date = min(end_date, datetime(year, 12, 31))
+
+        index_name, key_condition, window_in_key_condition = year_key_condition(
+            dynamo_table=dynamo_table,
+            year=year,
+            start_date=year_start_date,
+            end_date=year_end_date
+        )
+
+        query_kwargs = {
+            "IndexName": index_name,
+            "KeyConditionExpression": key_condition,
+            "Limit": limit - len(cursor_ratings),
+            **fields_projection(fields=fields)
+        }
+        if exclusive_start_key is not None:
+            query_kwargs["ExclusiveStartKey"] = exclusive_start_key
+
+        '''
+            one dynamodb page at a time so the cursor can resume
+            exactly after the last item returned
+        '''
+        query_stats = {}
+        page_ratings = list(paginated_query(
+            dynamo_table=dynamo_table,
+            query_stats=query_stats,
+            max_pages=1,
+            **query_kwargs
+        ))
+        pages_read += 1
+
+        if window_in_key_condition is False:
+            page_ratings = filter_ratings(
+                ratings_query_response=page_ratings,
+                start_date=year_start_date,
+                end_date=year_end_date
+            )
+        cursor_ratings.extend(page_ratings)
+
+        exclusive_start_key = query_stats["last_evaluated_key"]
+        if exclusive_start_key is None:
+            year += 1
+
+    logging.info("dynamodb_cursor_request - " + str(len(cursor_ratings)) +
+        " ratings from " + str(pages_read) + " pages")
+
+    if year > last_year:
+        return(cursor_ratings, None)
+
+    next_url = CURSOR_NEXT_URL.format(
+        start_date=datetime.strftime(start_date, "%Y-%m-%d"),
+        end_date=datetime.strftime(end_date, "%Y-%m-%d"),
+        limit=limit,
+        cursor=encode_cursor(cursor_position={
+            "start": datetime.strftime(start_date, "%Y-%m-%d"),
+            "end": datetime.strftime(end_date, "%Y-%m-%d"),
+            "year": year,
+            "key": exclusive_start_key
+        })
+    )
+
+    return(cursor_ratings, next_url)
+
+
+def dynamodb_year_request(year, start_date=None, end_date=None, fields=None,
+    query_stats=None):
     """Query using the YEAR_ACCESS GSI
 
+        If start_date and end_date are passed and the table has an index
+        with YEAR as the partition key and RATINGS_OCCURRED_ON as the sort
+        key the date window is part of the key condition, otherwise the
+        year is filtered with filter_ratings
+
+        Parameters
+        ----------
+        year : int
+            year to request
+
+        start_date : datetime.datetime
+            optional inclusive start of the date window
+
+        end_date : datetime.datetime
+            optional inclusive end of the date window
+
+        fields : tuple
+            attributes to read from validate_fields_parameter, None
+            for every attribute
+
+        query_stats : dict
+            optional dict updated in place by paginated_query,
+            truncated is True when the query budget was reached
+
+        Returns
+        -------
+        error_message : dict
+            None if items are returned, dict of 404 errors when the
+            year has no ratings in the date window on either path
+        show_ratings : list
+            list of dict where each dict is a television show
+            rating
+
+        Raises
+        ------
+    """
+    error_message = None
+
+    if os.environ.get("DYNAMO_TABLE_NAME") is None:
+        dynamo_table_name = "prod_toonami_ratings"
+    else:
+        dynamo_table_name = os.environ.get("DYNAMO_TABLE_NAME")
+
+    logging.debug("dynamodb_year_request - DYNAMO_TABLE_NAME" + dynamo_table_name)
+    dynamo_client, dynamo_table = get_boto_clients(
+            resource_name="dynamodb",
+            region_name="us-east-1",
+            table_name=dynamo_table_name
+    )
+
+    logging.debug("dynamodb_year_request - year_access_query" )
+
+    index_name, key_condition, window_in_key_condition = year_key_condition(
+        dynamo_table=dynamo_table,
+        year=year,
+        start_date=start_date,
+        end_date=end_date
+    )
+
+    '''
+        Query one year using the GSI, following LastEvaluatedKey
+        so partitions over 1 MB are not cut off
+    '''
+    if query_stats is None:
+        query_stats = {}
+    show_ratings = list(paginated_query(
+        dynamo_table=dynamo_table,
+        query_stats=query_stats,
+        IndexName=index_name,
+        KeyConditionExpression=key_condition,
+        **fields_projection(fields=fields)
+    ))
+
+    logging.debug("dynamodb_year_request - Count " + str(query_stats["count"]) +
+        " Pages " + str(query_stats["pages"]) +
+        " ConsumedCapacity " + str(query_stats["consumed_capacity"]))
+
+    if query_stats["truncated"] is True:
+        logging.info("dynamodb_year_request - query budget reached, results truncated")
+
+    if start_date is not None and end_date is not None and window_in_key_condition is False:
+        show_ratings = filter_ratings(
+            ratings_query_response=show_ratings,
+            start_date=start_date,
+            end_date=end_date
+        )
+
+    '''
+        Same 404 whether the date window was in the key condition
+        or filtered, a truncated year may have more ratings
+    '''
+    if len(show_ratings) == 0 and query_stats["truncated"] is False:
+        error_message = {
+            "message": "year: {year_number} not found".format(
+                year_number=year
+            )
+        }
+
+    logging.debug(error_message)
+
+    return(error_message, show_ratings)
+
+
+
+def filter_ratings(ratings_query_response, start_date, end_date):
+    """filters a year of television ratings to be between the start_date
+    and end_date parameters
+
+        Parameters
+        ----------
+        ratings_query_response : list
+            list of dict where each dict is a television show
+            rating
+
+        start_date : datetime.datetime
+            converted startDate query parameter 
+
+        end_date : datetime.datetime
+            converted endDate query parameter
+
+        Returns
+        -------
+        filtered_show_ratings : list
+            list of dict where the ratings_occurred_on is greater than or
+            equal to start_date and less than or equal to end date
+
+        Raises
+        ------
+    """
+    if ratings_query_response == []:
+        logging.info("filter_ratings - no ratings to filter")
+
+        return(ratings_query_response)
+    
+    
+    filtered_show_ratings = list(iter_filter_ratings(
+        television_ratings=ratings_query_response,
+        start_date=start_date,
+        end_date=end_date
+    ))
+
+    logging.debug("filter_ratings - removed {removed_count} ratings outside {start} to {end}".format(
+        removed_count=len(ratings_query_response) - len(filtered_show_ratings),
+        start=datetime.strftime(start_date, "%Y-%m-%d"),
+        end=datetime.strftime(end_date, "%Y-%m-%d")
+    ))
+
+    return(filtered_show_ratings)
+
+
+def iter_filter_ratings(television_ratings, start_date, end_date):
+    """Generator form of filter_ratings for ratings that are still
+        arriving from dynamodb
+
+        Parameters
+        ----------
+        television_ratings : iterable
+            list or generator of dict where each dict is a television
+            show rating
+
+        start_date : datetime.datetime
+            converted startDate query parameter
+
+        end_date : datetime.datetime
+            converted endDate query parameter
+
+        Returns
+        -------
+        individual_ratings : dict
+            yields each rating between start_date and end_date
+
+        Raises
+        ------
+    """
+    '''
+        YYYY-MM-DD strings sort the same as the dates they represent
+        so no row needs to be parsed
+    '''
+    start_date_string = datetime.strftime(start_date, "%Y-%m-%d")
+    end_date_string = datetime.strftime(end_date, "%Y-%m-%d")
+
+    for individual_ratings in television_ratings:
+        if start_date_string <= individual_ratings["RATINGS_OCCURRED_ON"] <= end_date_string:
+            yield(individual_ratings)
+
+
+def stream_year_ratings(dynamo_table, year, start_date, end_date, fields=None,
+    query_stats=None, max_pages=None, max_bytes=None):
+    """Generator of one year of ratings in RATINGS_OCCURRED_ON order
+
+        Parameters
+        ----------
+        dynamo_table : boto3.resource.Table
+            Table resource to query
+
+        year : int
+            year to request
+
+        start_date : datetime.datetime
+            inclusive start of the date window within year
+
+        end_date : datetime.datetime
+            inclusive end of the date window within year
+
+        fields : tuple
+            attributes to read from validate_fields_parameter, None
+            for every attribute
+
+        query_stats : dict
+            optional dict updated in place by paginated_query,
+            truncated is True when the query budget was reached
+
+        max_pages : int
+            query budget passed to paginated_query, None for the
+            default
+
+        max_bytes : int
+            query budget passed to paginated_query, None for the
+            default
+
+        Returns
+        -------
+        individual_ratings : dict
+            yields each rating as its dynamodb page arrives when the
+            table has the date index, otherwise once the year is read
+
+        Raises
+        ------
+    """
+    index_name, key_condition, window_in_key_condition = year_key_condition(
+        dynamo_table=dynamo_table,
+        year=year,
+        start_date=start_date,
+        end_date=end_date
+    )
+
+    year_ratings = paginated_query(
+        dynamo_table=dynamo_table,
+        query_stats=query_stats,
+        max_pages=max_pages,
+        max_bytes=max_bytes,
+        IndexName=index_name,
+        KeyConditionExpression=key_condition,
+        **fields_projection(fields=fields)
+    )
+
+    if window_in_key_condition is True:
+        '''
+            the date index returns the window already in order
+        '''
+        yield from year_ratings
+        return
+
+    '''
+        YEAR_ACCESS is not sorted by night so one year is held to
+        sort it
+    '''
+    yield from sorted(
+        iter_filter_ratings(
+            television_ratings=year_ratings,
+            start_date=start_date,
+            end_date=end_date
+        ),
+        key=itemgetter("RATINGS_OCCURRED_ON")
+    )
+
+
+def stream_search_ratings(start_date, end_date, fields=None,
+    max_response_bytes=None, stream_stats=None):
+    """Generator of every rating between start_date and end_date in
+        RATINGS_OCCURRED_ON order, querying one year after another
+
+        Parameters
+        ----------
+        start_date : datetime.datetime
+            converted startDate query parameter
+
+        end_date : datetime.datetime
+            converted endDate query parameter
+
+        fields : tuple
+            attributes to read from validate_fields_parameter, None
+            for every attribute
+
+        max_response_bytes : int
+            stop at the first year boundary after the estimated size
+            reaches max_response_bytes, defaults to the
+            SEARCH_MAX_RESPONSE_BYTES environment variable or
+            DEFAULT_MAX_RESPONSE_BYTES. float("inf") also reads every
+            year without the query budget, so no rating is left out
+
+        stream_stats : dict
+            optional dict updated in place with ratings, bytes,
+            last_night, next_url and truncated, next_url is None
+            unless max_response_bytes was reached, truncated is True
+            when the query budget was reached in any year
+
+        Returns
+        -------
+        individual_ratings : dict
+            yields each rating
+
+        Raises
+        ------
+    """
+    if max_response_bytes is None:
+        max_response_bytes = int(os.environ.get(
+            "SEARCH_MAX_RESPONSE_BYTES", DEFAULT_MAX_RESPONSE_BYTES
+        ))
+
+    if stream_stats is None:
+        stream_stats = {}
+    stream_stats.update({
+        "ratings": 0,
+        "bytes": 0,
+        "last_night": None,
+        "next_url": None,
+        "truncated": False
+    })
+
+    if os.environ.get("DYNAMO_TABLE_NAME") is None:
+        dynamo_table_name = "prod_toonami_ratings"
+    else:
+        dynamo_table_name = os.environ.get("DYNAMO_TABLE_NAME")
+
+    dynamo_client, dynamo_table = get_boto_clients(
+            resource_name="dynamodb",
+            region_name="us-east-1",
+            table_name=dynamo_table_name
+    )
+
+    last_year = max(start_date.year, min(end_date.year, datetime.now().year))
+
+    '''
+        without a size cap the body is streamed, not held, so each
+        year is read to its last page
+    '''
+    year_budget = {}
+    if max_response_bytes == float("inf"):
+        year_budget = {"max_pages": float("inf"), "max_bytes": float("inf")}
+
+    for year in range(start_date.year, last_year + 1):
+        year_start_date = max(start_date, datetime(year, 1, 1))
+
+        if year > start_date.year and stream_stats["bytes"] >= max_response_bytes:
+            stream_stats["next_url"] = FULL_RANGE_NEXT_URL.format(
+                new_start_date=datetime.strftime(year_start_date, "%Y-%m-%d"),
+                same_end_date=datetime.strftime(end_date, "%Y-%m-%d")
+            ) + "&format=ndjson"
+            if fields is not None:
+                stream_stats["next_url"] += "&fields=" + ",".join(fields)
+            logging.info("stream_search_ratings - size cap reached " + stream_stats["next_url"])
+            return
+
+        year_query_stats = {}
+        for individual_ratings in stream_year_ratings(
+            dynamo_table=dynamo_table,
+            year=year,
+            start_date=year_start_date,
+            end_date=min(end_date, datetime(year, 12, 31)),
+            fields=fields,
+            query_stats=year_query_stats,
+            **year_budget):
+
+            stream_stats["ratings"] += 1
+            stream_stats["bytes"] += estimate_item_bytes(individual_ratings)
+            stream_stats["last_night"] = individual_ratings["RATINGS_OCCURRED_ON"]
+            yield(individual_ratings)
+
+        if year_query_stats.get("truncated") is True:
+            stream_stats["truncated"] = True
+
+    logging.info("stream_search_ratings - " + str(stream_stats["ratings"]) + " ratings")
+
+
+@metrics_phase("validate")
+def validate_export_parameter(event):
+    """Validates the optional export query parameter
+
+        Parameters
+        ----------
+        event : dict
+            lambda_handler event from api gateway
+
+        Returns
+        -------
+        error_response : dict
+            None if the parameter is valid or not passed. Otherwise
+            a dict with keys status_code and message
+
+        export_format : str
+            key of EXPORT_FORMATS, None if export was not requested
+
+        Raises
+        ------
+    """
+    query_parameters = event.get("queryStringParameters") or {}
+    export_format = query_parameters.get("export")
+
+    if export_format is None:
+        return(None, None)
+
+    if export_format not in EXPORT_FORMATS:
+        logging.info("validate_export_parameter - invalid export " + str(export_format))
+        return(
+            {
+                "message": "export must be one of " + ", ".join(sorted(EXPORT_FORMATS)),
+                "status_code": 400
+            },
+            None
+        )
+
+    if PYARROW_AVAILABLE is False:
+        logging.info("validate_export_parameter - pyarrow is not installed")
+        return(
+            {
+                "message": "export is not available",
+                "status_code": 501
+            },
+            None
+        )
+
+    return(None, export_format)
+
+
+def export_schema(fields=None):
+    """Returns the typed arrow schema of an export
+
         Parameters
         ----------
-        year : int
-            year to request
+        fields : tuple
+            attributes from validate_fields_parameter, None for every
+            attribute in RATING_FIELDS
 
         Returns
         -------
-        error_message : dict
-            None if items are returned, dict of 404 errors otherwise
-        show_ratings : list
+        ratings_schema : pyarrow.Schema
+            one field per attribute in RATING_FIELDS order, SHOW is
+            dictionary encoded
+
+        Raises
+        ------
+    """
+    import pyarrow
+
+    column_types = {
+        "RATINGS_OCCURRED_ON": pyarrow.date32(),
+        "TIME": pyarrow.string(),
+        "SHOW": pyarrow.dictionary(pyarrow.int32(), pyarrow.string()),
+        "TOTAL_VIEWERS": pyarrow.int64(),
+        "YEAR": pyarrow.int16(),
+        "PERCENTAGE_OF_HOUSEHOLDS": pyarrow.float64(),
+        "TOTAL_VIEWERS_AGE_18_49": pyarrow.int64(),
+        "PERCENTAGE_OF_HOUSEHOLDS_AGE_18_49": pyarrow.float64(),
+        "IS_RERUN": pyarrow.bool_()
+    }
+
+    return(pyarrow.schema([
+        (field_name, column_types[field_name])
+        for field_name in (RATING_FIELDS if fields is None else fields)
+    ]))
+
+
+def ratings_record_batch(television_ratings, ratings_schema):
+    """Converts ratings to an arrow record batch through
+        columnar_ratings so each attribute is read once
+
+        Parameters
+        ----------
+        television_ratings : list
             list of dict where each dict is a television show
             rating
 
+        ratings_schema : pyarrow.Schema
+            from export_schema
+
+        Returns
+        -------
+        record_batch : pyarrow.RecordBatch
+            attributes no rating has are all null
+
         Raises
         ------
     """
-    error_message = None
+    import pyarrow
 
-    if os.environ.get("DYNAMO_TABLE_NAME") is None:
-        dynamo_table_name = "prod_toonami_ratings"
+    ratings_columns = columnar_ratings(television_ratings=television_ratings)
+    row_count = ratings_columns["rows"]
+
+    column_arrays = []
+    for schema_field in ratings_schema:
+        column_values = ratings_columns["columns"].get(schema_field.name)
+
+        if column_values is None:
+            column_arrays.append(pyarrow.nulls(row_count, type=schema_field.type))
+            continue
+
+        if schema_field.name == "SHOW":
+            column_arrays.append(pyarrow.DictionaryArray.from_arrays(
+                pyarrow.array(column_values["indices"], type=pyarrow.int32()),
+                pyarrow.array(column_values["dictionary"], type=pyarrow.string())
+            ))
+            continue
+
+        '''
+            dynamodb numbers are Decimal and nights are strings
+        '''
+        if pyarrow.types.is_date(schema_field.type):
+            convert_value = lambda column_value: datetime.strptime(
+                column_value, "%Y-%m-%d").date()
+        elif pyarrow.types.is_integer(schema_field.type):
+            convert_value = int
+        elif pyarrow.types.is_floating(schema_field.type):
+            convert_value = float
+        else:
+            convert_value = None
+
+        if convert_value is not None:
+            column_values = [
+                None if column_value is None else convert_value(column_value)
+                for column_value in column_values
+            ]
+        column_arrays.append(pyarrow.array(column_values, type=schema_field.type))
+
+    return(pyarrow.RecordBatch.from_arrays(column_arrays, schema=ratings_schema))
+
+
+def export_ratings(television_ratings, export_format, fields=None):
+    """Writes ratings sorted by RATINGS_OCCURRED_ON as arrow ipc stream
+        or parquet bytes
+
+        Parameters
+        ----------
+        television_ratings : iterable
+            dict for each television show rating in
+            RATINGS_OCCURRED_ON order, such as stream_search_ratings,
+            consumed one year at a time
+
+        export_format : str
+            key of EXPORT_FORMATS
+
+        fields : tuple
+            attributes from validate_fields_parameter, None for every
+            attribute
+
+        Returns
+        -------
+        export_bytes : bytes
+
+        Raises
+        ------
+    """
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+
+    ratings_schema = export_schema(fields=fields)
+    export_sink = pyarrow.BufferOutputStream()
+
+    if export_format == "parquet":
+        export_writer = pyarrow.parquet.ParquetWriter(export_sink, ratings_schema)
     else:
-        dynamo_table_name = os.environ.get("DYNAMO_TABLE_NAME")
+        export_writer = pyarrow.ipc.new_stream(export_sink, ratings_schema)
 
-    logging.info("dynamodb_year_request - DYNAMO_TABLE_NAME" + dynamo_table_name)
-    dynamo_client, dynamo_table = get_boto_clients(
-            resource_name="dynamodb",
-            region_name="us-east-1",
-            table_name=dynamo_table_name
-    )
+    '''
+        one record batch per year, which is one parquet row group,
+        so only a year of python rows is converted at a time
+    '''
+    with export_writer:
+        for year, year_ratings in groupby(
+            television_ratings,
+            key=lambda individual_ratings: individual_ratings["RATINGS_OCCURRED_ON"][:4]):
+
+            record_batch = ratings_record_batch(
+                television_ratings=list(year_ratings),
+                ratings_schema=ratings_schema
+            )
+            if export_format == "parquet":
+                export_writer.write_table(pyarrow.Table.from_batches([record_batch]))
+            else:
+                export_writer.write_batch(record_batch)
+
+    return(export_sink.getvalue().to_pybytes())
+
+
+def stage_export(export_bytes, export_format):
+    """Uploads an export to the EXPORT_BUCKET_NAME s3 bucket
+
+        Parameters
+        ----------
+        export_bytes : bytes
+            from export_ratings
+
+        export_format : str
+            key of EXPORT_FORMATS
+
+        Returns
+        -------
+        export_url : str
+            presigned get url valid for EXPORT_URL_EXPIRES_SECONDS,
+            None if no bucket is configured
+
+        Raises
+        ------
+    """
+    export_bucket_name = os.environ.get("EXPORT_BUCKET_NAME")
 
-    logging.info("dynamodb_year_request - year_access_query" )
+    if export_bucket_name is None:
+        logging.info("stage_export - EXPORT_BUCKET_NAME not set")
+        return(None)
 
     '''
-        Query one year using the GSI
+        the same export is uploaded to the same key
     '''
-    year_access_query = dynamo_table.query(
-        IndexName="YEAR_ACCESS",
-        KeyConditionExpression=Key("YEAR").eq(int(year))
+    export_key = (EXPORT_KEY_PREFIX + hashlib.sha256(export_bytes).hexdigest() +
+        "." + export_format)
+
+    s3_client = get_boto_clients(resource_name="s3", region_name="us-east-1")
+    s3_client.put_object(
+        Bucket=export_bucket_name,
+        Key=export_key,
+        Body=export_bytes,
+        ContentType=EXPORT_FORMATS[export_format]
     )
+    logging.info("stage_export - uploaded " + export_key)
+
+    return(s3_client.generate_presigned_url(
+        "get_object",
+        Params={"Bucket": export_bucket_name, "Key": export_key},
+        ExpiresIn=EXPORT_URL_EXPIRES_SECONDS
+    ))
+
+
+def export_main(event, start_date, end_date, export_format, fields=None):
+    """Returns every rating between start_date and end_date as one
+        arrow or parquet file, limit, cursor and fullRange do not apply
+
+        Parameters
+        ----------
+        event : dict
+            api gateway lambda proxy event
+
+        start_date : datetime.datetime
+            converted startDate query parameter
+
+        end_date : datetime.datetime
+            converted endDate query parameter
+
+        export_format : str
+            key of EXPORT_FORMATS
 
-    show_ratings = year_access_query["Items"]
-    logging.info("dynamodb_year_request - Count " + str(year_access_query["Count"]))
+        fields : tuple
+            attributes from validate_fields_parameter, None for every
+            attribute
+
+        Returns
+        -------
+        lambda_proxy_response : dict
+            the export as a base64 body, or a 303 redirect to the
+            staged export when it is over EXPORT_MAX_INLINE_BYTES
 
+        Raises
+        ------
+    """
     '''
-        If no items returned
+        ratings are read one year after another and written one record
+        batch per year, only a year of ratings is held in memory
     '''
-    if year_access_query["Count"] == 0:
-        error_message = {
-            "message": "year: {year_number} not found".format(
-                year_number=year
+    stream_stats = {}
+    export_bytes = export_ratings(
+        television_ratings=stream_search_ratings(
+            start_date=start_date,
+            end_date=end_date,
+            fields=fields,
+            max_response_bytes=float("inf"),
+            stream_stats=stream_stats
+        ),
+        export_format=export_format,
+        fields=fields
+    )
+    logging.info("export_main - " + str(stream_stats["ratings"]) + " ratings " +
+        str(len(export_bytes)) + " bytes " + export_format)
+
+    if stream_stats["ratings"] == 0:
+        return(
+            lambda_proxy_response(status_code=404, headers_dict={},
+            response_body={
+                "message": "ratings from {start} to {end} not found".format(
+                    start=datetime.strftime(start_date, "%Y-%m-%d"),
+                    end=datetime.strftime(end_date, "%Y-%m-%d")
+                )
+            })
+        )
+
+    if len(export_bytes) > int(os.environ.get(
+        "EXPORT_MAX_INLINE_BYTES", EXPORT_MAX_INLINE_BYTES)):
+
+        export_url = stage_export(export_bytes=export_bytes, export_format=export_format)
+
+        if export_url is None:
+            return(
+                lambda_proxy_response(status_code=413, headers_dict={},
+                response_body={"message": "Export too large, request fewer years"})
             )
-        }
-    else:
-        logging.info("dynamodb_year_request - preparing year for serialization")
-        '''
-            convert from decimal to str for json serialization
-        '''
-        for individual_show in show_ratings:
-            try:
-                individual_show["YEAR"] = str(individual_show["YEAR"])
-            except KeyError:
-                logging.info("dynamodb_year_request - No year for " + individual_show["SHOW"])
-        
-    logging.info(error_message)
 
-    return(error_message, show_ratings)
+        return(
+            lambda_proxy_response(status_code=303,
+            headers_dict={"Location": export_url},
+            response_body={"url": export_url})
+        )
 
+    end_date_string = datetime.strftime(end_date, "%Y-%m-%d")
+    headers_dict = {
+        "Content-Type": EXPORT_FORMATS[export_format],
+        "Content-Disposition": "attachment; filename=ratings_{start}_{end}.{export_format}".format(
+            start=datetime.strftime(start_date, "%Y-%m-%d"),
+            end=end_date_string,
+            export_format=export_format
+        )
+    }
 
+    if stream_stats["truncated"] is True:
+        headers_dict = truncated_response_headers(headers_dict=headers_dict)
+        http_caching = None
+    else:
+        http_caching = http_caching_policy(
+            encoded_body=export_bytes,
+            max_age=response_cache_ttl(period_end=end_date_string),
+            last_modified=stream_stats["last_night"]
+        )
+
+    return(
+        lambda_proxy_response(
+            status_code=200,
+            headers_dict=headers_dict,
+            response_body=export_bytes,
+            request_headers=event.get("headers"),
+            http_caching=http_caching,
+            binary_body=True
+        )
+    )
 
-def filter_ratings(ratings_query_response, start_date, end_date):
-    """filters a year of television ratings to be between the start_date
-    and end_date parameters
+
+def ndjson_main(event, start_date, end_date, fields=None):
+    """Returns ratings between start_date and end_date as ndjson, one
+        rating per line, limit, cursor and fullRange do not apply
 
         Parameters
         ----------
-        ratings_query_response : list
-            list of dict where each dict is a television show
-            rating
+        event : dict
+            api gateway lambda proxy event
 
         start_date : datetime.datetime
-            converted startDate query parameter 
+            converted startDate query parameter
 
         end_date : datetime.datetime
             converted endDate query parameter
 
+        fields : tuple
+            attributes from validate_fields_parameter, None for every
+            attribute
+
         Returns
         -------
-        filtered_show_ratings : list
-            list of dict where the ratings_occurred_on is greater than or
-            equal to start_date and less than or equal to end date
+        lambda_proxy_response : dict
+            a Link header has the next url when the size cap is reached
 
         Raises
         ------
     """
-    if ratings_query_response == []:
-        logging.info("filter_ratings - no ratings to filter")
+    stream_stats = {}
+    encoded_body = encode_ndjson_body(
+        television_ratings=stream_search_ratings(
+            start_date=start_date,
+            end_date=end_date,
+            fields=fields,
+            stream_stats=stream_stats
+        )
+    )
+    logging.info("ndjson_main - " + str(stream_stats["ratings"]) + " ratings " +
+        str(len(encoded_body)) + " bytes")
 
-        return(ratings_query_response)
-    
-    
-    filtered_show_ratings = []
-    for individual_ratings in ratings_query_response:
-        ratings_date = datetime.strptime(individual_ratings["RATINGS_OCCURRED_ON"], "%Y-%m-%d")
-        if (
-                (ratings_date < start_date)
-            or
-                (ratings_date > end_date)
-            ):
-            logging.info("filter_ratings - removing {ratings_occurred_on}".format(
-                ratings_occurred_on=individual_ratings["RATINGS_OCCURRED_ON"]
-            ))
-        
-        else:
-            filtered_show_ratings.append(individual_ratings)
+    headers_dict = response_format_headers(response_format="ndjson")
+    if stream_stats["next_url"] is not None:
+        headers_dict["Link"] = "<" + stream_stats["next_url"] + ">; rel=\"next\""
 
+    if stream_stats["truncated"] is True:
+        headers_dict = truncated_response_headers(headers_dict=headers_dict)
+        http_caching = None
+    else:
+        http_caching = http_caching_policy(
+            encoded_body=encoded_body,
+            max_age=response_cache_ttl(period_end=datetime.strftime(end_date, "%Y-%m-%d")),
+            last_modified=stream_stats["last_night"]
+        )
 
-    return(filtered_show_ratings)
+    return(
+        lambda_proxy_response(
+            status_code=200,
+            headers_dict=headers_dict,
+            response_body=encoded_body,
+            request_headers=event.get("headers"),
+            http_caching=http_caching
+        )
+    )
+
+
+def stream_main(event):
+    """Entry point for response streaming, the ndjson body is a
+        generator so the first ratings are sent while later dynamodb
+        pages are still being read
+
+        Parameters
+        ----------
+        event : dict
+            api gateway lambda proxy event
+
+        Returns
+        -------
+        status_code : int
+
+        headers_dict : dict
+
+        body_chunks : iterable
+            bytes to write in order, every rating between startDate
+            and endDate without a size cap
+
+        Raises
+        ------
+    """
+    error_response, start_date, end_date = validate_request_parameters(event=event)
+
+    if error_response is None:
+        error_response, fields = validate_fields_parameter(event=event)
+
+    if error_response is not None:
+        status_code = error_response.pop("status_code")
+        return(
+            status_code,
+            {"Content-Type": "application/json"},
+            [encode_response_body(error_response)]
+        )
+
+    return(
+        200,
+        response_format_headers(response_format="ndjson"),
+        ndjson_chunks(television_ratings=stream_search_ratings(
+            start_date=start_date,
+            end_date=end_date,
+            fields=fields,
+            max_response_bytes=float("inf")
+        ))
+    )
 
+
+@request_metrics(endpoint="search")
 def main(event):
     """Entry point into the script
 
@@ -317,29 +1569,166 @@ def main(event):
         headers_dict={}, response_body=error_response))
 
 
-    error_message, year_access_query = dynamodb_year_request(
-        year=start_date.year
+    error_response, limit, cursor_position = validate_cursor_parameters(
+        event=event,
+        start_date=start_date,
+        end_date=end_date
     )
 
-    if error_message is None:
-        next_url = get_next_url(start_date=start_date, end_date=end_date)
-        filtered_show_ratings = filter_ratings(
-            ratings_query_response=year_access_query,
+    if error_response is not None:
+        status_code = error_response.pop("status_code")
+        return(lambda_proxy_response(status_code=status_code, 
+        headers_dict={}, response_body=error_response))
+
+    error_response, fields = validate_fields_parameter(event=event)
+
+    if error_response is None:
+        error_response, response_format = validate_format_parameter(event=event)
+
+    if error_response is None:
+        error_response, export_format = validate_export_parameter(event=event)
+
+    if error_response is not None:
+        status_code = error_response.pop("status_code")
+        return(lambda_proxy_response(status_code=status_code,
+        headers_dict={}, response_body=error_response))
+
+    if export_format is not None:
+        return(export_main(
+            event=event,
             start_date=start_date,
-            end_date=end_date
+            end_date=end_date,
+            export_format=export_format,
+            fields=fields
+        ))
+
+    if response_format == "ndjson":
+        return(ndjson_main(
+            event=event,
+            start_date=start_date,
+            end_date=end_date,
+            fields=fields
+        ))
+
+    full_range = full_range_requested(event=event)
+    end_date_string = datetime.strftime(end_date, "%Y-%m-%d")
+
+    cache_key = response_cache_key(
+        endpoint="search",
+        start_date=datetime.strftime(start_date, "%Y-%m-%d"),
+        end_date=end_date_string,
+        full_range=full_range,
+        limit=limit,
+        cursor=event["queryStringParameters"].get("cursor"),
+        fields=None if fields is None else ",".join(fields),
+        response_format=response_format
+    )
+    cached_body, http_caching = response_cache_get(cache_key=cache_key)
+
+    if cached_body is not None:
+        logging.info("main - response cache hit")
+        return(
+            lambda_proxy_response(
+                status_code=200, 
+                headers_dict=response_format_headers(response_format=response_format),
+                response_body=cached_body,
+                request_headers=event.get("headers"),
+                http_caching=http_caching
+            ) 
+        )
+
+    query_stats = {}
+    if limit is not None:
+        '''
+            pages of at most limit ratings with an opaque cursor
+        '''
+        error_message = None
+        year_access_query, next_url = dynamodb_cursor_request(
+            start_date=start_date,
+            end_date=end_date,
+            limit=limit,
+            cursor_position=cursor_position,
+            fields=fields
+        )
+
+    elif full_range is True:
+        '''
+            every year in one response unless the size cap is reached
+        '''
+        error_message, year_access_query, next_url = dynamodb_range_request(
+            start_date=start_date,
+            end_date=end_date,
+            fields=fields,
+            query_stats=query_stats
+        )
+
+    else:
+        error_message, year_access_query = dynamodb_year_request(
+            year=start_date.year,
+            start_date=start_date,
+            end_date=end_date,
+            fields=fields,
+            query_stats=query_stats
         )
+        next_url = get_next_url(start_date=start_date, end_date=end_date)
+
+    '''
+        the next page has the same format and selects the same fields,
+        a format chosen with the Accept header is made explicit
+    '''
+    if next_url is not None and response_format == "columnar":
+        next_url += "&format=columnar"
+
+    if next_url is not None and fields is not None:
+        next_url += "&fields=" + ",".join(fields)
 
+    if error_message is None:
         paginated_response = {
             "next": next_url,
-            "ratings": filtered_show_ratings
+            "ratings": year_access_query
         }
+        if response_format == "columnar":
+            paginated_response["ratings"] = columnar_ratings(
+                television_ratings=year_access_query
+            )
 
         logging.info("main - returning year_access_query" + str(len(year_access_query)))
+        encoded_body = encode_response_body(paginated_response)
+
+        if query_stats.get("truncated") is True:
+            '''
+                ratings are missing before next, the response is
+                neither cached nor reusable
+            '''
+            return(
+                lambda_proxy_response(
+                    status_code=200,
+                    headers_dict=truncated_response_headers(
+                        headers_dict=response_format_headers(response_format=response_format)
+                    ),
+                    response_body=encoded_body,
+                    request_headers=event.get("headers")
+                )
+            )
+
+        http_caching = http_caching_policy(
+            encoded_body=encoded_body,
+            max_age=response_cache_ttl(period_end=end_date_string),
+            last_modified=latest_ratings_night(television_ratings=year_access_query)
+        )
+        response_cache_put(
+            cache_key=cache_key,
+            encoded_body=encoded_body,
+            ttl_seconds=http_caching["max_age"],
+            http_caching=http_caching
+        )
         return(
             lambda_proxy_response(
                 status_code=200, 
-                headers_dict={}, 
-                response_body=paginated_response
+                headers_dict=response_format_headers(response_format=response_format),
+                response_body=encoded_body,
+                request_headers=event.get("headers"),
+                http_caching=http_caching
             ) 
         )
     else:
@@ -363,12 +1752,52 @@ def lambda_handler(event, context):
         ------
     """
     '''
-        Logging required for cloudwatch logs
+        Logging required for cloudwatch logs, the whole proxy
+        event is only logged with LOG_LEVEL=DEBUG
     '''
-    logging.getLogger().setLevel(logging.INFO)
+    configure_logging(context=context)
 
-    logging.info("main - Lambda proxy event: ")
-    logging.info(event)
+    logging.info("lambda_handler - " + str(event.get("httpMethod")) + " " + str(event.get("path")))
+    logging.debug(event)
     return(main(event=event))
 
 
+def wsgi_application(environ, start_response):
+    """Serves stream_main over wsgi so ndjson streaming can be tried
+        locally, see the __main__ block
+
+        Parameters
+        ----------
+        environ : dict
+            wsgi request environment
+
+        start_response : function
+            wsgi callable that sends the status and headers
+
+        Returns
+        -------
+        body_chunks : iterable
+
+        Raises
+        ------
+    """
+    status_code, headers_dict, body_chunks = stream_main(event={
+        "queryStringParameters": dict(parse_qsl(environ.get("QUERY_STRING", ""))),
+        "headers": {}
+    })
+    start_response(
+        str(status_code) + " " + HTTPStatus(status_code).phrase,
+        list(headers_dict.items())
+    )
+
+    return(body_chunks)
+
+
+if __name__ == "__main__":
+    '''
+        curl -N "localhost:8000/search?startDate=2012-05-26&endDate=2020-12-31"
+    '''
+    from wsgiref.simple_server import make_server
+
+    logging.getLogger().setLevel(logging.INFO)
+    make_server("localhost", 8000, wsgi_application).serve_forever()
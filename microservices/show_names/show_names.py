@@ -0,0 +1,283 @@
+import bisect
+import logging
+import threading
+import time
+
+from microlib.microlib import ALL_PERIODS
+from microlib.microlib import RESPONSE_CACHE_CURRENT_TTL
+from microlib.microlib import SHOW_NAMES_ROLLUP
+from microlib.microlib import configure_logging
+from microlib.microlib import encode_response_body
+from microlib.microlib import get_rollups
+from microlib.microlib import http_caching_policy
+from microlib.microlib import lambda_proxy_response
+from microlib.microlib import metrics_phase
+from microlib.microlib import prewarm_boto_clients
+from microlib.microlib import request_metrics
+from microlib.microlib import rollup_table_name
+
+'''
+    Distinct SHOW values are kept in the SHOW_NAMES rollup, built by the
+    scheduled backfill of microservices/rollups and kept current from
+    the ratings table stream, so requests never scan a table
+'''
+MAX_PREFIX_LENGTH = 100
+
+'''
+    rollup kept in memory between warm invocations
+'''
+_SHOW_NAMES_CACHE = {
+    "expires_at": 0,
+    "show_names": [],
+    "folded_names": [],
+    "last_ratings_night": None
+}
+_SHOW_NAMES_CACHE_LOCK = threading.Lock()
+
+
+'''
+    dynamodb clients are built during the lambda init phase
+'''
+prewarm_boto_clients(table_names=[rollup_table_name()])
+
+
+@metrics_phase("validate")
+def validate_request_parameters(event):
+    """Validates the optional prefix query parameter
+
+        Parameters
+        ----------
+        event : dict
+            lambda_handler event from api gateway
+
+        Returns
+        -------
+        error_response : dict
+            None if request is valid. Otherwise a dict with
+            keys status_code and message detailing the error in
+            the request
+
+        prefix : str
+            prefix show names must start with, empty string for
+            every show name
+
+        Raises
+        ------
+    """
+    error_response = None
+    prefix = (event.get("queryStringParameters") or {}).get("prefix") or ""
+
+    if len(prefix) > MAX_PREFIX_LENGTH:
+        logging.info("validate_request_parameters - prefix length")
+        error_response = {
+            "message": "prefix must be at most {max_length} characters".format(
+                max_length=MAX_PREFIX_LENGTH
+            ),
+            "status_code": 400
+        }
+
+    elif prefix.isascii() is False:
+        logging.info("validate_request_parameters - prefix is not ascii")
+        error_response = {
+            "message": "Invalid prefix query parameter",
+            "status_code": 400
+        }
+
+    return(error_response, prefix)
+
+
+def load_show_names_index():
+    """Returns the SHOW_NAMES rollup, kept in memory for
+        RESPONSE_CACHE_CURRENT_TTL seconds
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        show_names : list
+            sorted distinct show names, None if the rollup has not
+            been built
+
+        folded_names : list
+            casefolded show_names in the same order for prefix search
+
+        last_ratings_night : str
+            most recent ratings night in the rollup, None if unknown
+
+        Raises
+        ------
+    """
+    with _SHOW_NAMES_CACHE_LOCK:
+        if _SHOW_NAMES_CACHE["expires_at"] > time.monotonic():
+            return(
+                _SHOW_NAMES_CACHE["show_names"],
+                _SHOW_NAMES_CACHE["folded_names"],
+                _SHOW_NAMES_CACHE["last_ratings_night"]
+            )
+
+    '''
+        read outside the lock so one slow GetItem does not hold up
+        every other request of the container
+    '''
+    show_names_rollups = get_rollups(rollup_name=SHOW_NAMES_ROLLUP, period=ALL_PERIODS)
+
+    if not show_names_rollups:
+        logging.error("load_show_names_index - SHOW_NAMES rollup not found, "
+            "invoke the rollups lambda with {\"backfill\": true}")
+        return(None, None, None)
+
+    '''
+        sort by the casefolded name so bisect can find a prefix
+    '''
+    show_names = sorted(show_names_rollups[0].get("SHOW_NAMES", []), key=str.casefold)
+    last_ratings_night = show_names_rollups[0].get("LAST_NIGHT")
+
+    with _SHOW_NAMES_CACHE_LOCK:
+        _SHOW_NAMES_CACHE["show_names"] = show_names
+        _SHOW_NAMES_CACHE["folded_names"] = [
+            show_name.casefold() for show_name in show_names
+        ]
+        _SHOW_NAMES_CACHE["last_ratings_night"] = last_ratings_night
+        _SHOW_NAMES_CACHE["expires_at"] = (
+            time.monotonic() + RESPONSE_CACHE_CURRENT_TTL
+        )
+
+        return(
+            _SHOW_NAMES_CACHE["show_names"],
+            _SHOW_NAMES_CACHE["folded_names"],
+            _SHOW_NAMES_CACHE["last_ratings_night"]
+        )
+
+
+def reset_show_names_cache():
+    """Forgets the in memory SHOW_NAMES rollup
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+
+        Raises
+        ------
+    """
+    with _SHOW_NAMES_CACHE_LOCK:
+        _SHOW_NAMES_CACHE["expires_at"] = 0
+
+
+def filter_show_names(show_names, folded_names, prefix):
+    """Returns the show names starting with prefix, ignoring case
+
+        Parameters
+        ----------
+        show_names : list
+            from load_show_names_index
+
+        folded_names : list
+            from load_show_names_index
+
+        prefix : str
+            empty string for every show name
+
+        Returns
+        -------
+        matching_names : list
+
+        Raises
+        ------
+    """
+    if prefix == "":
+        return(list(show_names))
+
+    folded_prefix = prefix.casefold()
+    first_match = bisect.bisect_left(folded_names, folded_prefix)
+
+    matching_names = []
+    for name_position in range(first_match, len(folded_names)):
+        if not folded_names[name_position].startswith(folded_prefix):
+            break
+        matching_names.append(show_names[name_position])
+
+    return(matching_names)
+
+
+@request_metrics(endpoint="showNames")
+def main(event):
+    """Entry point into the script
+
+        Parameters
+        ----------
+        event : dict
+            api gateway lambda proxy event
+
+        Returns
+        -------
+
+        Raises
+        ------
+    """
+    error_response, prefix = validate_request_parameters(event=event)
+
+    if error_response is not None:
+        status_code = error_response.pop("status_code")
+        '''
+            return http 400 level error response
+        '''
+        return(lambda_proxy_response(status_code=status_code,
+        headers_dict={}, response_body=error_response))
+
+    show_names, folded_names, last_ratings_night = load_show_names_index()
+
+    if show_names is None:
+        '''
+            not cached, the next request reads the rollup again
+        '''
+        return(lambda_proxy_response(status_code=503, headers_dict={},
+        response_body={"message": "Show names are not available, try again later"}))
+
+    matching_names = filter_show_names(
+        show_names=show_names,
+        folded_names=folded_names,
+        prefix=prefix
+    )
+    logging.info("main - returning matching_names " + str(len(matching_names)))
+
+    encoded_body = encode_response_body(matching_names)
+    return(
+        lambda_proxy_response(status_code=200, headers_dict={},
+        response_body=encoded_body, request_headers=event.get("headers"),
+        http_caching=http_caching_policy(
+            encoded_body=encoded_body,
+            max_age=RESPONSE_CACHE_CURRENT_TTL,
+            last_modified=last_ratings_night
+        ))
+    )
+
+
+def lambda_handler(event, context):
+    """Handles lambda invocation from api gateway
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+
+        Raises
+        ------
+    """
+    '''
+        Logging required for cloudwatch logs, the whole proxy
+        event is only logged with LOG_LEVEL=DEBUG
+    '''
+    configure_logging(context=context)
+
+    logging.info("lambda_handler - " + str(event.get("httpMethod")) + " " + str(event.get("path")))
+    logging.debug(event)
+
+    return(main(event=event))
+
+
+if __name__ == "__main__":
+    main(event={"queryStringParameters": {"prefix": "Dragon"}})
@@ -1,12 +1,52 @@
-import boto3
-import json
 import logging
 import os
 
-from boto3.dynamodb.conditions import Key
+from concurrent.futures import TimeoutError as FutureTimeoutError
 
+from microlib.microlib import ALL_PERIODS
+from microlib.microlib import RESPONSE_CACHE_CURRENT_TTL
+from microlib.microlib import SHOW_ROLLUP_PREFIX
+from microlib.microlib import configure_logging
+from microlib.microlib import encode_batch_response
+from microlib.microlib import encode_response_body
+from microlib.microlib import fields_projection
 from microlib.microlib import get_boto_clients
+from microlib.microlib import get_rollups
+from microlib.microlib import http_caching_policy
 from microlib.microlib import lambda_proxy_response
+from microlib.microlib import latest_ratings_night
+from microlib.microlib import metrics_phase
+from microlib.microlib import paginated_query
+from microlib.microlib import prewarm_boto_clients
+from microlib.microlib import query_parameter_flag
+from microlib.microlib import request_metrics
+from microlib.microlib import response_cache_get
+from microlib.microlib import response_cache_key
+from microlib.microlib import response_cache_put
+from microlib.microlib import response_cache_ttl
+from microlib.microlib import rollup_items
+from microlib.microlib import rollup_summary
+from microlib.microlib import rollup_table_name
+from microlib.microlib import run_concurrently_within_budget
+from microlib.microlib import truncated_response_headers
+from microlib.microlib import validate_fields_parameter
+
+'''
+    comparison dashboards request five to fifteen shows, the budget
+    leaves time to encode the response inside the 5 second lambda
+    timeout
+'''
+MAX_BATCH_SHOWS = 20
+DEFAULT_BATCH_BUDGET_SECONDS = 3.5
+
+
+'''
+    dynamodb clients are built during the lambda init phase
+'''
+prewarm_boto_clients(table_names=[
+    os.environ.get("DYNAMO_TABLE_NAME", "prod_toonami_ratings"),
+    rollup_table_name()
+])
 
 
 def clean_path_parameter_string(show_name):
@@ -41,7 +81,7 @@ def clean_path_parameter_string(show_name):
 
 
 
-def dynamodb_show_request(show_name):
+def dynamodb_show_request(show_name, fields=None, query_stats=None):
     """Query using the SHOW_ACCESS GSI
 
         Parameters
@@ -49,6 +89,14 @@ def dynamodb_show_request(show_name):
         show_name : str
             Name of the show to request
 
+        fields : tuple
+            attributes to read from validate_fields_parameter, None
+            for every attribute
+
+        query_stats : dict
+            optional dict updated in place by paginated_query,
+            truncated is True when the query budget was reached
+
         Returns
         -------
         error_message : dict
@@ -60,6 +108,8 @@ def dynamodb_show_request(show_name):
         Raises
         ------
     """
+    from boto3.dynamodb.conditions import Key
+
     error_message = None
 
     if os.environ.get("DYNAMO_TABLE_NAME") is None:
@@ -77,41 +127,437 @@ def dynamodb_show_request(show_name):
     logging.info("dynamodb_show_request - show_access_query" )
 
     '''
-        Query one show using the GSI
+        Query one show using the GSI, following LastEvaluatedKey
+        so partitions over 1 MB are not cut off
     '''
-    show_access_query = dynamo_table.query(
+    if query_stats is None:
+        query_stats = {}
+    show_ratings = list(paginated_query(
+        dynamo_table=dynamo_table,
+        query_stats=query_stats,
         IndexName="SHOW_ACCESS",
-        KeyConditionExpression=Key("SHOW").eq(show_name)
-    )
+        KeyConditionExpression=Key("SHOW").eq(show_name),
+        **fields_projection(fields=fields)
+    ))
+
+    logging.info("dynamodb_show_request - Count " + str(query_stats["count"]) +
+        " Pages " + str(query_stats["pages"]) +
+        " ConsumedCapacity " + str(query_stats["consumed_capacity"]))
 
-    show_ratings = show_access_query["Items"]
-    logging.info("dynamodb_show_request - Count " + str(show_access_query["Count"]))
+    if query_stats["truncated"] is True:
+        logging.info("dynamodb_show_request - query budget reached, results truncated")
 
     '''
         If no items returned
     '''
-    if show_access_query["Count"] == 0:
+    if query_stats["count"] == 0:
         error_message = {
             "message": "show: {show_name} not found".format(
                 show_name=show_name
             )
         }
-    else:
-        logging.info("dynamodb_show_request - preparing year for serialization")
-        '''
-            convert from decimal to str for json serialization
-        '''
-        for individual_show in show_ratings:
-            try:
-                individual_show["YEAR"] = str(individual_show["YEAR"])
-            except KeyError:
-                logging.info("dynamodb_show_request - No year for " + individual_show["SHOW"])
         
     logging.info(error_message)
 
     return(error_message, show_ratings)
 
 
+def batch_request(event):
+    """Returns True if the event is a batch request for
+        /shows?show=name&show=name
+
+        Parameters
+        ----------
+        event : dict
+            lambda_handler event from api gateway
+
+        Returns
+        -------
+        batch_request : bool
+
+        Raises
+        ------
+    """
+    return(
+        (event.get("pathParameters") or {}).get("show") is None
+        and
+        (event.get("multiValueQueryStringParameters") or {}).get("show") is not None
+    )
+
+
+@metrics_phase("validate")
+def validate_batch_parameters(event):
+    """Validates the repeated show query parameter, repeated instead
+        of comma separated because show names can contain commas
+
+        Parameters
+        ----------
+        event : dict
+            lambda_handler event from api gateway
+
+        Returns
+        -------
+        error_response : dict
+            None if request is valid. Otherwise a dict with 
+            keys status_code and message detailing the error in
+            the request
+
+        batch_shows : list
+            distinct show names in the order requested
+
+        Raises
+        ------
+    """
+    batch_shows = list(dict.fromkeys(
+        event["multiValueQueryStringParameters"]["show"]
+    ))
+
+    if len(batch_shows) > MAX_BATCH_SHOWS:
+        logging.info("validate_batch_parameters - shows count " + str(len(batch_shows)))
+        return(
+            {
+                "message": "At most {max_shows} show query parameters are allowed".format(
+                    max_shows=MAX_BATCH_SHOWS
+                ),
+                "status_code": 400
+            },
+            batch_shows
+        )
+
+    for show_name in batch_shows:
+        if clean_path_parameter_string(show_name) is not True:
+            logging.info("validate_batch_parameters - show parameter invalid")
+            return(
+                {
+                    "message": "Invalid show query parameter",
+                    "status_code": 400
+                },
+                batch_shows
+            )
+
+    return(None, batch_shows)
+
+
+def dynamodb_batch_show_request(batch_shows, fields=None, truncated_shows=None):
+    """Queries each show concurrently within one latency budget
+
+        Parameters
+        ----------
+        batch_shows : list
+            distinct show names
+
+        fields : tuple
+            attributes to read from validate_fields_parameter, None
+            for every attribute
+
+        truncated_shows : set
+            optional set updated in place with the shows whose query
+            reached the query budget
+
+        Returns
+        -------
+        show_results : dict
+            show name to the (error_message, show_ratings) tuple from
+            dynamodb_show_request, error_message has a status of 404
+            for shows not found, 502 for a failed query and 504 if
+            the budget ran out first
+
+        Raises
+        ------
+    """
+    budget_seconds = float(os.environ.get(
+        "SHOWS_BATCH_BUDGET_SECONDS", DEFAULT_BATCH_BUDGET_SECONDS
+    ))
+
+    request_kwargs_list = [
+        {"show_name": show_name, "fields": fields, "query_stats": {}}
+        for show_name in batch_shows
+    ]
+    request_outcomes = run_concurrently_within_budget(
+        request_function=dynamodb_show_request,
+        request_kwargs_list=request_kwargs_list,
+        budget_seconds=budget_seconds
+    )
+
+    show_results = {}
+    for show_name, request_kwargs, (request_result, request_error) in zip(
+        batch_shows, request_kwargs_list, request_outcomes):
+
+        if request_error is None:
+            error_message, show_ratings = request_result
+            if error_message is not None:
+                error_message = dict(error_message, status=404)
+            elif truncated_shows is not None and request_kwargs["query_stats"].get("truncated") is True:
+                truncated_shows.add(show_name)
+            show_results[show_name] = (error_message, show_ratings)
+
+        elif isinstance(request_error, FutureTimeoutError):
+            show_results[show_name] = (
+                {
+                    "message": "show: {show_name} not returned within {budget} seconds".format(
+                        show_name=show_name, budget=budget_seconds
+                    ),
+                    "status": 504
+                },
+                []
+            )
+
+        else:
+            show_results[show_name] = (
+                {
+                    "message": "show: {show_name} request failed".format(
+                        show_name=show_name
+                    ),
+                    "status": 502
+                },
+                []
+            )
+
+    return(show_results)
+
+
+def cache_show_response(cache_key, show_ratings):
+    """Encodes the ratings for a show and adds them to the response cache
+
+        Parameters
+        ----------
+        cache_key : tuple
+            from response_cache_key
+
+        show_ratings : list
+            from dynamodb_show_request
+
+        Returns
+        -------
+        encoded_body : bytes
+
+        http_caching : dict
+            from http_caching_policy
+
+        Raises
+        ------
+    """
+    encoded_body = encode_response_body(show_ratings)
+    '''
+        a show that has not aired recently will not get new ratings
+    '''
+    latest_night = latest_ratings_night(television_ratings=show_ratings)
+    http_caching = http_caching_policy(
+        encoded_body=encoded_body,
+        max_age=response_cache_ttl(period_end=latest_night),
+        last_modified=latest_night
+    )
+    response_cache_put(
+        cache_key=cache_key,
+        encoded_body=encoded_body,
+        ttl_seconds=http_caching["max_age"],
+        http_caching=http_caching
+    )
+
+    return(encoded_body, http_caching)
+
+
+def main_batch(event):
+    """Returns the ratings for many shows in one response, grouped by
+        show with a status for each show
+
+        Parameters
+        ----------
+        event : dict
+            api gateway lambda proxy event
+
+        Returns
+        -------
+
+        Raises
+        ------
+    """
+    error_response, batch_shows = validate_batch_parameters(event=event)
+
+    if error_response is None:
+        error_response, fields = validate_fields_parameter(event=event)
+
+    if error_response is not None:
+        status_code = error_response.pop("status_code")
+        return(lambda_proxy_response(status_code=status_code, 
+        headers_dict={}, response_body=error_response))
+
+    fields_key = None if fields is None else ",".join(fields)
+
+    show_bodies = {}
+    show_caching = {}
+    show_errors = {}
+    uncached_shows = []
+    for show_name in batch_shows:
+        cached_body, http_caching = response_cache_get(
+            cache_key=response_cache_key(endpoint="shows", show=show_name, fields=fields_key)
+        )
+        if cached_body is None:
+            uncached_shows.append(show_name)
+        else:
+            show_bodies[show_name] = cached_body
+            show_caching[show_name] = http_caching
+
+    logging.info("main_batch - " + str(len(batch_shows) - len(uncached_shows)) +
+        " cached shows, querying " + str(len(uncached_shows)))
+
+    truncated_shows = set()
+    show_results = dynamodb_batch_show_request(
+        batch_shows=uncached_shows,
+        fields=fields,
+        truncated_shows=truncated_shows
+    )
+
+    for show_name, (error_message, show_ratings) in show_results.items():
+        if show_name in truncated_shows:
+            show_bodies[show_name] = encode_response_body(show_ratings)
+        elif error_message is None:
+            show_bodies[show_name], show_caching[show_name] = cache_show_response(
+                cache_key=response_cache_key(endpoint="shows", show=show_name, fields=fields_key),
+                show_ratings=show_ratings
+            )
+        else:
+            logging.info("main_batch - error_message " + str(error_message))
+            show_errors[show_name] = error_message
+
+    encoded_body = encode_batch_response(
+        batch_keys=batch_shows,
+        encoded_bodies=show_bodies,
+        batch_errors=show_errors
+    )
+
+    if truncated_shows:
+        logging.info("main_batch - truncated shows " + str(sorted(truncated_shows)))
+        return(
+            lambda_proxy_response(status_code=200,
+            headers_dict=truncated_response_headers(headers_dict={}),
+            response_body=encoded_body, request_headers=event.get("headers"))
+        )
+
+    '''
+        a batch with a failed show should be retried, not cached
+    '''
+    if any(show_error["status"] != 404 for show_error in show_errors.values()):
+        return(
+            lambda_proxy_response(status_code=200, headers_dict={}, 
+            response_body=encoded_body, request_headers=event.get("headers"))
+        )
+
+    return(
+        lambda_proxy_response(status_code=200, headers_dict={}, 
+        response_body=encoded_body, request_headers=event.get("headers"),
+        http_caching=http_caching_policy(
+            encoded_body=encoded_body,
+            max_age=min(
+                (http_caching["max_age"] for http_caching in show_caching.values()),
+                default=RESPONSE_CACHE_CURRENT_TTL
+            ),
+            last_modified=max(
+                (
+                    http_caching["last_modified"]
+                    for http_caching in show_caching.values()
+                    if http_caching["last_modified"] is not None
+                ),
+                default=None
+            )
+        ))
+    )
+
+
+def main_summary(event):
+    """Returns the show rollups, in total and for each year, instead
+        of every rating, falling back to the SHOW_ACCESS query if the
+        rollups have not been built
+
+        Parameters
+        ----------
+        event : dict
+            api gateway lambda proxy event with a valid show
+
+        Returns
+        -------
+
+        Raises
+        ------
+    """
+    show_name = event["pathParameters"]["show"]
+    cache_key = response_cache_key(endpoint="shows", show=show_name, summary=True)
+    cached_body, http_caching = response_cache_get(cache_key=cache_key)
+
+    if cached_body is not None:
+        logging.info("main_summary - response cache hit")
+        return(
+            lambda_proxy_response(status_code=200, headers_dict={},
+            response_body=cached_body, request_headers=event.get("headers"),
+            http_caching=http_caching)
+        )
+
+    '''
+        one query reads the ALL rollup and every year of the show
+    '''
+    show_rollups = {
+        show_rollup["PERIOD"]: show_rollup
+        for show_rollup in get_rollups(rollup_name=SHOW_ROLLUP_PREFIX + show_name)
+    }
+
+    query_stats = {}
+    if ALL_PERIODS not in show_rollups:
+        logging.info("main_summary - rollup not found, querying show")
+        error_message, show_access_query = dynamodb_show_request(
+            show_name=show_name,
+            query_stats=query_stats
+        )
+
+        if error_message is not None:
+            return(
+                lambda_proxy_response(status_code=404, headers_dict={},
+                response_body=error_message)
+            )
+        show_rollups = {
+            period: show_rollup
+            for (rollup_name, period), show_rollup in rollup_items(
+                television_ratings=show_access_query
+            ).items()
+            if rollup_name == SHOW_ROLLUP_PREFIX + show_name
+        }
+
+    show_summary = dict(
+        rollup_summary(rollup_item=show_rollups.pop(ALL_PERIODS)),
+        show=show_name,
+        years={
+            period: rollup_summary(rollup_item=show_rollup)
+            for period, show_rollup in sorted(show_rollups.items())
+        }
+    )
+    encoded_body = encode_response_body(show_summary)
+
+    if query_stats.get("truncated") is True:
+        return(
+            lambda_proxy_response(status_code=200,
+            headers_dict=truncated_response_headers(headers_dict={}),
+            response_body=encoded_body, request_headers=event.get("headers"))
+        )
+
+    http_caching = http_caching_policy(
+        encoded_body=encoded_body,
+        max_age=response_cache_ttl(period_end=show_summary["last_night"]),
+        last_modified=show_summary["last_night"]
+    )
+    response_cache_put(
+        cache_key=cache_key,
+        encoded_body=encoded_body,
+        ttl_seconds=http_caching["max_age"],
+        http_caching=http_caching
+    )
+
+    return(
+        lambda_proxy_response(status_code=200, headers_dict={},
+        response_body=encoded_body, request_headers=event.get("headers"),
+        http_caching=http_caching)
+    )
+
+
+@request_metrics(endpoint="shows")
 def main(event):
     """Entry point into the script
 
@@ -126,6 +572,9 @@ def main(event):
         Raises
         ------
     """
+    if batch_request(event=event):
+        return(main_batch(event=event))
+
     error_response = None
     try:
         assert clean_path_parameter_string(event["pathParameters"]["show"]) is True, (
@@ -147,16 +596,59 @@ def main(event):
         '''
         return(lambda_proxy_response(status_code=400, headers_dict={}, response_body=error_response))
 
+    if query_parameter_flag(event=event, parameter_name="summary") is True:
+        return(main_summary(event=event))
+
+    error_response, fields = validate_fields_parameter(event=event)
+
+    if error_response is not None:
+        status_code = error_response.pop("status_code")
+        return(lambda_proxy_response(status_code=status_code,
+        headers_dict={}, response_body=error_response))
+
+    cache_key = response_cache_key(
+        endpoint="shows",
+        show=event["pathParameters"]["show"],
+        fields=None if fields is None else ",".join(fields)
+    )
+    cached_body, http_caching = response_cache_get(cache_key=cache_key)
+
+    if cached_body is not None:
+        logging.info("main - response cache hit")
+        return(
+            lambda_proxy_response(status_code=200, headers_dict={}, 
+            response_body=cached_body, request_headers=event.get("headers"),
+            http_caching=http_caching)
+        )
 
+    query_stats = {}
     error_message, show_access_query = dynamodb_show_request(
-        show_name=event["pathParameters"]["show"]
+        show_name=event["pathParameters"]["show"],
+        fields=fields,
+        query_stats=query_stats
     )
 
+    if error_message is None and query_stats.get("truncated") is True:
+        '''
+            a partial show is neither cached nor reusable
+        '''
+        return(
+            lambda_proxy_response(status_code=200,
+            headers_dict=truncated_response_headers(headers_dict={}),
+            response_body=encode_response_body(show_access_query),
+            request_headers=event.get("headers"))
+        )
+
     if error_message is None:
         logging.info("main - returning show_access_query" + str(len(show_access_query)))
+        encoded_body, http_caching = cache_show_response(
+            cache_key=cache_key,
+            show_ratings=show_access_query
+        )
         return(
             lambda_proxy_response(status_code=200, headers_dict={}, 
-            response_body=show_access_query)
+            response_body=encoded_body, request_headers=event.get("headers"),
+            http_caching=http_caching)
             
         )
     else:
@@ -180,12 +672,13 @@ def lambda_handler(event, context):
         ------
     """
     '''
-        Logging required for cloudwatch logs
+        Logging required for cloudwatch logs, the whole proxy
+        event is only logged with LOG_LEVEL=DEBUG
     '''
-    logging.getLogger().setLevel(logging.INFO)
+    configure_logging(context=context)
 
-    logging.info("main - Lambda proxy event: ")
-    logging.info(event)
+    logging.info("lambda_handler - " + str(event.get("httpMethod")) + " " + str(event.get("path")))
+    logging.debug(event)
     return(main(event=event))
 
 
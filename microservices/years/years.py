@@ -1,12 +1,42 @@
-import boto3
-import json
 import logging
 import os
 
-from boto3.dynamodb.conditions import Key
-
+from microlib.microlib import YEAR_ROLLUP
+from microlib.microlib import columnar_ratings
+from microlib.microlib import configure_logging
+from microlib.microlib import encode_ndjson_body
+from microlib.microlib import encode_response_body
+from microlib.microlib import fields_projection
 from microlib.microlib import get_boto_clients
+from microlib.microlib import get_rollups
+from microlib.microlib import http_caching_policy
 from microlib.microlib import lambda_proxy_response
+from microlib.microlib import latest_ratings_night
+from microlib.microlib import metrics_phase
+from microlib.microlib import paginated_query
+from microlib.microlib import prewarm_boto_clients
+from microlib.microlib import query_parameter_flag
+from microlib.microlib import request_metrics
+from microlib.microlib import response_cache_get
+from microlib.microlib import response_cache_key
+from microlib.microlib import response_cache_put
+from microlib.microlib import response_cache_ttl
+from microlib.microlib import response_format_headers
+from microlib.microlib import rollup_statistics
+from microlib.microlib import rollup_summary
+from microlib.microlib import rollup_table_name
+from microlib.microlib import truncated_response_headers
+from microlib.microlib import validate_fields_parameter
+from microlib.microlib import validate_format_parameter
+
+
+'''
+    dynamodb clients are built during the lambda init phase
+'''
+prewarm_boto_clients(table_names=[
+    os.environ.get("DYNAMO_TABLE_NAME", "prod_toonami_ratings"),
+    rollup_table_name()
+])
 
 
 def clean_path_parameter_string(year):
@@ -32,6 +62,7 @@ def clean_path_parameter_string(year):
     return(year.isnumeric())
 
 
+@metrics_phase("validate")
 def validate_request_parameters(event):
     """Validates the request passed in via the lambda handler event
 
@@ -74,7 +105,7 @@ def validate_request_parameters(event):
 
     return(error_response)
 
-def dynamodb_year_request(year):
+def dynamodb_year_request(year, fields=None, query_stats=None):
     """Query using the YEAR_ACCESS GSI
 
         Parameters
@@ -82,6 +113,14 @@ def dynamodb_year_request(year):
         year : int
             year to request
 
+        fields : tuple
+            attributes to read from validate_fields_parameter, None
+            for every attribute
+
+        query_stats : dict
+            optional dict updated in place by paginated_query,
+            truncated is True when the query budget was reached
+
         Returns
         -------
         error_message : dict
@@ -93,6 +132,8 @@ def dynamodb_year_request(year):
         Raises
         ------
     """
+    from boto3.dynamodb.conditions import Key
+
     error_message = None
 
     if os.environ.get("DYNAMO_TABLE_NAME") is None:
@@ -110,41 +151,119 @@ def dynamodb_year_request(year):
     logging.info("dynamodb_year_request - year_access_query" )
 
     '''
-        Query one year using the GSI
+        Query one year using the GSI, following LastEvaluatedKey
+        so partitions over 1 MB are not cut off
     '''
-    year_access_query = dynamo_table.query(
+    if query_stats is None:
+        query_stats = {}
+    show_ratings = list(paginated_query(
+        dynamo_table=dynamo_table,
+        query_stats=query_stats,
         IndexName="YEAR_ACCESS",
-        KeyConditionExpression=Key("YEAR").eq(int(year))
-    )
+        KeyConditionExpression=Key("YEAR").eq(int(year)),
+        **fields_projection(fields=fields)
+    ))
+
+    logging.info("dynamodb_year_request - Count " + str(query_stats["count"]) +
+        " Pages " + str(query_stats["pages"]) +
+        " ConsumedCapacity " + str(query_stats["consumed_capacity"]))
 
-    show_ratings = year_access_query["Items"]
-    logging.info("dynamodb_year_request - Count " + str(year_access_query["Count"]))
+    if query_stats["truncated"] is True:
+        logging.info("dynamodb_year_request - query budget reached, results truncated")
 
     '''
         If no items returned
     '''
-    if year_access_query["Count"] == 0:
+    if query_stats["count"] == 0:
         error_message = {
             "message": "year: {year_number} not found".format(
                 year_number=year
             )
         }
-    else:
-        logging.info("dynamodb_year_request - preparing year for serialization")
-        '''
-            convert from decimal to str for json serialization
-        '''
-        for individual_show in show_ratings:
-            try:
-                individual_show["YEAR"] = str(individual_show["YEAR"])
-            except KeyError:
-                logging.info("dynamodb_year_request - No year for " + individual_show["SHOW"])
         
     logging.info(error_message)
 
     return(error_message, show_ratings)
 
 
+def main_summary(event):
+    """Returns the year rollup instead of every rating, falling back
+        to the YEAR_ACCESS query if the rollup has not been built
+
+        Parameters
+        ----------
+        event : dict
+            api gateway lambda proxy event with a valid year
+
+        Returns
+        -------
+
+        Raises
+        ------
+    """
+    year = int(event["pathParameters"]["year"])
+    cache_key = response_cache_key(endpoint="years", year=year, summary=True)
+    cached_body, http_caching = response_cache_get(cache_key=cache_key)
+
+    if cached_body is not None:
+        logging.info("main_summary - response cache hit")
+        return(
+            lambda_proxy_response(status_code=200, headers_dict={},
+            response_body=cached_body, request_headers=event.get("headers"),
+            http_caching=http_caching)
+        )
+
+    year_rollups = get_rollups(rollup_name=YEAR_ROLLUP, period=year)
+    query_stats = {}
+
+    if year_rollups:
+        year_rollup = year_rollups[0]
+    else:
+        logging.info("main_summary - rollup not found, querying year")
+        error_message, year_access_query = dynamodb_year_request(
+            year=year,
+            query_stats=query_stats
+        )
+
+        if error_message is not None:
+            return(
+                lambda_proxy_response(status_code=404, headers_dict={},
+                response_body=error_message)
+            )
+        year_rollup = rollup_statistics(television_ratings=year_access_query)
+
+    year_summary = dict(rollup_summary(rollup_item=year_rollup), year=year)
+    encoded_body = encode_response_body(year_summary)
+
+    if query_stats.get("truncated") is True:
+        return(
+            lambda_proxy_response(status_code=200,
+            headers_dict=truncated_response_headers(headers_dict={}),
+            response_body=encoded_body, request_headers=event.get("headers"))
+        )
+
+    http_caching = http_caching_policy(
+        encoded_body=encoded_body,
+        max_age=response_cache_ttl(
+            period_end="{year:04d}-12-31".format(year=year)
+        ),
+        last_modified=year_summary["last_night"]
+    )
+    response_cache_put(
+        cache_key=cache_key,
+        encoded_body=encoded_body,
+        ttl_seconds=http_caching["max_age"],
+        http_caching=http_caching
+    )
+
+    return(
+        lambda_proxy_response(status_code=200, headers_dict={},
+        response_body=encoded_body, request_headers=event.get("headers"),
+        http_caching=http_caching)
+    )
+
+
+@request_metrics(endpoint="years")
 def main(event):
     """Entry point into the script
 
@@ -169,16 +288,88 @@ def main(event):
         return(lambda_proxy_response(status_code=status_code, 
         headers_dict={}, response_body=error_response))
 
+    if query_parameter_flag(event=event, parameter_name="summary") is True:
+        return(main_summary(event=event))
+
+    error_response, fields = validate_fields_parameter(event=event)
+
+    if error_response is None:
+        error_response, response_format = validate_format_parameter(event=event)
+
+    if error_response is not None:
+        status_code = error_response.pop("status_code")
+        return(lambda_proxy_response(status_code=status_code,
+        headers_dict={}, response_body=error_response))
+
+    cache_key = response_cache_key(
+        endpoint="years",
+        year=int(event["pathParameters"]["year"]),
+        fields=None if fields is None else ",".join(fields),
+        response_format=response_format
+    )
+    cached_body, http_caching = response_cache_get(cache_key=cache_key)
+
+    if cached_body is not None:
+        logging.info("main - response cache hit")
+        return(
+            lambda_proxy_response(status_code=200,
+            headers_dict=response_format_headers(response_format=response_format),
+            response_body=cached_body, request_headers=event.get("headers"),
+            http_caching=http_caching)
+        )
 
+    query_stats = {}
     error_message, year_access_query = dynamodb_year_request(
-        year=event["pathParameters"]["year"]
+        year=event["pathParameters"]["year"],
+        fields=fields,
+        query_stats=query_stats
     )
 
     if error_message is None:
         logging.info("main - returning year_access_query" + str(len(year_access_query)))
+        if response_format == "columnar":
+            encoded_body = encode_response_body(
+                columnar_ratings(television_ratings=year_access_query)
+            )
+        elif response_format == "ndjson":
+            encoded_body = encode_ndjson_body(television_ratings=year_access_query)
+        else:
+            encoded_body = encode_response_body(year_access_query)
+
+        if query_stats.get("truncated") is True:
+            '''
+                a partial year is neither cached nor reusable
+            '''
+            return(
+                lambda_proxy_response(status_code=200,
+                headers_dict=truncated_response_headers(
+                    headers_dict=response_format_headers(response_format=response_format)
+                ),
+                response_body=encoded_body, request_headers=event.get("headers"))
+            )
+        '''
+            a year is closed once December 31st is historical
+        '''
+        http_caching = http_caching_policy(
+            encoded_body=encoded_body,
+            max_age=response_cache_ttl(
+                period_end="{year:04d}-12-31".format(
+                    year=int(event["pathParameters"]["year"])
+                )
+            ),
+            last_modified=latest_ratings_night(television_ratings=year_access_query)
+        )
+        response_cache_put(
+            cache_key=cache_key,
+            encoded_body=encoded_body,
+            ttl_seconds=http_caching["max_age"],
+            http_caching=http_caching
+        )
         return(
-            lambda_proxy_response(status_code=200, headers_dict={}, 
-            response_body=year_access_query)
+            lambda_proxy_response(status_code=200,
+            headers_dict=response_format_headers(response_format=response_format),
+            response_body=encoded_body, request_headers=event.get("headers"),
+            http_caching=http_caching)
             
         )
     else:
@@ -202,11 +393,12 @@ def lambda_handler(event, context):
         ------
     """
     '''
-        Logging required for cloudwatch logs
+        Logging required for cloudwatch logs, the whole proxy
+        event is only logged with LOG_LEVEL=DEBUG
     '''
-    logging.getLogger().setLevel(logging.INFO)
+    configure_logging(context=context)
 
-    logging.info("main - Lambda proxy event: ")
-    logging.info(event)
+    logging.info("lambda_handler - " + str(event.get("httpMethod")) + " " + str(event.get("path")))
+    logging.debug(event)
     return(main(event=event))
 
@@ -8,6 +8,8 @@ import os
 import requests
 import unittest
 
+from microlib.microlib import get_boto_clients
+
 '''
     Load environment from environment variable
 '''
@@ -16,57 +18,6 @@ BUILD_ENVIRONMENT = os.environ.get("BUILD_ENVIRONMENT")
 if BUILD_ENVIRONMENT is None:
     BUILD_ENVIRONMENT = "dev"
 
-def get_boto_clients(resource_name, region_name="us-east-1",
-    table_name=None):
-    """Returns the boto client for various aws resources
-
-        Parameters
-        ----------
-        resource_name : str
-            Name of the resource for the client
-
-        region_name : str
-                aws region you are using, defaults to
-                us-east-1
-
-        Returns
-        -------
-        service_client : boto3.client
-            boto3 client for the aws resource in resource_name
-            in region region_name
-
-        dynamodb_table_resource : boto3.resource.Table
-            boto3 Table resource, only returned if table_name is
-            not None
-        
-
-
-        Raises
-        ------
-    """
-
-    service_client = boto3.client(
-            service_name=resource_name, 
-            region_name=region_name
-        )
-
-    '''
-        return boto3 DynamoDb table resource in addition to boto3 client
-        if table_name parameter is not None
-    '''
-    if table_name is not None:
-        dynamodb_table_resource = boto3.resource(
-            service_name=resource_name,
-            region_name=region_name
-        ).Table(table_name)
-
-        return(service_client, dynamodb_table_resource)
-
-    '''
-        Otherwise return just a resource client
-    '''
-    return(service_client)
-
 
 class AwsDevBuild(unittest.TestCase):
     """Tests AWS resources for dev environment
@@ -216,7 +167,7 @@ class AwsDevBuild(unittest.TestCase):
         '''
         self.assertTrue(first_night_2014[0]["TOTAL_VIEWERS"].isnumeric())
 
-        self.assertTrue(first_night_2014[0]["YEAR"].isnumeric())
+        self.assertIsInstance(first_night_2014[0]["YEAR"], int)
 
     def test_search_endpoint(self):
         """Tests that the search integrations is setup
@@ -293,7 +244,7 @@ class AwsDevBuild(unittest.TestCase):
         '''
         self.assertTrue(ratings_response["ratings"][200]["TOTAL_VIEWERS"].isnumeric())
 
-        self.assertTrue(ratings_response["ratings"][200]["YEAR"].isnumeric())
+        self.assertIsInstance(ratings_response["ratings"][200]["YEAR"], int)
 
 
     @unittest.skipIf(BUILD_ENVIRONMENT != "prod", "Skipping when there is no prod ratings data")
@@ -358,6 +309,53 @@ class AwsDevBuild(unittest.TestCase):
         ))
 
 
+    def test_show_names_endpoint(self):
+        """Tests that the showNames lambda proxy integration is setup
+            and serves prefix matches from the show names rollup
+
+        """
+        apigw_method = self.apigw_client.get_method(
+            restApiId=self.restapi_id,
+            resourceId=self.path_to_resource_id["/showNames"],
+            httpMethod="GET"
+        )
+
+        self.assertTrue(apigw_method["apiKeyRequired"])
+
+        self.assertTrue(apigw_method["methodIntegration"]["uri"].endswith(
+            self.PROJECT_NAME + "-show_names-endpoint-" + BUILD_ENVIRONMENT + 
+            "/invocations"
+        ))
+
+        apigw_response = self.apigw_client.test_invoke_method(
+            restApiId=self.restapi_id,
+            resourceId=self.path_to_resource_id["/showNames"],
+            httpMethod="GET",
+            pathWithQueryString="/showNames?prefix=star wars"
+        )
+
+        self.assertEqual(apigw_response["status"], 200)
+        self.assertIn("Star Wars the Clone Wars", json.loads(apigw_response["body"]))
+
+
+    def test_aggregations_endpoint(self):
+        """Tests that the aggregations lambda proxy integration is setup
+
+        """
+        apigw_method = self.apigw_client.get_method(
+            restApiId=self.restapi_id,
+            resourceId=self.path_to_resource_id["/aggregations/{dimension}/{value}"],
+            httpMethod="GET"
+        )
+
+        self.assertTrue(apigw_method["apiKeyRequired"])
+
+        self.assertTrue(apigw_method["methodIntegration"]["uri"].endswith(
+            self.PROJECT_NAME + "-aggregations-endpoint-" + BUILD_ENVIRONMENT + 
+            "/invocations"
+        ))
+
+
     def test_shows_not_found(self):
         """Tests 404 is returned for shows not found
         """
@@ -409,7 +407,7 @@ class AwsDevBuild(unittest.TestCase):
         '''
         self.assertTrue(star_wars_ratings[10]["TOTAL_VIEWERS"].isnumeric())
 
-        self.assertTrue(star_wars_ratings[10]["YEAR"].isnumeric())
+        self.assertIsInstance(star_wars_ratings[10]["YEAR"], int)
 
 
     def test_years_endpoint(self):
@@ -481,7 +479,7 @@ class AwsDevBuild(unittest.TestCase):
         '''
         self.assertTrue(ratings_2014[100]["TOTAL_VIEWERS"].isnumeric())
 
-        self.assertTrue(ratings_2014[100]["YEAR"].isnumeric())
+        self.assertIsInstance(ratings_2014[100]["YEAR"], int)
 
 
     @unittest.skip("Skip until custom domain name is setup for API")
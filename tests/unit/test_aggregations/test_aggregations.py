@@ -0,0 +1,245 @@
+from decimal import Decimal
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+import json
+import os
+import unittest
+
+
+class AggregationsUnitTests(unittest.TestCase):
+    """Testing aggregations endpoint logic unit tests only
+    """
+    @classmethod
+    def setUpClass(cls):
+        """Unitest function that is run once for the class
+        """
+        with open("tests/events/aggregations_proxy_event.json", "r") as lambda_event:
+            cls.aggregations_proxy_event = json.load(lambda_event)
+
+    def setUp(self):
+        """Empties the response cache shared by every endpoint
+        """
+        from microlib.microlib import reset_response_cache
+
+        reset_response_cache()
+
+    def test_validate_request_parameters(self):
+        """Tests each dimension validates its value like its endpoint
+        """
+        from microservices.aggregations.aggregations import validate_request_parameters
+
+        self.assertIsNone(validate_request_parameters(event=self.aggregations_proxy_event))
+
+        for dimension, dimension_value in [
+            ("years", "2019"), ("nights", "2019-05-18"), ("shows", "Yes, Dear")]:
+            self.assertIsNone(validate_request_parameters(event={
+                "pathParameters": {"dimension": dimension, "value": dimension_value}
+            }))
+
+        for dimension, dimension_value in [
+            ("years", "20190"), ("nights", "2019-05-32"), ("shows", ""),
+            ("times", "12:00")]:
+            error_response = validate_request_parameters(event={
+                "pathParameters": {"dimension": dimension, "value": dimension_value}
+            })
+            self.assertEqual(error_response["status_code"], 404)
+
+        self.assertEqual(
+            validate_request_parameters(event={"pathParameters": None})["status_code"],
+            400
+        )
+
+    @patch("microservices.aggregations.aggregations.get_boto_clients")
+    def test_dynamodb_dimension_request(self, get_boto_clients_mock):
+        """Tests the index, key and projection used for each dimension
+        """
+        from boto3.dynamodb.conditions import Key
+        from microservices.aggregations.aggregations import dynamodb_dimension_request
+
+        mock_dynamodb_table = MagicMock()
+        mock_dynamodb_table.query.return_value = {
+            "Items": [{"RATINGS_OCCURRED_ON": "2019-05-18", "TOTAL_VIEWERS": Decimal("512")}],
+            "Count": 1,
+            "ScannedCount": 1
+        }
+        get_boto_clients_mock.return_value = (None, mock_dynamodb_table)
+
+        error_message, television_ratings = dynamodb_dimension_request(
+            dimension="years",
+            dimension_value="2019"
+        )
+
+        self.assertIsNone(error_message)
+        self.assertEqual(len(television_ratings), 1)
+        mock_dynamodb_table.query.assert_called_once_with(
+            IndexName="YEAR_ACCESS",
+            KeyConditionExpression=Key("YEAR").eq(2019),
+            ProjectionExpression="RATINGS_OCCURRED_ON, TOTAL_VIEWERS, TOTAL_VIEWERS_AGE_18_49",
+            ReturnConsumedCapacity="TOTAL"
+        )
+
+        mock_dynamodb_table.query.reset_mock()
+        mock_dynamodb_table.query.return_value = {"Items": [], "Count": 0, "ScannedCount": 0}
+
+        error_message, television_ratings = dynamodb_dimension_request(
+            dimension="nights",
+            dimension_value="2019-05-25"
+        )
+
+        self.assertEqual(error_message, {"message": "night: 2019-05-25 not found"})
+        self.assertNotIn("IndexName", mock_dynamodb_table.query.call_args[1])
+
+    def test_viewer_statistics(self):
+        """Tests sums, means, extremes and interpolated percentiles
+        """
+        from microservices.aggregations.aggregations import viewer_statistics
+
+        ratings_statistics = viewer_statistics(television_ratings=[
+            {"TOTAL_VIEWERS": Decimal("100"), "TOTAL_VIEWERS_AGE_18_49": Decimal("60")},
+            {"TOTAL_VIEWERS": Decimal("400")},
+            {"TOTAL_VIEWERS": Decimal("200"), "TOTAL_VIEWERS_AGE_18_49": Decimal("90")},
+            {"TOTAL_VIEWERS": Decimal("300"), "TOTAL_VIEWERS_AGE_18_49": None}
+        ])
+
+        self.assertEqual(
+            ratings_statistics["TOTAL_VIEWERS"],
+            {
+                "count": 4, "sum": 1000, "mean": 250.0, "min": 100, "max": 400,
+                "p25": 175.0, "p50": 250.0, "p75": 325.0, "p90": 370.0, "p99": 397.0
+            }
+        )
+        self.assertEqual(ratings_statistics["TOTAL_VIEWERS_AGE_18_49"]["count"], 2)
+        self.assertEqual(ratings_statistics["TOTAL_VIEWERS_AGE_18_49"]["p50"], 75.0)
+
+        self.assertEqual(
+            viewer_statistics(television_ratings=[])["TOTAL_VIEWERS"],
+            {"count": 0}
+        )
+
+    @patch("microservices.aggregations.aggregations.dynamodb_dimension_request")
+    def test_main(self, dynamodb_dimension_request_mock):
+        """Tests main returns statistics instead of the ratings
+        """
+        from microservices.aggregations.aggregations import main
+
+        dynamodb_dimension_request_mock.return_value = (
+            None,
+            [
+                {"RATINGS_OCCURRED_ON": "2013-08-24", "TOTAL_VIEWERS": Decimal("683")},
+                {"RATINGS_OCCURRED_ON": "2013-08-17", "TOTAL_VIEWERS": Decimal("727")}
+            ]
+        )
+
+        apigw_response = main(event=self.aggregations_proxy_event)
+
+        self.assertEqual(apigw_response["statusCode"], 200)
+        ratings_statistics = json.loads(apigw_response["body"])
+        self.assertEqual(ratings_statistics["dimension"], "shows")
+        self.assertEqual(ratings_statistics["value"], "mockpathparam")
+        self.assertEqual(ratings_statistics["ratings"], 2)
+        self.assertEqual(ratings_statistics["first_night"], "2013-08-17")
+        self.assertEqual(ratings_statistics["last_night"], "2013-08-24")
+        self.assertEqual(ratings_statistics["TOTAL_VIEWERS"]["max"], 727)
+
+        dynamodb_dimension_request_mock.assert_called_once_with(
+            dimension="shows",
+            dimension_value="mockpathparam",
+            query_stats={}
+        )
+
+    @patch("microservices.aggregations.aggregations.dynamodb_dimension_request")
+    def test_main_truncated(self, dynamodb_dimension_request_mock):
+        """Tests statistics of ratings cut off by the query budget are
+            flagged and not cached
+        """
+        from microservices.aggregations.aggregations import main
+
+        def mock_dimension_request(dimension, dimension_value, query_stats):
+            query_stats["truncated"] = True
+            return(None, [
+                {"RATINGS_OCCURRED_ON": "2013-08-24", "TOTAL_VIEWERS": Decimal("683")}
+            ])
+
+        dynamodb_dimension_request_mock.side_effect = mock_dimension_request
+
+        first_response = main(event=self.aggregations_proxy_event)
+        second_response = main(event=self.aggregations_proxy_event)
+
+        self.assertEqual(dynamodb_dimension_request_mock.call_count, 2)
+        self.assertEqual(json.loads(second_response["body"])["ratings"], 1)
+        self.assertEqual(first_response["headers"]["X-Results-Truncated"], "true")
+        self.assertEqual(first_response["headers"]["Cache-Control"], "no-store")
+        self.assertNotIn("ETag", first_response["headers"])
+
+    @patch("microservices.aggregations.aggregations.dynamodb_dimension_request")
+    @patch("microservices.aggregations.aggregations.get_rollups")
+    def test_main_rollup(self, get_rollups_mock, dynamodb_dimension_request_mock):
+        """Tests percentiles=false is answered from the rollup table
+        """
+        from microservices.aggregations.aggregations import main
+
+        rollup_event = dict(
+            self.aggregations_proxy_event,
+            queryStringParameters={"percentiles": "false"}
+        )
+        get_rollups_mock.return_value = [{
+            "ROLLUP": "SHOW#mockpathparam", "PERIOD": "ALL", "RATINGS": Decimal("2"),
+            "FIRST_NIGHT": "2013-08-17", "LAST_NIGHT": "2013-08-24",
+            "TOTAL_VIEWERS": {"count": Decimal("2"), "sum": Decimal("1410"),
+                "min": Decimal("683"), "max": Decimal("727")}
+        }]
+
+        apigw_response = main(event=rollup_event)
+
+        self.assertEqual(apigw_response["statusCode"], 200)
+        ratings_statistics = json.loads(apigw_response["body"])
+        self.assertEqual(ratings_statistics["ratings"], 2)
+        self.assertEqual(ratings_statistics["value"], "mockpathparam")
+        self.assertEqual(ratings_statistics["TOTAL_VIEWERS"]["mean"], 705.0)
+        self.assertNotIn("p50", ratings_statistics["TOTAL_VIEWERS"])
+
+        get_rollups_mock.assert_called_once_with(
+            rollup_name="SHOW#mockpathparam", period="ALL"
+        )
+        dynamodb_dimension_request_mock.assert_not_called()
+
+    @patch("microservices.aggregations.aggregations.dynamodb_dimension_request")
+    def test_main_404_error(self, dynamodb_dimension_request_mock):
+        """Tests main returns the 404 error message
+        """
+        from microservices.aggregations.aggregations import main
+
+        dynamodb_dimension_request_mock.return_value = (
+            {"message": "show: mockpathparam not found"}, []
+        )
+
+        apigw_response = main(event=self.aggregations_proxy_event)
+
+        self.assertEqual(apigw_response["statusCode"], 404)
+        self.assertEqual(
+            json.loads(apigw_response["body"]),
+            {"message": "show: mockpathparam not found"}
+        )
+
+    @patch("logging.getLogger")
+    @patch("microservices.aggregations.aggregations.main")
+    def test_lambda_handler_event(self, main_mock,
+        getLogger_mock):
+        """Tests passing sample event to lambda_handler
+        """
+        from microservices.aggregations.aggregations import lambda_handler
+
+        lambda_handler(
+            event=self.aggregations_proxy_event,
+            context={}
+        )
+
+        self.assertEqual(
+            getLogger_mock.call_count,
+            1
+        )
+
+        main_mock.assert_called_once_with(
+            event=self.aggregations_proxy_event
+        )
@@ -0,0 +1,31 @@
+import unittest
+
+
+class HotPathsUnitTests(unittest.TestCase):
+    """Testing the regression gate of benchmarks/bench_hot_paths.py, the
+        timings themselves run in builds/buildspec_benchmarks.yml
+    """
+    def test_regression_errors(self):
+        """Tests a slower or unknown benchmark is reported
+        """
+        from benchmarks.bench_hot_paths import regression_errors
+
+        self.assertEqual(
+            regression_errors(
+                benchmark_results={
+                    "encode_response_body_year": {"milliseconds": 9.0, "relative": 3.0},
+                    "main_years": {"milliseconds": 3.0, "relative": 1.5},
+                    "main_unknown": {"milliseconds": 1.0, "relative": 0.5}
+                },
+                baselines={
+                    "encode_response_body_year": {"milliseconds": 2.0, "relative": 1.0},
+                    "main_years": {"milliseconds": 2.0, "relative": 1.0}
+                },
+                max_slowdown=2.0
+            ),
+            [
+                "encode_response_body_year is 3.00 times its baseline, over 2.0",
+                "main_unknown has no baseline, run "
+                "python -m benchmarks.bench_hot_paths --update-baselines"
+            ]
+        )
@@ -0,0 +1,195 @@
+from unittest.mock import patch
+
+import os
+import tempfile
+import unittest
+
+
+class LoadUnitTests(unittest.TestCase):
+    """Testing the local dynamodb stand in, benchmarks/bench_load.py and
+        benchmarks/synthetic_ratings.py
+    """
+    def tearDown(self):
+        """Removes the local tables from the client registry
+        """
+        from microlib.microlib import reset_boto_clients
+        from microlib.microlib import reset_response_cache
+
+        reset_boto_clients()
+        reset_response_cache()
+
+    def test_local_table_query(self):
+        """Tests index queries, key conditions, projections and
+            LastEvaluatedKey pages
+        """
+        from boto3.dynamodb.conditions import Key
+        from benchmarks.local_dynamodb import local_ratings_tables
+        from benchmarks.synthetic_ratings import synthetic_ratings
+
+        ratings_table, rollup_table = local_ratings_tables(
+            television_ratings=synthetic_ratings(years=2, nights_per_year=10, shows_per_night=4),
+            year_date_index=True
+        )
+
+        self.assertEqual(len(ratings_table.all_items()), 80)
+        self.assertEqual(
+            rollup_table.get_item(Key={"ROLLUP": "YEAR", "PERIOD": "2012"})["Item"]["RATINGS"],
+            40
+        )
+
+        night_response = ratings_table.query(
+            KeyConditionExpression=Key("RATINGS_OCCURRED_ON").eq("2012-01-07")
+        )
+        self.assertEqual(
+            [ratings_item["TIME"] for ratings_item in night_response["Items"]],
+            ["11:00", "11:30", "12:00", "12:30"]
+        )
+
+        year_response = ratings_table.query(
+            IndexName="YEAR_ACCESS",
+            KeyConditionExpression=Key("YEAR").eq(2013),
+            ReturnConsumedCapacity="TOTAL"
+        )
+        self.assertEqual(year_response["Count"], 40)
+        self.assertNotIn("LastEvaluatedKey", year_response)
+        self.assertGreater(year_response["ConsumedCapacity"]["CapacityUnits"], 0)
+
+        window_kwargs = {
+            "IndexName": "YEAR_DATE_ACCESS",
+            "KeyConditionExpression": Key("YEAR").eq(2012) & Key(
+                "RATINGS_OCCURRED_ON").between("2012-01-14", "2012-01-28"),
+            "ProjectionExpression": "#RATINGS_OCCURRED_ON, #SHOW",
+            "ExpressionAttributeNames": {"#RATINGS_OCCURRED_ON": "RATINGS_OCCURRED_ON", "#SHOW": "SHOW"},
+            "Limit": 5
+        }
+        first_page = ratings_table.query(**window_kwargs)
+        second_page = ratings_table.query(
+            ExclusiveStartKey=first_page["LastEvaluatedKey"], **window_kwargs
+        )
+        third_page = ratings_table.query(
+            ExclusiveStartKey=second_page["LastEvaluatedKey"], **window_kwargs
+        )
+
+        window_nights = [
+            ratings_item["RATINGS_OCCURRED_ON"]
+            for query_page in (first_page, second_page, third_page)
+            for ratings_item in query_page["Items"]
+        ]
+        self.assertEqual(window_nights, sorted(window_nights))
+        self.assertEqual(len(window_nights), 12)
+        self.assertEqual(set(first_page["Items"][0]), {"RATINGS_OCCURRED_ON", "SHOW"})
+        self.assertNotIn("LastEvaluatedKey", third_page)
+
+        with self.assertRaises(ValueError):
+            ratings_table.query(IndexName="NOT_AN_INDEX", KeyConditionExpression=Key("YEAR").eq(2012))
+
+    def test_run_load(self):
+        """Tests every endpoint answers the load from the local tables
+        """
+        from benchmarks.bench_load import LOAD_ENDPOINTS
+        from benchmarks.bench_load import run_load
+        from benchmarks.local_dynamodb import install_local_tables
+        from benchmarks.local_dynamodb import local_ratings_tables
+        from benchmarks.synthetic_ratings import synthetic_ratings
+
+        ratings_table, rollup_table = local_ratings_tables(
+            television_ratings=synthetic_ratings(years=2, nights_per_year=6, shows_per_night=5)
+        )
+        install_local_tables(local_tables=[ratings_table, rollup_table])
+
+        with patch.dict(os.environ, {"REQUEST_METRICS": "false", "LOG_LEVEL": "WARNING"}):
+            load_report = run_load(
+                ratings_table=ratings_table,
+                endpoints=list(LOAD_ENDPOINTS),
+                requests=3,
+                concurrency=4
+            )
+
+        self.assertEqual(set(load_report), set(LOAD_ENDPOINTS) | {"all"})
+        self.assertEqual(load_report["all"]["requests"], 3 * len(LOAD_ENDPOINTS))
+        self.assertEqual(load_report["all"]["errors"], 0)
+        self.assertEqual(load_report["all"]["not_found"], 0)
+        self.assertLessEqual(
+            load_report["all"]["latency"]["p50"],
+            load_report["all"]["latency"]["p99"]
+        )
+
+    def test_latency_percentiles(self):
+        """Tests nearest rank percentiles
+        """
+        from benchmarks.bench_load import latency_percentiles
+
+        latency_stats = latency_percentiles(latencies_ms=list(range(1, 101)))
+
+        self.assertEqual(
+            (latency_stats["p50"], latency_stats["p95"], latency_stats["p99"], latency_stats["max"]),
+            (50, 95, 99, 100)
+        )
+        self.assertEqual(latency_stats["mean"], 50.5)
+        self.assertEqual(latency_percentiles(latencies_ms=[]), {})
+
+    def test_synthetic_ratings(self):
+        """Tests ratings are seeded televisionRating items on saturdays
+            with long running shows
+        """
+        from collections import Counter
+        from datetime import datetime
+        from decimal import Decimal
+        from benchmarks.synthetic_ratings import EXTENDED_TIMESLOTS
+        from benchmarks.synthetic_ratings import synthetic_ratings
+
+        ratings_kwargs = {"years": 3, "shows_per_night": len(EXTENDED_TIMESLOTS)}
+        television_ratings = list(synthetic_ratings(**ratings_kwargs))
+
+        self.assertEqual(television_ratings, list(synthetic_ratings(**ratings_kwargs)))
+        self.assertNotEqual(television_ratings, list(synthetic_ratings(seed=1, **ratings_kwargs)))
+        self.assertEqual(len(television_ratings), 3 * 52 * 24)
+        self.assertEqual(
+            len({(television_rating["RATINGS_OCCURRED_ON"], television_rating["TIME"])
+                for television_rating in television_ratings}),
+            len(television_ratings)
+        )
+
+        for television_rating in television_ratings[:50]:
+            self.assertEqual(
+                datetime.strptime(television_rating["RATINGS_OCCURRED_ON"], "%Y-%m-%d").weekday(), 5
+            )
+            self.assertEqual(
+                int(television_rating["RATINGS_OCCURRED_ON"][:4]), television_rating["YEAR"]
+            )
+            for attribute_name in ("TOTAL_VIEWERS", "YEAR", "PERCENTAGE_OF_HOUSEHOLDS",
+                    "TOTAL_VIEWERS_AGE_18_49", "PERCENTAGE_OF_HOUSEHOLDS_AGE_18_49"):
+                self.assertIsInstance(television_rating[attribute_name], Decimal)
+            self.assertIsInstance(television_rating["IS_RERUN"], bool)
+
+        show_counts = Counter(television_rating["SHOW"] for television_rating in television_ratings)
+        self.assertGreater(show_counts.most_common(1)[0][1], 3 * len(television_ratings) / len(show_counts))
+
+    def test_write_read_ratings(self):
+        """Tests ratings stream to gzip json lines under max_bytes and
+            read back as Decimal items
+        """
+        from benchmarks.synthetic_ratings import parse_size
+        from benchmarks.synthetic_ratings import read_ratings
+        from benchmarks.synthetic_ratings import synthetic_ratings
+        from benchmarks.synthetic_ratings import write_ratings
+
+        self.assertEqual(parse_size("2GB"), 2 * 1024 ** 3)
+        self.assertEqual(parse_size("64kb"), 64 * 1024)
+        with self.assertRaises(ValueError):
+            parse_size("two gigabytes")
+
+        with tempfile.TemporaryDirectory() as ratings_directory:
+            ratings_path = os.path.join(ratings_directory, "ratings.json.gz")
+            item_count, written_bytes = write_ratings(
+                television_ratings=synthetic_ratings(years=None),
+                ratings_path=ratings_path,
+                max_bytes=parse_size("64KB")
+            )
+
+            self.assertLessEqual(written_bytes, 64 * 1024)
+            self.assertGreater(written_bytes, 63 * 1024)
+            self.assertEqual(
+                list(read_ratings(ratings_path=ratings_path)),
+                list(synthetic_ratings(years=1))[:item_count]
+            )
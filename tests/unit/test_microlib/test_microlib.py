@@ -1,10 +1,13 @@
 
 from datetime import datetime
 from unittest.mock import MagicMock
+from unittest.mock import PropertyMock
 from unittest.mock import patch
 
 import json
 import os
+import threading
+import time
 import unittest
 
 
@@ -35,7 +38,12 @@ class MicrolibUnitTests(unittest.TestCase):
         """
         pass
 
+    def setUp(self):
+        """Clears the client registry so every test builds new clients
+        """
+        from microlib.microlib import reset_boto_clients
 
+        reset_boto_clients()
 
     @patch("boto3.client")
     def test_get_boto_clients_no_region(self, boto3_client_mock):
@@ -118,6 +126,133 @@ class MicrolibUnitTests(unittest.TestCase):
                 dynamodb_function,
                 dir(dynamodb_table)
             )        
+    @patch("boto3.resource")
+    @patch("boto3.client")
+    def test_get_boto_clients_registry(self, boto3_client_mock,
+        boto3_resource_mock):
+        """Tests clients and Table resources are built once and reused
+
+            Parameters
+            ----------
+            boto3_client_mock : unittest.mock.MagicMock
+                Mock object used to patch boto3.client
+
+            boto3_resource_mock : unittest.mock.MagicMock
+                Mock object used to patch boto3.resource
+
+            Returns
+            -------
+
+            Raises
+            ------
+        """
+        from microlib.microlib import get_boto_clients
+        from microlib.microlib import reset_boto_clients
+
+        first_client, first_table = get_boto_clients(
+            resource_name="dynamodb",
+            table_name="fake_ddb_table"
+        )
+        second_client, second_table = get_boto_clients(
+            resource_name="dynamodb",
+            table_name="fake_ddb_table"
+        )
+
+        self.assertIs(first_client, second_client)
+        self.assertIs(first_table, second_table)
+        boto3_client_mock.assert_called_once_with(
+            service_name="dynamodb",
+            region_name="us-east-1"
+        )
+        boto3_resource_mock.assert_called_once_with(
+            service_name="dynamodb",
+            region_name="us-east-1"
+        )
+
+        '''
+            a different endpoint is a different registry key
+        '''
+        get_boto_clients(
+            resource_name="dynamodb",
+            endpoint_url="http://localhost:8000"
+        )
+        boto3_client_mock.assert_called_with(
+            service_name="dynamodb",
+            region_name="us-east-1",
+            endpoint_url="http://localhost:8000"
+        )
+        self.assertEqual(boto3_client_mock.call_count, 2)
+
+        reset_boto_clients()
+        get_boto_clients(resource_name="dynamodb")
+        self.assertEqual(boto3_client_mock.call_count, 3)
+
+    def test_register_boto_client(self):
+        """Tests injecting a Table resource into the registry
+        """
+        from microlib.microlib import get_boto_clients
+        from microlib.microlib import register_boto_client
+
+        mock_dynamodb_client = MagicMock()
+        mock_dynamodb_table = MagicMock()
+        register_boto_client(
+            boto_object=mock_dynamodb_client,
+            resource_name="dynamodb"
+        )
+        register_boto_client(
+            boto_object=mock_dynamodb_table,
+            resource_name="dynamodb",
+            table_name="fake_ddb_table"
+        )
+
+        dynamodb_client, dynamodb_table = get_boto_clients(
+            resource_name="dynamodb",
+            table_name="fake_ddb_table"
+        )
+        self.assertIs(dynamodb_client, mock_dynamodb_client)
+        self.assertIs(dynamodb_table, mock_dynamodb_table)
+
+    @patch("boto3.resource")
+    @patch("boto3.client")
+    def test_get_boto_clients_thread_table_resource(self, boto3_client_mock,
+        boto3_resource_mock):
+        """Tests worker threads get their own Table resource and share
+            the client
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        from microlib.microlib import get_boto_clients
+
+        boto3_resource_mock.side_effect = lambda **resource_kwargs: MagicMock()
+
+        main_client, main_table = get_boto_clients(
+            resource_name="dynamodb",
+            table_name="fake_ddb_table"
+        )
+
+        def thread_clients():
+            first_clients = get_boto_clients(
+                resource_name="dynamodb",
+                table_name="fake_ddb_table"
+            )
+            second_clients = get_boto_clients(
+                resource_name="dynamodb",
+                table_name="fake_ddb_table"
+            )
+            self.assertIs(first_clients[1], second_clients[1])
+            return(first_clients)
+
+        with ThreadPoolExecutor(max_workers=1) as first_pool:
+            first_client, first_table = first_pool.submit(thread_clients).result()
+        with ThreadPoolExecutor(max_workers=1) as second_pool:
+            second_client, second_table = second_pool.submit(thread_clients).result()
+
+        self.assertIs(first_client, main_client)
+        self.assertIs(second_client, main_client)
+        self.assertIsNot(first_table, main_table)
+        self.assertIsNot(second_table, main_table)
+        self.assertIsNot(first_table, second_table)
+        boto3_client_mock.assert_called_once()
+
     def test_lambda_proxy_response(self):
         '''validates lambda_proxy_response
 
@@ -145,7 +280,7 @@ class MicrolibUnitTests(unittest.TestCase):
 
         self.assertEqual(lambda_success_response["statusCode"], 200)
         self.assertFalse(lambda_success_response["isBase64Encoded"])
-        self.assertEqual(lambda_success_response["body"], json.dumps(mock_success_response))
+        self.assertEqual(json.loads(lambda_success_response["body"]), mock_success_response)
 
 
         mock_show_not_found = {"error": "Show name not found"}
@@ -157,6 +292,1250 @@ class MicrolibUnitTests(unittest.TestCase):
 
         self.assertEqual(lambda_error_response["statusCode"], 404)
         self.assertFalse(lambda_error_response["isBase64Encoded"])
-        self.assertEqual(lambda_error_response["body"], json.dumps(mock_show_not_found))
+        self.assertEqual(json.loads(lambda_error_response["body"]), mock_show_not_found)
        
 
+
+    def test_paginated_query(self):
+        """Tests paginated_query follows LastEvaluatedKey and reports
+            pages and consumed capacity
+        """
+        from microlib.microlib import paginated_query
+
+        mock_dynamodb_table = MagicMock()
+        mock_dynamodb_table.query.side_effect = [
+            {
+                "Items": [{"SHOW": "mockshow"}, {"SHOW": "mockshow2"}],
+                "Count": 2,
+                "ScannedCount": 2,
+                "ConsumedCapacity": {"CapacityUnits": 1.5},
+                "LastEvaluatedKey": {"SHOW": "mockshow2"}
+            },
+            {
+                "Items": [{"SHOW": "mockshow3"}],
+                "Count": 1,
+                "ScannedCount": 1,
+                "ConsumedCapacity": {"CapacityUnits": 0.5}
+            }
+        ]
+
+        query_stats = {}
+        dynamodb_items = paginated_query(
+            dynamo_table=mock_dynamodb_table,
+            query_stats=query_stats,
+            IndexName="SHOW_ACCESS"
+        )
+
+        '''
+            nothing is queried until the generator is consumed
+        '''
+        mock_dynamodb_table.query.assert_not_called()
+
+        self.assertEqual(
+            [dynamodb_item["SHOW"] for dynamodb_item in dynamodb_items],
+            ["mockshow", "mockshow2", "mockshow3"]
+        )
+
+        mock_dynamodb_table.query.assert_called_with(
+            IndexName="SHOW_ACCESS",
+            ReturnConsumedCapacity="TOTAL",
+            ExclusiveStartKey={"SHOW": "mockshow2"}
+        )
+        self.assertEqual(query_stats["pages"], 2)
+        self.assertEqual(query_stats["count"], 3)
+        self.assertEqual(query_stats["consumed_capacity"], 2.0)
+        self.assertFalse(query_stats["truncated"])
+        self.assertIsNone(query_stats["last_evaluated_key"])
+
+    def test_paginated_query_budget(self):
+        """Tests paginated_query stops at the page and byte budget
+        """
+        from microlib.microlib import paginated_query
+
+        mock_dynamodb_table = MagicMock()
+        mock_dynamodb_table.query.return_value = {
+            "Items": [{"SHOW": "mockshow"}],
+            "Count": 1,
+            "ScannedCount": 1,
+            "LastEvaluatedKey": {"SHOW": "mockshow"}
+        }
+
+        query_stats = {}
+        dynamodb_items = list(paginated_query(
+            dynamo_table=mock_dynamodb_table,
+            query_stats=query_stats,
+            max_pages=3
+        ))
+
+        self.assertEqual(len(dynamodb_items), 3)
+        self.assertEqual(mock_dynamodb_table.query.call_count, 3)
+        self.assertTrue(query_stats["truncated"])
+        self.assertEqual(query_stats["last_evaluated_key"], {"SHOW": "mockshow"})
+
+        mock_dynamodb_table.query.reset_mock()
+        dynamodb_items = list(paginated_query(
+            dynamo_table=mock_dynamodb_table,
+            query_stats=query_stats,
+            max_bytes=1
+        ))
+
+        self.assertEqual(len(dynamodb_items), 1)
+        self.assertEqual(mock_dynamodb_table.query.call_count, 1)
+        self.assertTrue(query_stats["truncated"])
+
+    def test_find_index_name(self):
+        """Tests finding a global secondary index by key schema
+        """
+        from botocore.exceptions import ClientError
+        from microlib.microlib import find_index_name
+
+        mock_dynamodb_table = MagicMock()
+        mock_dynamodb_table.name = "fake_ddb_table"
+        mock_dynamodb_table.global_secondary_indexes = [
+            {
+                "IndexName": "SHOW_ACCESS",
+                "KeySchema": [
+                    {"AttributeName": "SHOW", "KeyType": "HASH"},
+                    {"AttributeName": "RATINGS_OCCURRED_ON", "KeyType": "RANGE"}
+                ]
+            }
+        ]
+
+        self.assertEqual(
+            find_index_name(
+                dynamo_table=mock_dynamodb_table,
+                hash_key="SHOW",
+                range_key="RATINGS_OCCURRED_ON"
+            ),
+            "SHOW_ACCESS"
+        )
+        self.assertIsNone(
+            find_index_name(
+                dynamo_table=mock_dynamodb_table,
+                hash_key="YEAR",
+                range_key="RATINGS_OCCURRED_ON"
+            )
+        )
+
+        '''
+            results are cached so the table is only described once
+        '''
+        mock_dynamodb_table.global_secondary_indexes = []
+        self.assertEqual(
+            find_index_name(
+                dynamo_table=mock_dynamodb_table,
+                hash_key="SHOW",
+                range_key="RATINGS_OCCURRED_ON"
+            ),
+            "SHOW_ACCESS"
+        )
+
+        mock_denied_table = MagicMock()
+        mock_denied_table.name = "denied_ddb_table"
+        type(mock_denied_table).global_secondary_indexes = PropertyMock(
+            side_effect=ClientError({"Error": {"Code": "AccessDeniedException"}}, "DescribeTable")
+        )
+        self.assertIsNone(
+            find_index_name(
+                dynamo_table=mock_denied_table,
+                hash_key="YEAR",
+                range_key="RATINGS_OCCURRED_ON"
+            )
+        )
+
+    def test_run_concurrently(self):
+        """Tests results are returned in the order of the arguments
+        """
+        from microlib.microlib import run_concurrently
+
+        def mock_request(year):
+            return(year * 2)
+
+        self.assertEqual(
+            run_concurrently(
+                request_function=mock_request,
+                request_kwargs_list=[{"year": year} for year in range(2012, 2021)]
+            ),
+            [year * 2 for year in range(2012, 2021)]
+        )
+
+        self.assertEqual(
+            run_concurrently(
+                request_function=mock_request,
+                request_kwargs_list=[{"year": 2012}]
+            ),
+            [4024]
+        )
+
+    def test_run_concurrently_within_budget(self):
+        """Tests failed and late calls are reported without failing the rest
+        """
+        from concurrent.futures import TimeoutError as FutureTimeoutError
+        from microlib.microlib import run_concurrently_within_budget
+
+        release_slow_request = threading.Event()
+
+        def mock_request(show_name):
+            if show_name == "slow":
+                release_slow_request.wait(5)
+            if show_name == "broken":
+                raise ValueError("mock failure")
+            return(show_name.upper())
+
+        request_outcomes = run_concurrently_within_budget(
+            request_function=mock_request,
+            request_kwargs_list=[
+                {"show_name": "one piece"},
+                {"show_name": "slow"},
+                {"show_name": "broken"}
+            ],
+            budget_seconds=0.2
+        )
+        release_slow_request.set()
+
+        self.assertEqual(request_outcomes[0], ("ONE PIECE", None))
+        self.assertIsNone(request_outcomes[1][0])
+        self.assertIsInstance(request_outcomes[1][1], FutureTimeoutError)
+        self.assertIsNone(request_outcomes[2][0])
+        self.assertIsInstance(request_outcomes[2][1], ValueError)
+
+    def test_run_concurrently_within_budget_late_call(self):
+        """Tests a late call stops at its next page, off the shared
+            pool, without counting towards the next request
+        """
+        from concurrent.futures import TimeoutError as FutureTimeoutError
+        from microlib.microlib import paginated_query
+        from microlib.microlib import request_metrics_record
+        from microlib.microlib import reset_request_metrics
+        from microlib.microlib import run_concurrently_within_budget
+
+        release_page = threading.Event()
+        query_threads = []
+
+        def mock_query(**query_kwargs):
+            query_threads.append(threading.current_thread().name)
+            release_page.wait(5)
+            return({
+                "Items": [{"SHOW": "mockshow"}],
+                "Count": 1,
+                "LastEvaluatedKey": {"SHOW": "mockshow"}
+            })
+
+        mock_dynamodb_table = MagicMock()
+        mock_dynamodb_table.query.side_effect = mock_query
+        query_stats = {}
+
+        def mock_request(show_name):
+            return(list(paginated_query(
+                dynamo_table=mock_dynamodb_table,
+                query_stats=query_stats,
+                max_pages=100
+            )))
+
+        reset_request_metrics(endpoint="shows")
+        request_outcomes = run_concurrently_within_budget(
+            request_function=mock_request,
+            request_kwargs_list=[{"show_name": "slow"}],
+            budget_seconds=0.1
+        )
+        self.assertIsInstance(request_outcomes[0][1], FutureTimeoutError)
+
+        '''
+            the late page arrives during the next request
+        '''
+        reset_request_metrics(endpoint="years")
+        release_page.set()
+        for _ in range(500):
+            if query_stats.get("truncated") is True:
+                break
+            time.sleep(0.01)
+
+        self.assertTrue(query_stats["truncated"])
+        self.assertEqual(mock_dynamodb_table.query.call_count, 1)
+        self.assertTrue(query_threads[0].startswith("microlib-budget"))
+        self.assertNotIn("pages", request_metrics_record(duration_ms=1.0))
+
+        self.assertEqual(
+            run_concurrently_within_budget(
+                request_function=mock_request,
+                request_kwargs_list=[],
+                budget_seconds=0.1
+            ),
+            []
+        )
+
+    def test_encode_batch_response(self):
+        """Tests encoded bodies are joined without being decoded
+        """
+        from microlib.microlib import encode_batch_response
+
+        encoded_body = encode_batch_response(
+            batch_keys=["2020-06-27", "2020-06-20"],
+            encoded_bodies={"2020-06-20": b'[{"YEAR":2020}]'},
+            batch_errors={"2020-06-27": {"message": "not found", "status": 404}}
+        )
+
+        self.assertEqual(
+            json.loads(encoded_body),
+            {
+                "2020-06-27": {"message": "not found", "status": 404},
+                "2020-06-20": {"status": 200, "ratings": [{"YEAR": 2020}]}
+            }
+        )
+        self.assertEqual(
+            list(json.loads(encoded_body).keys()), ["2020-06-27", "2020-06-20"]
+        )
+
+    @patch.dict(os.environ, {"CURSOR_SIGNING_KEY": "mock-key"})
+    def test_encode_cursor(self):
+        """Tests cursors round trip and tampered cursors or a missing
+            CURSOR_SIGNING_KEY are rejected
+        """
+        from decimal import Decimal
+        from microlib.microlib import decode_cursor
+        from microlib.microlib import encode_cursor
+
+        cursor_position = {
+            "year": 2019,
+            "key": {
+                "YEAR": Decimal("2019"),
+                "RATINGS_OCCURRED_ON": "2019-10-26",
+                "PERCENTAGE_OF_HOUSEHOLDS": Decimal("0.25")
+            }
+        }
+
+        cursor_token = encode_cursor(cursor_position=cursor_position)
+
+        self.assertNotIn("2019-10-26", cursor_token)
+        self.assertEqual(decode_cursor(cursor_token=cursor_token), cursor_position)
+        self.assertIsInstance(
+            decode_cursor(cursor_token=cursor_token)["key"]["PERCENTAGE_OF_HOUSEHOLDS"],
+            Decimal
+        )
+
+        tampered_token = encode_cursor(cursor_position={"year": 2020}).split(".")[0] + \
+            "." + cursor_token.split(".")[1]
+        self.assertIsNone(decode_cursor(cursor_token=tampered_token))
+        self.assertIsNone(decode_cursor(cursor_token="not-a-cursor"))
+        self.assertIsNone(decode_cursor(cursor_token=None))
+
+        with patch.dict(os.environ, {"CURSOR_SIGNING_KEY": "other-key"}):
+            self.assertIsNone(decode_cursor(cursor_token=cursor_token))
+
+        with patch.dict(os.environ, {"CURSOR_SIGNING_KEY": ""}):
+            self.assertIsNone(decode_cursor(cursor_token=cursor_token))
+            with self.assertRaises(ValueError):
+                encode_cursor(cursor_position=cursor_position)
+
+    @patch("microlib.microlib.get_boto_clients")
+    def test_cursor_signing_key(self, get_boto_clients_mock):
+        """Tests the signing secret is read once per container and a
+            CURSOR_SIGNING_KEY environment variable takes precedence
+        """
+        from microlib.microlib import cursor_signing_key
+        from microlib.microlib import reset_boto_clients
+
+        mock_secret_arn = "arn:aws:secretsmanager:us-west-2:123456789012:secret:mock-key"
+        get_boto_clients_mock.return_value.get_secret_value.return_value = {
+            "SecretString": "mock-secret"
+        }
+
+        with patch.dict(os.environ, {"CURSOR_SIGNING_SECRET_ARN": mock_secret_arn}):
+            os.environ.pop("CURSOR_SIGNING_KEY", None)
+            self.assertEqual(cursor_signing_key(), b"mock-secret")
+            self.assertEqual(cursor_signing_key(), b"mock-secret")
+
+            with patch.dict(os.environ, {"CURSOR_SIGNING_KEY": "mock-key"}):
+                self.assertEqual(cursor_signing_key(), b"mock-key")
+
+            reset_boto_clients()
+            get_boto_clients_mock.return_value.get_secret_value.side_effect = ValueError("denied")
+            self.assertIsNone(cursor_signing_key())
+
+        get_boto_clients_mock.assert_called_with(
+            resource_name="secretsmanager", region_name="us-west-2"
+        )
+        self.assertEqual(
+            get_boto_clients_mock.return_value.get_secret_value.call_count, 2
+        )
+
+        with patch.dict(os.environ, {}, clear=True):
+            self.assertIsNone(cursor_signing_key())
+
+    def test_encode_response_body(self):
+        """Tests Decimal values are encoded without changing the items
+        """
+        from decimal import Decimal
+        from microlib.microlib import encode_response_body
+        from microlib.microlib import lambda_proxy_response
+
+        mock_ratings = [
+            {
+                "RATINGS_OCCURRED_ON": "2016-11-05",
+                "SHOW": "Dragon Ball Z Kai",
+                "TOTAL_VIEWERS": Decimal("1293"),
+                "YEAR": Decimal("2016"),
+                "PERCENTAGE_OF_HOUSEHOLDS": Decimal("0.62")
+            }
+        ]
+
+        expected_ratings = [
+            {
+                "RATINGS_OCCURRED_ON": "2016-11-05",
+                "SHOW": "Dragon Ball Z Kai",
+                "TOTAL_VIEWERS": 1293,
+                "YEAR": 2016,
+                "PERCENTAGE_OF_HOUSEHOLDS": 0.62
+            }
+        ]
+
+        encoded_body = encode_response_body(response_body=mock_ratings)
+        self.assertIsInstance(encoded_body, bytes)
+        self.assertEqual(json.loads(encoded_body), expected_ratings)
+        self.assertIsInstance(json.loads(encoded_body)[0]["YEAR"], int)
+
+        '''
+            standard library json when orjson is not installed
+        '''
+        with patch("microlib.microlib.orjson", None):
+            encoded_body = encode_response_body(response_body=mock_ratings)
+        self.assertEqual(json.loads(encoded_body), expected_ratings)
+
+        '''
+            items are not mutated
+        '''
+        self.assertEqual(mock_ratings[0]["YEAR"], Decimal("2016"))
+
+        '''
+            pre-encoded bodies are not encoded again
+        '''
+        encoded_body = encode_response_body(response_body=mock_ratings)
+        self.assertIs(encode_response_body(response_body=encoded_body), encoded_body)
+        self.assertEqual(
+            lambda_proxy_response(
+                status_code=200,
+                headers_dict={},
+                response_body=encoded_body
+            )["body"],
+            encoded_body.decode("utf-8")
+        )
+
+        with self.assertRaises(TypeError):
+            encode_response_body(response_body={"mock": object()})
+
+    def test_encode_response_body_schema_types(self):
+        """Tests an integral percentage stays a json number with a
+            fraction, as rows, batches and columns
+        """
+        from decimal import Decimal
+        from microlib.microlib import columnar_ratings
+        from microlib.microlib import encode_response_body
+
+        mock_rating = {
+            "RATINGS_OCCURRED_ON": "2012-05-26",
+            "TOTAL_VIEWERS": Decimal("1000"),
+            "PERCENTAGE_OF_HOUSEHOLDS": Decimal("1.0"),
+            "PERCENTAGE_OF_HOUSEHOLDS_AGE_18_49": Decimal("2")
+        }
+
+        batch_body = {"2012-05-26": {"status": 200, "ratings": [mock_rating]}}
+        encoded_body = encode_response_body(response_body=batch_body)
+
+        '''
+            standard library json when orjson is not installed
+        '''
+        with patch("microlib.microlib.orjson", None):
+            json_encoded_body = encode_response_body(response_body=batch_body)
+
+        for encoded_body in (encoded_body, json_encoded_body):
+            self.assertIn(b'"PERCENTAGE_OF_HOUSEHOLDS":1.0', encoded_body)
+            self.assertIn(b'"PERCENTAGE_OF_HOUSEHOLDS_AGE_18_49":2.0', encoded_body)
+            self.assertIn(b'"TOTAL_VIEWERS":1000,', encoded_body)
+
+        encoded_columns = json.loads(
+            encode_response_body(response_body=columnar_ratings([mock_rating])),
+            parse_int=str
+        )
+        self.assertEqual(
+            encoded_columns["columns"]["PERCENTAGE_OF_HOUSEHOLDS"], [1.0]
+        )
+        self.assertEqual(encoded_columns["columns"]["TOTAL_VIEWERS"], ["1000"])
+
+        '''
+            the item is not changed
+        '''
+        self.assertEqual(str(mock_rating["PERCENTAGE_OF_HOUSEHOLDS"]), "1.0")
+        self.assertIsInstance(mock_rating["PERCENTAGE_OF_HOUSEHOLDS"], Decimal)
+
+    def test_negotiate_content_encoding(self):
+        """Tests choosing a compression from Accept-Encoding
+        """
+        from microlib.microlib import negotiate_content_encoding
+
+        self.assertIsNone(negotiate_content_encoding(request_headers=None))
+        self.assertIsNone(negotiate_content_encoding(request_headers={}))
+        self.assertIsNone(
+            negotiate_content_encoding(request_headers={"Accept-Encoding": "identity"})
+        )
+        self.assertIsNone(
+            negotiate_content_encoding(request_headers={"Accept-Encoding": "gzip;q=0"})
+        )
+
+        with patch("microlib.microlib.brotli", None):
+            self.assertEqual(
+                negotiate_content_encoding(
+                    request_headers={"accept-encoding": "gzip, deflate, br"}
+                ),
+                "gzip"
+            )
+            self.assertEqual(
+                negotiate_content_encoding(request_headers={"Accept-Encoding": "*"}),
+                "gzip"
+            )
+
+        with patch("microlib.microlib.brotli", MagicMock()):
+            self.assertEqual(
+                negotiate_content_encoding(
+                    request_headers={"Accept-Encoding": "gzip, deflate, br"}
+                ),
+                "br"
+            )
+            self.assertEqual(
+                negotiate_content_encoding(
+                    request_headers={"Accept-Encoding": "gzip, br;q=0"}
+                ),
+                "gzip"
+            )
+
+    @patch("microlib.microlib.brotli", None)
+    def test_lambda_proxy_response_compression(self):
+        """Tests large bodies are gzip compressed and base64 encoded
+        """
+        import base64
+        import gzip
+        from microlib.microlib import lambda_proxy_response
+
+        mock_year = [
+            {"RATINGS_OCCURRED_ON": "2016-11-05", "SHOW": "mockshow" + str(show_number)}
+            for show_number in range(200)
+        ]
+
+        compressed_response = lambda_proxy_response(
+            status_code=200,
+            headers_dict={},
+            response_body=mock_year,
+            request_headers={"Accept-Encoding": "gzip, deflate, sdch"}
+        )
+
+        self.assertTrue(compressed_response["isBase64Encoded"])
+        self.assertEqual(compressed_response["headers"]["Content-Encoding"], "gzip")
+        self.assertEqual(compressed_response["headers"]["Vary"], "Accept-Encoding")
+        self.assertEqual(
+            json.loads(gzip.decompress(base64.b64decode(compressed_response["body"]))),
+            mock_year
+        )
+
+        '''
+            small bodies and clients without gzip are not compressed
+        '''
+        for request_headers, response_body in [
+            ({"Accept-Encoding": "gzip"}, mock_year[0:1]),
+            ({"Accept-Encoding": "identity"}, mock_year)
+        ]:
+            uncompressed_response = lambda_proxy_response(
+                status_code=200,
+                headers_dict={},
+                response_body=response_body,
+                request_headers=request_headers
+            )
+            self.assertFalse(uncompressed_response["isBase64Encoded"])
+            self.assertNotIn("Content-Encoding", uncompressed_response["headers"])
+            self.assertEqual(json.loads(uncompressed_response["body"]), response_body)
+
+    def test_response_cache(self):
+        """Tests hits, misses, expirations and least recently used eviction
+        """
+        from microlib.microlib import reset_response_cache
+        from microlib.microlib import response_cache_get
+        from microlib.microlib import response_cache_key
+        from microlib.microlib import response_cache_put
+        from microlib.microlib import response_cache_stats
+
+        reset_response_cache()
+
+        year_cache_key = response_cache_key(endpoint="years", year=2014)
+        self.assertEqual(
+            year_cache_key,
+            response_cache_key(endpoint="years", year="2014", cursor=None)
+        )
+        self.assertNotEqual(
+            year_cache_key,
+            response_cache_key(endpoint="nights", year=2014)
+        )
+
+        self.assertEqual(response_cache_get(cache_key=year_cache_key), (None, None))
+        response_cache_put(
+            cache_key=year_cache_key,
+            encoded_body=b"[]",
+            ttl_seconds=60,
+            http_caching={"etag": 'W/"abc"', "max_age": 60, "last_modified": None}
+        )
+        cached_body, http_caching = response_cache_get(cache_key=year_cache_key)
+        self.assertEqual(cached_body, b"[]")
+        self.assertEqual(http_caching["etag"], 'W/"abc"')
+        self.assertLessEqual(http_caching["max_age"], 60)
+
+        with patch("microlib.microlib.time.monotonic", return_value=time.monotonic() + 61):
+            self.assertEqual(response_cache_get(cache_key=year_cache_key), (None, None))
+
+        cache_stats = response_cache_stats()
+        self.assertEqual(cache_stats["hits"], 1)
+        self.assertEqual(cache_stats["misses"], 2)
+        self.assertEqual(cache_stats["expirations"], 1)
+        self.assertEqual(cache_stats["entries"], 0)
+        self.assertEqual(cache_stats["bytes"], 0)
+
+        '''
+            the least recently used entry is evicted at the byte limit
+        '''
+        with patch.dict(os.environ, {"RESPONSE_CACHE_MAX_BYTES": "40"}):
+            for year in range(2012, 2015):
+                response_cache_put(
+                    cache_key=response_cache_key(endpoint="years", year=year),
+                    encoded_body=b"0123456789",
+                    ttl_seconds=60
+                )
+            response_cache_get(cache_key=response_cache_key(endpoint="years", year=2012))
+            response_cache_put(
+                cache_key=response_cache_key(endpoint="years", year=2015),
+                encoded_body=b"0123456789",
+                ttl_seconds=60
+            )
+            response_cache_put(
+                cache_key=response_cache_key(endpoint="years", year=2016),
+                encoded_body=b"0123456789",
+                ttl_seconds=60
+            )
+
+            self.assertIsNone(
+                response_cache_get(cache_key=response_cache_key(endpoint="years", year=2013))[0]
+            )
+            self.assertIsNotNone(
+                response_cache_get(cache_key=response_cache_key(endpoint="years", year=2012))[0]
+            )
+            cache_stats = response_cache_stats()
+            self.assertEqual(cache_stats["evictions"], 1)
+            self.assertEqual(cache_stats["bytes"], 40)
+
+            '''
+                bodies over a quarter of the cache are not stored
+            '''
+            response_cache_put(
+                cache_key=response_cache_key(endpoint="years", year=2017),
+                encoded_body=b"0" * 11,
+                ttl_seconds=60
+            )
+            self.assertEqual(response_cache_stats()["entries"], 4)
+
+        reset_response_cache()
+
+    def test_response_cache_max_bytes(self):
+        """Tests the cache limit follows the lambda memory size
+        """
+        from microlib.microlib import RESPONSE_CACHE_MAX_BYTES
+        from microlib.microlib import response_cache_max_bytes
+
+        with patch.dict(os.environ, {}, clear=True):
+            self.assertEqual(response_cache_max_bytes(), RESPONSE_CACHE_MAX_BYTES)
+
+        with patch.dict(os.environ, {"AWS_LAMBDA_FUNCTION_MEMORY_SIZE": "128"}, clear=True):
+            self.assertEqual(response_cache_max_bytes(), 8 * 1024 * 1024)
+
+        with patch.dict(os.environ, {"AWS_LAMBDA_FUNCTION_MEMORY_SIZE": "1024"}, clear=True):
+            self.assertEqual(response_cache_max_bytes(), 64 * 1024 * 1024)
+
+        with patch.dict(os.environ, {
+                "AWS_LAMBDA_FUNCTION_MEMORY_SIZE": "128",
+                "RESPONSE_CACHE_MAX_BYTES": "0"
+            }, clear=True):
+            self.assertEqual(response_cache_max_bytes(), 0)
+
+    def test_response_cache_ttl(self):
+        """Tests historical periods are cached longer than recent ones
+        """
+        from microlib.microlib import RESPONSE_CACHE_CURRENT_TTL
+        from microlib.microlib import RESPONSE_CACHE_HISTORICAL_TTL
+        from microlib.microlib import latest_ratings_night
+        from microlib.microlib import response_cache_ttl
+
+        self.assertEqual(
+            response_cache_ttl(period_end="2014-01-04"),
+            RESPONSE_CACHE_HISTORICAL_TTL
+        )
+        self.assertEqual(
+            response_cache_ttl(period_end=datetime.now().strftime("%Y-%m-%d")),
+            RESPONSE_CACHE_CURRENT_TTL
+        )
+        self.assertEqual(response_cache_ttl(), RESPONSE_CACHE_CURRENT_TTL)
+
+        self.assertEqual(
+            latest_ratings_night(television_ratings=[
+                {"RATINGS_OCCURRED_ON": "2013-04-27"},
+                {"RATINGS_OCCURRED_ON": "2014-01-04"},
+                {"RATINGS_OCCURRED_ON": "2013-05-04"}
+            ]),
+            "2014-01-04"
+        )
+        self.assertIsNone(latest_ratings_night(television_ratings=[]))
+
+    def test_http_caching_headers(self):
+        """Tests ETag, Cache-Control and Last-Modified headers
+        """
+        from microlib.microlib import http_caching_policy
+        from microlib.microlib import lambda_proxy_response
+
+        http_caching = http_caching_policy(
+            encoded_body=b'[{"YEAR":2014}]',
+            max_age=86400,
+            last_modified="2014-01-04"
+        )
+        self.assertEqual(
+            http_caching["etag"],
+            http_caching_policy(encoded_body=b'[{"YEAR":2014}]', max_age=300)["etag"]
+        )
+        self.assertTrue(http_caching["etag"].startswith('W/"'))
+
+        proxy_response = lambda_proxy_response(
+            status_code=200,
+            headers_dict={},
+            response_body=b'[{"YEAR":2014}]',
+            request_headers={},
+            http_caching=http_caching
+        )
+
+        self.assertEqual(proxy_response["statusCode"], 200)
+        self.assertEqual(proxy_response["headers"]["ETag"], http_caching["etag"])
+        self.assertEqual(proxy_response["headers"]["Cache-Control"], "public, max-age=86400")
+        self.assertEqual(
+            proxy_response["headers"]["Last-Modified"], "Sat, 04 Jan 2014 00:00:00 GMT"
+        )
+
+    def test_lambda_proxy_response_not_modified(self):
+        """Tests a 304 without a body for current conditional requests
+        """
+        from microlib.microlib import http_caching_policy
+        from microlib.microlib import lambda_proxy_response
+        from microlib.microlib import request_not_modified
+
+        http_caching = http_caching_policy(
+            encoded_body=b'[{"YEAR":2014}]',
+            max_age=300,
+            last_modified="2014-01-04"
+        )
+        current_tag = http_caching["etag"]
+
+        proxy_response = lambda_proxy_response(
+            status_code=200,
+            headers_dict={},
+            response_body=b'[{"YEAR":2014}]',
+            request_headers={"if-none-match": current_tag},
+            http_caching=http_caching
+        )
+        self.assertEqual(proxy_response["statusCode"], 304)
+        self.assertEqual(proxy_response["body"], "")
+        self.assertEqual(proxy_response["headers"]["ETag"], current_tag)
+
+        self.assertTrue(request_not_modified(
+            request_headers={"If-None-Match": '"other", ' + current_tag.replace("W/", "")},
+            http_caching=http_caching
+        ))
+        self.assertTrue(request_not_modified(
+            request_headers={"If-None-Match": "*"}, http_caching=http_caching
+        ))
+        self.assertFalse(request_not_modified(
+            request_headers={"If-None-Match": 'W/"other"'}, http_caching=http_caching
+        ))
+
+        '''
+            If-Modified-Since only counts without If-None-Match
+        '''
+        self.assertTrue(request_not_modified(
+            request_headers={"If-Modified-Since": "Sat, 04 Jan 2014 00:00:00 GMT"},
+            http_caching=http_caching
+        ))
+        self.assertFalse(request_not_modified(
+            request_headers={"If-Modified-Since": "Sat, 28 Dec 2013 00:00:00 GMT"},
+            http_caching=http_caching
+        ))
+        self.assertFalse(request_not_modified(
+            request_headers={
+                "If-Modified-Since": "Sat, 04 Jan 2014 00:00:00 GMT",
+                "If-None-Match": 'W/"other"'
+            },
+            http_caching=http_caching
+        ))
+        self.assertFalse(request_not_modified(
+            request_headers={"If-Modified-Since": "not a date"},
+            http_caching=http_caching
+        ))
+        self.assertFalse(request_not_modified(
+            request_headers=None, http_caching=http_caching
+        ))
+
+    def test_rollup_items(self):
+        """Tests ratings are grouped into night, year and show rollups
+            and the show names rollup lists every show
+        """
+        from decimal import Decimal
+        from microlib.microlib import rollup_items
+        from microlib.microlib import rollup_summary
+        from microlib.microlib import show_names_rollup
+
+        television_ratings = [
+            {
+                "RATINGS_OCCURRED_ON": "2018-12-29", "SHOW": "One Piece",
+                "YEAR": Decimal("2018"), "TOTAL_VIEWERS": Decimal("600"),
+                "TOTAL_VIEWERS_AGE_18_49": Decimal("300")
+            },
+            {
+                "RATINGS_OCCURRED_ON": "2019-01-05", "SHOW": "One Piece",
+                "YEAR": Decimal("2019"), "TOTAL_VIEWERS": Decimal("500")
+            },
+            {
+                "RATINGS_OCCURRED_ON": "2019-01-05", "SHOW": "Dr. Stone",
+                "YEAR": Decimal("2019"), "TOTAL_VIEWERS": Decimal("400")
+            },
+            {"RATINGS_OCCURRED_ON": "not a night", "SHOW": "One Piece"}
+        ]
+
+        rollups = rollup_items(television_ratings=television_ratings)
+
+        self.assertEqual(
+            sorted(rollups),
+            [
+                ("NIGHT", "2018-12-29"), ("NIGHT", "2019-01-05"),
+                ("SHOW#Dr. Stone", "2019"), ("SHOW#Dr. Stone", "ALL"),
+                ("SHOW#One Piece", "2018"), ("SHOW#One Piece", "2019"),
+                ("SHOW#One Piece", "ALL"),
+                ("YEAR", "2018"), ("YEAR", "2019")
+            ]
+        )
+        self.assertEqual(
+            rollups[("SHOW#One Piece", "ALL")],
+            {
+                "ROLLUP": "SHOW#One Piece", "PERIOD": "ALL", "RATINGS": 2,
+                "FIRST_NIGHT": "2018-12-29", "LAST_NIGHT": "2019-01-05",
+                "TOTAL_VIEWERS": {"count": 2, "sum": 1100, "min": 500, "max": 600},
+                "TOTAL_VIEWERS_AGE_18_49": {"count": 1, "sum": 300, "min": 300, "max": 300}
+            }
+        )
+
+        self.assertEqual(
+            rollup_summary(rollup_item=rollups[("YEAR", "2019")]),
+            {
+                "ratings": 2, "first_night": "2019-01-05", "last_night": "2019-01-05",
+                "TOTAL_VIEWERS": {
+                    "count": 2, "sum": 900, "mean": 450.0, "min": 400, "max": 500
+                },
+                "TOTAL_VIEWERS_AGE_18_49": {"count": 0}
+            }
+        )
+
+        self.assertEqual(
+            show_names_rollup(built_rollups=rollups),
+            {
+                "ROLLUP": "SHOW_NAMES", "PERIOD": "ALL",
+                "SHOW_NAMES": {"Dr. Stone", "One Piece"}, "LAST_NIGHT": "2019-01-05"
+            }
+        )
+        self.assertEqual(
+            show_names_rollup(built_rollups={}),
+            {"ROLLUP": "SHOW_NAMES", "PERIOD": "ALL", "LAST_NIGHT": None}
+        )
+
+    @patch("microlib.microlib.get_boto_clients")
+    def test_get_rollups(self, get_boto_clients_mock):
+        """Tests one period is a GetItem and a missing table is no rollup
+        """
+        from boto3.dynamodb.conditions import Key
+        from botocore.exceptions import ClientError
+        from microlib.microlib import get_rollups
+
+        mock_rollup_table = MagicMock()
+        mock_rollup_table.get_item.return_value = {
+            "Item": {"ROLLUP": "YEAR", "PERIOD": "2019", "RATINGS": 2}
+        }
+        mock_rollup_table.query.return_value = {
+            "Items": [{"ROLLUP": "SHOW#One Piece", "PERIOD": "ALL", "RATINGS": 2}]
+        }
+        get_boto_clients_mock.return_value = (None, mock_rollup_table)
+
+        self.assertEqual(len(get_rollups(rollup_name="YEAR", period=2019)), 1)
+        mock_rollup_table.get_item.assert_called_once_with(
+            Key={"ROLLUP": "YEAR", "PERIOD": "2019"}
+        )
+
+        self.assertEqual(len(get_rollups(rollup_name="SHOW#One Piece")), 1)
+        self.assertEqual(
+            mock_rollup_table.query.call_args[1]["KeyConditionExpression"],
+            Key("ROLLUP").eq("SHOW#One Piece")
+        )
+
+        mock_rollup_table.get_item.side_effect = ClientError(
+            {"Error": {"Code": "ResourceNotFoundException", "Message": "not found"}},
+            "GetItem"
+        )
+        self.assertEqual(get_rollups(rollup_name="YEAR", period=2019), [])
+
+    def test_query_parameter_flag(self):
+        """Tests true and false query string parameters
+        """
+        from microlib.microlib import query_parameter_flag
+
+        self.assertTrue(query_parameter_flag(
+            event={"queryStringParameters": {"summary": "True"}},
+            parameter_name="summary"
+        ))
+        self.assertFalse(query_parameter_flag(
+            event={"queryStringParameters": {"percentiles": "false"}},
+            parameter_name="percentiles", default=True
+        ))
+        self.assertTrue(query_parameter_flag(
+            event={"queryStringParameters": {"percentiles": "no"}},
+            parameter_name="percentiles", default=True
+        ))
+        self.assertFalse(query_parameter_flag(
+            event={"queryStringParameters": None}, parameter_name="summary"
+        ))
+
+    def test_rating_fields_match_openapi_spec(self):
+        """Tests RATING_FIELDS lists the televisionRating schema properties
+        """
+        import yaml
+        from microlib.microlib import RATING_FIELDS
+
+        with open("templates/openapi3_spec.yml", "r") as openapi_spec:
+            television_rating = yaml.safe_load(openapi_spec)["components"]["schemas"]["televisionRating"]
+
+        self.assertEqual(set(RATING_FIELDS), set(television_rating["properties"]))
+
+    def test_validate_fields_parameter(self):
+        """Tests fields is validated and turned into a projection
+        """
+        from microlib.microlib import fields_projection
+        from microlib.microlib import validate_fields_parameter
+
+        error_response, fields = validate_fields_parameter(
+            event={"queryStringParameters": {"fields": "TOTAL_VIEWERS, SHOW,SHOW"}}
+        )
+
+        self.assertIsNone(error_response)
+        self.assertEqual(fields, ("RATINGS_OCCURRED_ON", "SHOW", "TOTAL_VIEWERS"))
+        self.assertEqual(
+            fields_projection(fields=fields),
+            {
+                "ProjectionExpression": "#RATINGS_OCCURRED_ON, #SHOW, #TOTAL_VIEWERS",
+                "ExpressionAttributeNames": {
+                    "#RATINGS_OCCURRED_ON": "RATINGS_OCCURRED_ON",
+                    "#SHOW": "SHOW",
+                    "#TOTAL_VIEWERS": "TOTAL_VIEWERS"
+                }
+            }
+        )
+
+        error_response, fields = validate_fields_parameter(
+            event={"queryStringParameters": {"fields": "SHOW,PASSWORD"}}
+        )
+
+        self.assertEqual(error_response["status_code"], 400)
+        self.assertIn("PASSWORD", error_response["message"])
+        self.assertIsNone(fields)
+
+        for query_parameters in [None, {}, {"fields": ""}]:
+            self.assertEqual(
+                validate_fields_parameter(event={"queryStringParameters": query_parameters}),
+                (None, None)
+            )
+        self.assertEqual(fields_projection(fields=None), {})
+
+    def test_columnar_ratings(self):
+        """Tests one column per attribute with a dictionary encoded SHOW
+        """
+        from decimal import Decimal
+        from microlib.microlib import columnar_ratings
+        from microlib.microlib import encode_response_body
+
+        television_ratings = [
+            {"RATINGS_OCCURRED_ON": "2019-05-18", "SHOW": "Dr. Stone",
+                "TOTAL_VIEWERS": Decimal("512")},
+            {"RATINGS_OCCURRED_ON": "2019-05-18", "SHOW": "One Piece",
+                "IS_RERUN": True},
+            {"RATINGS_OCCURRED_ON": "2019-05-25", "SHOW": "Dr. Stone",
+                "TOTAL_VIEWERS": Decimal("530")}
+        ]
+
+        self.assertEqual(
+            columnar_ratings(television_ratings=television_ratings),
+            {
+                "rows": 3,
+                "columns": {
+                    "RATINGS_OCCURRED_ON": ["2019-05-18", "2019-05-18", "2019-05-25"],
+                    "TOTAL_VIEWERS": [Decimal("512"), None, Decimal("530")],
+                    "IS_RERUN": [None, True, None],
+                    "SHOW": {
+                        "dictionary": ["Dr. Stone", "One Piece"],
+                        "indices": [0, 1, 0]
+                    }
+                }
+            }
+        )
+        self.assertEqual(
+            columnar_ratings(television_ratings=[]),
+            {"rows": 0, "columns": {}}
+        )
+
+        '''
+            key names are no longer repeated on every row
+        '''
+        year_ratings = television_ratings * 100
+        self.assertLess(
+            len(encode_response_body(columnar_ratings(television_ratings=year_ratings))),
+            len(encode_response_body(year_ratings)) / 2
+        )
+
+    def test_validate_format_parameter(self):
+        """Tests the format query parameter and Accept header
+        """
+        from microlib.microlib import lambda_proxy_response
+        from microlib.microlib import response_format_headers
+        from microlib.microlib import validate_format_parameter
+
+        self.assertEqual(
+            validate_format_parameter(event={"queryStringParameters": {"format": "columnar"}}),
+            (None, "columnar")
+        )
+        self.assertEqual(
+            validate_format_parameter(event={
+                "queryStringParameters": None,
+                "headers": {"accept": "application/vnd.ratingsapi.columnar+json"}
+            }),
+            (None, "columnar")
+        )
+        self.assertEqual(
+            validate_format_parameter(event={
+                "queryStringParameters": {"format": "rows"},
+                "headers": {"Accept": "application/vnd.ratingsapi.columnar+json"}
+            }),
+            (None, "rows")
+        )
+        self.assertEqual(validate_format_parameter(event={}), (None, "rows"))
+
+        error_response, response_format = validate_format_parameter(
+            event={"queryStringParameters": {"format": "xml"}}
+        )
+        self.assertEqual(error_response["status_code"], 400)
+        self.assertIsNone(response_format)
+
+        proxy_response = lambda_proxy_response(
+            status_code=200,
+            headers_dict=response_format_headers(response_format="columnar"),
+            response_body={"rows": 0, "columns": {}},
+            request_headers={}
+        )
+        self.assertEqual(
+            proxy_response["headers"]["Content-Type"],
+            "application/vnd.ratingsapi.columnar+json"
+        )
+        self.assertEqual(proxy_response["headers"]["Vary"], "Accept, Accept-Encoding")
+
+    def test_ndjson_chunks(self):
+        """Tests one json line per rating grouped into chunks
+        """
+        from decimal import Decimal
+        from microlib.microlib import ndjson_chunks
+
+        television_ratings = (
+            {"SHOW": show_name, "TOTAL_VIEWERS": Decimal("500")}
+            for show_name in ["Dr. Stone", "Fire Force", "Black Clover"]
+        )
+
+        body_chunks = list(ndjson_chunks(
+            television_ratings=television_ratings, chunk_bytes=60
+        ))
+
+        self.assertEqual(body_chunks, [
+            b'{"SHOW":"Dr. Stone","TOTAL_VIEWERS":500}\n'
+            b'{"SHOW":"Fire Force","TOTAL_VIEWERS":500}\n',
+            b'{"SHOW":"Black Clover","TOTAL_VIEWERS":500}\n'
+        ])
+        self.assertEqual(list(ndjson_chunks(television_ratings=[])), [])
+
+    def test_encode_ndjson_body(self):
+        """Tests a whole ndjson body is one json line per rating
+        """
+        from decimal import Decimal
+        from microlib.microlib import encode_ndjson_body
+
+        self.assertEqual(
+            encode_ndjson_body(television_ratings=(
+                {"SHOW": show_name, "TOTAL_VIEWERS": Decimal("500")}
+                for show_name in ["Dr. Stone", "Fire Force"]
+            )),
+            b'{"SHOW":"Dr. Stone","TOTAL_VIEWERS":500}\n'
+            b'{"SHOW":"Fire Force","TOTAL_VIEWERS":500}\n'
+        )
+        self.assertEqual(encode_ndjson_body(television_ratings=[]), b"")
+
+    @patch("microlib.microlib.get_boto_clients")
+    def test_prewarm_boto_clients(self, get_boto_clients_mock):
+        """Tests clients are only prewarmed inside lambda
+        """
+        from microlib.microlib import prewarm_boto_clients
+
+        with patch.dict(os.environ, {}, clear=True):
+            self.assertFalse(prewarm_boto_clients(table_names=["mock_table"]))
+        get_boto_clients_mock.assert_not_called()
+
+        with patch.dict(os.environ, {"AWS_LAMBDA_FUNCTION_NAME": "mock-function",
+            "PREWARM_BOTO_CLIENTS": "false"}):
+            self.assertFalse(prewarm_boto_clients(table_names=["mock_table"]))
+        get_boto_clients_mock.assert_not_called()
+
+        with patch.dict(os.environ, {"AWS_LAMBDA_FUNCTION_NAME": "mock-function"}):
+            self.assertTrue(prewarm_boto_clients(
+                table_names=["mock_table", "mock_rollups"]
+            ))
+        self.assertEqual(
+            [call_args[1]["table_name"] for call_args in get_boto_clients_mock.call_args_list],
+            ["mock_table", "mock_rollups"]
+        )
+
+    @patch("builtins.print")
+    def test_request_metrics(self, print_mock):
+        """Tests one embedded metric format record per request with
+        phases, query counters and the response
+        """
+        from microlib.microlib import lambda_proxy_response
+        from microlib.microlib import metrics_phase
+        from microlib.microlib import paginated_query
+        from microlib.microlib import request_metrics
+
+        mock_dynamodb_table = MagicMock()
+        mock_dynamodb_table.query.side_effect = [
+            {"Items": [{"SHOW": "Naruto"}], "Count": 1, "ScannedCount": 2,
+                "ConsumedCapacity": {"CapacityUnits": 0.5},
+                "LastEvaluatedKey": {"SHOW": "Naruto"}},
+            {"Items": [{"SHOW": "Bleach"}], "Count": 1, "ScannedCount": 1,
+                "ConsumedCapacity": {"CapacityUnits": 0.5}}
+        ]
+
+        with patch.dict(os.environ, {"REQUEST_METRICS": "true"}):
+            with request_metrics(endpoint="mock_endpoint"):
+                with metrics_phase("validate"):
+                    pass
+                television_ratings = list(paginated_query(dynamo_table=mock_dynamodb_table))
+                proxy_response = lambda_proxy_response(status_code=200,
+                    headers_dict={}, response_body=television_ratings)
+
+        print_mock.assert_called_once()
+        metrics_record = json.loads(print_mock.call_args[0][0])
+
+        self.assertEqual(metrics_record["endpoint"], "mock_endpoint")
+        self.assertEqual(metrics_record["status_code"], 200)
+        self.assertEqual(metrics_record["pages"], 2)
+        self.assertEqual(metrics_record["items"], 2)
+        self.assertEqual(metrics_record["scanned_items"], 3)
+        self.assertEqual(metrics_record["consumed_capacity"], 1.0)
+        self.assertEqual(metrics_record["response_bytes"], len(proxy_response["body"]))
+        for phase_metric in ("duration_ms", "validate_ms", "query_ms", "serialize_ms"):
+            self.assertGreaterEqual(metrics_record[phase_metric], 0)
+
+        cloudwatch_metrics = metrics_record["_aws"]["CloudWatchMetrics"][0]
+        self.assertEqual(cloudwatch_metrics["Namespace"], "ratingsapi")
+        self.assertEqual(cloudwatch_metrics["Dimensions"], [["endpoint"]])
+        metric_units = {metric["Name"]: metric["Unit"] for metric in cloudwatch_metrics["Metrics"]}
+        self.assertEqual(metric_units["query_ms"], "Milliseconds")
+        self.assertEqual(metric_units["response_bytes"], "Bytes")
+        self.assertNotIn("status_code", metric_units)
+
+        print_mock.reset_mock()
+        with patch.dict(os.environ, {"REQUEST_METRICS": "false",
+            "AWS_LAMBDA_FUNCTION_NAME": "mock-function"}):
+            with request_metrics(endpoint="mock_endpoint"):
+                pass
+        print_mock.assert_not_called()
+
+        '''
+            without REQUEST_METRICS records are only printed inside lambda
+        '''
+        with patch.dict(os.environ, {}, clear=True):
+            with request_metrics(endpoint="mock_endpoint"):
+                pass
+        print_mock.assert_not_called()
+
+        with patch.dict(os.environ, {"AWS_LAMBDA_FUNCTION_NAME": "mock-function"}, clear=True):
+            with request_metrics(endpoint="mock_endpoint"):
+                pass
+        print_mock.assert_called_once()
+
+    def test_log_sample_rates(self):
+        """Tests LOG_SAMPLE_RATES parsing ignores invalid and WARNING levels
+        """
+        import logging
+
+        from microlib.microlib import log_sample_rates
+
+        with patch.dict(os.environ, {"LOG_SAMPLE_RATES": "info=0.25, DEBUG=0,WARNING=0,TRACE=1,INFO2=x"}):
+            self.assertEqual(log_sample_rates(), {logging.INFO: 0.25, logging.DEBUG: 0.0})
+
+        with patch.dict(os.environ, {"LOG_SAMPLE_RATES": "INFO=2"}):
+            self.assertEqual(log_sample_rates(), {logging.INFO: 1.0})
+
+    def test_configure_logging(self):
+        """Tests json lines, per request sampling and debug mode
+        """
+        import io
+        import logging
+
+        from microlib.microlib import configure_logging
+
+        log_stream = io.StringIO()
+        log_handler = logging.StreamHandler(log_stream)
+        root_logger = logging.getLogger()
+        root_level = root_logger.level
+        root_logger.addHandler(log_handler)
+        mock_context = MagicMock(aws_request_id="mock-request-id")
+
+        try:
+            with patch.dict(os.environ, {"LOG_LEVEL": "INFO", "LOG_FORMAT": "json",
+                "LOG_SAMPLE_RATES": "INFO=0.5"}):
+                with patch("microlib.microlib.random.random", return_value=0.1):
+                    configure_logging(context=mock_context)
+                logging.info("sampled - %s", "kept", extra={"ratings": 412})
+                logging.debug("sampled - below LOG_LEVEL")
+
+                with patch("microlib.microlib.random.random", return_value=0.9):
+                    configure_logging(context=mock_context)
+                logging.info("not sampled - dropped")
+                logging.warning("not sampled - warnings are kept")
+
+            with patch.dict(os.environ, {"LOG_LEVEL": "DEBUG", "LOG_FORMAT": "json",
+                "LOG_SAMPLE_RATES": "DEBUG=0,INFO=0"}):
+                configure_logging(context=None)
+                logging.debug("debug mode - kept")
+        finally:
+            root_logger.removeHandler(log_handler)
+            root_logger.setLevel(root_level)
+
+        log_lines = [json.loads(log_line) for log_line in log_stream.getvalue().splitlines()]
+
+        self.assertEqual(
+            [log_line["message"] for log_line in log_lines],
+            ["sampled - kept", "not sampled - warnings are kept", "debug mode - kept"]
+        )
+        self.assertEqual(log_lines[0]["level"], "INFO")
+        self.assertEqual(log_lines[0]["ratings"], 412)
+        self.assertEqual(log_lines[0]["request_id"], "mock-request-id")
+        self.assertEqual(log_lines[0]["function"], "test_configure_logging")
+        self.assertIsNone(log_lines[2]["request_id"])
+        self.assertEqual(len(log_handler.filters), 1)
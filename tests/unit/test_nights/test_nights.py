@@ -19,6 +19,13 @@ class NightsUnitTests(unittest.TestCase):
         with open("tests/events/nights_proxy_event.json", "r") as lambda_event:
             cls.nights_proxy_event = json.load(lambda_event)
 
+    def setUp(self):
+        """Empties the response cache shared by every endpoint
+        """
+        from microlib.microlib import reset_response_cache
+
+        reset_response_cache()
+
     def test_clean_path_parameter_string(self):
         """validates clean_night_path_parameter logic
         """
@@ -136,7 +143,8 @@ class NightsUnitTests(unittest.TestCase):
 
 
         dynamodb_night_request_mock.assert_called_once_with(
-            night=self.nights_proxy_event["pathParameters"]["night"]
+            night=self.nights_proxy_event["pathParameters"]["night"],
+            fields=None
         )
 
 
@@ -163,6 +171,124 @@ class NightsUnitTests(unittest.TestCase):
 
 
 
+    def test_validate_batch_parameters(self):
+        """Tests the comma separated nights query parameter
+        """
+        from microservices.nights.nights import MAX_BATCH_NIGHTS
+        from microservices.nights.nights import validate_batch_parameters
+
+        error_response, batch_nights = validate_batch_parameters(event={
+            "queryStringParameters": {"nights": "2020-06-20, 2020-06-27,,2020-06-20"}
+        })
+        self.assertIsNone(error_response)
+        self.assertEqual(batch_nights, ["2020-06-20", "2020-06-27"])
+
+        error_response, batch_nights = validate_batch_parameters(event={
+            "queryStringParameters": {"nights": "2020-06-20,2020-06-31"}
+        })
+        self.assertEqual(error_response["status_code"], 404)
+        self.assertIn("2020-06-31", error_response["message"])
+
+        too_many_nights = ",".join(
+            "2019-01-{day:02d}".format(day=day) for day in range(1, 29)
+        ) + "," + ",".join(
+            "2019-02-{day:02d}".format(day=day) for day in range(1, 29)
+        )
+        error_response, batch_nights = validate_batch_parameters(event={
+            "queryStringParameters": {"nights": too_many_nights}
+        })
+        self.assertGreater(len(batch_nights), MAX_BATCH_NIGHTS)
+        self.assertEqual(error_response["status_code"], 400)
+
+    @patch("microservices.nights.nights.dynamodb_night_request")
+    def test_main_batch(self, dynamodb_night_request_mock):
+        """Tests one batch request returns every night with per night 404s
+            and reuses nights already in the response cache
+        """
+        from microservices.nights.nights import main
+
+        def mock_night_request(night, fields):
+            if night == "2020-06-27":
+                return(
+                    {"message": "night: {night} not found".format(night=night)},
+                    []
+                )
+            return(
+                None,
+                [{"RATINGS_OCCURRED_ON": night, "TOTAL_VIEWERS": Decimal("512")}]
+            )
+
+        dynamodb_night_request_mock.side_effect = mock_night_request
+
+        '''
+            2020-06-20 is cached by a single night request
+        '''
+        main(event={"pathParameters": {"night": "2020-06-20"}})
+        dynamodb_night_request_mock.reset_mock()
+
+        batch_response = main(event={
+            "pathParameters": None,
+            "queryStringParameters": {"nights": "2020-06-20,2020-06-27,2020-07-04"}
+        })
+
+        self.assertEqual(batch_response["statusCode"], 200)
+        self.assertEqual(
+            json.loads(batch_response["body"]),
+            {
+                "2020-06-20": {
+                    "status": 200,
+                    "ratings": [{"RATINGS_OCCURRED_ON": "2020-06-20", "TOTAL_VIEWERS": 512}]
+                },
+                "2020-06-27": {
+                    "status": 404,
+                    "message": "night: 2020-06-27 not found"
+                },
+                "2020-07-04": {
+                    "status": 200,
+                    "ratings": [{"RATINGS_OCCURRED_ON": "2020-07-04", "TOTAL_VIEWERS": 512}]
+                }
+            }
+        )
+        self.assertEqual(
+            sorted(
+                mock_call[1]["night"]
+                for mock_call in dynamodb_night_request_mock.call_args_list
+            ),
+            ["2020-06-27", "2020-07-04"]
+        )
+        self.assertEqual(
+            batch_response["headers"]["Last-Modified"], "Sat, 04 Jul 2020 00:00:00 GMT"
+        )
+
+    @patch("microservices.nights.nights.run_concurrently_within_budget")
+    def test_main_batch_partial_failure(self, run_concurrently_within_budget_mock):
+        """Tests a failed or late night gets its own status instead of
+            failing the batch
+        """
+        from concurrent.futures import TimeoutError as FutureTimeoutError
+        from microservices.nights.nights import main
+
+        run_concurrently_within_budget_mock.return_value = [
+            (
+                (None, [{"RATINGS_OCCURRED_ON": "2021-06-05", "TOTAL_VIEWERS": Decimal("512")}]),
+                None
+            ),
+            (None, FutureTimeoutError()),
+            (None, ValueError("mock failure"))
+        ]
+
+        batch_response = main(event={
+            "pathParameters": None,
+            "queryStringParameters": {"nights": "2021-06-05,2021-06-12,2021-06-19"}
+        })
+
+        self.assertEqual(batch_response["statusCode"], 200)
+        batch_body = json.loads(batch_response["body"])
+        self.assertEqual(batch_body["2021-06-05"]["status"], 200)
+        self.assertEqual(batch_body["2021-06-12"]["status"], 504)
+        self.assertEqual(batch_body["2021-06-19"]["status"], 502)
+        self.assertNotIn("ETag", batch_response["headers"])
+
     @patch("logging.getLogger")
     @patch("microservices.nights.nights.main")
     def test_lambda_handler_event(self, main_mock, 
@@ -0,0 +1,381 @@
+from decimal import Decimal
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+import unittest
+
+
+class RollupsUnitTests(unittest.TestCase):
+    """Testing rollup maintenance logic unit tests only
+    """
+    def stream_record(self, event_name, new_image=None, old_image=None,
+        sequence_number="100"):
+        """Returns a dynamodb stream record in the wire format
+
+            Parameters
+            ----------
+            event_name : str
+                INSERT, MODIFY or REMOVE
+
+            new_image : dict
+                dynamodb json NewImage, None if missing
+
+            old_image : dict
+                dynamodb json OldImage, None if missing
+
+            sequence_number : str
+                SequenceNumber of the record
+
+            Returns
+            -------
+            stream_record : dict
+
+            Raises
+            ------
+        """
+        stream_record = {
+            "eventName": event_name,
+            "dynamodb": {"SequenceNumber": sequence_number}
+        }
+        if new_image is not None:
+            stream_record["dynamodb"]["NewImage"] = new_image
+        if old_image is not None:
+            stream_record["dynamodb"]["OldImage"] = old_image
+
+        return(stream_record)
+
+    def test_stream_rollup_changes(self):
+        """Tests both images of a stream record are used
+        """
+        from microservices.rollups.rollups import stream_rollup_changes
+
+        rollup_changes = stream_rollup_changes(stream_records=[
+            self.stream_record(
+                event_name="MODIFY",
+                new_image={
+                    "RATINGS_OCCURRED_ON": {"S": "2019-05-18"},
+                    "SHOW": {"S": "Dr. Stone"},
+                    "YEAR": {"N": "2019"},
+                    "TOTAL_VIEWERS": {"N": "512"}
+                },
+                old_image={
+                    "RATINGS_OCCURRED_ON": {"S": "2019-05-18"},
+                    "SHOW": {"S": "Dr Stone"},
+                    "YEAR": {"N": "2019"}
+                },
+                sequence_number="2100"
+            ),
+            self.stream_record(
+                event_name="MODIFY",
+                new_image={
+                    "RATINGS_OCCURRED_ON": {"S": "not a night"},
+                    "SHOW": {"S": "Dr. Stone"}
+                }
+            )
+        ])
+
+        self.assertEqual(
+            set(rollup_changes),
+            {
+                ("NIGHT", "2019-05-18"), ("YEAR", "2019"),
+                ("SHOW#Dr. Stone", "ALL"), ("SHOW#Dr. Stone", "2019"),
+                ("SHOW#Dr Stone", "ALL"), ("SHOW#Dr Stone", "2019")
+            }
+        )
+
+        '''
+            the night rollup loses the old rating and gains the new one,
+            the old show only loses it
+        '''
+        ratings_night, sequence_number, removed_rating, added_rating = (
+            rollup_changes[("NIGHT", "2019-05-18")][0]
+        )
+        self.assertEqual((ratings_night, sequence_number), ("2019-05-18", 2100))
+        self.assertEqual(removed_rating["SHOW"], "Dr Stone")
+        self.assertEqual(added_rating["TOTAL_VIEWERS"], Decimal("512"))
+
+        ratings_night, sequence_number, removed_rating, added_rating = (
+            rollup_changes[("SHOW#Dr Stone", "ALL")][0]
+        )
+        self.assertEqual(removed_rating["SHOW"], "Dr Stone")
+        self.assertIsNone(added_rating)
+
+    @patch("microservices.rollups.rollups.rebuild_rollup_item")
+    def test_changed_rollup_item(self, rebuild_rollup_item_mock):
+        """Tests changes are applied once and removing an extreme
+            rebuilds the rollup
+        """
+        from microservices.rollups.rollups import changed_rollup_item
+
+        stored_item = {
+            "ROLLUP": "YEAR", "PERIOD": "2019", "RATINGS": Decimal("2"),
+            "FIRST_NIGHT": "2019-05-11", "LAST_NIGHT": "2019-05-18",
+            "TOTAL_VIEWERS": {"count": Decimal("2"), "sum": Decimal("1100"),
+                "min": Decimal("500"), "max": Decimal("600")},
+            "TOTAL_VIEWERS_AGE_18_49": {"count": Decimal("0"), "sum": Decimal("0")},
+            "STREAM_SEQUENCES": {"2019-05-18": "300"},
+            "VERSION": Decimal("4")
+        }
+        added_rating = {"RATINGS_OCCURRED_ON": "2019-05-25", "SHOW": "Dr. Stone",
+            "YEAR": Decimal("2019"), "TOTAL_VIEWERS": Decimal("700")}
+
+        rollup_item, rollup_action = changed_rollup_item(
+            rollup_key=("YEAR", "2019"),
+            stored_item=stored_item,
+            rollup_changes=[("2019-05-25", 120, None, added_rating)]
+        )
+        self.assertEqual(rollup_action, "written")
+        self.assertEqual(rollup_item["RATINGS"], 3)
+        self.assertEqual(rollup_item["LAST_NIGHT"], "2019-05-25")
+        self.assertEqual(
+            rollup_item["TOTAL_VIEWERS"], {"count": 3, "sum": 1800, "min": 500, "max": 700}
+        )
+        self.assertEqual(
+            rollup_item["STREAM_SEQUENCES"], {"2019-05-18": "300", "2019-05-25": "120"}
+        )
+        self.assertEqual(rollup_item["VERSION"], 5)
+        self.assertEqual(stored_item["TOTAL_VIEWERS"]["count"], Decimal("2"))
+
+        '''
+            a redelivered record is skipped
+        '''
+        self.assertEqual(
+            changed_rollup_item(
+                rollup_key=("YEAR", "2019"),
+                stored_item=rollup_item,
+                rollup_changes=[("2019-05-25", 120, None, added_rating)]
+            ),
+            (None, "skipped")
+        )
+
+        '''
+            the max can not be taken back without the other ratings
+        '''
+        rebuild_rollup_item_mock.return_value = {
+            "ROLLUP": "YEAR", "PERIOD": "2019", "RATINGS": 2
+        }
+        rollup_item, rollup_action = changed_rollup_item(
+            rollup_key=("YEAR", "2019"),
+            stored_item=rollup_item,
+            rollup_changes=[("2019-05-25", 130, added_rating, None)]
+        )
+        rebuild_rollup_item_mock.assert_called_once_with(rollup_key=("YEAR", "2019"))
+        self.assertEqual(rollup_action, "written")
+        self.assertEqual(rollup_item["STREAM_SEQUENCES"]["2019-05-25"], "130")
+
+        '''
+            the last rating deletes the rollup
+        '''
+        self.assertEqual(
+            changed_rollup_item(
+                rollup_key=("NIGHT", "2019-05-25"),
+                stored_item=None,
+                rollup_changes=[
+                    ("2019-05-25", 140, None, added_rating),
+                    ("2019-05-25", 150, added_rating, None)
+                ]
+            ),
+            (None, "deleted")
+        )
+
+    @patch("microservices.rollups.rollups.get_rollup_table")
+    @patch("microservices.rollups.rollups.source_ratings")
+    def test_update_rollups(self, source_ratings_mock, get_rollup_table_mock):
+        """Tests rollups are updated from their stored items without
+            querying the ratings table and empty rollups are deleted
+        """
+        from botocore.exceptions import ClientError
+        from microservices.rollups.rollups import update_rollups
+
+        added_rating = {"RATINGS_OCCURRED_ON": "2019-05-18", "SHOW": "Dr. Stone",
+            "YEAR": Decimal("2019"), "TOTAL_VIEWERS": Decimal("512")}
+        removed_rating = dict(added_rating, SHOW="Dr Stone", TOTAL_VIEWERS=Decimal("488"))
+
+        stored_items = {
+            ("NIGHT", "2019-05-18"): {
+                "ROLLUP": "NIGHT", "PERIOD": "2019-05-18", "RATINGS": Decimal("1"),
+                "FIRST_NIGHT": "2019-05-18", "LAST_NIGHT": "2019-05-18",
+                "TOTAL_VIEWERS": {"count": Decimal("1"), "sum": Decimal("488"),
+                    "min": Decimal("488"), "max": Decimal("488")},
+                "TOTAL_VIEWERS_AGE_18_49": {"count": Decimal("0"), "sum": Decimal("0")},
+                "VERSION": Decimal("7")
+            },
+            ("SHOW#Dr Stone", "ALL"): {
+                "ROLLUP": "SHOW#Dr Stone", "PERIOD": "ALL", "RATINGS": Decimal("1"),
+                "FIRST_NIGHT": "2019-05-18", "LAST_NIGHT": "2019-05-18",
+                "TOTAL_VIEWERS": {"count": Decimal("1"), "sum": Decimal("488"),
+                    "min": Decimal("488"), "max": Decimal("488")}
+            }
+        }
+        mock_rollup_table = get_rollup_table_mock.return_value
+        mock_rollup_table.get_item.side_effect = lambda Key, ConsistentRead: {
+            "Item": stored_items.get((Key["ROLLUP"], Key["PERIOD"]))
+        }
+
+        '''
+            another batch writes the night rollup first once
+        '''
+        mock_rollup_table.put_item.side_effect = [
+            ClientError({"Error": {"Code": "ConditionalCheckFailedException"}}, "PutItem"),
+            None, None
+        ]
+
+        rollup_counts = update_rollups(rollup_changes={
+            ("NIGHT", "2019-05-18"): [("2019-05-18", 100, removed_rating, added_rating)],
+            ("SHOW#Dr. Stone", "ALL"): [("2019-05-18", 100, None, added_rating)],
+            ("SHOW#Dr Stone", "ALL"): [("2019-05-18", 100, removed_rating, None)]
+        })
+
+        self.assertEqual(rollup_counts, {"written": 2, "deleted": 1, "skipped": 0})
+        source_ratings_mock.assert_not_called()
+
+        put_calls = mock_rollup_table.put_item.call_args_list
+        self.assertEqual(len(put_calls), 3)
+        self.assertEqual(put_calls[0][1]["ConditionExpression"], "#version = :version")
+        self.assertEqual(put_calls[1][1], put_calls[0][1])
+        self.assertEqual(put_calls[1][1]["Item"]["TOTAL_VIEWERS"]["sum"], 512)
+        self.assertEqual(put_calls[1][1]["Item"]["VERSION"], 8)
+        self.assertEqual(put_calls[2][1]["ConditionExpression"], "attribute_not_exists(#rollup)")
+        self.assertEqual(put_calls[2][1]["Item"]["RATINGS"], 1)
+
+        mock_rollup_table.delete_item.assert_called_once_with(
+            Key={"ROLLUP": "SHOW#Dr Stone", "PERIOD": "ALL"},
+            ConditionExpression="attribute_exists(#rollup) AND attribute_not_exists(#version)",
+            ExpressionAttributeNames={"#rollup": "ROLLUP", "#version": "VERSION"}
+        )
+
+        '''
+            the show names rollup follows the written and deleted shows
+        '''
+        update_calls = [
+            (update_call[1]["UpdateExpression"], update_call[1]["ExpressionAttributeValues"])
+            for update_call in mock_rollup_table.update_item.call_args_list
+        ]
+        self.assertEqual(
+            update_calls,
+            [
+                ("ADD #show_names :show_names", {":show_names": {"Dr. Stone"}}),
+                ("DELETE #show_names :show_names", {":show_names": {"Dr Stone"}}),
+                ("SET #last_night = :last_night", {":last_night": "2019-05-18"})
+            ]
+        )
+
+    @patch("microservices.rollups.rollups.get_rollup_table")
+    def test_update_show_names_rollup(self, get_rollup_table_mock):
+        """Tests a missing show names rollup or earlier night is left
+            for the backfill
+        """
+        from botocore.exceptions import ClientError
+        from microservices.rollups.rollups import update_show_names_rollup
+
+        get_rollup_table_mock.return_value.update_item.side_effect = ClientError(
+            {"Error": {"Code": "ConditionalCheckFailedException"}}, "UpdateItem"
+        )
+
+        self.assertEqual(
+            update_show_names_rollup(
+                written_items={("NIGHT", "2019-05-18"): {}, ("SHOW#One Piece", "ALL"): {}},
+                deleted_keys=set()
+            ),
+            0
+        )
+        self.assertTrue(all(
+            update_call[1]["ConditionExpression"].startswith("attribute_exists(#rollup)")
+            for update_call in get_rollup_table_mock.return_value.update_item.call_args_list
+        ))
+
+        get_rollup_table_mock.return_value.update_item.side_effect = ClientError(
+            {"Error": {"Code": "ProvisionedThroughputExceededException"}}, "UpdateItem"
+        )
+        with self.assertRaises(ClientError):
+            update_show_names_rollup(
+                written_items={("SHOW#One Piece", "ALL"): {}},
+                deleted_keys=set()
+            )
+
+    @patch("microservices.rollups.rollups.get_rollup_table")
+    @patch("microservices.rollups.rollups.get_ratings_table")
+    def test_backfill_rollups(self, get_ratings_table_mock, get_rollup_table_mock):
+        """Tests the backfill scans every page and removes stale rollups
+        """
+        from microservices.rollups.rollups import backfill_rollups
+
+        get_ratings_table_mock.return_value.scan.side_effect = [
+            {
+                "Items": [{"RATINGS_OCCURRED_ON": "2019-05-18", "SHOW": "Dr. Stone",
+                    "YEAR": Decimal("2019"), "TOTAL_VIEWERS": Decimal("512")}],
+                "LastEvaluatedKey": {"RATINGS_OCCURRED_ON": "2019-05-18", "TIME": "11:00"}
+            },
+            {
+                "Items": [{"RATINGS_OCCURRED_ON": "2019-05-25", "SHOW": "Dr. Stone",
+                    "YEAR": Decimal("2019"), "TOTAL_VIEWERS": Decimal("530")}]
+            }
+        ]
+
+        mock_rollup_table = get_rollup_table_mock.return_value
+        mock_rollup_table.scan.return_value = {"Items": [
+            {"ROLLUP": "YEAR", "PERIOD": "2019",
+                "STREAM_SEQUENCES": {"2019-05-25": "900"}, "VERSION": Decimal("3")},
+            {"ROLLUP": "SHOW#Cowboy Bebop", "PERIOD": "ALL"}
+        ]}
+        mock_rollup_batch = MagicMock()
+        mock_rollup_table.batch_writer.return_value.__enter__.return_value = mock_rollup_batch
+
+        rollup_counts = backfill_rollups()
+
+        self.assertEqual(rollup_counts, {"ratings": 2, "written": 6, "deleted": 1})
+        mock_rollup_batch.put_item.assert_any_call(Item={
+            "ROLLUP": "SHOW_NAMES",
+            "PERIOD": "ALL",
+            "SHOW_NAMES": {"Dr. Stone"},
+            "LAST_NIGHT": "2019-05-25"
+        })
+        self.assertEqual(
+            get_ratings_table_mock.return_value.scan.call_args_list[1][1]["ExclusiveStartKey"],
+            {"RATINGS_OCCURRED_ON": "2019-05-18", "TIME": "11:00"}
+        )
+        mock_rollup_batch.delete_item.assert_called_once_with(
+            Key={"ROLLUP": "SHOW#Cowboy Bebop", "PERIOD": "ALL"}
+        )
+
+        '''
+            applied stream records stay applied
+        '''
+        mock_rollup_batch.put_item.assert_any_call(Item={
+            "ROLLUP": "YEAR", "PERIOD": "2019", "RATINGS": 2,
+            "FIRST_NIGHT": "2019-05-18", "LAST_NIGHT": "2019-05-25",
+            "TOTAL_VIEWERS": {"count": 2, "sum": 1042, "min": 512, "max": 530},
+            "TOTAL_VIEWERS_AGE_18_49": {"count": 0, "sum": 0},
+            "STREAM_SEQUENCES": {"2019-05-25": "900"},
+            "VERSION": 4
+        })
+
+    @patch("logging.getLogger")
+    @patch("microservices.rollups.rollups.backfill_rollups")
+    @patch("microservices.rollups.rollups.update_rollups")
+    def test_lambda_handler_event(self, update_rollups_mock,
+        backfill_rollups_mock, getLogger_mock):
+        """Tests stream events update rollups and backfill events
+            rebuild every rollup
+        """
+        from microservices.rollups.rollups import lambda_handler
+
+        lambda_handler(
+            event={"Records": [self.stream_record(
+                event_name="REMOVE",
+                old_image={"RATINGS_OCCURRED_ON": {"S": "2019-05-18"}, "YEAR": {"N": "2019"}}
+            )]},
+            context={}
+        )
+
+        removed_rating = {"RATINGS_OCCURRED_ON": "2019-05-18", "YEAR": Decimal("2019")}
+        update_rollups_mock.assert_called_once_with(rollup_changes={
+            ("NIGHT", "2019-05-18"): [("2019-05-18", 100, removed_rating, None)],
+            ("YEAR", "2019"): [("2019-05-18", 100, removed_rating, None)]
+        })
+        backfill_rollups_mock.assert_not_called()
+
+        lambda_handler(event={"backfill": True}, context={})
+
+        backfill_rollups_mock.assert_called_once()
+        update_rollups_mock.assert_called_once()
@@ -0,0 +1,174 @@
+from decimal import Decimal
+from unittest.mock import patch
+
+import json
+import unittest
+
+
+class RouterUnitTests(unittest.TestCase):
+    """Testing router endpoint logic unit tests only
+    """
+    @classmethod
+    def setUpClass(cls):
+        """Unitest function that is run once for the class
+        """
+        cls.proxy_events = {}
+        for event_name in ["aggregations", "nights", "search", "show_names",
+            "shows", "years"]:
+            with open("tests/events/" + event_name + "_proxy_event.json", "r") as lambda_event:
+                cls.proxy_events[event_name] = json.load(lambda_event)
+
+    def setUp(self):
+        """Empties the response cache shared by every endpoint
+        """
+        from microlib.microlib import reset_response_cache
+
+        reset_response_cache()
+
+    def test_endpoint_name(self):
+        """Tests every sample event is routed by its resource
+        """
+        from microservices.router.router import ENDPOINT_MODULES
+        from microservices.router.router import endpoint_name
+
+        for event_name, proxy_event in self.proxy_events.items():
+            self.assertEqual(
+                ENDPOINT_MODULES[endpoint_name(event=proxy_event)],
+                "microservices.{event_name}.{event_name}".format(event_name=event_name)
+            )
+
+        self.assertEqual(endpoint_name(event={"path": "/years/2014"}), "years")
+        self.assertEqual(endpoint_name(event={}), "")
+
+    @patch("microservices.shows.shows.main")
+    @patch("microservices.years.years.main")
+    def test_main(self, years_main_mock, shows_main_mock):
+        """Tests main calls the main function of the endpoint
+        """
+        from microservices.router.router import main
+
+        years_main_mock.return_value = {"statusCode": 200}
+
+        self.assertEqual(main(event=self.proxy_events["years"]), {"statusCode": 200})
+
+        years_main_mock.assert_called_once_with(event=self.proxy_events["years"])
+        shows_main_mock.assert_not_called()
+
+        unknown_response = main(event={"resource": "/times/{time}"})
+        self.assertEqual(unknown_response["statusCode"], 404)
+
+    @patch("microservices.years.years.dynamodb_year_request")
+    def test_main_shared_response_cache(self, dynamodb_year_request_mock):
+        """Tests routed requests use the same response cache as the
+            endpoint module
+        """
+        from microlib.microlib import response_cache_stats
+        from microservices.router.router import main
+        from microservices.years import years
+
+        dynamodb_year_request_mock.return_value = (
+            None, [{"YEAR": Decimal("2014"), "RATINGS_OCCURRED_ON": "2014-01-04"}]
+        )
+
+        routed_response = main(event=self.proxy_events["years"])
+        direct_response = years.main(event=self.proxy_events["years"])
+
+        self.assertEqual(routed_response["body"], direct_response["body"])
+        dynamodb_year_request_mock.assert_called_once()
+        self.assertEqual(response_cache_stats()["hits"], 1)
+
+    @patch("microservices.router.router.prewarm_boto_clients")
+    def test_prewarm_endpoints(self, prewarm_boto_clients_mock):
+        """Tests endpoint modules are only imported early inside lambda
+        """
+        from microservices.router import router
+
+        with patch.object(router.importlib, "import_module") as import_module_mock:
+            prewarm_boto_clients_mock.return_value = False
+            self.assertFalse(router.prewarm_endpoints())
+            import_module_mock.assert_not_called()
+
+            prewarm_boto_clients_mock.return_value = True
+            self.assertTrue(router.prewarm_endpoints())
+
+        self.assertEqual(
+            [call_args[0][0] for call_args in import_module_mock.call_args_list],
+            list(router.ENDPOINT_MODULES.values())
+        )
+
+    @patch("logging.getLogger")
+    @patch("microservices.router.router.main")
+    def test_lambda_handler_event(self, main_mock,
+        getLogger_mock):
+        """Tests passing sample event to lambda_handler
+        """
+        from microservices.router.router import lambda_handler
+
+        lambda_handler(
+            event=self.proxy_events["search"],
+            context={}
+        )
+
+        self.assertEqual(
+            getLogger_mock.call_count,
+            1
+        )
+
+        main_mock.assert_called_once_with(
+            event=self.proxy_events["search"]
+        )
+
+    def test_router_template_covers_endpoints(self):
+        """Tests the router lambda has the environment, permissions and
+            timeout of every endpoint lambda it replaces
+        """
+        import yaml
+        from fnmatch import fnmatch
+        from microservices.router.router import ENDPOINT_MODULES
+
+        class TemplateLoader(yaml.SafeLoader):
+            """Reads cloudformation tags such as !Sub as their value
+            """
+
+        def construct_tag(template_loader, tag_suffix, template_node):
+            if isinstance(template_node, yaml.ScalarNode):
+                return(template_loader.construct_scalar(template_node))
+            if isinstance(template_node, yaml.SequenceNode):
+                return(template_loader.construct_sequence(template_node))
+            return(template_loader.construct_mapping(template_node))
+
+        TemplateLoader.add_multi_constructor("!", construct_tag)
+
+        with open("templates/api_s3_bucket.yml", "r") as sam_template:
+            template_resources = yaml.load(sam_template, Loader=TemplateLoader)["Resources"]
+
+        def function_grants(function_properties):
+            return({
+                (policy_action, str(policy_resource).strip())
+                for policy_statement in function_properties["Policies"]["Statement"]
+                for policy_action in policy_statement["Action"]
+                for policy_resource in policy_statement["Resource"]
+            })
+
+        router_properties = template_resources["routerEndpoint"]["Properties"]
+        router_grants = function_grants(function_properties=router_properties)
+
+        for endpoint in ENDPOINT_MODULES:
+            with self.subTest(endpoint=endpoint):
+                endpoint_properties = template_resources[endpoint + "Endpoint"]["Properties"]
+
+                self.assertLessEqual(
+                    set(endpoint_properties["Environment"]["Variables"]),
+                    set(router_properties["Environment"]["Variables"])
+                )
+                self.assertLessEqual(endpoint_properties["Timeout"], router_properties["Timeout"])
+
+                for policy_action, policy_resource in function_grants(
+                    function_properties=endpoint_properties):
+                    self.assertTrue(
+                        any(
+                            router_action == policy_action and fnmatch(policy_resource, router_resource)
+                            for router_action, router_resource in router_grants
+                        ),
+                        policy_action + " on " + policy_resource
+                    )
@@ -20,6 +20,13 @@ class SearchUnitTests(unittest.TestCase):
         with open("tests/events/search_proxy_event.json", "r") as lambda_event:
             cls.search_proxy_event = json.load(lambda_event)
 
+    def setUp(self):
+        """Empties the response cache shared by every endpoint
+        """
+        from microlib.microlib import reset_response_cache
+
+        reset_response_cache()
+
     def test_clean_query_parameter_string(self):
         """validates clean_night_path_parameter logic
         """
@@ -367,9 +374,122 @@ class SearchUnitTests(unittest.TestCase):
 
         mock_dynamodb_resource.query.assert_called_once_with(
             IndexName="YEAR_ACCESS",
-            KeyConditionExpression=Key("YEAR").eq(int(mock_year))
+            KeyConditionExpression=Key("YEAR").eq(int(mock_year)),
+            ReturnConsumedCapacity="TOTAL"
+        )
+
+    @patch("microservices.search.search.get_boto_clients")
+    def test_dynamodb_year_request_date_index(self, get_boto_clients_mock):
+        """tests the date window is part of the key condition when an index
+            sorted by RATINGS_OCCURRED_ON exists
+        """
+        from microlib.microlib import reset_boto_clients
+        from microservices.search.search import dynamodb_year_request
+        from boto3.dynamodb.conditions import Key
+
+        reset_boto_clients()
+        mock_dynamodb_resource = MagicMock()
+        mock_dynamodb_resource.global_secondary_indexes = [
+            {
+                "IndexName": "YEAR_ACCESS",
+                "KeySchema": [
+                    {"AttributeName": "YEAR", "KeyType": "HASH"}
+                ]
+            },
+            {
+                "IndexName": "YEAR_DATE_ACCESS",
+                "KeySchema": [
+                    {"AttributeName": "YEAR", "KeyType": "HASH"},
+                    {"AttributeName": "RATINGS_OCCURRED_ON", "KeyType": "RANGE"}
+                ]
+            }
+        ]
+        mock_dynamodb_resource.query.return_value = {
+            "Items": [],
+            "Count": 0,
+            "ScannedCount": 0,
+            "ResponseMetadata": {}
+        }
+        get_boto_clients_mock.return_value = (None, mock_dynamodb_resource)
+
+        error_message, television_ratings = dynamodb_year_request(
+            year=2019,
+            start_date=datetime(2019, 12, 14),
+            end_date=datetime(2019, 12, 21)
+        )
+
+        mock_dynamodb_resource.query.assert_called_once_with(
+            IndexName="YEAR_DATE_ACCESS",
+            KeyConditionExpression=Key("YEAR").eq(2019) & Key(
+                "RATINGS_OCCURRED_ON").between("2019-12-14", "2019-12-21"),
+            ReturnConsumedCapacity="TOTAL"
+        )
+        '''
+            an empty week is a 404 like on the filter path
+        '''
+        self.assertEqual(error_message, {"message": "year: 2019 not found"})
+        self.assertEqual(television_ratings, [])
+        reset_boto_clients()
+
+    @patch("microservices.search.search.get_boto_clients")
+    def test_dynamodb_year_request_filter_fallback(self, get_boto_clients_mock):
+        """tests the year is filtered when there is no date sorted index
+        """
+        from microservices.search.search import dynamodb_year_request
+
+        mock_dynamodb_resource = MagicMock()
+        mock_dynamodb_resource.query.return_value = {
+            "Items": [
+                {"YEAR": Decimal("2019"), "SHOW": "Dr. Stone", "RATINGS_OCCURRED_ON": "2019-12-07"},
+                {"YEAR": Decimal("2019"), "SHOW": "Dr. Stone", "RATINGS_OCCURRED_ON": "2019-12-14"},
+                {"YEAR": Decimal("2019"), "SHOW": "Dr. Stone", "RATINGS_OCCURRED_ON": "2019-12-21"},
+                {"YEAR": Decimal("2019"), "SHOW": "Dr. Stone", "RATINGS_OCCURRED_ON": "2019-12-28"}
+            ],
+            "Count": 4,
+            "ScannedCount": 4,
+            "ResponseMetadata": {}
+        }
+        get_boto_clients_mock.return_value = (None, mock_dynamodb_resource)
+
+        error_message, television_ratings = dynamodb_year_request(
+            year=2019,
+            start_date=datetime(2019, 12, 14),
+            end_date=datetime(2019, 12, 21)
+        )
+
+        self.assertIsNone(error_message)
+        self.assertEqual(
+            [individual_show["RATINGS_OCCURRED_ON"] for individual_show in television_ratings],
+            ["2019-12-14", "2019-12-21"]
         )
 
+    @patch("microservices.search.search.get_boto_clients")
+    def test_dynamodb_year_request_filter_fallback_404(self, get_boto_clients_mock):
+        """tests an empty date window is a 404 when the year is filtered
+        """
+        from microservices.search.search import dynamodb_year_request
+
+        mock_dynamodb_resource = MagicMock()
+        mock_dynamodb_resource.query.return_value = {
+            "Items": [
+                {"YEAR": Decimal("2019"), "SHOW": "Dr. Stone", "RATINGS_OCCURRED_ON": "2019-12-07"},
+                {"YEAR": Decimal("2019"), "SHOW": "Dr. Stone", "RATINGS_OCCURRED_ON": "2019-12-28"}
+            ],
+            "Count": 2,
+            "ScannedCount": 2,
+            "ResponseMetadata": {}
+        }
+        get_boto_clients_mock.return_value = (None, mock_dynamodb_resource)
+
+        error_message, television_ratings = dynamodb_year_request(
+            year=2019,
+            start_date=datetime(2019, 12, 14),
+            end_date=datetime(2019, 12, 21)
+        )
+
+        self.assertEqual(error_message, {"message": "year: 2019 not found"})
+        self.assertEqual(television_ratings, [])
+
     @patch("microservices.search.search.get_boto_clients")
     def test_dynamodb_year_request_404(self, get_boto_clients_mock):
         """tests dynamodb_year_request for no year match http 404
@@ -404,34 +524,29 @@ class SearchUnitTests(unittest.TestCase):
         )
         self.assertEqual(television_ratings, [])
 
-    @patch("microservices.search.search.filter_ratings")
     @patch("microservices.search.search.dynamodb_year_request")
-    def test_main_success(self, dynamodb_year_request_mock, filter_ratings_mock):
+    def test_main_success(self, dynamodb_year_request_mock):
         """Tests main function for a successful request
         """
         from microservices.search.search import main
 
         dynamodb_year_request_mock.return_value = (None, [])
 
-        filter_ratings_mock.return_value = []
-
         main_success_response = main(
             event=self.search_proxy_event
         )
 
 
         dynamodb_year_request_mock.assert_called_once_with(
-            year=int(self.search_proxy_event["queryStringParameters"]["startDate"][0:4])
-        )
-
-        filter_ratings_mock.assert_called_once_with(
-            ratings_query_response=[],
+            year=int(self.search_proxy_event["queryStringParameters"]["startDate"][0:4]),
             start_date=datetime.strptime(
                 self.search_proxy_event["queryStringParameters"]["startDate"], "%Y-%m-%d"
             ),
             end_date=datetime.strptime(
                 self.search_proxy_event["queryStringParameters"]["endDate"], "%Y-%m-%d"
             ),
+            fields=None,
+            query_stats={}
         )
 
         self.assertEqual(
@@ -442,6 +557,689 @@ class SearchUnitTests(unittest.TestCase):
             }
         )
 
+    @patch("microservices.search.search.dynamodb_year_request")
+    def test_main_truncated(self, dynamodb_year_request_mock):
+        """Tests a year cut off by the query budget is flagged and
+            queried again instead of served from the response cache
+        """
+        from microservices.search.search import main
+
+        def mock_year_request(year, start_date, end_date, fields, query_stats):
+            query_stats["truncated"] = True
+            return(None, [{"RATINGS_OCCURRED_ON": "2020-01-04"}])
+
+        dynamodb_year_request_mock.side_effect = mock_year_request
+
+        first_response = main(event=self.search_proxy_event)
+        second_response = main(event=self.search_proxy_event)
+
+        self.assertEqual(dynamodb_year_request_mock.call_count, 2)
+        self.assertEqual(
+            json.loads(second_response["body"])["ratings"],
+            [{"RATINGS_OCCURRED_ON": "2020-01-04"}]
+        )
+        self.assertEqual(first_response["headers"]["X-Results-Truncated"], "true")
+        self.assertEqual(first_response["headers"]["Cache-Control"], "no-store")
+        self.assertNotIn("ETag", first_response["headers"])
+
+    def test_full_range_requested(self):
+        """Tests the fullRange query parameter is opt in
+        """
+        from microservices.search.search import full_range_requested
+
+        self.assertFalse(full_range_requested(event=self.search_proxy_event))
+        self.assertFalse(full_range_requested(event={}))
+        self.assertFalse(full_range_requested(event={"queryStringParameters": None}))
+
+        full_range_request = deepcopy(self.search_proxy_event)
+        full_range_request["queryStringParameters"]["fullRange"] = "True"
+        self.assertTrue(full_range_requested(event=full_range_request))
+
+    @patch("microservices.search.search.dynamodb_year_request")
+    def test_dynamodb_range_request(self, dynamodb_year_request_mock):
+        """Tests every year is queried and merged in date order
+        """
+        from microservices.search.search import dynamodb_range_request
+
+        mock_year_ratings = {
+            2017: [
+                {"RATINGS_OCCURRED_ON": "2017-05-27"},
+                {"RATINGS_OCCURRED_ON": "2017-05-20"}
+            ],
+            2018: [],
+            2019: [
+                {"RATINGS_OCCURRED_ON": "2019-01-05"}
+            ]
+        }
+
+        def mock_year_request(year, start_date, end_date, fields, query_stats):
+            if year == 2018:
+                return({"message": "year: 2018 not found"}, [])
+            query_stats["truncated"] = year == 2019
+            return(None, mock_year_ratings[year])
+
+        dynamodb_year_request_mock.side_effect = mock_year_request
+
+        query_stats = {}
+        error_message, range_ratings, next_url = dynamodb_range_request(
+            start_date=datetime(2017, 5, 20),
+            end_date=datetime(2019, 1, 5),
+            query_stats=query_stats
+        )
+
+        self.assertIsNone(error_message)
+        self.assertIsNone(next_url)
+        self.assertTrue(query_stats["truncated"])
+        self.assertEqual(
+            [individual_ratings["RATINGS_OCCURRED_ON"] for individual_ratings in range_ratings],
+            ["2017-05-20", "2017-05-27", "2019-01-05"]
+        )
+
+        dynamodb_year_request_mock.assert_any_call(
+            year=2017,
+            start_date=datetime(2017, 5, 20),
+            end_date=datetime(2017, 12, 31),
+            fields=None,
+            query_stats={"truncated": False}
+        )
+        dynamodb_year_request_mock.assert_any_call(
+            year=2019,
+            start_date=datetime(2019, 1, 1),
+            end_date=datetime(2019, 1, 5),
+            fields=None,
+            query_stats={"truncated": True}
+        )
+        self.assertEqual(dynamodb_year_request_mock.call_count, 3)
+
+        '''
+            the size cap leaves the later years for the next url, the
+            truncated year is not returned
+        '''
+        error_message, range_ratings, next_url = dynamodb_range_request(
+            start_date=datetime(2017, 5, 20),
+            end_date=datetime(2019, 1, 5),
+            max_response_bytes=1,
+            query_stats=query_stats
+        )
+        self.assertEqual(len(range_ratings), 2)
+        self.assertFalse(query_stats["truncated"])
+        self.assertEqual(
+            next_url,
+            "/search?startDate=2019-01-01&endDate=2019-01-05&fullRange=true"
+        )
+
+    @patch("microservices.search.search.dynamodb_year_request")
+    def test_dynamodb_range_request_404(self, dynamodb_year_request_mock):
+        """Tests a 404 is returned when no year in the range is found
+        """
+        from microservices.search.search import dynamodb_range_request
+
+        dynamodb_year_request_mock.return_value = ({"message": "year: 2010 not found"}, [])
+
+        error_message, range_ratings, next_url = dynamodb_range_request(
+            start_date=datetime(2010, 1, 1),
+            end_date=datetime(2011, 1, 1)
+        )
+
+        self.assertEqual(error_message, {"message": "year: 2010 not found"})
+        self.assertEqual(range_ratings, [])
+
+    @patch("microservices.search.search.dynamodb_range_request")
+    def test_main_full_range(self, dynamodb_range_request_mock):
+        """Tests main uses the concurrent range request for fullRange
+        """
+        from microservices.search.search import main
+
+        dynamodb_range_request_mock.return_value = (
+            None, [{"RATINGS_OCCURRED_ON": "2020-01-04"}], None
+        )
+        full_range_request = deepcopy(self.search_proxy_event)
+        full_range_request["queryStringParameters"]["fullRange"] = "true"
+
+        main_success_response = main(event=full_range_request)
+
+        dynamodb_range_request_mock.assert_called_once_with(
+            start_date=datetime(2020, 1, 1),
+            end_date=datetime(2020, 2, 1),
+            fields=None,
+            query_stats={}
+        )
+        self.assertEqual(
+            json.loads(main_success_response["body"]),
+            {
+                "ratings": [{"RATINGS_OCCURRED_ON": "2020-01-04"}],
+                "next": None
+            }
+        )
+
+    @patch("microservices.search.search.dynamodb_range_request")
+    def test_main_fields(self, dynamodb_range_request_mock):
+        """Tests fields is passed to the query and kept in the next url
+        """
+        from microservices.search.search import main
+
+        dynamodb_range_request_mock.return_value = (
+            None,
+            [{"RATINGS_OCCURRED_ON": "2020-01-04", "TOTAL_VIEWERS": Decimal("512")}],
+            "/search?startDate=2020-01-11&endDate=2020-02-01&fullRange=true"
+        )
+        fields_request = deepcopy(self.search_proxy_event)
+        fields_request["queryStringParameters"]["fullRange"] = "true"
+        fields_request["queryStringParameters"]["fields"] = "TOTAL_VIEWERS"
+
+        main_success_response = main(event=fields_request)
+
+        dynamodb_range_request_mock.assert_called_once_with(
+            start_date=datetime(2020, 1, 1),
+            end_date=datetime(2020, 2, 1),
+            fields=("RATINGS_OCCURRED_ON", "TOTAL_VIEWERS"),
+            query_stats={}
+        )
+        self.assertEqual(
+            json.loads(main_success_response["body"])["next"],
+            "/search?startDate=2020-01-11&endDate=2020-02-01&fullRange=true"
+            "&fields=RATINGS_OCCURRED_ON,TOTAL_VIEWERS"
+        )
+
+    @patch("microservices.search.search.dynamodb_range_request")
+    def test_main_columnar_next(self, dynamodb_range_request_mock):
+        """Tests the next url of a columnar page asks for columnar,
+            including when the Accept header chose the format
+        """
+        from microservices.search.search import main
+
+        dynamodb_range_request_mock.return_value = (
+            None,
+            [{"RATINGS_OCCURRED_ON": "2020-01-04", "TOTAL_VIEWERS": Decimal("512")}],
+            "/search?startDate=2020-01-11&endDate=2020-02-01&fullRange=true"
+        )
+        columnar_request = deepcopy(self.search_proxy_event)
+        columnar_request["queryStringParameters"]["fullRange"] = "true"
+        columnar_request["queryStringParameters"]["format"] = "columnar"
+        columnar_request["queryStringParameters"]["fields"] = "TOTAL_VIEWERS"
+
+        columnar_body = json.loads(main(event=columnar_request)["body"])
+
+        self.assertEqual(columnar_body["ratings"]["rows"], 1)
+        self.assertEqual(
+            columnar_body["next"],
+            "/search?startDate=2020-01-11&endDate=2020-02-01&fullRange=true"
+            "&format=columnar&fields=RATINGS_OCCURRED_ON,TOTAL_VIEWERS"
+        )
+
+        accept_request = deepcopy(self.search_proxy_event)
+        accept_request["queryStringParameters"]["fullRange"] = "true"
+        accept_request["headers"] = {"Accept": "application/vnd.ratingsapi.columnar+json"}
+
+        accept_body = json.loads(main(event=accept_request)["body"])
+
+        self.assertEqual(
+            accept_body["next"],
+            "/search?startDate=2020-01-11&endDate=2020-02-01&fullRange=true&format=columnar"
+        )
+
+    def test_export_ratings(self):
+        """Tests arrow and parquet exports keep typed columns
+        """
+        from microservices.search.search import PYARROW_AVAILABLE
+        from microservices.search.search import export_ratings
+
+        if PYARROW_AVAILABLE is False:
+            self.skipTest("pyarrow is not installed")
+
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+
+        television_ratings = [
+            {"RATINGS_OCCURRED_ON": "2019-12-28", "SHOW": "Dr. Stone",
+                "TOTAL_VIEWERS": Decimal("312"), "YEAR": Decimal("2019"),
+                "PERCENTAGE_OF_HOUSEHOLDS_AGE_18_49": Decimal("0.12")},
+            {"RATINGS_OCCURRED_ON": "2020-01-04", "SHOW": "Dr. Stone",
+                "YEAR": Decimal("2020"), "IS_RERUN": True},
+            {"RATINGS_OCCURRED_ON": "2020-01-04", "SHOW": "Fire Force",
+                "TOTAL_VIEWERS": Decimal("301"), "YEAR": Decimal("2020")}
+        ]
+
+        arrow_table = pyarrow.ipc.open_stream(export_ratings(
+            television_ratings=television_ratings,
+            export_format="arrow"
+        )).read_all()
+
+        self.assertEqual(arrow_table.num_rows, 3)
+        self.assertEqual(arrow_table.schema.field("TOTAL_VIEWERS").type, pyarrow.int64())
+        self.assertEqual(arrow_table.schema.field("RATINGS_OCCURRED_ON").type, pyarrow.date32())
+        self.assertEqual(
+            arrow_table.column("TOTAL_VIEWERS").to_pylist(), [312, None, 301]
+        )
+        self.assertEqual(
+            arrow_table.column("SHOW").to_pylist(), ["Dr. Stone", "Dr. Stone", "Fire Force"]
+        )
+        self.assertEqual(arrow_table.column("TIME").null_count, 3)
+
+        '''
+            one row group per year
+        '''
+        parquet_file = pyarrow.parquet.ParquetFile(pyarrow.BufferReader(export_ratings(
+            television_ratings=television_ratings,
+            export_format="parquet",
+            fields=("RATINGS_OCCURRED_ON", "TOTAL_VIEWERS")
+        )))
+
+        self.assertEqual(parquet_file.metadata.num_row_groups, 2)
+        self.assertEqual(
+            parquet_file.schema_arrow.names, ["RATINGS_OCCURRED_ON", "TOTAL_VIEWERS"]
+        )
+
+    @patch("microservices.search.search.stage_export")
+    @patch("microservices.search.search.export_ratings")
+    @patch("microservices.search.search.stream_search_ratings")
+    def test_main_export(self, stream_search_ratings_mock, export_ratings_mock,
+        stage_export_mock):
+        """Tests exports are streamed to the writer and returned base64
+            encoded or staged in s3 when they are too large
+        """
+        import base64
+        from microservices.search.search import main
+
+        mock_ratings = iter([{"RATINGS_OCCURRED_ON": "2020-01-04"}])
+
+        def mock_stream_search_ratings(stream_stats, **kwargs):
+            stream_stats.update({
+                "ratings": 1,
+                "bytes": 64,
+                "last_night": "2020-01-04",
+                "next_url": None,
+                "truncated": False
+            })
+            return(mock_ratings)
+
+        stream_search_ratings_mock.side_effect = mock_stream_search_ratings
+        export_ratings_mock.return_value = b"ARROW\xff\x00"
+        export_request = deepcopy(self.search_proxy_event)
+        export_request["queryStringParameters"]["export"] = "arrow"
+
+        with patch("microservices.search.search.PYARROW_AVAILABLE", True):
+            main_success_response = main(event=export_request)
+
+        self.assertEqual(main_success_response["statusCode"], 200)
+        self.assertTrue(main_success_response["isBase64Encoded"])
+        self.assertEqual(
+            base64.b64decode(main_success_response["body"]), b"ARROW\xff\x00"
+        )
+        self.assertEqual(
+            main_success_response["headers"]["Content-Type"],
+            "application/vnd.apache.arrow.stream"
+        )
+        self.assertEqual(
+            main_success_response["headers"]["Last-Modified"], "Sat, 04 Jan 2020 00:00:00 GMT"
+        )
+        stream_search_ratings_mock.assert_called_once_with(
+            start_date=datetime(2020, 1, 1),
+            end_date=datetime(2020, 2, 1),
+            fields=None,
+            max_response_bytes=float("inf"),
+            stream_stats=stream_search_ratings_mock.call_args[1]["stream_stats"]
+        )
+        '''
+            the generator is handed to the writer, not materialized
+        '''
+        self.assertIs(export_ratings_mock.call_args[1]["television_ratings"], mock_ratings)
+        stage_export_mock.assert_not_called()
+
+        stage_export_mock.return_value = "https://mock-bucket.s3.amazonaws.com/exports/mock.arrow"
+        with patch("microservices.search.search.PYARROW_AVAILABLE", True), \
+            patch.dict(os.environ, {"EXPORT_MAX_INLINE_BYTES": "4"}):
+            main_staged_response = main(event=export_request)
+
+        self.assertEqual(main_staged_response["statusCode"], 303)
+        self.assertEqual(
+            main_staged_response["headers"]["Location"],
+            "https://mock-bucket.s3.amazonaws.com/exports/mock.arrow"
+        )
+        stage_export_mock.assert_called_once_with(
+            export_bytes=b"ARROW\xff\x00", export_format="arrow"
+        )
+
+        stream_search_ratings_mock.side_effect = lambda stream_stats, **kwargs: (
+            stream_stats.update({"ratings": 0, "last_night": None, "truncated": False})
+        )
+        with patch("microservices.search.search.PYARROW_AVAILABLE", True):
+            self.assertEqual(main(event=export_request)["statusCode"], 404)
+
+        with patch("microservices.search.search.PYARROW_AVAILABLE", False):
+            self.assertEqual(main(event=export_request)["statusCode"], 501)
+
+        export_request["queryStringParameters"]["export"] = "csv"
+        self.assertEqual(main(event=export_request)["statusCode"], 400)
+
+    @patch("microservices.search.search.get_boto_clients")
+    def test_stage_export(self, get_boto_clients_mock):
+        """Tests exports are uploaded under a content hash and presigned
+        """
+        import hashlib
+        from microservices.search.search import stage_export
+
+        with patch.dict(os.environ, {}, clear=True):
+            self.assertIsNone(stage_export(export_bytes=b"PAR1", export_format="parquet"))
+        get_boto_clients_mock.assert_not_called()
+
+        mock_s3_client = MagicMock()
+        mock_s3_client.generate_presigned_url.return_value = "https://mock-presigned-url"
+        get_boto_clients_mock.return_value = mock_s3_client
+        export_key = "exports/" + hashlib.sha256(b"PAR1").hexdigest() + ".parquet"
+
+        with patch.dict(os.environ, {"EXPORT_BUCKET_NAME": "mock-bucket"}):
+            export_url = stage_export(export_bytes=b"PAR1", export_format="parquet")
+
+        self.assertEqual(export_url, "https://mock-presigned-url")
+        mock_s3_client.put_object.assert_called_once_with(
+            Bucket="mock-bucket",
+            Key=export_key,
+            Body=b"PAR1",
+            ContentType="application/vnd.apache.parquet"
+        )
+        mock_s3_client.generate_presigned_url.assert_called_once_with(
+            "get_object",
+            Params={"Bucket": "mock-bucket", "Key": export_key},
+            ExpiresIn=900
+        )
+
+    @patch.dict(os.environ, {"DYNAMO_QUERY_MAX_PAGES": "1"})
+    @patch("microlib.microlib.NDJSON_CHUNK_BYTES", 1)
+    @patch("microservices.search.search.get_boto_clients")
+    def test_stream_main(self, get_boto_clients_mock):
+        """Tests the first ndjson chunk is ready before the later
+            dynamodb pages are queried, and the query budget does not
+            cut a streamed year short
+        """
+        from microlib.microlib import reset_boto_clients
+        from microservices.search.search import stream_main
+
+        reset_boto_clients()
+        mock_dynamodb_resource = MagicMock()
+        mock_dynamodb_resource.global_secondary_indexes = [
+            {
+                "IndexName": "YEAR_DATE_ACCESS",
+                "KeySchema": [
+                    {"AttributeName": "YEAR", "KeyType": "HASH"},
+                    {"AttributeName": "RATINGS_OCCURRED_ON", "KeyType": "RANGE"}
+                ]
+            }
+        ]
+        mock_dynamodb_resource.query.side_effect = [
+            {
+                "Items": [{"RATINGS_OCCURRED_ON": "2019-12-21", "SHOW": "Dr. Stone"}],
+                "LastEvaluatedKey": {"RATINGS_OCCURRED_ON": "2019-12-21"}
+            },
+            {"Items": [{"RATINGS_OCCURRED_ON": "2019-12-28", "SHOW": "Dr. Stone"}]},
+            {"Items": [{"RATINGS_OCCURRED_ON": "2020-01-04", "SHOW": "Fire Force"}]}
+        ]
+        get_boto_clients_mock.return_value = (None, mock_dynamodb_resource)
+
+        stream_event = deepcopy(self.search_proxy_event)
+        stream_event["queryStringParameters"] = {
+            "startDate": "2019-12-01", "endDate": "2020-01-31"
+        }
+        status_code, headers_dict, body_chunks = stream_main(event=stream_event)
+
+        self.assertEqual(status_code, 200)
+        self.assertEqual(headers_dict["Content-Type"], "application/x-ndjson")
+        self.assertEqual(
+            json.loads(next(body_chunks)),
+            {"RATINGS_OCCURRED_ON": "2019-12-21", "SHOW": "Dr. Stone"}
+        )
+        self.assertEqual(mock_dynamodb_resource.query.call_count, 1)
+
+        self.assertEqual(
+            [json.loads(ndjson_chunk)["RATINGS_OCCURRED_ON"] for ndjson_chunk in body_chunks],
+            ["2019-12-28", "2020-01-04"]
+        )
+        self.assertEqual(mock_dynamodb_resource.query.call_count, 3)
+
+        stream_event["queryStringParameters"] = {"startDate": "2020-01-31"}
+        status_code, headers_dict, body_chunks = stream_main(event=stream_event)
+        self.assertEqual(status_code, 400)
+        reset_boto_clients()
+
+    @patch("microservices.search.search.stream_search_ratings")
+    def test_main_ndjson(self, stream_search_ratings_mock):
+        """Tests format=ndjson returns one rating per line with the next
+            url in a Link header
+        """
+        from microservices.search.search import main
+
+        def mock_stream_search_ratings(start_date, end_date, fields, stream_stats):
+            stream_stats.update({
+                "ratings": 2,
+                "bytes": 80,
+                "last_night": "2020-01-11",
+                "next_url": "/search?startDate=2021-01-01&endDate=2021-02-01&fullRange=true&format=ndjson",
+                "truncated": False
+            })
+            return(iter([
+                {"RATINGS_OCCURRED_ON": "2020-01-04", "TOTAL_VIEWERS": Decimal("512")},
+                {"RATINGS_OCCURRED_ON": "2020-01-11", "TOTAL_VIEWERS": Decimal("498")}
+            ]))
+
+        stream_search_ratings_mock.side_effect = mock_stream_search_ratings
+        ndjson_request = deepcopy(self.search_proxy_event)
+        ndjson_request["headers"] = {"Accept": "application/x-ndjson"}
+
+        main_success_response = main(event=ndjson_request)
+
+        self.assertEqual(main_success_response["statusCode"], 200)
+        self.assertEqual(
+            main_success_response["body"],
+            '{"RATINGS_OCCURRED_ON":"2020-01-04","TOTAL_VIEWERS":512}\n'
+            '{"RATINGS_OCCURRED_ON":"2020-01-11","TOTAL_VIEWERS":498}\n'
+        )
+        self.assertEqual(
+            main_success_response["headers"]["Content-Type"], "application/x-ndjson"
+        )
+        self.assertEqual(
+            main_success_response["headers"]["Link"],
+            "</search?startDate=2021-01-01&endDate=2021-02-01&fullRange=true&format=ndjson>; rel=\"next\""
+        )
+        self.assertEqual(
+            main_success_response["headers"]["Last-Modified"], "Sat, 11 Jan 2020 00:00:00 GMT"
+        )
+
+    @patch.dict(os.environ, {"CURSOR_SIGNING_KEY": "mock-key"})
+    def test_validate_cursor_parameters(self):
+        """Tests the limit and cursor query parameters
+        """
+        from microlib.microlib import encode_cursor
+        from microservices.search.search import validate_cursor_parameters
+
+        start_date = datetime(2020, 1, 1)
+        end_date = datetime(2020, 2, 1)
+
+        self.assertEqual(
+            validate_cursor_parameters(
+                event=self.search_proxy_event,
+                start_date=start_date,
+                end_date=end_date
+            ),
+            (None, None, None)
+        )
+
+        cursor_request = deepcopy(self.search_proxy_event)
+        cursor_request["queryStringParameters"]["limit"] = "25"
+
+        '''
+            fails closed without a signing key shared by every container
+        '''
+        with patch.dict(os.environ, {"CURSOR_SIGNING_KEY": ""}):
+            error_response, limit, cursor_position = validate_cursor_parameters(
+                event=cursor_request,
+                start_date=start_date,
+                end_date=end_date
+            )
+            self.assertEqual(error_response["status_code"], 500)
+
+        self.assertEqual(
+            validate_cursor_parameters(
+                event=cursor_request,
+                start_date=start_date,
+                end_date=end_date
+            ),
+            (None, 25, None)
+        )
+
+        for invalid_limit in ["0", "-5", "abc", "5000", "1" * 50]:
+            cursor_request["queryStringParameters"]["limit"] = invalid_limit
+            error_response, limit, cursor_position = validate_cursor_parameters(
+                event=cursor_request,
+                start_date=start_date,
+                end_date=end_date
+            )
+            self.assertEqual(error_response["status_code"], 404)
+
+        cursor_position = {
+            "start": "2020-01-01",
+            "end": "2020-02-01",
+            "year": 2020,
+            "key": {"YEAR": 2020, "RATINGS_OCCURRED_ON": "2020-01-11"}
+        }
+        cursor_request["queryStringParameters"]["limit"] = "25"
+        cursor_request["queryStringParameters"]["cursor"] = encode_cursor(
+            cursor_position=cursor_position
+        )
+        self.assertEqual(
+            validate_cursor_parameters(
+                event=cursor_request,
+                start_date=start_date,
+                end_date=end_date
+            ),
+            (None, 25, cursor_position)
+        )
+
+        '''
+            cursor from a different search
+        '''
+        error_response, limit, cursor_position = validate_cursor_parameters(
+            event=cursor_request,
+            start_date=datetime(2019, 1, 1),
+            end_date=end_date
+        )
+        self.assertEqual(
+            error_response,
+            {
+                "message": "Invalid cursor for this startDate and endDate",
+                "status_code": 404
+            }
+        )
+
+    @patch.dict(os.environ, {"CURSOR_SIGNING_KEY": "mock-key"})
+    @patch("microservices.search.search.get_boto_clients")
+    def test_dynamodb_cursor_request(self, get_boto_clients_mock):
+        """Tests pages are bounded by limit and resume from the cursor
+        """
+        from microlib.microlib import decode_cursor
+        from microservices.search.search import dynamodb_cursor_request
+        from urllib.parse import parse_qs
+        from urllib.parse import urlparse
+
+        mock_dynamodb_resource = MagicMock()
+        mock_dynamodb_resource.query.side_effect = [
+            {
+                "Items": [
+                    {"YEAR": Decimal("2018"), "SHOW": "Dr. Stone", "RATINGS_OCCURRED_ON": "2018-12-29"}
+                ],
+                "Count": 1,
+                "ScannedCount": 1
+            },
+            {
+                "Items": [
+                    {"YEAR": Decimal("2019"), "SHOW": "Dr. Stone", "RATINGS_OCCURRED_ON": "2019-01-05"}
+                ],
+                "Count": 1,
+                "ScannedCount": 1,
+                "LastEvaluatedKey": {"YEAR": Decimal("2019"), "RATINGS_OCCURRED_ON": "2019-01-05"}
+            }
+        ]
+        get_boto_clients_mock.return_value = (None, mock_dynamodb_resource)
+
+        cursor_ratings, next_url = dynamodb_cursor_request(
+            start_date=datetime(2018, 12, 1),
+            end_date=datetime(2019, 2, 1),
+            limit=2
+        )
+
+        self.assertEqual(
+            [individual_show["RATINGS_OCCURRED_ON"] for individual_show in cursor_ratings],
+            ["2018-12-29", "2019-01-05"]
+        )
+        self.assertEqual(mock_dynamodb_resource.query.call_count, 2)
+        self.assertEqual(
+            mock_dynamodb_resource.query.call_args_list[1][1]["Limit"], 1
+        )
+
+        next_query = parse_qs(urlparse(next_url).query)
+        self.assertEqual(next_query["limit"], ["2"])
+        cursor_position = decode_cursor(cursor_token=next_query["cursor"][0])
+        self.assertEqual(cursor_position["year"], 2019)
+        self.assertEqual(
+            cursor_position["key"],
+            {"YEAR": 2019, "RATINGS_OCCURRED_ON": "2019-01-05"}
+        )
+
+        '''
+            resume from the cursor until 2019 runs out
+        '''
+        mock_dynamodb_resource.query.reset_mock()
+        mock_dynamodb_resource.query.side_effect = [
+            {
+                "Items": [
+                    {"YEAR": Decimal("2019"), "SHOW": "Dr. Stone", "RATINGS_OCCURRED_ON": "2019-01-12"}
+                ],
+                "Count": 1,
+                "ScannedCount": 1
+            }
+        ]
+        cursor_ratings, next_url = dynamodb_cursor_request(
+            start_date=datetime(2018, 12, 1),
+            end_date=datetime(2019, 2, 1),
+            limit=2,
+            cursor_position=cursor_position
+        )
+
+        self.assertEqual(len(cursor_ratings), 1)
+        self.assertIsNone(next_url)
+        self.assertEqual(
+            mock_dynamodb_resource.query.call_args[1]["ExclusiveStartKey"],
+            {"YEAR": 2019, "RATINGS_OCCURRED_ON": "2019-01-05"}
+        )
+
+    @patch.dict(os.environ, {"CURSOR_SIGNING_KEY": "mock-key"})
+    @patch("microservices.search.search.dynamodb_cursor_request")
+    def test_main_cursor(self, dynamodb_cursor_request_mock):
+        """Tests main uses cursor pagination when limit is passed
+        """
+        from microservices.search.search import main
+
+        dynamodb_cursor_request_mock.return_value = ([], "/search?mock")
+        cursor_request = deepcopy(self.search_proxy_event)
+        cursor_request["queryStringParameters"]["limit"] = "10"
+
+        main_success_response = main(event=cursor_request)
+
+        dynamodb_cursor_request_mock.assert_called_once_with(
+            start_date=datetime(2020, 1, 1),
+            end_date=datetime(2020, 2, 1),
+            limit=10,
+            cursor_position=None,
+            fields=None
+        )
+        self.assertEqual(
+            json.loads(main_success_response["body"]),
+            {"ratings": [], "next": "/search?mock"}
+        )
+
+        cursor_request["queryStringParameters"]["limit"] = "abc"
+        self.assertEqual(main(event=cursor_request)["statusCode"], 404)
+
     @patch("microservices.search.search.dynamodb_year_request")
     def test_main_error(self, dynamodb_year_request_mock):
         """Tests main function with an error response
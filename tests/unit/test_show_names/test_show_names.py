@@ -0,0 +1,150 @@
+from unittest.mock import patch
+
+import json
+import os
+import unittest
+
+
+class ShowNamesUnitTests(unittest.TestCase):
+    """Testing showNames endpoint logic unit tests only
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+
+        Raises
+        ------
+    """
+    @classmethod
+    def setUpClass(cls):
+        """Unitest function that is run once for the class
+
+            Parameters
+            ----------
+
+            Returns
+            -------
+
+            Raises
+            ------
+        """
+        with open("tests/events/show_names_proxy_event.json", "r") as lambda_event:
+            cls.show_names_proxy_event = json.load(lambda_event)
+
+    def setUp(self):
+        """Forgets the in memory show names rollup
+        """
+        from microservices.show_names.show_names import reset_show_names_cache
+
+        reset_show_names_cache()
+
+    @patch("microservices.show_names.show_names.get_rollups")
+    def test_main(self, get_rollups_mock):
+        """Tests prefix filtering from the show names rollup
+        """
+        from microservices.show_names.show_names import main
+
+        get_rollups_mock.return_value = [{
+            "ROLLUP": "SHOW_NAMES",
+            "PERIOD": "ALL",
+            "SHOW_NAMES": {
+                "Dragon Ball Z Kai", "One Piece", "Dr. Stone",
+                "dragon Ball Super", "Naruto Shippuden"
+            },
+            "LAST_NIGHT": "2019-05-18"
+        }]
+
+        apigw_response = main(event=self.show_names_proxy_event)
+
+        self.assertEqual(apigw_response["statusCode"], 200)
+        self.assertEqual(
+            json.loads(apigw_response["body"]),
+            ["dragon Ball Super", "Dragon Ball Z Kai"]
+        )
+        self.assertEqual(
+            apigw_response["headers"]["Last-Modified"], "Sat, 18 May 2019 00:00:00 GMT"
+        )
+
+        get_rollups_mock.assert_called_once_with(rollup_name="SHOW_NAMES", period="ALL")
+
+        '''
+            warm invocations reuse the rollup
+        '''
+        all_names_event = dict(self.show_names_proxy_event, queryStringParameters=None)
+        apigw_response = main(event=all_names_event)
+
+        self.assertEqual(
+            json.loads(apigw_response["body"]),
+            [
+                "Dr. Stone", "dragon Ball Super", "Dragon Ball Z Kai",
+                "Naruto Shippuden", "One Piece"
+            ]
+        )
+        get_rollups_mock.assert_called_once()
+
+    @patch("microservices.show_names.show_names.get_rollups")
+    def test_main_request_error(self, get_rollups_mock):
+        """Tests an invalid prefix returns http 400
+        """
+        from microservices.show_names.show_names import main
+
+        long_prefix_event = dict(
+            self.show_names_proxy_event,
+            queryStringParameters={"prefix": "a" * 101}
+        )
+        apigw_response = main(event=long_prefix_event)
+
+        self.assertEqual(apigw_response["statusCode"], 400)
+        get_rollups_mock.assert_not_called()
+
+    @patch("microservices.show_names.show_names.get_rollups")
+    def test_main_rollup_missing(self, get_rollups_mock):
+        """Tests a show names rollup that has not been built returns
+            http 503 and is read again by the next request
+        """
+        from microservices.show_names.show_names import main
+
+        get_rollups_mock.return_value = []
+
+        self.assertEqual(main(event=self.show_names_proxy_event)["statusCode"], 503)
+        self.assertEqual(main(event=self.show_names_proxy_event)["statusCode"], 503)
+        self.assertEqual(get_rollups_mock.call_count, 2)
+
+    def test_filter_show_names(self):
+        """Tests case insensitive prefix matching
+        """
+        from microservices.show_names.show_names import filter_show_names
+
+        show_names = ["Black Clover", "Dr. Stone", "Dragon Ball Z Kai", "One Piece"]
+        folded_names = [show_name.casefold() for show_name in show_names]
+
+        self.assertEqual(
+            filter_show_names(show_names=show_names, folded_names=folded_names, prefix="DR"),
+            ["Dr. Stone", "Dragon Ball Z Kai"]
+        )
+        self.assertEqual(
+            filter_show_names(show_names=show_names, folded_names=folded_names, prefix="z"),
+            []
+        )
+        self.assertEqual(
+            filter_show_names(show_names=show_names, folded_names=folded_names, prefix=""),
+            show_names
+        )
+
+    @patch("logging.getLogger")
+    @patch("microservices.show_names.show_names.main")
+    def test_lambda_handler_event(self, main_mock, getLogger_mock):
+        """Tests lambda_handler function with a proxy event
+        """
+        from microservices.show_names.show_names import lambda_handler
+
+        lambda_handler(
+            event=self.show_names_proxy_event,
+            context={}
+        )
+
+        main_mock.assert_called_once_with(
+            event=self.show_names_proxy_event
+        )
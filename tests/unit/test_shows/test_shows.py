@@ -37,6 +37,13 @@ class ShowsUnitTests(unittest.TestCase):
         with open("tests/events/shows_proxy_event.json", "r") as lambda_event:
             cls.shows_proxy_event = json.load(lambda_event)
 
+    def setUp(self):
+        """Empties the response cache shared by every endpoint
+        """
+        from microlib.microlib import reset_response_cache
+
+        reset_response_cache()
+
     @patch("microservices.shows.shows.dynamodb_show_request")
     @patch("microservices.shows.shows.get_boto_clients")
     def test_main(self, get_boto_clients_mock, dynamodb_show_request_mock):
@@ -59,7 +66,7 @@ class ShowsUnitTests(unittest.TestCase):
         '''
         from microservices.shows.shows import main
 
-        dynamodb_show_request_mock.return_value = [None, {"statusCode": 200, "body": "{}"}]
+        dynamodb_show_request_mock.return_value = [None, [{"SHOW": "mockpathparam", "RATINGS_OCCURRED_ON": "2013-08-17"}]]
         apigw_response = main(event=self.shows_proxy_event)
 
 
@@ -68,7 +75,9 @@ class ShowsUnitTests(unittest.TestCase):
         self.assertEqual(apigw_response["statusCode"], 200 )
 
         dynamodb_show_request_mock.assert_called_once_with(
-            show_name="mockpathparam"
+            show_name="mockpathparam",
+            fields=None,
+            query_stats={}
         )
 
 
@@ -153,18 +162,52 @@ class ShowsUnitTests(unittest.TestCase):
 
 
         self.assertEqual(
-            apigw_response["body"], 
-            json.dumps(
-                {"message": "show: mockpathparam not found"}
-            )
+            json.loads(apigw_response["body"]), 
+            {"message": "show: mockpathparam not found"}
         )
 
         self.assertEqual(apigw_response["statusCode"], 404 )
 
         dynamodb_show_request_mock.assert_called_once_with(
-            show_name="mockpathparam"
+            show_name="mockpathparam",
+            fields=None,
+            query_stats={}
+        )
+
+
+
+    @patch("microservices.shows.shows.dynamodb_show_request")
+    @patch("microservices.shows.shows.get_rollups")
+    def test_main_summary(self, get_rollups_mock, dynamodb_show_request_mock):
+        """Tests summary=true groups the show rollups by year and falls
+            back to the show query when they are missing
+        """
+        from microservices.shows.shows import main
+
+        summary_event = dict(
+            self.shows_proxy_event,
+            queryStringParameters={"summary": "true"}
         )
+        get_rollups_mock.return_value = []
+        dynamodb_show_request_mock.return_value = (None, [
+            {"SHOW": "mockpathparam", "RATINGS_OCCURRED_ON": "2013-08-17",
+                "YEAR": Decimal("2013"), "TOTAL_VIEWERS": Decimal("727")},
+            {"SHOW": "mockpathparam", "RATINGS_OCCURRED_ON": "2014-01-04",
+                "YEAR": Decimal("2014"), "TOTAL_VIEWERS": Decimal("683")}
+        ])
 
+        apigw_response = main(event=summary_event)
+
+        self.assertEqual(apigw_response["statusCode"], 200)
+        show_summary = json.loads(apigw_response["body"])
+        self.assertEqual(show_summary["show"], "mockpathparam")
+        self.assertEqual(show_summary["ratings"], 2)
+        self.assertEqual(show_summary["last_night"], "2014-01-04")
+        self.assertEqual(sorted(show_summary["years"]), ["2013", "2014"])
+        self.assertEqual(show_summary["years"]["2014"]["TOTAL_VIEWERS"]["max"], 683)
+
+        get_rollups_mock.assert_called_once_with(rollup_name="SHOW#mockpathparam")
+        dynamodb_show_request_mock.assert_called_once_with(show_name="mockpathparam", query_stats={})
 
 
     def test_clean_path_parameter_string(self):
@@ -222,7 +265,8 @@ class ShowsUnitTests(unittest.TestCase):
 
         mock_dynamodb_resource.query.assert_called_once_with(
             IndexName="SHOW_ACCESS",
-            KeyConditionExpression=Key("SHOW").eq(mock_show_name)
+            KeyConditionExpression=Key("SHOW").eq(mock_show_name),
+            ReturnConsumedCapacity="TOTAL"
         )
 
 
@@ -270,6 +314,136 @@ class ShowsUnitTests(unittest.TestCase):
         self.assertEqual(dyanmodb_shows, [])
 
 
+    def test_validate_batch_parameters(self):
+        """Tests the repeated show query parameter
+        """
+        from microservices.shows.shows import MAX_BATCH_SHOWS
+        from microservices.shows.shows import validate_batch_parameters
+
+        error_response, batch_shows = validate_batch_parameters(event={
+            "multiValueQueryStringParameters": {
+                "show": ["One Piece", "Yes, Dear", "One Piece"]
+            }
+        })
+        self.assertIsNone(error_response)
+        self.assertEqual(batch_shows, ["One Piece", "Yes, Dear"])
+
+        error_response, batch_shows = validate_batch_parameters(event={
+            "multiValueQueryStringParameters": {"show": ["One Piece", ""]}
+        })
+        self.assertEqual(error_response["status_code"], 400)
+
+        error_response, batch_shows = validate_batch_parameters(event={
+            "multiValueQueryStringParameters": {
+                "show": ["show " + str(show_number) for show_number in range(MAX_BATCH_SHOWS + 1)]
+            }
+        })
+        self.assertEqual(error_response["status_code"], 400)
+
+    @patch("microservices.shows.shows.run_concurrently_within_budget")
+    def test_main_batch(self, run_concurrently_within_budget_mock):
+        """Tests shows are grouped by show with partial failures
+        """
+        from concurrent.futures import TimeoutError as FutureTimeoutError
+        from microservices.shows.shows import main
+
+        run_concurrently_within_budget_mock.return_value = [
+            (
+                (None, [{"SHOW": "One Piece", "RATINGS_OCCURRED_ON": "2019-05-18"}]),
+                None
+            ),
+            (({"message": "show: Corey in the House not found"}, []), None),
+            (None, FutureTimeoutError()),
+            (None, ValueError("mock failure"))
+        ]
+
+        batch_response = main(event={
+            "pathParameters": None,
+            "multiValueQueryStringParameters": {
+                "show": ["One Piece", "Corey in the House", "Naruto", "Bleach"]
+            }
+        })
+
+        self.assertEqual(batch_response["statusCode"], 200)
+        batch_body = json.loads(batch_response["body"])
+        self.assertEqual(
+            batch_body["One Piece"],
+            {
+                "status": 200,
+                "ratings": [{"SHOW": "One Piece", "RATINGS_OCCURRED_ON": "2019-05-18"}]
+            }
+        )
+        self.assertEqual(batch_body["Corey in the House"]["status"], 404)
+        self.assertEqual(batch_body["Naruto"]["status"], 504)
+        self.assertEqual(batch_body["Bleach"]["status"], 502)
+
+        '''
+            queries are deduplicated and a partial failure is not cached
+        '''
+        self.assertEqual(
+            run_concurrently_within_budget_mock.call_args[1]["request_kwargs_list"],
+            [
+                {"show_name": "One Piece", "fields": None, "query_stats": {}},
+                {"show_name": "Corey in the House", "fields": None, "query_stats": {}},
+                {"show_name": "Naruto", "fields": None, "query_stats": {}},
+                {"show_name": "Bleach", "fields": None, "query_stats": {}}
+            ]
+        )
+        self.assertNotIn("ETag", batch_response["headers"])
+
+        '''
+            One Piece is served from the response cache on the next batch
+        '''
+        run_concurrently_within_budget_mock.return_value = []
+        batch_response = main(event={
+            "pathParameters": None,
+            "multiValueQueryStringParameters": {"show": ["One Piece"]}
+        })
+        self.assertEqual(
+            run_concurrently_within_budget_mock.call_args[1]["request_kwargs_list"], []
+        )
+        self.assertEqual(json.loads(batch_response["body"])["One Piece"]["status"], 200)
+        self.assertEqual(
+            batch_response["headers"]["Last-Modified"], "Sat, 18 May 2019 00:00:00 GMT"
+        )
+
+    @patch("microservices.shows.shows.dynamodb_show_request")
+    def test_main_batch_truncated(self, dynamodb_show_request_mock):
+        """Tests a show cut off by the query budget flags the batch and
+            is not cached
+        """
+        from microservices.shows.shows import main
+
+        def mock_show_request(show_name, fields, query_stats):
+            query_stats["truncated"] = show_name == "One Piece"
+            return(None, [{"SHOW": show_name, "RATINGS_OCCURRED_ON": "2019-05-18"}])
+
+        dynamodb_show_request_mock.side_effect = mock_show_request
+        batch_event = {
+            "pathParameters": None,
+            "multiValueQueryStringParameters": {"show": ["One Piece", "Naruto"]}
+        }
+
+        batch_response = main(event=batch_event)
+
+        self.assertEqual(json.loads(batch_response["body"])["One Piece"]["status"], 200)
+        self.assertEqual(batch_response["headers"]["X-Results-Truncated"], "true")
+        self.assertEqual(batch_response["headers"]["Cache-Control"], "no-store")
+        self.assertNotIn("ETag", batch_response["headers"])
+
+        '''
+            only the complete show is served from the response cache
+        '''
+        main(event=batch_event)
+        self.assertEqual(
+            [
+                show_call[1]["show_name"]
+                for show_call in dynamodb_show_request_mock.call_args_list
+            ].count("One Piece"),
+            2
+        )
+        self.assertEqual(dynamodb_show_request_mock.call_count, 3)
+
     @patch("logging.getLogger")
     @patch("microservices.shows.shows.main")
     def test_lambda_handler_event(self, main_mock, 
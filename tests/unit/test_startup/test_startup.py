@@ -0,0 +1,67 @@
+import unittest
+
+
+class StartupUnitTests(unittest.TestCase):
+    """Testing handler cold start imports against benchmarks/bench_startup.py
+    """
+    def test_parse_importtime(self):
+        """Tests self and cumulative microseconds are read per module
+        """
+        from benchmarks.bench_startup import parse_importtime
+
+        self.assertEqual(
+            parse_importtime(importtime_output="\n".join([
+                "import time: self [us] | cumulative | imported package",
+                "import time:       412 |        412 |     _json",
+                "import time:      1204 |       1616 |   json",
+                "import time:      5954 |      77910 | microservices.years.years",
+                "Traceback (most recent call last):"
+            ])),
+            {
+                "_json": (412, 412),
+                "json": (1204, 1616),
+                "microservices.years.years": (5954, 77910)
+            }
+        )
+
+    def test_handler_deferred_imports(self):
+        """Tests every handler defers boto3 and pyarrow, the millisecond
+            budget is gated by python -m benchmarks.bench_startup
+        """
+        from benchmarks.bench_startup import HANDLER_MODULES
+        from benchmarks.bench_startup import deferred_import_errors
+        from benchmarks.bench_startup import measure_startup
+
+        for handler_module in HANDLER_MODULES:
+            with self.subTest(handler_module=handler_module):
+                startup_stats = measure_startup(
+                    handler_module=handler_module,
+                    benchmark_repeat=1
+                )
+
+                self.assertEqual(
+                    deferred_import_errors(
+                        handler_module=handler_module,
+                        startup_stats=startup_stats
+                    ),
+                    []
+                )
+
+    def test_budget_errors(self):
+        """Tests a deferred module or slow import is reported
+        """
+        from benchmarks.bench_startup import budget_errors
+
+        self.assertEqual(
+            budget_errors(
+                handler_module="microservices.years.years",
+                startup_stats={
+                    "import_ms": 310.5,
+                    "imported_modules": {"boto3", "microservices.years.years"}
+                }
+            ),
+            [
+                "microservices.years.years imports boto3 at import time",
+                "microservices.years.years imports in 310.5 ms, budget 200 ms"
+            ]
+        )
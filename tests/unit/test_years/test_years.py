@@ -1,4 +1,5 @@
 
+from copy import deepcopy
 from datetime import datetime
 from decimal import Decimal
 from unittest.mock import MagicMock
@@ -37,6 +38,13 @@ class YearsUnitTests(unittest.TestCase):
         with open("tests/events/years_proxy_event.json", "r") as lambda_event:
             cls.years_proxy_event = json.load(lambda_event)
 
+    def setUp(self):
+        """Empties the response cache shared by every endpoint
+        """
+        from microlib.microlib import reset_response_cache
+
+        reset_response_cache()
+
     def test_clean_path_parameter_string(self):
         """validates clean_year_path_parameter logic
         """
@@ -94,8 +102,42 @@ class YearsUnitTests(unittest.TestCase):
 
         mock_dynamodb_resource.query.assert_called_once_with(
             IndexName="YEAR_ACCESS",
-            KeyConditionExpression=Key("YEAR").eq(int(mock_year))
+            KeyConditionExpression=Key("YEAR").eq(int(mock_year)),
+            ReturnConsumedCapacity="TOTAL"
+        )
+
+    @patch("microservices.years.years.get_boto_clients")
+    def test_dynamodb_year_request_pagination(self, get_boto_clients_mock):
+        """tests every page of a year over 1 MB is returned
+        """
+        from microservices.years.years import dynamodb_year_request
+
+        mock_dynamodb_resource = MagicMock()
+
+        mock_dynamodb_resource.query.side_effect = [
+            {
+                "Items": [{"YEAR": Decimal("2013"), "SHOW": "IGPX", "RATINGS_OCCURRED_ON": "2013-04-27"}],
+                "Count": 1,
+                "ScannedCount": 1,
+                "LastEvaluatedKey": {"YEAR": Decimal("2013"), "RATINGS_OCCURRED_ON": "2013-04-27"}
+            },
+            {
+                "Items": [{"YEAR": Decimal("2013"), "SHOW": "IGPX", "RATINGS_OCCURRED_ON": "2013-05-04"}],
+                "Count": 1,
+                "ScannedCount": 1
+            }
+        ]
+        get_boto_clients_mock.return_value = (None, mock_dynamodb_resource)
+
+        error_message, dynamodb_years = dynamodb_year_request(year="2013")
+
+        self.assertIsNone(error_message)
+        self.assertEqual(mock_dynamodb_resource.query.call_count, 2)
+        self.assertEqual(
+            [individual_show["RATINGS_OCCURRED_ON"] for individual_show in dynamodb_years],
+            ["2013-04-27", "2013-05-04"]
         )
+        self.assertEqual(dynamodb_years[1]["YEAR"], Decimal("2013"))
 
     @patch("microservices.years.years.get_boto_clients")
     def test_dynamodb_year_request_404(self, get_boto_clients_mock):
@@ -145,9 +187,235 @@ class YearsUnitTests(unittest.TestCase):
 
 
         dynamodb_year_request_mock.assert_called_once_with(
-            year=self.years_proxy_event["pathParameters"]["year"]
+            year=self.years_proxy_event["pathParameters"]["year"],
+            fields=None,
+            query_stats={}
+        )
+
+
+    @patch("microservices.years.years.dynamodb_year_request")
+    def test_main_response_cache(self, dynamodb_year_request_mock):
+        """Tests a repeated year is served from the response cache
+        """
+        from microservices.years.years import main
+
+        dynamodb_year_request_mock.return_value = (
+            None, [{"YEAR": Decimal("2014"), "RATINGS_OCCURRED_ON": "2014-01-04"}]
+        )
+
+        first_response = main(event=self.years_proxy_event)
+        second_response = main(event=self.years_proxy_event)
+
+        dynamodb_year_request_mock.assert_called_once()
+        self.assertEqual(second_response["statusCode"], 200)
+        self.assertEqual(
+            json.loads(second_response["body"]),
+            [{"YEAR": 2014, "RATINGS_OCCURRED_ON": "2014-01-04"}]
+        )
+        self.assertEqual(first_response["body"], second_response["body"])
+
+        '''
+            the ETag from the first response makes the next request a 304
+        '''
+        conditional_event = deepcopy(self.years_proxy_event)
+        conditional_event["headers"] = {
+            "If-None-Match": first_response["headers"]["ETag"]
+        }
+        not_modified_response = main(event=conditional_event)
+
+        dynamodb_year_request_mock.assert_called_once()
+        self.assertEqual(not_modified_response["statusCode"], 304)
+        self.assertEqual(not_modified_response["body"], "")
+        self.assertGreater(
+            int(not_modified_response["headers"]["Cache-Control"].split("max-age=")[1]),
+            86000
+        )
+
+    @patch("microservices.years.years.dynamodb_year_request")
+    def test_main_truncated(self, dynamodb_year_request_mock):
+        """Tests a year cut off by the query budget is flagged and
+            neither cached nor given an ETag
+        """
+        from microservices.years.years import main
+
+        def mock_year_request(year, fields, query_stats):
+            query_stats["truncated"] = True
+            return(None, [{"YEAR": Decimal("2014"), "RATINGS_OCCURRED_ON": "2014-01-04"}])
+
+        dynamodb_year_request_mock.side_effect = mock_year_request
+
+        first_response = main(event=self.years_proxy_event)
+        second_response = main(event=self.years_proxy_event)
+
+        self.assertEqual(dynamodb_year_request_mock.call_count, 2)
+        self.assertEqual(second_response["statusCode"], 200)
+        self.assertEqual(
+            json.loads(second_response["body"]),
+            [{"YEAR": 2014, "RATINGS_OCCURRED_ON": "2014-01-04"}]
+        )
+        self.assertEqual(first_response["headers"]["X-Results-Truncated"], "true")
+        self.assertEqual(first_response["headers"]["Cache-Control"], "no-store")
+        self.assertNotIn("ETag", first_response["headers"])
+
+    @patch("microservices.years.years.dynamodb_year_request")
+    @patch("microservices.years.years.get_rollups")
+    def test_main_summary(self, get_rollups_mock, dynamodb_year_request_mock):
+        """Tests summary=true reads the year rollup and falls back to
+            the year query when the rollup is missing
+        """
+        from microservices.years.years import main
+
+        summary_event = deepcopy(self.years_proxy_event)
+        summary_event["queryStringParameters"] = {"summary": "true"}
+        summary_year = int(summary_event["pathParameters"]["year"])
+
+        get_rollups_mock.return_value = [{
+            "ROLLUP": "YEAR", "PERIOD": str(summary_year), "RATINGS": Decimal("2"),
+            "FIRST_NIGHT": "2014-01-04", "LAST_NIGHT": "2014-01-11",
+            "TOTAL_VIEWERS": {"count": Decimal("2"), "sum": Decimal("900"),
+                "min": Decimal("400"), "max": Decimal("500")}
+        }]
+
+        summary_response = main(event=summary_event)
+
+        self.assertEqual(summary_response["statusCode"], 200)
+        self.assertEqual(
+            json.loads(summary_response["body"]),
+            {
+                "year": summary_year, "ratings": 2,
+                "first_night": "2014-01-04", "last_night": "2014-01-11",
+                "TOTAL_VIEWERS": {
+                    "count": 2, "sum": 900, "mean": 450.0, "min": 400, "max": 500
+                },
+                "TOTAL_VIEWERS_AGE_18_49": {"count": 0}
+            }
+        )
+        get_rollups_mock.assert_called_once_with(rollup_name="YEAR", period=summary_year)
+        dynamodb_year_request_mock.assert_not_called()
+
+        '''
+            the summary is cached apart from the ratings
+        '''
+        from microlib.microlib import reset_response_cache
+
+        reset_response_cache()
+        get_rollups_mock.return_value = []
+        dynamodb_year_request_mock.return_value = (None, [
+            {"RATINGS_OCCURRED_ON": "2014-01-04", "TOTAL_VIEWERS": Decimal("400")}
+        ])
+
+        fallback_response = main(event=summary_event)
+
+        dynamodb_year_request_mock.assert_called_once_with(year=summary_year, query_stats={})
+        self.assertEqual(json.loads(fallback_response["body"])["ratings"], 1)
+
+    @patch("microservices.years.years.get_boto_clients")
+    def test_main_fields(self, get_boto_clients_mock):
+        """Tests the fields query parameter becomes a ProjectionExpression
+        """
+        from microservices.years.years import main
+
+        mock_dynamodb_resource = MagicMock()
+        mock_dynamodb_resource.query.return_value = {
+            "Items": [{"RATINGS_OCCURRED_ON": "2014-01-04", "SHOW": "IGPX"}],
+            "Count": 1,
+            "ScannedCount": 1
+        }
+        get_boto_clients_mock.return_value = (None, mock_dynamodb_resource)
+
+        fields_event = deepcopy(self.years_proxy_event)
+        fields_event["queryStringParameters"] = {"fields": "SHOW"}
+
+        fields_response = main(event=fields_event)
+
+        self.assertEqual(fields_response["statusCode"], 200)
+        self.assertEqual(
+            json.loads(fields_response["body"]),
+            [{"RATINGS_OCCURRED_ON": "2014-01-04", "SHOW": "IGPX"}]
+        )
+        self.assertEqual(
+            mock_dynamodb_resource.query.call_args[1]["ProjectionExpression"],
+            "#RATINGS_OCCURRED_ON, #SHOW"
         )
 
+        fields_event["queryStringParameters"] = {"fields": "SHOW,NOT_A_FIELD"}
+        error_response = main(event=fields_event)
+
+        self.assertEqual(error_response["statusCode"], 400)
+        mock_dynamodb_resource.query.assert_called_once()
+
+    @patch("builtins.print")
+    @patch("microservices.years.years.get_boto_clients")
+    def test_main_request_metrics(self, get_boto_clients_mock, print_mock):
+        """Tests main prints one metrics record for each request
+        """
+        from microservices.years.years import main
+
+        mock_dynamodb_resource = MagicMock()
+        mock_dynamodb_resource.query.return_value = {
+            "Items": [{"RATINGS_OCCURRED_ON": "2014-01-04", "SHOW": "IGPX"}],
+            "Count": 1,
+            "ScannedCount": 1,
+            "ConsumedCapacity": {"CapacityUnits": 0.5}
+        }
+        get_boto_clients_mock.return_value = (None, mock_dynamodb_resource)
+
+        with patch.dict(os.environ, {"REQUEST_METRICS": "true"}):
+            apigw_response = main(event=self.years_proxy_event)
+            main(event=self.years_proxy_event)
+
+        self.assertEqual(print_mock.call_count, 2)
+        metrics_record, cached_record = [
+            json.loads(call_args[0][0]) for call_args in print_mock.call_args_list
+        ]
+        self.assertEqual(metrics_record["endpoint"], "years")
+        self.assertEqual(metrics_record["status_code"], 200)
+        self.assertEqual(metrics_record["items"], 1)
+        self.assertEqual(metrics_record["consumed_capacity"], 0.5)
+        self.assertEqual(metrics_record["response_bytes"], len(apigw_response["body"]))
+        self.assertIn("validate_ms", metrics_record)
+        self.assertIn("query_ms", metrics_record)
+
+        self.assertEqual(cached_record["cache_hits"], 1)
+        self.assertNotIn("query_ms", cached_record)
+
+    @patch("microservices.years.years.dynamodb_year_request")
+    def test_main_columnar(self, dynamodb_year_request_mock):
+        """Tests format=columnar returns one list per attribute and is
+            cached apart from the rows format
+        """
+        from microservices.years.years import main
+
+        dynamodb_year_request_mock.return_value = (None, [
+            {"RATINGS_OCCURRED_ON": "2014-01-04", "SHOW": "IGPX", "YEAR": Decimal("2014")},
+            {"RATINGS_OCCURRED_ON": "2014-01-11", "SHOW": "IGPX", "YEAR": Decimal("2014")}
+        ])
+
+        columnar_event = deepcopy(self.years_proxy_event)
+        columnar_event["queryStringParameters"] = {"format": "columnar"}
+
+        columnar_response = main(event=columnar_event)
+        rows_response = main(event=self.years_proxy_event)
+
+        self.assertEqual(
+            json.loads(columnar_response["body"]),
+            {
+                "rows": 2,
+                "columns": {
+                    "RATINGS_OCCURRED_ON": ["2014-01-04", "2014-01-11"],
+                    "YEAR": [2014, 2014],
+                    "SHOW": {"dictionary": ["IGPX"], "indices": [0, 0]}
+                }
+            }
+        )
+        self.assertEqual(
+            columnar_response["headers"]["Content-Type"],
+            "application/vnd.ratingsapi.columnar+json"
+        )
+        self.assertEqual(len(json.loads(rows_response["body"])), 2)
+        self.assertNotEqual(
+            columnar_response["headers"]["ETag"], rows_response["headers"]["ETag"]
+        )
 
     @patch("microservices.years.years.dynamodb_year_request")
     def test_main_error(self, dynamodb_year_request_mock):